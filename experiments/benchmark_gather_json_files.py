@@ -0,0 +1,124 @@
+"""
+Benchmark 'Data.gather_json_files()' on a synthetic results tree.
+
+500 testgroups x 100 tests = 50k outcomes, every 7th test failed and xfailed.
+
+Baseline: The implementation before: read_text(), json.loads(),
+ResultTestOutcome(**r) and a second pass to patch the xfailed tests.
+
+Measured on one CPU without orjson: 0.8x to 1.2x, within the noise.
+Reading the files in a thread pool did not help either: Parsing holds the GIL.
+The time goes into json parsing and creating the outcomes.
+
+python experiments/benchmark_gather_json_files.py
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import pathlib
+import tempfile
+import time
+
+from testbed_micropython.report_test.util_baseclasses import (
+    Outcome,
+    ResultContext,
+    ResultTestGroup,
+    ResultTestOutcome,
+)
+from testbed_micropython.report_test.util_constants import (
+    FILENAME_CONTEXT_JSON,
+    FILENAME_CONTEXT_TESTGROUP_JSON,
+)
+from testbed_micropython.report_test.util_testreport import Data
+from testbed_micropython.report_test.util_xfail import XFailList
+
+TESTGROUPS = 500
+TESTS = 100
+TESTGROUP = "RUN-TESTS_STANDARD"
+BOARD_VARIANT = "RPI_PICO2"
+
+
+def write_tree(directory: pathlib.Path) -> pathlib.Path:
+    (directory / FILENAME_CONTEXT_JSON).write_text(
+        json.dumps(dataclasses.asdict(ResultContext()))
+    )
+    for idx_group in range(TESTGROUPS):
+        directory_relative = f"{TESTGROUP}@{idx_group:04x}-{BOARD_VARIANT},a"
+        testgroup = ResultTestGroup(
+            directory_relative=directory_relative,
+            testgroup=TESTGROUP,
+            testid=f"{TESTGROUP}@{idx_group:04x}-{BOARD_VARIANT}",
+            tentacle_variant=f"{idx_group:04x}-{BOARD_VARIANT}",
+            msg_error="",
+            outcomes=[
+                ResultTestOutcome(
+                    name=f"basics/test_{idx_test}.py",
+                    outcome=Outcome.FAILED if idx_test % 7 == 0 else Outcome.PASSED,
+                )
+                for idx_test in range(TESTS)
+            ],
+        )
+        (directory / directory_relative).mkdir()
+        (directory / directory_relative / FILENAME_CONTEXT_TESTGROUP_JSON).write_text(
+            json.dumps(dataclasses.asdict(testgroup), indent=4)
+        )
+
+    xfail_list = XFailList()
+    xfail_group = xfail_list.get_group(testgroup=TESTGROUP)
+    for idx_test in range(0, TESTS, 7):
+        xfail_group.add(
+            board_variant=BOARD_VARIANT, test_name=f"basics/test_{idx_test}.py"
+        )
+    filename_xfail = directory / "xfail.json"
+    xfail_list.write(filename_xfail)
+    return filename_xfail
+
+
+def baseline(directory: pathlib.Path, xfail_list: XFailList) -> int:
+    testgroups: list[ResultTestGroup] = []
+    for filename in directory.glob(f"*/{FILENAME_CONTEXT_TESTGROUP_JSON}"):
+        testgroup = ResultTestGroup(**json.loads(filename.read_text()))
+        testgroup.outcomes = [
+            ResultTestOutcome(**r)  # type: ignore[arg-type]
+            for r in testgroup.outcomes
+        ]
+        testgroups.append(testgroup)
+    for testgroup in testgroups:
+        for outcome in testgroup.outcomes:
+            if outcome.outcome == Outcome.FAILED.value:
+                if xfail_list.match(
+                    testgroup=testgroup.testgroup,
+                    test_name=outcome.name,
+                    board_variant=testgroup.board_variant,
+                ):
+                    outcome.outcome = Outcome.XFAILED.value
+    return sum(len(testgroup.outcomes) for testgroup in testgroups)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = pathlib.Path(tmp)
+        filename_xfail = write_tree(directory)
+        xfail_list = XFailList.factory(filename_xfail)
+
+        for _ in range(3):
+            begin_s = time.perf_counter()
+            outcomes = baseline(directory=directory, xfail_list=xfail_list)
+            baseline_s = time.perf_counter() - begin_s
+
+            begin_s = time.perf_counter()
+            data = Data.gather_json_files(
+                directory_results=directory, xfail_file=str(filename_xfail)
+            )
+            gather_s = time.perf_counter() - begin_s
+            assert sum(len(tg.outcomes) for tg in data.testgroups) == outcomes
+
+            print(
+                f"{outcomes} outcomes: baseline {baseline_s:0.3f}s, gather_json_files {gather_s:0.3f}s, speedup {baseline_s / gather_s:0.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
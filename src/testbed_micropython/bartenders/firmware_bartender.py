@@ -7,6 +7,7 @@ import time
 import typing
 from collections import defaultdict
 
+from mpbuild.board_database import Database
 from octoprobe import util_firmware_spec
 from octoprobe.util_baseclasses import OctoprobeAppExitException
 from octoprobe.util_constants import relative_cwd
@@ -15,8 +16,11 @@ from octoprobe.util_micropython_boards import BoardVariant
 from octoprobe.util_pytest import util_logging
 
 from .. import util_firmware_mpbuild, util_multiprocessing
+from ..constants import reference_boards
 from ..mpbuild.build_api import MpbuildDockerException
 from ..testcollection.baseclasses_run import TestRunSpecs
+from ..util_ccache import Ccache, CcacheStats
+from ..util_firmware_cache import FirmwareCache
 from ..util_mpycross import copy_mpycross
 
 logger = logging.getLogger(__file__)
@@ -28,6 +32,10 @@ class EventFirmwareSpec(util_multiprocessing.EventBase):
     start_s: float
     end_s: float
     logfile: pathlib.Path
+    ccache_stats: CcacheStats | None = None
+    """
+    None: ccache was not used, for example: Taken from the firmware cache
+    """
 
     @property
     def duration_s(self) -> float:
@@ -46,63 +54,70 @@ class EventExitFirmware(util_multiprocessing.EventExit):
 def target_build_firmware_async(
     arg1: util_multiprocessing.TargetArg1,
     directory_mpbuild_artifacts: pathlib.Path,
-    firmwares: FirmwaresTobeBuilt,
+    firmware: FirmwareTobeBuilt,
     repo_micropython_firmware: pathlib.Path,
+    firmware_cache: FirmwareCache | None,
+    ccache: Ccache | None,
 ) -> None:
+    """
+    Builds one firmware.
+    The 'FirmwareBartender' will start one process for every firmware.
+    """
     assert isinstance(arg1, util_multiprocessing.TargetArg1)
     assert isinstance(directory_mpbuild_artifacts, pathlib.Path)
-    assert isinstance(firmwares, FirmwaresTobeBuilt)
+    assert isinstance(firmware, FirmwareTobeBuilt)
     assert isinstance(repo_micropython_firmware, pathlib.Path)
+    assert isinstance(firmware_cache, FirmwareCache | None)
+    assert isinstance(ccache, Ccache | None)
 
     success = False
     logfile = pathlib.Path("/dummy_path")
     target_unique_name = arg1.target_unique_name
     try:
         arg1.initfunc(arg1=arg1)
-        for firmware in firmwares:
-            builder = util_firmware_mpbuild.Builder(
-                variant=firmware.firmware_build_spec.board_variant,
-                mpbuild_artifacts=directory_mpbuild_artifacts,
+        builder = util_firmware_mpbuild.Builder(
+            variant=firmware.firmware_build_spec.board_variant,
+            mpbuild_artifacts=directory_mpbuild_artifacts,
+        )
+        with util_logging.Logs(builder.mpbuild_artifacts) as logs:
+            logfile = logs.filename
+            util_multiprocessing.EVENTLOGCALLBACK.log(
+                msg=f"Firmware build start. Logfile: {relative_cwd(builder.docker_logfile)}",
+                target_unique_name=target_unique_name,
             )
-            with util_logging.Logs(builder.mpbuild_artifacts) as logs:
-                logfile = logs.filename
-                target_unique_name = (
-                    firmware.firmware_build_spec.board_variant.name_normalized
+
+            start_s = time.monotonic()
+            try:
+                spec = builder.build(
+                    repo_micropython_firmware=repo_micropython_firmware,
+                    firmware_cache=firmware_cache,
+                    ccache=ccache,
                 )
-                util_multiprocessing.EVENTLOGCALLBACK.log(
-                    msg=f"Firmware build start. Logfile: {relative_cwd(builder.docker_logfile)}",
-                    target_unique_name=target_unique_name,
+            except MpbuildDockerException as e:
+                # We log the exception in the local logger and do NOT
+                # send the exception to the main process: pickle will fail on some exceptions!
+                logger.error(f"{e!r}: See logfile: {builder.docker_logfile}")
+                raise e
+            except Exception as e:
+                logger.exception(
+                    f"{e!r}: See logfile: {builder.docker_logfile}", exc_info=e
                 )
+                raise e
 
-                start_s = time.monotonic()
-                try:
-                    spec = builder.build(
-                        repo_micropython_firmware=repo_micropython_firmware
-                    )
-                except MpbuildDockerException as e:
-                    # We log the exception in the local logger and do NOT
-                    # send the exception to the main process: pickle will fail on some exceptions!
-                    logger.error(f"{e!r}: See logfile: {builder.docker_logfile}")
-                    raise e
-                except Exception as e:
-                    logger.exception(
-                        f"{e!r}: See logfile: {builder.docker_logfile}", exc_info=e
-                    )
-                    raise e
-
-                copy_mpycross(
-                    repo_micropython=repo_micropython_firmware,
-                    directory_mpbuild_artifacts=builder.mpbuild_artifacts,
-                )
-                arg1.queue_put(
-                    EventFirmwareSpec(
-                        target_unique_name=spec.board_variant.name_normalized,
-                        firmware_spec=spec,
-                        start_s=start_s,
-                        end_s=time.monotonic(),
-                        logfile=builder.docker_logfile,
-                    )
+            copy_mpycross(
+                repo_micropython=repo_micropython_firmware,
+                directory_mpbuild_artifacts=builder.mpbuild_artifacts,
+            )
+            arg1.queue_put(
+                EventFirmwareSpec(
+                    target_unique_name=target_unique_name,
+                    firmware_spec=spec,
+                    start_s=start_s,
+                    end_s=time.monotonic(),
+                    logfile=builder.docker_logfile,
+                    ccache_stats=builder.ccache_stats,
                 )
+            )
         success = True
 
     except Exception:
@@ -160,10 +175,11 @@ class FirmwaresTobeBuilt(list[FirmwareTobeBuilt]):
             for tsv in testrun_spec.tsvs_todo:
                 add_board_variant(board=tsv.board, variant=tsv.variant)
 
+        boards_reference = reference_boards(reference_board)
         firmwares = FirmwaresTobeBuilt()
         for board, variants in board_variants.items():
             for idx, variant in enumerate(sorted(variants)):
-                if board == reference_board:
+                if board in boards_reference:
                     # The referenced_board should be compiled first: highest priority!
                     idx = -1000
                 firmwares.append(
@@ -187,6 +203,13 @@ class FirmwareBartenderSkipFlash:
     def firmwares_built(self) -> set[str] | None:
         return None
 
+    @property
+    def firmwares_todo(self) -> int:
+        """
+        The number of firmwares which have not been started yet.
+        """
+        return 0
+
     def firmware_built(self, firmware_build_spec: FirmwareBuildSpec) -> None:
         pass
 
@@ -195,6 +218,12 @@ class FirmwareBartenderSkipFlash:
         directory_mpbuild_artifacts: pathlib.Path,
         repo_micropython_firmware: pathlib.Path,
         reference_board: str,
+    ) -> None:
+        pass
+
+    def firmware_next(
+        self,
+        waiting_tentacles: dict[str, int],
     ) -> AsyncTargetFirmware | None:
         return None
 
@@ -223,10 +252,35 @@ class FirmwareBartenderSkipFlash:
 
 
 class FirmwareBartender(FirmwareBartenderSkipFlash):
-    def __init__(self, testrun_specs: TestRunSpecs) -> None:
+    PORT_JOBS_MAX = 1
+    """
+    The builds of the same port share the port directory,
+    for example 'ports/esp32/managed_components' or the submodules.
+    Therefore only one build per port may run at the same time.
+    """
+
+    def __init__(
+        self,
+        testrun_specs: TestRunSpecs,
+        build_jobs: int = 1,
+        firmware_cache: FirmwareCache | None = None,
+        ccache: Ccache | None = None,
+    ) -> None:
+        assert isinstance(testrun_specs, TestRunSpecs)
+        assert isinstance(build_jobs, int)
+        assert build_jobs >= 1
+        assert isinstance(firmware_cache, FirmwareCache | None)
+        assert isinstance(ccache, Ccache | None)
         super().__init__()
         self._testrun_specs = testrun_specs
+        self._build_jobs = build_jobs
+        self._firmware_cache = firmware_cache
+        self._ccache = ccache
         self._firmwares_built = FirmwaresBuilt()
+        self._firmwares_todo = FirmwaresTobeBuilt()
+        self._port_by_board: dict[str, str] = {}
+        self._directory_mpbuild_artifacts = pathlib.Path("/dummy_path")
+        self._repo_micropython_firmware = pathlib.Path("/dummy_path")
 
     @typing.override
     def firmware_built(self, firmware_build_spec: FirmwareBuildSpec) -> None:
@@ -235,23 +289,101 @@ class FirmwareBartender(FirmwareBartenderSkipFlash):
             firmware_build_spec
         )
 
+    @property
+    @typing.override
+    def firmwares_todo(self) -> int:
+        return len(self._firmwares_todo)
+
     @typing.override
     def build_firmwares(
         self,
         directory_mpbuild_artifacts: pathlib.Path,
         repo_micropython_firmware: pathlib.Path,
         reference_board: str,
-    ) -> AsyncTargetFirmware | None:
-        async_target = AsyncTargetFirmware(
-            directory_mpbuild_artifacts=directory_mpbuild_artifacts,
-            firmwares_tobe_build=FirmwaresTobeBuilt.factory(
-                self._testrun_specs,
-                reference_board=reference_board,
-            ),
-            repo_micropython_firmware=repo_micropython_firmware,
+    ) -> None:
+        """
+        Collects the firmwares to be built.
+        The builds are started by 'firmware_next()'.
+        """
+        assert isinstance(directory_mpbuild_artifacts, pathlib.Path)
+        assert isinstance(repo_micropython_firmware, pathlib.Path)
+        assert isinstance(reference_board, str)
+
+        self._directory_mpbuild_artifacts = directory_mpbuild_artifacts
+        self._repo_micropython_firmware = repo_micropython_firmware
+        self._firmwares_todo = FirmwaresTobeBuilt.factory(
+            self._testrun_specs,
+            reference_board=reference_board,
         )
-        self.async_targets.append(async_target)
-        return async_target
+
+        db = Database(repo_micropython_firmware)
+        for firmware in self._firmwares_todo:
+            board = firmware.firmware_build_spec.board_variant.board
+            try:
+                self._port_by_board[board] = db.boards[board].port.name
+            except KeyError:
+                # The build will fail and report the error
+                self._port_by_board[board] = board
+
+    def _ports_running(self) -> list[str]:
+        return [
+            self._port_by_board[
+                async_target.firmware.firmware_build_spec.board_variant.board
+            ]
+            for async_target in self.async_targets
+            if not async_target.target.has_been_joined
+        ]
+
+    @typing.override
+    def firmware_next(
+        self,
+        waiting_tentacles: dict[str, int],
+    ) -> AsyncTargetFirmware | None:
+        """
+        Return the next firmware to be built or None if
+        * all firmwares have been started
+        * 'build_jobs' builds are running
+        * the firmwares left belong to ports which are busy
+
+        'waiting_tentacles': board_variant -> number of idle tentacles waiting for this firmware.
+        The firmwares for the most waiting tentacles are built first.
+
+        The first build runs alone: It also builds 'mpy-cross' which is shared by all ports.
+        """
+        assert isinstance(waiting_tentacles, dict)
+
+        ports_running = self._ports_running()
+        if len(ports_running) >= self._build_jobs:
+            return None
+        if len(ports_running) > 0 and len(self._firmwares_built) == 0:
+            return None
+
+        def priority(firmware: FirmwareTobeBuilt) -> tuple[typing.Any, ...]:
+            reference_first, *priority = firmware.priority
+            name_normalized = firmware.firmware_build_spec.board_variant.name_normalized
+            return (
+                min(reference_first, 0),
+                -waiting_tentacles.get(name_normalized, 0),
+                reference_first,
+                *priority,
+            )
+
+        for firmware in sorted(self._firmwares_todo, key=priority):
+            port = self._port_by_board[firmware.firmware_build_spec.board_variant.board]
+            if ports_running.count(port) >= self.PORT_JOBS_MAX:
+                continue
+            self._firmwares_todo.remove(firmware)
+            async_target = AsyncTargetFirmware(
+                directory_mpbuild_artifacts=self._directory_mpbuild_artifacts,
+                firmware_tobe_build=firmware,
+                repo_micropython_firmware=self._repo_micropython_firmware,
+                firmware_cache=self._firmware_cache,
+                ccache=self._ccache,
+            )
+            self.async_targets.append(async_target)
+            return async_target
+
+        return None
 
     @property
     @typing.override
@@ -295,24 +427,30 @@ class AsyncTargetFirmware(util_multiprocessing.AsyncTarget):
     def __init__(
         self,
         directory_mpbuild_artifacts: pathlib.Path,
-        firmwares_tobe_build: FirmwaresTobeBuilt,
+        firmware_tobe_build: FirmwareTobeBuilt,
         repo_micropython_firmware: pathlib.Path,
+        firmware_cache: FirmwareCache | None,
+        ccache: Ccache | None,
     ) -> None:
         assert isinstance(directory_mpbuild_artifacts, pathlib.Path)
-        assert isinstance(firmwares_tobe_build, FirmwaresTobeBuilt)
+        assert isinstance(firmware_tobe_build, FirmwareTobeBuilt)
         assert isinstance(repo_micropython_firmware, pathlib.Path)
+        assert isinstance(firmware_cache, FirmwareCache | None)
+        assert isinstance(ccache, Ccache | None)
 
         super().__init__(
-            target_unique_name="Firmware",
+            target_unique_name=firmware_tobe_build.firmware_build_spec.board_variant.name_normalized,
             tentacles=[],
             func=target_build_firmware_async,
             func_args=[
                 directory_mpbuild_artifacts,
-                firmwares_tobe_build,
+                firmware_tobe_build,
                 repo_micropython_firmware,
+                firmware_cache,
+                ccache,
             ],
-            timeout_s=60 * 60.0,
+            timeout_s=30 * 60.0,
         )
 
-        self.firmwares_build = firmwares_tobe_build
+        self.firmware = firmware_tobe_build
         self.repo_micropython_firmware = repo_micropython_firmware
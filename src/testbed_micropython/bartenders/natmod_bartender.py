@@ -0,0 +1,269 @@
+"""
+The natmod bartender compiles the natmod examples required by RUN-NATMODTESTS.
+
+* One async target per arch: 'compile_natmod_examples()'.
+* At most 'natmod_jobs' archs are compiled at the same time.
+* RUN-NATMODTESTS on a tentacle may start as soon as the
+  examples of its arch have been compiled, see 'natmod_arch()'.
+* If the compilation of an arch failed, RUN-NATMODTESTS is started
+  anyway and reports a skipped testgroup, see 'skip_missing_natmod_examples()'.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import pathlib
+import time
+
+from octoprobe.util_pytest import util_logging
+
+from .. import util_multiprocessing
+from ..testcollection.testrun_specs import TestRun
+from ..testrunspecs import run_natmodtests
+from ..testrunspecs.run_natmodtests import (
+    ARCHS,
+    Arch,
+    compile_natmod_examples,
+    natmod_arch,
+    natmod_containers,
+    prepare_natmod_examples,
+)
+from ..util_natmod_cache import NatmodCache
+
+logger = logging.getLogger(__file__)
+
+SUBDIR_NATMODTESTS = "compile_natmodtests"
+
+
+@dataclasses.dataclass(repr=True, slots=True)
+class EventNatmodBuilt(util_multiprocessing.EventBase):
+    arch: str
+    cached: bool
+    start_s: float
+    end_s: float
+
+    @property
+    def duration_text(self) -> str:
+        return f"{self.end_s - self.start_s:0.1f}s"
+
+
+@dataclasses.dataclass(repr=True, slots=True)
+class EventExitNatmod(util_multiprocessing.EventExit):
+    pass
+
+
+def target_compile_natmod_async(
+    arg1: util_multiprocessing.TargetArg1,
+    repo_micropython_tests: pathlib.Path,
+    directory_natmodtests: pathlib.Path,
+    arch: Arch,
+    docker_args_ext: list[str],
+    natmod_cache: NatmodCache | None,
+) -> None:
+    """
+    Compiles the natmod examples for one arch.
+    The 'NatmodBartender' will start one process for every arch.
+    """
+    assert isinstance(arg1, util_multiprocessing.TargetArg1)
+    assert isinstance(repo_micropython_tests, pathlib.Path)
+    assert isinstance(directory_natmodtests, pathlib.Path)
+    assert isinstance(arch, Arch)
+    assert isinstance(docker_args_ext, list)
+    assert isinstance(natmod_cache, NatmodCache | None)
+
+    success = False
+    logfile = pathlib.Path("/dummy_path")
+    target_unique_name = arg1.target_unique_name
+    try:
+        arg1.initfunc(arg1=arg1)
+        with util_logging.Logs(directory_natmodtests / arch.arch) as logs:
+            logfile = logs.filename
+            start_s = time.monotonic()
+            cached = compile_natmod_examples(
+                repo_micropython_tests=repo_micropython_tests,
+                directory_natmodtests=directory_natmodtests,
+                arch=arch,
+                docker_args_ext=docker_args_ext,
+                natmod_cache=natmod_cache,
+            )
+            arg1.queue_put(
+                EventNatmodBuilt(
+                    target_unique_name=target_unique_name,
+                    arch=arch.arch,
+                    cached=cached,
+                    start_s=start_s,
+                    end_s=time.monotonic(),
+                )
+            )
+        success = True
+
+    except Exception:
+        # We can not write to the logger anymore at this point
+        pass
+
+    arg1.queue_put(
+        EventExitNatmod(
+            target_unique_name=target_unique_name,
+            success=success,
+            logfile=logfile,
+        )
+    )
+
+
+class NatmodBartender:
+    def __init__(
+        self,
+        natmod_jobs: int = 2,
+        natmod_cache: NatmodCache | None = None,
+    ) -> None:
+        assert isinstance(natmod_jobs, int)
+        assert natmod_jobs >= 1
+        assert isinstance(natmod_cache, NatmodCache | None)
+
+        self.async_targets = util_multiprocessing.AsyncTargets[AsyncTargetNatmod]()
+        self.get_by_event = self.async_targets.get_by_event
+        self._natmod_jobs = natmod_jobs
+        self._natmod_cache = natmod_cache
+        self._archs_todo: list[Arch] = []
+        self._archs_built: set[str] | None = None
+        """
+        None: No natmod examples required.
+        """
+        self._archs_failed: set[str] = set()
+        self._repo_micropython_tests = pathlib.Path("/dummy_path")
+        self._directory_natmodtests = pathlib.Path("/dummy_path")
+
+    def compile_natmods(
+        self,
+        repo_micropython_tests: pathlib.Path,
+        directory_mpbuild_artifacts: pathlib.Path,
+    ) -> None:
+        """
+        Collects the archs to be compiled.
+        The compilations are started by 'natmod_next()'.
+        """
+        assert isinstance(repo_micropython_tests, pathlib.Path)
+        assert isinstance(directory_mpbuild_artifacts, pathlib.Path)
+
+        self._repo_micropython_tests = repo_micropython_tests
+        self._directory_natmodtests = directory_mpbuild_artifacts / SUBDIR_NATMODTESTS
+        prepare_natmod_examples(
+            repo_micropython_tests=repo_micropython_tests,
+            directory_natmodtests=self._directory_natmodtests,
+        )
+        self._archs_todo = list(ARCHS)
+        self._archs_built = set()
+        self._archs_failed = set()
+
+    @property
+    def natmods_todo(self) -> int:
+        """
+        The number of archs which have not been started yet.
+        """
+        return len(self._archs_todo)
+
+    def natmod_next(self) -> AsyncTargetNatmod | None:
+        """
+        Return the next arch to be compiled or None if
+        * all archs have been started
+        * 'natmod_jobs' compilations are running
+        """
+        running = [
+            async_target
+            for async_target in self.async_targets
+            if not async_target.target.has_been_joined
+        ]
+        if len(running) >= self._natmod_jobs:
+            return None
+        if len(self._archs_todo) == 0:
+            return None
+
+        arch = self._archs_todo.pop(0)
+        async_target = AsyncTargetNatmod(
+            repo_micropython_tests=self._repo_micropython_tests,
+            directory_natmodtests=self._directory_natmodtests,
+            arch=arch,
+            natmod_cache=self._natmod_cache,
+        )
+        self.async_targets.append(async_target)
+        return async_target
+
+    def natmod_built(self, arch: str) -> None:
+        assert isinstance(arch, str)
+        assert self._archs_built is not None
+        self._archs_built.add(arch)
+
+    def natmod_failed(self, arch: str) -> None:
+        """
+        The compilation failed or timed out.
+        The tests of this arch are not blocked anymore: They will be skipped.
+        """
+        assert isinstance(arch, str)
+        assert self._archs_built is not None
+        self._archs_failed.add(arch)
+
+    def testrun_ready(self, testrun: TestRun) -> bool:
+        """
+        Return False if 'testrun' has to wait for the natmod examples.
+        """
+        assert isinstance(testrun, TestRun)
+
+        if self._archs_built is None:
+            return True
+        if (
+            testrun.testrun_spec.label
+            != run_natmodtests.TESTRUNSPEC_RUN_NATMODTESTS.label
+        ):
+            return True
+        archs_done = self._archs_built | self._archs_failed
+        arch = natmod_arch(testrun.tentacle_variant.board_variant)
+        if arch is None:
+            # Unknown arch: Wait for all archs
+            return len(archs_done) == len(ARCHS)
+        return arch in archs_done
+
+    def handle_timeouts(self) -> bool:
+        """
+        There might be processes which reached the timeout.
+        The tests of this arch are not blocked anymore.
+        Return True if an arch has been released.
+        """
+        released = False
+        for async_target in self.async_targets.timeout_reached():
+            logger.error(
+                f"{async_target.target_unique_name}: Timeout of {async_target.timeout_s:0.1f}s."
+            )
+            self.natmod_failed(arch=async_target.arch.arch)
+            released = True
+        return released
+
+
+class AsyncTargetNatmod(util_multiprocessing.AsyncTarget):
+    def __init__(
+        self,
+        repo_micropython_tests: pathlib.Path,
+        directory_natmodtests: pathlib.Path,
+        arch: Arch,
+        natmod_cache: NatmodCache | None,
+    ) -> None:
+        assert isinstance(repo_micropython_tests, pathlib.Path)
+        assert isinstance(directory_natmodtests, pathlib.Path)
+        assert isinstance(arch, Arch)
+        assert isinstance(natmod_cache, NatmodCache | None)
+
+        super().__init__(
+            target_unique_name=f"natmod-{arch.arch}",
+            tentacles=[],
+            func=target_compile_natmod_async,
+            func_args=[
+                repo_micropython_tests,
+                directory_natmodtests,
+                arch,
+                natmod_containers.docker_args_ext,
+                natmod_cache,
+            ],
+            timeout_s=len(run_natmodtests.NATMOD_LIBS) * 300.0,
+        )
+
+        self.arch = arch
@@ -17,6 +17,7 @@ from __future__ import annotations
 import logging
 import pathlib
 import typing
+from collections import defaultdict
 
 from octoprobe import octoprobe
 from octoprobe.util_constants import DirectoryTag
@@ -25,7 +26,7 @@ from .. import constants, util_multiprocessing
 from ..mptest import util_testrunner
 from ..report_task import util_report_tasks
 from ..tentacle_spec import TentacleMicropython
-from ..testcollection.baseclasses_run import TestRunSpecs
+from ..testcollection.baseclasses_run import TestRunCandidates, TestRunSpecs
 from ..testcollection.baseclasses_spec import ConnectedTentacles
 from ..testcollection.testrun_specs import TestRun
 
@@ -46,26 +47,37 @@ class TestBartender:
     def __init__(
         self,
         connected_tentacles: ConnectedTentacles,
-        tentacle_reference: TentacleMicropython | None,
+        tentacles_reference: list[TentacleMicropython],
         testrun_specs: TestRunSpecs,
-        priority_sorter: typing.Callable[
-            [list[TestRun], ConnectedTentacles], list[TestRun]
+        priority: typing.Callable[
+            [TestRun, ConnectedTentacles], tuple[typing.Any, ...]
         ],
         directory_results: pathlib.Path,
     ) -> None:
+        """
+        priority: For example 'TestRun.priority'. The lowest value has the highest priority.
+        """
         assert isinstance(connected_tentacles, ConnectedTentacles)
-        assert isinstance(tentacle_reference, TentacleMicropython | None)
+        assert isinstance(tentacles_reference, list)
         assert isinstance(testrun_specs, TestRunSpecs)
-        assert isinstance(priority_sorter, typing.Callable)  # type: ignore[arg-type]
+        assert callable(priority)
         assert isinstance(directory_results, pathlib.Path)
         self.connected_tentacles = connected_tentacles
-        self.tentacle_reference = tentacle_reference
+        self.tentacles_reference = tentacles_reference
         self.testrun_specs = testrun_specs
         self.available_tentacles = connected_tentacles.copy()
         self.async_targets = util_multiprocessing.AsyncTargets[AsyncTargetTest]()
         self.get_by_event = self.async_targets.get_by_event
-        self.priority_sorter = priority_sorter
+        self.priority = priority
         self.directory_results = directory_results
+        self._candidates = TestRunCandidates(
+            testrun_specs=testrun_specs,
+            tentacles_reference=tentacles_reference,
+            priority=self._priority,
+        )
+
+    def _priority(self, testrun: TestRun) -> tuple[typing.Any, ...]:
+        return self.priority(testrun, self.connected_tentacles)
 
     @property
     def tests_todo(self) -> int:
@@ -74,21 +86,44 @@ class TestBartender:
     def contains_test_with_label(self, label: str) -> bool:
         return self.testrun_specs.contains_test_with_label(label=label)
 
+    def waiting_tentacles_by_board_variant(self) -> dict[str, int]:
+        """
+        Key: board_variant, for example 'RPI_PICO2-RISCV'
+        Value: The number of available tentacles x tests waiting for this board_variant.
+
+        This is used to decide which firmware should be built first.
+        """
+        waiting: dict[str, int] = defaultdict(int)
+        for testrun_spec in self.testrun_specs:
+            for tsv in testrun_spec.tsvs_todo:
+                for tentacle in self.available_tentacles:
+                    if tentacle.tentacle_spec.board == tsv.board:
+                        waiting[tsv.board_variant] += 1
+        return dict(waiting)
+
     def possible_testruns(
         self,
         firmwares_built: set[str] | None,
         flash_skip: bool,
+        testrun_ready: typing.Callable[[TestRun], bool] | None = None,
     ) -> list[TestRun]:
+        """
+        All testruns which may be started, ordered by priority.
+        'testrun_next()' only requires the first one: See 'TestRunCandidates.first()'.
+
+        testrun_ready: Return False if the testrun has to wait, for example for the natmod examples.
+        """
+        self._candidates.update(
+            firmwares_built=firmwares_built,
+            flash_skip=flash_skip,
+        )
         _possible_testruns = list(
-            self.testrun_specs.generate(
-                available_tentacles=self.available_tentacles,
-                firmwares_built=firmwares_built,
-                flash_skip=flash_skip,
-                tentacle_reference=self.tentacle_reference,
-            )
+            self._candidates.generate(available_tentacles=self.available_tentacles)
         )
+        if testrun_ready is not None:
+            _possible_testruns = [t for t in _possible_testruns if testrun_ready(t)]
 
-        return self.priority_sorter(_possible_testruns, self.connected_tentacles)
+        return sorted(_possible_testruns, key=self._priority)
 
     def testrun_next(
         self,
@@ -96,6 +131,7 @@ class TestBartender:
         args: util_testrunner.Args,
         ctxtestrun: octoprobe.CtxTestRun,
         repo_micropython_tests: pathlib.Path,
+        testrun_ready: typing.Callable[[TestRun], bool] | None = None,
     ) -> AsyncTargetTest:
         assert isinstance(firmwares_built, set | None)
         assert isinstance(args, util_testrunner.Args)
@@ -108,14 +144,17 @@ class TestBartender:
                 logger.debug(msg)
                 raise CurrentlyNoTestsException(msg)
 
-        possible_testruns = self.possible_testruns(
+        self._candidates.update(
             firmwares_built=firmwares_built,
             flash_skip=args.firmware.flash_skip,
         )
-        if len(possible_testruns) == 0:
+        selected_testrun = self._candidates.first(
+            available_tentacles=self.available_tentacles,
+            testrun_ready=testrun_ready,
+        )
+        if selected_testrun is None:
             raise CurrentlyNoTestsException()
 
-        selected_testrun = possible_testruns[0]
         timeout_s = (
             args.count + constants.TEST_MAX_RETRIES
         ) * selected_testrun.timeout_s + self.WAIT_FOR_SUBPROCESS_EXIT_TIMEOUT_S
@@ -167,7 +206,7 @@ class TestBartender:
             assert tentacle in self.available_tentacles
             self.available_tentacles.remove(tentacle)
 
-        async_target.testrun.mark_as_done()
+        self._candidates.mark_as_done(testrun=async_target.testrun)
 
     def _release(self, async_target: AsyncTargetTest) -> None:
         assert isinstance(async_target, AsyncTargetTest)
@@ -178,15 +217,21 @@ class TestBartender:
             assert tentacle not in self.available_tentacles
             self.available_tentacles.append(tentacle)
 
-    def handle_timeouts(self, report_tasks: util_report_tasks.Tasks) -> None:
-        assert isinstance(report_tasks, util_report_tasks.Tasks)
-
+    def handle_timeouts(
+        self, add_task: typing.Callable[[util_report_tasks.Task], None]
+    ) -> bool:
+        """
+        Return True if tentacles have been released.
+        """
+        released = False
         for async_target in self.async_targets.timeout_reached():
-            report_tasks.append(async_target.report_task)
+            add_task(async_target.report_task)
             self._release(async_target=async_target)
+            released = True
             logger.warning(
                 f"[COLOR_FAILED]{async_target.target_unique_name}: Timeout after {async_target.target.livetime_text_full}: Terminated!"
             )
+        return released
 
     def pytest_print_actual_testruns(
         self, title: str, indent: int, file: typing.TextIO
@@ -225,3 +270,13 @@ class AsyncTargetTest(util_multiprocessing.AsyncTarget):
         )
 
         self.testrun = testrun
+
+    @property
+    @typing.override
+    def worker_key(self) -> str | None:
+        """
+        One persistent worker per tentacle under test: The reference tentacle
+        may change from testrun to testrun.
+        Example: '5f2c-RPI_PICO_W'
+        """
+        return self.testrun.tentacle_variant.tentacle.label_short
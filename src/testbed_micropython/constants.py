@@ -26,6 +26,16 @@ TESTBED_NAME = "testbed_micropython"
 DEFAULT_REFERENCE_BOARD = "RPI_PICO_W"
 ANY_REFERENCE_BOARD = ""
 
+
+def reference_boards(reference_board: str) -> list[str]:
+    """
+    '--reference-board' may specify a comma separated list of boards.
+    Example: 'RPI_PICO_W,RPI_PICO2_W' -> ['RPI_PICO_W', 'RPI_PICO2_W']
+    """
+    assert isinstance(reference_board, str)
+    return [board.strip() for board in reference_board.split(",") if board.strip()]
+
+
 DIRECTORY_OF_THIS_FILE = pathlib.Path(__file__).parent
 DIRECTORY_GIT_REPO = DIRECTORY_OF_THIS_FILE.parent.parent
 if (DIRECTORY_GIT_REPO / ".git").is_dir():
@@ -34,6 +44,10 @@ else:
     # If we have been installed into 'site-packages', the default will be ~/octoprobe_downloads/testresults
     DIRECTORY_RESULTS_PARENT = DIRECTORY_OCTOPROBE_DOWNLOADS
 DIRECTORY_TESTRESULTS_DEFAULT = DIRECTORY_RESULTS_PARENT / "testresults"
+FILENAME_HISTORY_DEFAULT = DIRECTORY_RESULTS_PARENT / "testresults_history.sqlite"
+"""
+The test outcomes of all runs. See 'mptest history'.
+"""
 
 DIRECTORY_GIT_CACHE = DIRECTORY_OCTOPROBE_GIT_CACHE
 FILENAME_TESTBED_LOCK = pathlib.Path("/tmp/octoprobe/testbed.lock")
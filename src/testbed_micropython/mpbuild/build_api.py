@@ -24,7 +24,7 @@ import pathlib
 import re
 import subprocess
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from mpbuild.board_database import Board, Database
 from mpbuild.build import (
@@ -35,6 +35,7 @@ from mpbuild.build import (
 from octoprobe.lib_tentacle_dut import VERSION_IMPLEMENTATION_SEPARATOR
 from octoprobe.util_micropython_boards import VARIANT_SEPARATOR
 
+from ..util_ccache import Ccache, CcacheStats, docker_cmd_add_args
 from .board_tweaks import board_specific_download, tweak_build_folder
 
 logger = logging.getLogger(__file__)
@@ -114,6 +115,11 @@ class Firmware:
      * PYBV11-DP: PYBV11-DP;3.4.0; MicroPython v1.24.0-338.g265d1b2ec on 2025-03-04;PYBv1.1 with STM32F405RG
     """
 
+    ccache_stats: CcacheStats | None = field(default=None, compare=False)
+    """
+    None: The build did not use ccache
+    """
+
     def __str__(self) -> str:
         return f"Firmware({self.variant_name_full}, {self.filename}, {self.micropython_full_version_text})"
 
@@ -356,9 +362,12 @@ def build(
     board: Board,
     variant: str | None = None,
     do_clean: bool = False,
+    ccache: Ccache | None = None,
 ) -> Firmware:
     """
     Build the firmware and write the docker ouput to 'logfile'
+
+    ccache: Mount the ccache of the toolchain into the docker container.
     """
     board_specific_download(logfile=logfile, db=db, board=board, variant=variant)
 
@@ -371,6 +380,22 @@ def build(
         add_device_flags=False,
     )
 
+    filename_statslog: pathlib.Path | None = None
+    if ccache is not None:
+        docker_image = BUILD_CONTAINERS.get(board.port.name, "")
+        filename_statslog = ccache.filename_statslog(
+            docker_image=docker_image,
+            name=board.name if variant is None else f"{board.name}-{variant}",
+        )
+        build_cmd = docker_cmd_add_args(
+            build_cmd=build_cmd,
+            docker_args=ccache.docker_args(
+                docker_image=docker_image,
+                mpy_root_directory=db.mpy_root_directory,
+                filename_statslog=filename_statslog,
+            ),
+        )
+
     mpbuild_cmd = f"mpbuild build {board.name}"
     if variant is not None:
         mpbuild_cmd += f" {variant}"
@@ -397,6 +422,14 @@ def build(
             f.write(f"\n\nreturncode={proc.returncode}\n")
             f.write(f"duration={time.monotonic() - begin_s:0.3f}s\n")
 
+        ccache_stats: CcacheStats | None = None
+        if filename_statslog is not None:
+            ccache_stats = CcacheStats.factory(filename_statslog)
+            filename_statslog.unlink(missing_ok=True)
+            if ccache_stats is not None:
+                with logfile.open("a") as f:
+                    f.write(f"ccache: {ccache_stats.text}\n")
+
         if proc.returncode != 0:
             raise MpbuildDockerException(
                 board=board,
@@ -411,14 +444,28 @@ def build(
         board=board,
         variant=variant,
         micropython_full_version_text=build_folder.micropython_full_version_text,
+        ccache_stats=ccache_stats,
     )
 
 
+def docker_image_by_variant_normalized(db: Database, variant_normalized: str) -> str:
+    """
+    Return the docker image mpbuild will use to build this variant.
+    Return "" if the board is unknown: The build will report the error.
+    """
+    board_variant = BoardVariant.parse(variant_normalized)
+    board = db.boards.get(board_variant.board, None)
+    if board is None:
+        return ""
+    return BUILD_CONTAINERS.get(board.port.name, "")
+
+
 def build_by_variant_normalized(
     logfile: pathlib.Path,
     db: Database,
     variant_normalized: str,
     do_clean: bool,
+    ccache: Ccache | None = None,
 ) -> Firmware:
     """
     This is the main entry point into mpbuild.
@@ -458,6 +505,7 @@ def build_by_variant_normalized(
         board=board,
         variant=variant,
         do_clean=do_clean,
+        ccache=ccache,
     )
 
 
@@ -23,7 +23,11 @@ from octoprobe.util_constants import DIRECTORY_OCTOPROBE_DOWNLOADS, ExitCode
 from octoprobe.util_pyudev import UDEV_POLLER_LAZY
 from octoprobe.util_tentacle_label import label_renderer
 
-from testbed_micropython.constants import DIRECTORY_TESTRESULTS_DEFAULT, EnumFut
+from testbed_micropython.constants import (
+    DIRECTORY_TESTRESULTS_DEFAULT,
+    EnumFut,
+    FILENAME_HISTORY_DEFAULT,
+)
 from testbed_micropython.report_test import util_constants
 from testbed_micropython.report_test.renderer import ReportRenderer
 from testbed_micropython.report_test.util_push_testresults import (
@@ -31,13 +35,18 @@ from testbed_micropython.report_test.util_push_testresults import (
     TarAndHttpsPush,
 )
 
-from .. import constants, util_multiprocessing
+from .. import constants, util_live_results, util_multiprocessing
 from ..mptest import util_testrunner
 from ..mptest.util_common import ArgsMpTest
 from ..pr_check import util_pr_check
-from ..report_test import util_email
+from ..report_test import util_email, util_history
 from ..tentacles_inventory import TENTACLES_INVENTORY
+from ..util_ccache import DIRECTORY_CCACHE
+from ..util_firmware_cache import DIRECTORY_FIRMWARE_CACHE, FirmwareCache
+from ..util_firmware_identity import DIRECTORY_FLASHED_FIRMWARE
 from ..util_firmware_mpbuild_interface import ArgsFirmware
+from ..util_mip_cache import MipCache, MipCacheException
+from ..util_natmod_cache import NatmodCache
 from .util_baseclasses import ArgsQuery
 from .util_testbootmode import do_debugbootmode, get_programmer_labels
 
@@ -53,6 +62,14 @@ TyperAnnotated = typing.Annotated
 #   op.py:58: note: See https://mypy.readthedocs.io/en/stable/common_issues.html#variables-vs-type-aliases
 
 app = typer.Typer(pretty_exceptions_enable=False)
+cache_app = typer.Typer(pretty_exceptions_enable=False)
+app.add_typer(
+    cache_app, name="cache", help="Inspect the firmware, natmod and mip caches"
+)
+history_app = typer.Typer(pretty_exceptions_enable=False)
+app.add_typer(
+    history_app, name="history", help="Query the test outcomes of previous runs"
+)
 
 
 def complete_only_test() -> list[str]:
@@ -263,7 +280,7 @@ def test(
     reference_board: TyperAnnotated[
         str | None,
         typer.Option(
-            help=f"The board to be used as WLAN/bluetooth reference. Any board is used as reference if this parameter is set to '{constants.ANY_REFERENCE_BOARD}'.",
+            help=f"The board to be used as WLAN/bluetooth reference. A comma separated list of boards, for example 'RPI_PICO_W,RPI_PICO2_W': All tentacles of these boards are used as references and the multi tests run in parallel. Any board is used as reference if this parameter is set to '{constants.ANY_REFERENCE_BOARD}'.",
             autocompletion=complete_only_board,
         ),
     ] = constants.DEFAULT_REFERENCE_BOARD,  # noqa: UP007
@@ -309,6 +326,12 @@ def test(
             help="Do a 'git clean -fXd' to make sure that all prior artifacts are removed. Applies ONLY to the firmware repo!",
         ),
     ] = True,  # noqa: UP007
+    persistent_workers: TyperAnnotated[
+        bool,
+        typer.Option(
+            help="Run the tests in persistent worker processes, one per tentacle under test, instead of a new process per test.",
+        ),
+    ] = False,  # noqa: UP007
     force_multiprocessing: TyperAnnotated[
         bool,
         typer.Option(
@@ -329,6 +352,85 @@ def test(
             help="Limit parallel jobs. 0: No limit on job count. Limiting parallel jobs might reduce stability issues.",
         ),
     ] = 6,  # noqa: UP007
+    build_jobs: TyperAnnotated[
+        int,
+        typer.Option(
+            help="Parallel firmware builds. Only one build per port at the same time.",
+        ),
+    ] = 1,  # noqa: UP007
+    natmod_jobs: TyperAnnotated[
+        int,
+        typer.Option(
+            help="Parallel compilations of the natmod examples for RUN-NATMODTESTS: One per arch.",
+        ),
+    ] = 2,  # noqa: UP007
+    firmware_cache: TyperAnnotated[
+        bool,
+        typer.Option(
+            help=f"Take unchanged firmwares from the firmware cache in {DIRECTORY_FIRMWARE_CACHE}. See 'mptest cache --help'.",
+        ),
+    ] = True,  # noqa: UP007
+    ccache: TyperAnnotated[
+        bool,
+        typer.Option(
+            help=f"Mount a persistent ccache per toolchain into the mpbuild docker container. Only esp32 (esp-idf) and rp2 (cmake) use it: The make based ports are built without ccache. The cache is in {DIRECTORY_CCACHE}.",
+        ),
+    ] = True,  # noqa: UP007
+    flash_probe: TyperAnnotated[
+        bool,
+        typer.Option(
+            help=f"Skip flashing if the DUT already runs the required firmware: The firmware flashed is recorded per tentacle in {DIRECTORY_FLASHED_FIRMWARE}.",
+        ),
+    ] = False,  # noqa: UP007
+    reference_session: TyperAnnotated[
+        bool,
+        typer.Option(
+            help="Only flash the reference tentacle if it does not run the reference firmware yet, also with --no-flash-probe.",
+        ),
+    ] = False,  # noqa: UP007
+    durations_from: TyperAnnotated[
+        str | None,
+        typer.Option(
+            help="Directory with the testresults of a previous run. The testruns on the critical path and with the longest durations are started first. May be the same directory as --testresults.",
+        ),
+    ] = None,  # noqa: UP007
+    history: TyperAnnotated[
+        str,
+        typer.Option(
+            envvar="TESTBED_MICROPYTHON_HISTORY",
+            help="Ingest the test outcomes into this database at the end of the run. See 'mptest history --help'. Empty string will skip.",
+        ),
+    ] = str(FILENAME_HISTORY_DEFAULT),  # noqa: UP007
+    shards: TyperAnnotated[
+        int,
+        typer.Option(
+            help="Split run-tests.py (RUN-TESTS_STANDARD*) into up to this number of shards which run in parallel on identical boards. Use --durations-from to balance the shards.",
+        ),
+    ] = 1,  # noqa: UP007
+    live_results: TyperAnnotated[
+        bool,
+        typer.Option(
+            help="Write the outcome of every single test as it arrives to 'live_results.jsonl' in --testresults.",
+        ),
+    ] = False,  # noqa: UP007
+    early_abort_consecutive_failures: TyperAnnotated[
+        int,
+        typer.Option(
+            help="Terminate a testgroup after this number of failed tests in a row, for example 20. If not a single test passed, the testgroup is not retried. 0: Disabled.",
+        ),
+    ] = 0,  # noqa: UP007
+    early_abort_failure_rate: TyperAnnotated[
+        float,
+        typer.Option(
+            help="Terminate a testgroup if this rate of tests failed, for example 0.5. Evaluated after 50 tests. 0.0: Disabled.",
+        ),
+    ] = 0.0,  # noqa: UP007
+    impacted_by: TyperAnnotated[
+        str | None,
+        typer.Option(
+            help="A git ref of the firmware repo, for example 'origin/master'. Only run the tests and boards impacted by the changed files since this git ref. The co-failures in --history are added.",
+        ),
+    ] = None,  # noqa: UP007
     debug_fast_fake_tests: TyperAnnotated[
         bool | None,
         typer.Option(help="Run some fast faketest"),
@@ -384,11 +486,30 @@ def test(
             ),
             force_multiprocessing=force_multiprocessing,
             jobs=jobs,
+            build_jobs=build_jobs,
+            natmod_jobs=natmod_jobs,
+            firmware_cache=firmware_cache,
+            ccache=ccache,
+            flash_probe=flash_probe,
+            reference_session=reference_session,
             debug_skip_tests=debug_skip_tests,
             debug_fast_fake_tests=debug_fast_fake_tests,
             debug_skip_usb_error=debug_skip_usb_error,
             reference_board=reference_board,
             count=count,
+            durations_from=None
+            if durations_from is None
+            else pathlib.Path(durations_from).expanduser().resolve(),
+            history=None
+            if history == ""
+            else pathlib.Path(history).expanduser().resolve(),
+            shards=shards,
+            live_results=live_results,
+            early_abort=util_live_results.EarlyAbortPolicy(
+                consecutive_failures=early_abort_consecutive_failures,
+                failure_rate=early_abort_failure_rate,
+            ),
+            impacted_by=impacted_by,
         )
         testrunner = util_testrunner.TestRunner(args=args)
         logger.info(f"{' '.join(sys.argv)}")
@@ -409,6 +530,7 @@ def test(
         with util_multiprocessing.TargetCtx(
             multiprocessing=multiprocessing,
             initfunc=initfunc,
+            persistent_workers=persistent_workers,
         ) as target_ctx:
             assert target_ctx is not None
             testrunner.run_all_in_sequence(target_ctx=target_ctx)
@@ -520,5 +642,239 @@ def report(
     raise typer.Exit(rc)
 
 
+@app.command(
+    help="Benchmark the scheduling on simulated tentacles. No hardware is required."
+)
+def bench_scheduler(
+    copies: TyperAnnotated[
+        int,
+        typer.Option(help="Number of simulated tentacles for every tentacle spec"),
+    ] = 10,  # noqa: UP007
+    build_jobs: TyperAnnotated[
+        int,
+        typer.Option(help="Parallel firmware builds"),
+    ] = 1,  # noqa: UP007
+    build_s: TyperAnnotated[
+        float,
+        typer.Option(help="Simulated duration of a firmware build"),
+    ] = 120.0,  # noqa: UP007
+    shards: TyperAnnotated[
+        int,
+        typer.Option(help="See 'mptest test --help'"),
+    ] = 1,  # noqa: UP007
+    reference_board: TyperAnnotated[
+        str,
+        typer.Option(help="See 'mptest test --help'"),
+    ] = constants.DEFAULT_REFERENCE_BOARD,  # noqa: UP007
+    durations_from: TyperAnnotated[
+        str | None,
+        typer.Option(
+            help="Directory with the testresults of a previous run: Simulate these durations and prioritize like 'mptest test --durations-from'. Default: Random durations.",
+        ),
+    ] = None,  # noqa: UP007
+) -> None:
+    from ..testcollection.testrun_durations import TestRunDurations
+    from .util_bench_scheduler import SchedulerBench
+
+    durations = None
+    if durations_from is not None:
+        durations = TestRunDurations.factory(
+            directory_results=pathlib.Path(durations_from).expanduser().resolve()
+        )
+    bench = SchedulerBench(
+        copies=copies,
+        build_jobs=build_jobs,
+        build_s=build_s,
+        shards=shards,
+        durations=durations,
+        reference_board=reference_board,
+    )
+    print(bench.run().text)
+
+
+@cache_app.command(
+    name="list", help="List the cached firmwares, most recently used first"
+)
+def cache_list() -> None:
+    firmware_cache = FirmwareCache()
+    entries = firmware_cache.entries
+    size_bytes = 0
+    for entry in entries:
+        size_bytes += entry.size_bytes
+        print(
+            f"{entry.key}  {entry.metadata['board_variant']:<30}  {entry.metadata['git_commit'][:12]}  {entry.metadata['created']}"
+        )
+    print(
+        f"{len(entries)} firmwares, {size_bytes / 1e6:0.1f}MB in {firmware_cache.directory}"
+    )
+
+
+@cache_app.command(name="prune", help="Remove the least recently used firmwares")
+def cache_prune(
+    max_mb: TyperAnnotated[
+        int,
+        typer.Option(
+            help="Remove firmwares until the cache is smaller. 0: Remove all."
+        ),
+    ] = 0,  # noqa: UP007
+) -> None:
+    firmware_cache = FirmwareCache()
+    removed = firmware_cache.prune(max_size_bytes=max_mb * 1_000_000)
+    for entry in removed:
+        print(f"Removed {entry.key}  {entry.metadata['board_variant']}")
+    print(f"Removed {len(removed)} firmwares")
+
+
+@cache_app.command(
+    name="natmod-prune", help="Remove the least recently used natmod examples"
+)
+def cache_natmod_prune(
+    max_mb: TyperAnnotated[
+        int,
+        typer.Option(
+            help="Remove natmod examples until the cache is smaller. 0: Remove all."
+        ),
+    ] = 0,  # noqa: UP007
+) -> None:
+    natmod_cache = NatmodCache()
+    removed = natmod_cache.prune(max_size_bytes=max_mb * 1_000_000)
+    for entry in removed:
+        print(
+            f"Removed {entry.key}  {entry.metadata['arch']}  {entry.metadata['git_commit'][:12]}"
+        )
+    print(f"Removed {len(removed)} natmod examples in {natmod_cache.directory}")
+
+
+@cache_app.command(name="inspect", help="Show the metadata of cached firmwares")
+def cache_inspect(
+    key: TyperAnnotated[
+        str,
+        typer.Argument(help="The key or the beginning of the key"),
+    ],
+) -> None:
+    entries = FirmwareCache().find(key_prefix=key)
+    if len(entries) == 0:
+        print(f"No firmware found for key '{key}'")
+        raise typer.Exit(1)
+    for entry in entries:
+        print(f"{entry.directory}:")
+        for k, v in entry.metadata.items():
+            print(f"  {k}={v}")
+        for f in sorted(entry.directory.iterdir()):
+            print(f"  {f.name}: {f.stat().st_size} bytes")
+
+
+@cache_app.command(
+    name="mip-fetch",
+    help="Fetch mip packages into the mip cache: The tests may then run offline",
+)
+def cache_mip_fetch(
+    packages: TyperAnnotated[
+        list[str],
+        typer.Argument(help="Example: unittest"),
+    ],
+    mpy_version: TyperAnnotated[
+        list[str],
+        typer.Option(help="Example: 6. 'py' for boards without .mpy support."),
+    ] = ["6", "py"],  # noqa: UP007, B006
+) -> None:
+    mpy_versions: list[str] = mpy_version
+    # Always refresh the index
+    mip_cache = MipCache(max_age_s=0.0)
+    for _mpy_version in mpy_versions:
+        try:
+            mip_files = mip_cache.resolve(packages=packages, mpy_version=_mpy_version)
+        except MipCacheException as e:
+            print(f"mpy version {_mpy_version}: {e}")
+            raise typer.Exit(1) from e
+        for mip_file in mip_files:
+            print(f"{_mpy_version}: {mip_file.path}  {mip_file.filename}")
+    print(f"mip cache: {mip_cache.directory}")
+
+
+HistoryOption = TyperAnnotated[
+    str,
+    typer.Option(
+        envvar="TESTBED_MICROPYTHON_HISTORY",
+        help="The history database",
+    ),
+]
+
+
+@history_app.command(
+    name="ingest",
+    help="Ingest testresults directories of previous runs. A run is ingested only once.",
+)
+def history_ingest(
+    testresults: TyperAnnotated[
+        list[pathlib.Path],
+        typer.Argument(help="Directories containing results"),
+    ],
+    history: HistoryOption = str(FILENAME_HISTORY_DEFAULT),
+) -> None:
+    init_logging()
+    directories_results: list[pathlib.Path] = testresults
+    filename_history = pathlib.Path(history).expanduser().resolve()
+    with util_history.History(filename=filename_history) as _history:
+        for directory_results in directories_results:
+            _history.ingest(directory_results=directory_results.expanduser().resolve())
+
+
+@history_app.command(
+    name="flaky",
+    help="The tests which failed in at least one run. Columns: runs flaky (failed and passed in the same run), runs failed, runs",
+)
+def history_flaky(
+    test: TyperAnnotated[
+        str,
+        typer.Option(help="Glob pattern, for example 'extmod/*'"),
+    ] = "*",
+    board: TyperAnnotated[
+        str,
+        typer.Option(
+            help="Glob pattern for the board variant, for example 'RPI_PICO*'"
+        ),
+    ] = "*",
+    min_runs: TyperAnnotated[
+        int,
+        typer.Option(help="Only tests which have been run this number of times"),
+    ] = 1,
+    history: HistoryOption = str(FILENAME_HISTORY_DEFAULT),
+) -> None:
+    with util_history.History(
+        filename=pathlib.Path(history).expanduser().resolve()
+    ) as _history:
+        for flaky_test in _history.flaky(
+            pattern_test=test, pattern_board_variant=board, min_runs=min_runs
+        ):
+            print(flaky_test.text)
+
+
+@history_app.command(
+    name="first-failure",
+    help="The tests which failed in their latest run. Columns: time of the first failing run, firmware sha of the first failing run, firmware sha of the last passing run",
+)
+def history_first_failure(
+    test: TyperAnnotated[
+        str,
+        typer.Option(help="Glob pattern, for example 'extmod/*'"),
+    ] = "*",
+    board: TyperAnnotated[
+        str,
+        typer.Option(
+            help="Glob pattern for the board variant, for example 'RPI_PICO*'"
+        ),
+    ] = "*",
+    history: HistoryOption = str(FILENAME_HISTORY_DEFAULT),
+) -> None:
+    with util_history.History(
+        filename=pathlib.Path(history).expanduser().resolve()
+    ) as _history:
+        for first_failure in _history.first_failure(
+            pattern_test=test, pattern_board_variant=board
+        ):
+            print(first_failure.text)
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,494 @@
+"""
+Benchmark of the scheduling: 'TestRunner.run_all()' with its bartenders.
+
+No hardware is required:
+* The tentacles are created from 'tentacle_specs'.
+* 'SimulatedTargetCtx' does not start the firmware builds, the natmod
+  compilations and the tests: It queues the events of their completion
+  and a simulated clock jumps from one completion to the next.
+
+Reported
+* decisions/s: Calls to 'testrun_next()'/'firmware_next()' per second of real time.
+  This is the overhead of the scheduling.
+* idle tentacle-seconds: Simulated time the tentacles did not run a test.
+* makespan: Simulated time until all tests completed.
+
+Use 'mptest bench-scheduler'.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import heapq
+import itertools
+import logging
+import pathlib
+import random
+import tempfile
+import time
+import typing
+
+from octoprobe import octoprobe
+from octoprobe.usb_tentacle.usb_baseclasses import Location
+from octoprobe.usb_tentacle.usb_constants import HwVersion
+from octoprobe.usb_tentacle.usb_tentacle import UsbPico, UsbTentacle
+from octoprobe.util_baseclasses import TentacleInstance
+from octoprobe.util_constants import TAG_MCU
+
+from .. import constants, tentacle_specs, util_live_results, util_multiprocessing
+from ..bartenders import firmware_bartender, natmod_bartender
+from ..bartenders.test_bartender import AsyncTargetTest, TestBartender
+from ..report_test.util_testreport import ReportTests
+from ..tentacle_spec import TentacleMicropython, TentacleSpecMicropython
+from ..testcollection.baseclasses_spec import ConnectedTentacles
+from ..testcollection.testrun_durations import DurationPrioritySorter, TestRunDurations
+from ..testcollection.testrun_specs import TestRun
+from ..testrunspecs import run_natmodtests
+from . import util_testrunner
+
+logger = logging.getLogger(__file__)
+
+
+def simulated_tentacle_specs() -> list[TentacleSpecMicropython]:
+    """
+    All assembled MCU tentacles.
+    """
+    return [
+        spec
+        for spec in vars(tentacle_specs).values()
+        if isinstance(spec, TentacleSpecMicropython)
+        and spec.tentacle_type is constants.EnumTentacleType.TENTACLE_MCU
+        and len(spec.futs) > 0
+    ]
+
+
+def simulated_tentacles(copies: int) -> ConnectedTentacles:
+    """
+    'copies' tentacles for every tentacle spec.
+    """
+    assert isinstance(copies, int)
+    assert copies >= 1
+
+    tentacles = ConnectedTentacles()
+    specs = simulated_tentacle_specs()
+    for i, spec in enumerate(s for s in specs for _ in range(copies)):
+        tentacle_instance = TentacleInstance(
+            serial=f"{i:04x}",
+            tentacle_spec=spec,
+            hw_version_expected=HwVersion.V03,
+            solder_version="1.0",
+            testbed_name=constants.TESTBED_NAME,
+            testbed_instance="simulated",
+        )
+        tentacles.append(
+            TentacleMicropython(
+                tentacle_instance=tentacle_instance,
+                usb_tentacle=UsbTentacle(
+                    tentacle_hub_location=Location(3, [1, i]),
+                    pico_infra=UsbPico(
+                        location=Location(bus=1, path=[]),
+                        serial=None,
+                        serial_port=None,
+                    ),
+                ),
+            )
+        )
+    return tentacles
+
+
+class SimulatedTestBartender(TestBartender):
+    """
+    Counts the calls to 'testrun_next()'.
+    """
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.decisions = 0
+
+    @typing.override
+    def testrun_next(
+        self,
+        firmwares_built: set[str] | None,
+        args: util_testrunner.Args,
+        ctxtestrun: octoprobe.CtxTestRun,
+        repo_micropython_tests: pathlib.Path,
+        testrun_ready: typing.Callable[[TestRun], bool] | None = None,
+    ) -> AsyncTargetTest:
+        self.decisions += 1
+        return super().testrun_next(
+            firmwares_built=firmwares_built,
+            args=args,
+            ctxtestrun=ctxtestrun,
+            repo_micropython_tests=repo_micropython_tests,
+            testrun_ready=testrun_ready,
+        )
+
+
+class SimulatedFirmwareBartender(firmware_bartender.FirmwareBartender):
+    """
+    'build_firmwares()' does not require a micropython repo:
+    The port is taken from the 'mcu' tag of the tentacle spec.
+
+    Counts the calls to 'firmware_next()'.
+    """
+
+    def __init__(
+        self,
+        connected_tentacles: ConnectedTentacles,
+        test_bartender: TestBartender,
+        build_jobs: int,
+    ) -> None:
+        super().__init__(test_bartender.testrun_specs, build_jobs=build_jobs)
+        self._connected_tentacles = connected_tentacles
+        self.decisions = 0
+
+    @typing.override
+    def build_firmwares(
+        self,
+        directory_mpbuild_artifacts: pathlib.Path,
+        repo_micropython_firmware: pathlib.Path,
+        reference_board: str,
+    ) -> None:
+        self._firmwares_todo = firmware_bartender.FirmwaresTobeBuilt.factory(
+            self._testrun_specs,
+            reference_board=reference_board,
+        )
+        for tentacle in self._connected_tentacles:
+            spec = tentacle.tentacle_spec
+            self._port_by_board[spec.board] = spec.get_tag(TAG_MCU) or spec.board
+
+    @typing.override
+    def firmware_next(
+        self,
+        waiting_tentacles: dict[str, int],
+    ) -> firmware_bartender.AsyncTargetFirmware | None:
+        self.decisions += 1
+        return super().firmware_next(waiting_tentacles=waiting_tentacles)
+
+
+class SimulatedNatmodBartender(natmod_bartender.NatmodBartender):
+    """
+    'compile_natmods()' does not require a micropython tests repo.
+    """
+
+    @typing.override
+    def compile_natmods(
+        self,
+        repo_micropython_tests: pathlib.Path,
+        directory_mpbuild_artifacts: pathlib.Path,
+    ) -> None:
+        self._archs_todo = list(run_natmodtests.ARCHS)
+        self._archs_built = set()
+        self._archs_failed = set()
+
+
+class SimulatedTargetCtx(util_multiprocessing.TargetCtx):
+    """
+    'start()' does not start the target but queues the events
+    the target would send on completion.
+    'iter_queue()' advances the simulated clock to the next completion.
+
+    A simulated target never reaches its timeout.
+    """
+
+    def __init__(self, bench: SchedulerBench) -> None:
+        super().__init__(multiprocessing=False, initfunc=lambda arg1: None)
+        self._bench = bench
+        self.now_s = 0.0
+        self.testruns = 0
+        self.busy_s: dict[str, float] = {}
+        """
+        Key: tentacle.label_short
+        """
+        self._completions: list[
+            tuple[float, int, list[util_multiprocessing.EventBase]]
+        ] = []
+        """
+        (end_s, sequence, events): heapq
+        """
+        self._sequence = itertools.count()
+
+    @typing.override
+    def start(self, async_target: util_multiprocessing.AsyncTarget) -> None:
+        assert isinstance(async_target, util_multiprocessing.AsyncTarget)
+
+        async_target.fake_start()
+        name = async_target.target_unique_name
+        logfile = self._bench.args.directory_results / "simulated.txt"
+        start_s = self.now_s
+        events: list[util_multiprocessing.EventBase]
+        if isinstance(async_target, AsyncTargetTest):
+            duration_s = self._bench.testrun_duration_s(async_target.testrun)
+            self.testruns += 1
+            for tentacle in async_target.tentacles:
+                label = tentacle.label_short
+                self.busy_s[label] = self.busy_s.get(label, 0.0) + duration_s
+            events = [
+                util_testrunner.EventExitRunOneTest(
+                    target_unique_name=name,
+                    logfile=logfile,
+                    success=True,
+                    testid=async_target.testrun.testid,
+                )
+            ]
+        elif isinstance(async_target, firmware_bartender.AsyncTargetFirmware):
+            duration_s = self._bench.build_s
+            events = [
+                firmware_bartender.EventFirmwareSpec(
+                    target_unique_name=name,
+                    firmware_spec=async_target.firmware.firmware_build_spec,
+                    start_s=start_s,
+                    end_s=start_s + duration_s,
+                    logfile=logfile,
+                ),
+                firmware_bartender.EventExitFirmware(
+                    target_unique_name=name, logfile=logfile, success=True
+                ),
+            ]
+        elif isinstance(async_target, natmod_bartender.AsyncTargetNatmod):
+            duration_s = self._bench.natmod_s
+            events = [
+                natmod_bartender.EventNatmodBuilt(
+                    target_unique_name=name,
+                    arch=async_target.arch.arch,
+                    cached=False,
+                    start_s=start_s,
+                    end_s=start_s + duration_s,
+                ),
+                natmod_bartender.EventExitNatmod(
+                    target_unique_name=name, logfile=logfile, success=True
+                ),
+            ]
+        else:
+            raise ValueError(f"Unexpected target: {async_target}")
+
+        heapq.heappush(
+            self._completions,
+            (start_s + duration_s, next(self._sequence), events),
+        )
+
+    @property
+    @typing.override
+    def wait_s(self) -> float:
+        return 0.0
+
+    @typing.override
+    def deadline_reached(self) -> bool:
+        return False
+
+    @typing.override
+    def iter_queue(
+        self, timeout_s: float = 0.1
+    ) -> typing.Iterator[util_multiprocessing.EventBase]:
+        assert len(self._completions) > 0, "Programming error: Nothing is running!"
+        self.now_s, _, events = heapq.heappop(self._completions)
+        yield from events
+
+    @property
+    @typing.override
+    def duration_s(self) -> float:
+        return self.now_s
+
+
+class SimulatedTestRunner(util_testrunner.TestRunner):
+    """
+    'TestRunner.__init__()' is not called: It acquires the testbed lock
+    and removes 'directory_results'.
+    """
+
+    def __init__(self, bench: SchedulerBench) -> None:
+        # pylint: disable=super-init-not-called
+        directory_results = bench.args.directory_results
+        self.args = bench.args
+        self.ctxtestrun = octoprobe.CtxTestRun(
+            connected_tentacles=bench.connected_tentacles
+        )
+        self.test_bartender = bench.test_bartender
+        self.tentacles_reference = bench.test_bartender.tentacles_reference
+        self.firmware_bartender = bench.firmware_bartender
+        self.natmod_bartender = bench.natmod_bartender
+        self.durations = None
+        self.predicted_makespan_s = None
+        self.report_testgroup = ReportTests(
+            testresults_directory=directory_results,
+            log_output=directory_results / "simulated.txt",
+            ref_firmware="simulated",
+            ref_tests="simulated",
+        )
+
+
+@dataclasses.dataclass(slots=True)
+class BenchResult:
+    tentacles: int
+    testruns: int
+    testruns_not_scheduled: int
+    """
+    Testruns which could never be started, for example
+    because the reference tentacle is missing.
+    """
+    firmwares: int
+    decisions: int
+    scheduler_s: float
+    """
+    Real time spent in 'TestRunner.run_all()'.
+    """
+    makespan_s: float
+    """
+    Simulated time.
+    """
+    idle_tentacle_s: float
+    """
+    Simulated time.
+    """
+
+    @property
+    def decisions_per_s(self) -> float:
+        return self.decisions / max(self.scheduler_s, 1e-9)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(
+            [
+                f"tentacles:              {self.tentacles}",
+                f"testruns:               {self.testruns} ({self.testruns_not_scheduled} not scheduled)",
+                f"firmwares:              {self.firmwares}",
+                f"decisions:              {self.decisions} in {self.scheduler_s:0.3f}s: {self.decisions_per_s:0.0f} decisions/s",
+                f"makespan:               {self.makespan_s:0.0f}s",
+                f"idle tentacle-seconds:  {self.idle_tentacle_s:0.0f}s ({self.idle_tentacle_s / max(self.tentacles * self.makespan_s, 1e-9):0.0%})",
+            ]
+        )
+
+
+class SchedulerBench:
+    def __init__(
+        self,
+        copies: int = 1,
+        build_jobs: int = 1,
+        build_s: float = 120.0,
+        natmod_s: float = 60.0,
+        shards: int = 1,
+        durations: TestRunDurations | None = None,
+        seed: int = 42,
+        reference_board: str = constants.DEFAULT_REFERENCE_BOARD,
+    ) -> None:
+        """
+        build_s: Simulated duration of a firmware build.
+        natmod_s: Simulated duration of the natmod compilation of one arch.
+        durations: Simulated durations of the testruns.
+          None: A random fraction of 'timeout_s'.
+        reference_board: See 'mptest test --reference-board'.
+        """
+        assert isinstance(copies, int)
+        assert isinstance(build_jobs, int)
+        assert isinstance(build_s, float)
+        assert isinstance(natmod_s, float)
+        assert isinstance(shards, int)
+        assert isinstance(durations, TestRunDurations | None)
+        assert isinstance(seed, int)
+        assert isinstance(reference_board, str)
+
+        self.build_s = build_s
+        self.natmod_s = natmod_s
+        self.durations = durations
+        self.seed = seed
+        self.connected_tentacles = simulated_tentacles(copies=copies)
+        self._directory = tempfile.TemporaryDirectory()
+        directory_results = pathlib.Path(self._directory.name)
+
+        self.args = util_testrunner.Args.get_default_args(
+            directory_git_cache=constants.DIRECTORY_GIT_CACHE,
+            directory_results=directory_results,
+        )
+        self.args.firmware.flash_skip = False
+        self.args.debug_fast_fake_tests = True
+        self.args.jobs = 0
+        self.args.shards = shards
+        self.args.reference_board = reference_board
+
+        testrun_specs = util_testrunner.get_testrun_specs()
+        tentacles_reference = self.connected_tentacles.find_reference_tentacles(
+            reference_board=reference_board
+        )
+        testrun_specs.assign_tentacles(
+            tentacles=self.connected_tentacles,
+            flash_skip=False,
+            shards=shards,
+        )
+        priority: typing.Callable[
+            [TestRun, ConnectedTentacles], tuple[typing.Any, ...]
+        ] = TestRun.priority
+        if durations is not None:
+            priority = DurationPrioritySorter(
+                durations=durations, testrun_specs=testrun_specs
+            ).priority
+        self.test_bartender = SimulatedTestBartender(
+            connected_tentacles=self.connected_tentacles,
+            tentacles_reference=tentacles_reference,
+            testrun_specs=testrun_specs,
+            priority=priority,
+            directory_results=directory_results,
+        )
+        self.firmware_bartender = SimulatedFirmwareBartender(
+            connected_tentacles=self.connected_tentacles,
+            test_bartender=self.test_bartender,
+            build_jobs=build_jobs,
+        )
+        self.natmod_bartender = SimulatedNatmodBartender(
+            natmod_jobs=self.args.natmod_jobs
+        )
+        self.testrunner = SimulatedTestRunner(bench=self)
+
+    def testrun_duration_s(self, testrun: TestRun) -> float:
+        if self.durations is not None:
+            return self.durations.testrun_duration_s(testrun=testrun)
+        rnd = random.Random(f"{self.seed}:{testrun.testid}")
+        return rnd.uniform(0.05, 0.25) * testrun.timeout_s
+
+    def run(self) -> BenchResult:
+        try:
+            return self._run()
+        finally:
+            self._directory.cleanup()
+
+    def _run(self) -> BenchResult:
+        """
+        Prepared like in 'TestRunner.run_all_in_sequence()'.
+        """
+        directory_dummy = pathlib.Path("/dummy_path")
+        if self.test_bartender.contains_test_with_label(
+            label=run_natmodtests.TESTRUNSPEC_RUN_NATMODTESTS.label
+        ):
+            self.natmod_bartender.compile_natmods(
+                repo_micropython_tests=directory_dummy,
+                directory_mpbuild_artifacts=directory_dummy,
+            )
+        self.firmware_bartender.build_firmwares(
+            directory_mpbuild_artifacts=directory_dummy,
+            repo_micropython_firmware=directory_dummy,
+            reference_board=self.args.reference_board,
+        )
+
+        target_ctx = SimulatedTargetCtx(bench=self)
+        begin_s = time.perf_counter()
+        self.testrunner.run_all(
+            target_ctx=target_ctx,
+            repo_micropython_tests=directory_dummy,
+            add_task=lambda task: None,
+            live_results=util_live_results.LiveResults(filename_jsonl=None),
+        )
+        scheduler_s = time.perf_counter() - begin_s
+
+        makespan_s = target_ctx.now_s
+        return BenchResult(
+            tentacles=len(self.connected_tentacles),
+            testruns=target_ctx.testruns,
+            testruns_not_scheduled=self.test_bartender.tests_todo,
+            firmwares=len(self.firmware_bartender.async_targets),
+            decisions=self.test_bartender.decisions + self.firmware_bartender.decisions,
+            scheduler_s=scheduler_s,
+            makespan_s=makespan_s,
+            idle_tentacle_s=sum(
+                makespan_s - target_ctx.busy_s.get(tentacle.label_short, 0.0)
+                for tentacle in self.connected_tentacles
+            ),
+        )
@@ -6,6 +6,7 @@ testbed_showcase and testbed_micropython
 from __future__ import annotations
 
 import dataclasses
+import hashlib
 import logging
 import os
 import pathlib
@@ -27,6 +28,8 @@ from testbed_micropython.testcollection.testrun_specs import TestRun
 
 from ..constants import is_url
 from ..testcollection.constants import ENV_PYTHONUNBUFFERED, MICROPYTHON_DIRECTORY_TESTS
+from ..util_mip_cache import MIP_CACHE, MipCacheException, MipFile, mpy_version
+from ..util_phases import PHASES, SPAN_MIP_INSTALL
 from ..util_subprocess_tentacle import tentacle_subprocess_run
 
 if typing.TYPE_CHECKING:
@@ -73,25 +76,130 @@ class ArgsMpTest:
         return _directory
 
 
+_CMD_PROBE_MIP = """
+import sys
+print('OCTOPROBE_MIP:', getattr(sys.implementation, '_mpy', 0), next((p for p in sys.path if p.endswith('/lib')), '/lib'))
+"""
+"""
+Like mip: The packages are installed into the first 'lib' directory in 'sys.path'.
+"""
+
+
 def mip_install(
     testargs: TestArgs,
     tentacle: TentacleBase,
     serial_port: str,
-    mip_package: str,
+    mip_packages: list[str],
     testrun: TestRun,
 ) -> None:
+    """
+    Install the packages from the local mip cache ('util_mip_cache.py')
+    in one mpremote session.
+    Falls back to 'mpremote mip install' if the cache or the probe of the device fails.
+    """
     assert testargs.__class__.__name__ == "TestArgs"
     assert isinstance(tentacle, TentacleBase)
     assert isinstance(serial_port, str)
-    assert isinstance(mip_package, str)
+    assert isinstance(mip_packages, list)
     assert isinstance(testrun, TestRun)
-    # if False:
-    # Using internal mp_remote connection
-    # logger.info(f"{tentacle.dut.label}: mip install {mip_package}")
-    # tentacle.dut.mp_remote.mip_install_package(mip_package)
-    # return
 
-    # Using external mpremote mip install
+    with PHASES.span(SPAN_MIP_INSTALL, tentacle=tentacle.label_short):
+        try:
+            mip_files, directory_lib = _mip_resolve(
+                tentacle=tentacle, mip_packages=mip_packages
+            )
+        except (MipCacheException, ExceptionTransport) as e:
+            logger.warning(
+                f"{tentacle.label_short}: mip cache failed, using 'mpremote mip install': {e!r}"
+            )
+            for mip_package in mip_packages:
+                _mip_install(
+                    testargs=testargs,
+                    serial_port=serial_port,
+                    mip_package=mip_package,
+                    testrun=testrun,
+                )
+            return
+
+        _mip_install_batch(
+            testargs=testargs,
+            serial_port=serial_port,
+            mip_packages=mip_packages,
+            mip_files=mip_files,
+            directory_lib=directory_lib,
+            testrun=testrun,
+        )
+
+
+def _mip_resolve(
+    tentacle: TentacleBase, mip_packages: list[str]
+) -> tuple[list[MipFile], str]:
+    """
+    Return the files to be copied and the 'lib' directory on the device.
+    """
+    output = tentacle.dut.mp_remote.exec_raw(cmd=_CMD_PROBE_MIP)
+    for line in output.splitlines():
+        if line.startswith("OCTOPROBE_MIP:"):
+            _, mpy, directory_lib = line.split()
+            break
+    else:
+        raise MipCacheException(f"Unexpected probe output: {output!r}")
+
+    mip_files = MIP_CACHE.resolve(
+        packages=mip_packages, mpy_version=mpy_version(int(mpy))
+    )
+    return mip_files, directory_lib
+
+
+def _mip_install_batch(
+    testargs: TestArgs,
+    serial_port: str,
+    mip_packages: list[str],
+    mip_files: list[MipFile],
+    directory_lib: str,
+    testrun: TestRun,
+) -> None:
+    directories = sorted(
+        {
+            "/".join([directory_lib, *mip_file.path.split("/")[:i]])
+            for mip_file in mip_files
+            for i in range(1, mip_file.path.count("/") + 1)
+        }
+    )
+    cmd_mkdirs = "\n".join(
+        [
+            "import os",
+            f"for d in {[directory_lib, *directories]!r}:",
+            "    try:",
+            "        os.mkdir(d)",
+            "    except OSError:",
+            "        pass",
+        ]
+    )
+    args = [sys.executable, "-m", "mpremote", "connect", serial_port]
+    args.extend(["exec", cmd_mkdirs])
+    for mip_file in mip_files:
+        args.extend(
+            ["+", "cp", str(mip_file.filename), f":{directory_lib}/{mip_file.path}"]
+        )
+    tentacle_subprocess_run(
+        args=args,
+        cwd=testargs.repo_micropython_tests / MICROPYTHON_DIRECTORY_TESTS,
+        testrun=testrun,
+        env=ENV_PYTHONUNBUFFERED,
+        logfile=testargs.testresults_directory(
+            f"mip_install_{'_'.join(mip_packages)}.txt"
+        ).filename,
+        timeout_s=60.0,
+    )
+
+
+def _mip_install(
+    testargs: TestArgs,
+    serial_port: str,
+    mip_package: str,
+    testrun: TestRun,
+) -> None:
     args = [
         sys.executable,
         "-m",
@@ -114,13 +222,61 @@ def mip_install(
     )
 
 
+_PREFIX_CERTIFICATE = "OCTOPROBE_CERTIFICATE:"
+
+
+def _certificates_on_dut(dut: TentacleDut, names: list[str]) -> dict[str, str]:
+    """
+    Return the sha256 of the certificates already on the DUT.
+    key: filename, value: sha256
+    Files which do not exist on the DUT are missing.
+    """
+    cmd = f"""
+import binascii, hashlib
+for name in {names!r}:
+    try:
+        f = open(name, 'rb')
+        h = hashlib.sha256(f.read())
+        f.close()
+    except OSError:
+        continue
+    print('{_PREFIX_CERTIFICATE}', name, binascii.hexlify(h.digest()).decode())
+"""
+    output = dut.mp_remote.exec_raw(cmd=cmd)
+    sha256s: dict[str, str] = {}
+    for line in output.splitlines():
+        if line.startswith(_PREFIX_CERTIFICATE):
+            _, name, sha256 = line.split()
+            sha256s[name] = sha256
+    return sha256s
+
+
 def copy_certificates(dut: TentacleDut, src: pathlib.Path) -> None:
+    """
+    Only the certificates which are missing on the DUT or differ are copied.
+    """
     assert isinstance(dut, TentacleDut)
     assert isinstance(src, pathlib.Path)
 
     dut.mp_remote.set_rtc()
 
-    for certificate in list(src.glob("*.der")) + list(src.glob("*.pem")):
+    certificates = list(src.glob("*.der")) + list(src.glob("*.pem"))
+    try:
+        sha256s = _certificates_on_dut(
+            dut=dut, names=[certificate.name for certificate in certificates]
+        )
+    except Exception as e:
+        # For example: No 'hashlib' on the DUT
+        logger.debug(f"{dut.label}: copy_certificates(): Probe failed: {e!r}")
+        sha256s = {}
+
+    for certificate in certificates:
+        sha256 = hashlib.sha256(certificate.read_bytes()).hexdigest()
+        if sha256s.get(certificate.name, None) == sha256:
+            logger.debug(
+                f"{dut.label}: copy_certificates(): {certificate.name} already on the DUT"
+            )
+            continue
         logger.info(f"{dut.label}: copy_certificates(): {certificate.name}")
         dut.mp_remote.cp(certificate, ":")
 
@@ -32,17 +32,33 @@ from octoprobe.util_serialnumber import assert_serialdelimted_valid
 from octoprobe.util_subprocess import SubprocessExitCodeException
 from octoprobe.util_testbed_lock import TestbedLock
 
-from .. import constants, util_multiprocessing
+from .. import (
+    constants,
+    util_firmware_identity,
+    util_live_results,
+    util_multiprocessing,
+    util_phases,
+)
 from ..mptest.util_common import ArgsMpTest
-from ..report_task import util_report_renderer, util_report_tasks
+from ..report_task import util_report_tasks, util_report_writer
+from ..report_test import util_history
+from ..report_test.util_baseclasses import ResultTestGroup
+from ..report_test.util_constants import FILENAME_PHASES_JSON
 from ..report_test.util_testreport import (
     ReportTestgroup,
     ReportTests,
+    next_rerun_of,
 )
 from ..tentacle_spec import TentacleMicropython, TentacleSpecMicropython
 from ..tentacles_inventory import TENTACLES_INVENTORY
+from ..testcollection import testrun_impact
 from ..testcollection.baseclasses_run import TestRunSpecs
 from ..testcollection.baseclasses_spec import ConnectedTentacles
+from ..testcollection.testrun_durations import (
+    DurationPrioritySorter,
+    TestRunDurations,
+)
+from ..testcollection.testrun_shards import TestFileDurations
 from ..testcollection.testrun_specs import TestArgs, TestRun, TestRunSpec
 from ..testrunspecs import (
     run_flash_format,
@@ -53,9 +69,12 @@ from ..testrunspecs import (
     runtests,
     runtests_net_inet,
 )
-from ..testrunspecs.run_natmodtests import NATMOD_EXAMPLES
 from ..testrunspecs.util_testarg import TestArg
+from ..util_ccache import Ccache, CcacheStats
+from ..util_firmware_cache import FirmwareCache
 from ..util_firmware_mpbuild_interface import ArgsFirmware
+from ..util_natmod_cache import NatmodCache
+from ..util_phases import PHASES
 from .util_baseclasses import ArgsQuery
 
 if typing.TYPE_CHECKING:
@@ -202,17 +221,83 @@ class Args:
     """
     The board to be used a reference for WLAN/Bluetooth tests.
     Example: RPI_PICO_W
+    Example: RPI_PICO_W,RPI_PICO2_W: A pool of reference tentacles
     """
     jobs: int = 0
     """
     Limit parallel jobs.
     0: No limit
     """
+    build_jobs: int = 1
+    """
+    Parallel firmware builds.
+    """
+    natmod_jobs: int = 2
+    """
+    Parallel compilations of the natmod examples: One per arch.
+    """
+    firmware_cache: bool = False
+    """
+    Take the firmwares from the persistent firmware cache if possible.
+    """
+    ccache: bool = False
+    """
+    Mount a persistent ccache per toolchain into the mpbuild docker container.
+    Only esp32 (esp-idf) and rp2 (cmake) use it: The make based ports are built without ccache.
+    """
+    flash_probe: bool = False
+    """
+    Skip flashing if the DUT already runs the required firmware.
+    """
+    reference_session: bool = False
+    """
+    The reference tentacle is only flashed if it does not run the
+    reference firmware yet: Even without 'flash_probe'.
+    The reference is still power cycled for every testrun by 'CtxTestRun'.
+    """
     count: int = 0
     """
     Is only relevant for '--query-test'.
     Every test should be repeated 'count' time.
     """
+    durations_from: pathlib.Path | None = None
+    """
+    The testresults of a previous run.
+    If set, the testruns with the longest durations are started first.
+    """
+    live_results: bool = False
+    """
+    Write the per-test outcomes as they arrive to 'live_results.jsonl'.
+    """
+    history: pathlib.Path | None = None
+    """
+    At the end of the run, the outcomes are ingested into this database.
+    None: Disabled
+    """
+    shards: int = 1
+    """
+    Split 'shardable' testruns into up to 'shards' shards
+    which run on identical tentacles.
+    """
+    test_file_durations: TestFileDurations = dataclasses.field(
+        default_factory=TestFileDurations
+    )
+    """
+    The durations of the test files of a previous run: Used to balance the shards.
+    """
+    early_abort: util_live_results.EarlyAbortPolicy = (
+        util_live_results.EARLY_ABORT_POLICY_DISABLED
+    )
+    """
+    Terminate a testgroup if too many tests fail.
+    """
+    impacted_by: str | None = None
+    """
+    A git ref of the micropython firmware repo.
+    Only run the tests which are impacted by the changes since this git ref.
+    See 'testrun_impact.py'.
+    None: Run all tests
+    """
 
     def __post_init__(self) -> None:
         assert isinstance(self.mp_test, ArgsMpTest | None)
@@ -220,6 +305,14 @@ class Args:
         assert isinstance(self.directory_results, pathlib.Path)
         assert isinstance(self.force_multiprocessing, bool)
         assert isinstance(self.jobs, int)
+        assert isinstance(self.build_jobs, int)
+        assert self.build_jobs >= 1
+        assert isinstance(self.natmod_jobs, int)
+        assert self.natmod_jobs >= 1
+        assert isinstance(self.firmware_cache, bool)
+        assert isinstance(self.ccache, bool)
+        assert isinstance(self.flash_probe, bool)
+        assert isinstance(self.reference_session, bool)
         assert isinstance(self.query_test, ArgsQuery)
         assert isinstance(self.query_board, ArgsQuery)
         assert isinstance(self.debug_skip_tests, bool)
@@ -227,6 +320,14 @@ class Args:
         assert isinstance(self.debug_skip_usb_error, bool)
         assert isinstance(self.reference_board, str)
         assert isinstance(self.count, int)
+        assert isinstance(self.durations_from, pathlib.Path | None)
+        assert isinstance(self.live_results, bool)
+        assert isinstance(self.history, pathlib.Path | None)
+        assert isinstance(self.impacted_by, str | None)
+        assert isinstance(self.shards, int)
+        assert self.shards >= 1
+        assert isinstance(self.test_file_durations, TestFileDurations)
+        assert isinstance(self.early_abort, util_live_results.EarlyAbortPolicy)
 
     @staticmethod
     def get_default_args(
@@ -302,18 +403,38 @@ class TestRunner:
         Clone github.
         """
         assert isinstance(args, Args)
-        from ..bartenders import firmware_bartender
+        from ..bartenders import firmware_bartender, natmod_bartender
 
         self.ctxtestrun: CtxTestRun
         self.test_bartender: TestBartender
-        self.tentacle_reference: TentacleMicropython | None
+        self.tentacles_reference: list[TentacleMicropython]
         self.firmware_bartender: firmware_bartender.FirmwareBartenderBase
+        self.natmod_bartender = natmod_bartender.NatmodBartender(
+            natmod_jobs=args.natmod_jobs,
+            natmod_cache=NatmodCache(),
+        )
         self.args = args
+        self.durations: TestRunDurations | None = None
+        self.predicted_makespan_s: float | None = None
 
         util_logging.init_logging()
 
         _TESTBED_LOCK.acquire(constants.FILENAME_TESTBED_LOCK)
 
+        if args.durations_from is not None:
+            # Read the durations before 'directory_results' is removed:
+            # 'durations_from' might be the same directory.
+            self.durations = TestRunDurations.factory(
+                directory_results=args.durations_from
+            )
+            logger.info(
+                f"Read {len(self.durations)} testrun durations from {args.durations_from}"
+            )
+            if args.shards > 1:
+                args.test_file_durations = TestFileDurations.factory(
+                    directory_results=args.durations_from
+                )
+
         if args.directory_results.exists():
             shutil.rmtree(args.directory_results, ignore_errors=False)
         args.directory_results.mkdir(parents=True, exist_ok=True)
@@ -395,26 +516,59 @@ class TestRunner:
         # _testrun.session_powercycle_tentacles()
 
         testrun_specs = get_testrun_specs(query=self.args.query_test)
-        self.tentacle_reference = connected_tentacles.find_first_tentacle(
-            board=self.args.reference_board
+        impact = self._impact(testrun_specs=testrun_specs)
+        if impact is not None:
+            testrun_specs = impact.testrun_specs(testrun_specs=testrun_specs)
+        any_reference = self.args.reference_board == constants.ANY_REFERENCE_BOARD
+        self.tentacles_reference = connected_tentacles.find_reference_tentacles(
+            reference_board=self.args.reference_board
         )
         selected_tentacles = connected_tentacles.query_boards(
             query=self.args.query_board,
-            tentacle_reference=self.tentacle_reference,
+            tentacles_reference=None if any_reference else self.tentacles_reference,
             testrun_specs=testrun_specs,
         )
+        if any_reference:
+            # Only the selected tentacles may be used as reference
+            self.tentacles_reference = selected_tentacles.find_reference_tentacles(
+                reference_board=self.args.reference_board
+            )
         testrun_specs.assign_tentacles(
             tentacles=selected_tentacles,
             flash_skip=self.args.firmware.flash_skip,
+            shards=self.args.shards,
         )
+        if impact is not None:
+            impact.filter_boards(
+                testrun_specs=testrun_specs,
+                board_ports=testrun_impact.board_ports(
+                    repo=self.args.firmware.repo_micropython_firmware
+                ),
+            )
 
         from ..bartenders.test_bartender import TestBartender
 
+        priority: typing.Callable[
+            [TestRun, ConnectedTentacles], tuple[typing.Any, ...]
+        ] = TestRun.priority
+        if self.durations is not None:
+            priority = DurationPrioritySorter(
+                durations=self.durations,
+                testrun_specs=testrun_specs,
+            ).priority
+            self.predicted_makespan_s = self.durations.predicted_makespan_s(
+                testrun_specs=testrun_specs,
+                connected_tentacles=selected_tentacles,
+            )
+            logger.info(
+                f"Predicted duration of the testruns: {self.predicted_makespan_s:0.0f}s"
+            )
+
         self.test_bartender = TestBartender(
             connected_tentacles=selected_tentacles,
-            tentacle_reference=self.tentacle_reference,
+            tentacles_reference=self.tentacles_reference,
             testrun_specs=testrun_specs,
-            priority_sorter=TestRun.priority_sorter,
+            priority=priority,
             directory_results=self.args.directory_results,
         )
 
@@ -424,7 +578,10 @@ class TestRunner:
             self.firmware_bartender = firmware_bartender.FirmwareBartenderSkipFlash()
         else:
             self.firmware_bartender = firmware_bartender.FirmwareBartender(
-                self.test_bartender.testrun_specs
+                self.test_bartender.testrun_specs,
+                build_jobs=self.args.build_jobs,
+                firmware_cache=FirmwareCache() if self.args.firmware_cache else None,
+                ccache=Ccache() if self.args.ccache else None,
             )
         if self.args.firmware.flash_force:
             for tentacle in selected_tentacles:
@@ -439,6 +596,36 @@ class TestRunner:
 
         update_testbed_instance()
 
+    def _impact(self, testrun_specs: TestRunSpecs) -> testrun_impact.Impact | None:
+        """
+        Return None if '--impacted-by' is not given: All tests are run.
+        """
+        if self.args.impacted_by is None:
+            return None
+
+        files_changed = testrun_impact.files_changed(
+            repo=self.args.firmware.repo_micropython_firmware,
+            git_ref=self.args.impacted_by,
+        )
+        impact = testrun_impact.Impact.factory(
+            files_changed=files_changed,
+            all_labels=[testrun_spec.label for testrun_spec in testrun_specs],
+        )
+        impact.remove_missing_tests(repo=self.args.firmware.repo_micropython_firmware)
+        if self.args.history is not None and self.args.history.is_file():
+            try:
+                with util_history.History(filename=self.args.history) as history:
+                    impact.add_co_failures(
+                        co_failures=history.co_failures(testgroups=set(impact))
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to query {self.args.history}: {e!r}")
+
+        logger.info(
+            f"--impacted-by={self.args.impacted_by}: {len(files_changed)} files changed, impacted:\n{impact.text}"
+        )
+        return impact
+
     def flash(self, udev_poller: UdevPoller, last_variant: bool) -> None:
         assert isinstance(last_variant, bool)
 
@@ -480,49 +667,121 @@ class TestRunner:
         if self.test_bartender.contains_test_with_label(
             label=run_natmodtests.TESTRUNSPEC_RUN_NATMODTESTS.label
         ):
-            NATMOD_EXAMPLES.compile_all(
+            self.natmod_bartender.compile_natmods(
                 repo_micropython_tests=repo_micropython_tests,
                 directory_mpbuild_artifacts=directory_mpbuild_artifacts,
             )
-        async_target = self.firmware_bartender.build_firmwares(
+        self.firmware_bartender.build_firmwares(
             directory_mpbuild_artifacts=directory_mpbuild_artifacts,
             repo_micropython_firmware=self.args.firmware.repo_micropython_firmware,
             reference_board=self.args.reference_board,
         )
-        if async_target is not None:
-            target_ctx.start(async_target=async_target)
 
         # Write 'context_json' in case the tests will timeout!
         self.report_testgroup.write_context_json()
 
-        report_tasks = util_report_tasks.Tasks()
+        report_task_writer = util_report_writer.TaskReportWriter(
+            directory_results=self.args.directory_results
+        )
+        live_results = util_live_results.LiveResults(
+            filename_jsonl=self.args.directory_results
+            / util_live_results.FILENAME_LIVE_RESULTS
+            if self.args.live_results
+            else None
+        )
+
+        def add_task(task: util_report_tasks.Task) -> None:
+            # Include the tests which are still running
+            report_task_writer.add_task(
+                task=task,
+                running_tasks=[
+                    async_target.report_task_running()
+                    for async_target in self.test_bartender.async_targets
+                    if async_target.target_optional is not None
+                ],
+            )
+
+        try:
+            self.run_all(
+                target_ctx=target_ctx,
+                repo_micropython_tests=repo_micropython_tests,
+                add_task=add_task,
+                live_results=live_results,
+            )
+        finally:
+            # Also if a firmware build failed: The report includes the failing task
+            report_task_writer.close()
+        live_results.log_progress()
+
+        target_ctx.close_and_join(self.firmware_bartender.async_targets)
+        target_ctx.close_and_join(self.natmod_bartender.async_targets)
+        target_ctx.close_and_join(self.test_bartender.async_targets)
+
+        self.ctxtestrun.session_teardown()
+        UDEV_POLLER_LAZY.close()
 
-        def generate_task_report(align_time: bool = False) -> None:
-            filename_report_base = self.args.directory_results / "task_report"
-            (
-                self.args.directory_results / (filename_report_base.name + "_repr.py")
-            ).write_text(repr(report_tasks))
+        self.report_testgroup.write_ok()
 
-            report = util_report_tasks.TaskReport(tasks=report_tasks)
-            for suffix, cls_renderer in (
-                (".txt", util_report_renderer.RendererAscii),
-                (".md", util_report_renderer.RendererMarkdown),
-                (".html", util_report_renderer.RendererHtml),
-            ):
-                filename_report = filename_report_base.with_suffix(suffix)
-                with filename_report.open("w", encoding="ascii") as f:
-                    report.report(renderer=cls_renderer(f))
+        if self.args.history is not None:
+            util_history.ingest_run(
+                filename=self.args.history,
+                directory_results=self.args.directory_results,
+            )
 
-        def run_all() -> None:
-            from ..bartenders.test_bartender import CurrentlyNoTestsException
+    def run_all(
+        self,
+        target_ctx: util_multiprocessing.TargetCtx,
+        repo_micropython_tests: pathlib.Path,
+        add_task: typing.Callable[[util_report_tasks.Task], None],
+        live_results: util_live_results.LiveResults,
+    ) -> None:
+        """
+        Start the firmware builds, the natmod compilations and the tests
+        and handle their events till all of them are done.
 
+        'mptest bench-scheduler' drives this loop with simulated targets.
+        """
+        from ..bartenders import firmware_bartender, natmod_bartender
+        from ..bartenders.test_bartender import CurrentlyNoTestsException
+
+        def start_firmware_builds() -> None:
+            """
+            Start firmware builds as long as build jobs are available.
+            The firmwares for the tentacles waiting the most are built first.
+            """
+            while True:
+                async_target = self.firmware_bartender.firmware_next(
+                    waiting_tentacles=self.test_bartender.waiting_tentacles_by_board_variant()
+                )
+                if async_target is None:
+                    return
+                target_ctx.start(async_target=async_target)
+
+        def start_natmod_builds() -> None:
+            """
+            Start the natmod compilations as long as natmod jobs are available.
+            """
             while True:
+                async_target = self.natmod_bartender.natmod_next()
+                if async_target is None:
+                    return
+                target_ctx.start(async_target=async_target)
+
+        schedule_required = True
+        """
+        The candidates are only recomputed if the situation has changed:
+        A firmware has been built, a tentacle has been released or
+        a timeout has been reached.
+        """
+        while True:
+            if schedule_required:
                 try:
                     async_target = self.test_bartender.testrun_next(
                         firmwares_built=self.firmware_bartender.firmwares_built,
                         args=self.args,
                         ctxtestrun=self.ctxtestrun,
                         repo_micropython_tests=repo_micropython_tests,
+                        testrun_ready=self.natmod_bartender.testrun_ready,
                     )
 
                     #
@@ -535,94 +794,145 @@ class TestRunner:
                         async_target=async_target,
                         target_ctx=target_ctx,
                     )
+                    # There might be more tests which may be started right away
+                    continue
                 except CurrentlyNoTestsException:
+                    schedule_required = False
                     logger.debug(
                         "CurrentlyNoTestsException: Wait for firmware to be built or tentacles to be freed!"
                     )
+                    start_firmware_builds()
+                    start_natmod_builds()
                     if target_ctx.done(self.test_bartender.async_targets):
-                        if target_ctx.done(self.firmware_bartender.async_targets):
+                        if (
+                            target_ctx.done(self.firmware_bartender.async_targets)
+                            and self.firmware_bartender.firmwares_todo == 0
+                            and target_ctx.done(self.natmod_bartender.async_targets)
+                            and self.natmod_bartender.natmods_todo == 0
+                        ):
                             logger.info(f"Done in {target_ctx.duration_text}")
+                            if self.predicted_makespan_s is not None:
+                                logger.info(
+                                    f"Duration predicted {self.predicted_makespan_s:0.0f}s, actual {target_ctx.duration_s:0.0f}s"
+                                )
                             return
 
+            if target_ctx.deadline_reached():
                 self.firmware_bartender.handle_timeouts()
-                self.test_bartender.handle_timeouts(report_tasks)
-
-                for event in target_ctx.iter_queue():
-
-                    def handle_event(event: util_multiprocessing.EventBase) -> None:
-                        async_target_firmware = self.firmware_bartender.get_by_event(
-                            event
-                        )
-                        if async_target_firmware is not None:
-                            async_target_firmware.target.handle_exit_event(event)
-                            return
-                        async_target_test = self.test_bartender.get_by_event(event)
-                        if async_target_test is not None:
-                            async_target_test.target.handle_exit_event(event)
-                            return
-                        # raise ValueError(f"Bartender not found for event: {event}!")
-
-                    handle_event(event)
-                    generate_task_report()
-
-                    from ..bartenders import firmware_bartender
+                if self.natmod_bartender.handle_timeouts():
+                    schedule_required = True
+                if self.test_bartender.handle_timeouts(add_task=add_task):
+                    schedule_required = True
+
+            for event in target_ctx.iter_queue(timeout_s=target_ctx.wait_s):
+
+                def handle_event(event: util_multiprocessing.EventBase) -> None:
+                    async_target_firmware = self.firmware_bartender.get_by_event(event)
+                    if async_target_firmware is not None:
+                        async_target_firmware.target.handle_exit_event(event)
+                        return
+                    async_target_natmod = self.natmod_bartender.get_by_event(event)
+                    if async_target_natmod is not None:
+                        async_target_natmod.target.handle_exit_event(event)
+                        return
+                    async_target_test = self.test_bartender.get_by_event(event)
+                    if async_target_test is not None:
+                        async_target_test.target.handle_exit_event(event)
+                        return
+                    # raise ValueError(f"Bartender not found for event: {event}!")
+
+                handle_event(event)
+
+                if isinstance(event, util_multiprocessing.EventLog):
+                    logger.info(f"[COLOR_INFO]{event.target_unique_name}: {event.msg}")
+                elif isinstance(event, util_multiprocessing.EventTestOutcomes):
+                    live_results.handle_event(event)
+                    async_target_test = self.test_bartender.get_by_event(event)
+                    if async_target_test is not None:
+                        async_target_test.add_event_test_outcomes(event)
+                elif isinstance(event, util_multiprocessing.EventFlash):
+                    async_target_test = self.test_bartender.get_by_event(event)
+                    if async_target_test is not None:
+                        async_target_test.add_event_flash(event)
+                elif isinstance(event, util_multiprocessing.EventPhase):
+                    async_target_test = self.test_bartender.get_by_event(event)
+                    if async_target_test is not None:
+                        async_target_test.add_event_phase(event)
+                elif isinstance(event, EventExitRunOneTest):
+                    async_target_test = self.test_bartender.testrun_done(event=event)
+                    add_task(async_target_test.report_task)
+                    schedule_required = True
+
+                elif isinstance(event, firmware_bartender.EventFirmwareSpec):
+                    logfile = DirectoryTag.R.render_relative_to(
+                        top=self.args.directory_results, filename=event.logfile
+                    )
 
-                    if isinstance(event, util_multiprocessing.EventLog):
+                    logger.info(
+                        f"[COLOR_SUCCESS]{event.target_unique_name}: Firmware build took {event.duration_text}. Logfile: {logfile}"
+                    )
+                    if event.ccache_stats is not None:
                         logger.info(
-                            f"[COLOR_INFO]{event.target_unique_name}: {event.msg}"
+                            f"{event.target_unique_name}: ccache: {event.ccache_stats.text}"
                         )
-                    elif isinstance(event, EventExitRunOneTest):
-                        async_target_test = self.test_bartender.testrun_done(
-                            event=event
+                    self.firmware_bartender.firmware_built(event.firmware_spec)
+                    schedule_required = True
+                    ccache_stats = event.ccache_stats or CcacheStats()
+                    add_task(
+                        util_report_tasks.Task(
+                            label=event.target_unique_name,
+                            start_s=event.start_s,
+                            end_s=event.end_s,
+                            tentacles=[],
+                            ccache_hits=ccache_stats.hits,
+                            ccache_misses=ccache_stats.misses,
                         )
-                        report_tasks.append(async_target_test.report_task)
-
-                    elif isinstance(event, firmware_bartender.EventFirmwareSpec):
-                        logfile = DirectoryTag.R.render_relative_to(
-                            top=self.args.directory_results, filename=event.logfile
+                    )
+                elif isinstance(event, natmod_bartender.EventNatmodBuilt):
+                    source = "natmod cache" if event.cached else "compiled"
+                    logger.info(
+                        f"[COLOR_SUCCESS]{event.target_unique_name}: Natmod examples {source} in {event.duration_text}"
+                    )
+                    self.natmod_bartender.natmod_built(arch=event.arch)
+                    schedule_required = True
+                    add_task(
+                        util_report_tasks.Task(
+                            label=event.target_unique_name,
+                            start_s=event.start_s,
+                            end_s=event.end_s,
+                            tentacles=[],
                         )
-
-                        logger.info(
-                            f"[COLOR_SUCCESS]{event.target_unique_name}: Firmware build took {event.duration_text}. Logfile: {logfile}"
+                    )
+                elif isinstance(event, natmod_bartender.EventExitNatmod):
+                    logger.debug(f"{event.target_unique_name}: Completed")
+                    schedule_required = True
+                    if not event.success:
+                        async_target_natmod = self.natmod_bartender.get_by_event(event)
+                        assert async_target_natmod is not None
+                        logger.error(
+                            f"[COLOR_ERROR]{event.target_unique_name}: Natmod compilation failed, RUN-NATMODTESTS will be skipped: {event.logfile}"
+                        )
+                        self.natmod_bartender.natmod_failed(
+                            arch=async_target_natmod.arch.arch
                         )
-                        self.firmware_bartender.firmware_built(event.firmware_spec)
-                        report_tasks.append(
-                            util_report_tasks.Task(
-                                label=event.target_unique_name,
-                                start_s=event.start_s,
-                                end_s=event.end_s,
-                                tentacles=[],
-                            )
+                elif isinstance(event, firmware_bartender.EventExitFirmware):
+                    logger.debug(f"{event.target_unique_name}: Completed")
+                    schedule_required = True
+                    if not event.success:
+                        logfile = DirectoryTag.R.render_relative_to(
+                            top=self.args.directory_results,
+                            filename=event.logfile,
+                        )
+                        error = f"Firmware build failed: {logfile}"
+                        logger.error(
+                            f"[COLOR_ERROR]{event.target_unique_name}: {error}"
                         )
-                    elif isinstance(event, firmware_bartender.EventExitFirmware):
-                        logger.debug(f"{event.target_unique_name}: Completed")
-                        target_ctx.close_and_join(self.firmware_bartender.async_targets)
-                        if not event.success:
-                            logfile = DirectoryTag.R.render_relative_to(
-                                top=self.args.directory_results,
-                                filename=event.logfile,
-                            )
-                            error = f"Firmware build failed: {logfile}"
-                            logger.error(
-                                f"[COLOR_ERROR]{event.target_unique_name}: {error}"
-                            )
-                            self.report_testgroup.write_error(error=error)
-                            raise OctoprobeAppExitException(error)
-                    else:
-                        error = "Programming error!"
                         self.report_testgroup.write_error(error=error)
-                        raise ValueError(error)
-
-        run_all()
-
-        target_ctx.close_and_join(self.firmware_bartender.async_targets)
-        target_ctx.close_and_join(self.test_bartender.async_targets)
-
-        self.ctxtestrun.session_teardown()
-        UDEV_POLLER_LAZY.close()
-
-        self.report_testgroup.write_ok()
-        generate_task_report(align_time=True)
+                        raise OctoprobeAppExitException(error)
+                else:
+                    error = "Programming error!"
+                    self.report_testgroup.write_error(error=error)
+                    raise ValueError(error)
 
     def run_one_test(
         self,
@@ -689,6 +999,10 @@ def _target_run_one_test_async_b(
     duration_text: typing.Callable[[float | None], str],
     debug_skip_tests: bool,
     debug_fast_fake_tests: bool,
+    flash_probe: bool,
+    reference_session: bool,
+    test_file_durations: dict[str, float],
+    rerun_tests: list[str],
 ) -> None:
     """
     This is a 'global' method and as such may be used within process or
@@ -697,28 +1011,39 @@ def _target_run_one_test_async_b(
     logger.info(f"TEST SETUP {duration_text(0.0)} {testid}")
 
     for tentacle in testrun.tentacles:
-        ctxtestrun.function_setup_infra(
-            udev_poller=UDEV_POLLER_LAZY.udev_poller,
-            tentacle=tentacle,
-        )
-        ctxtestrun.function_prepare_dut(tentacle=tentacle)
-        ctxtestrun.function_setup_dut_flash(
-            udev_poller=UDEV_POLLER_LAZY.udev_poller,
-            tentacle=tentacle,
-            directory_logs=testresults_directory.directory_test,
-        )
+        label = tentacle.label_short
+        with PHASES.span(util_phases.SPAN_SETUP_INFRA, tentacle=label):
+            ctxtestrun.function_setup_infra(
+                udev_poller=UDEV_POLLER_LAZY.udev_poller,
+                tentacle=tentacle,
+            )
+        with PHASES.span(util_phases.SPAN_PREPARE_DUT, tentacle=label):
+            ctxtestrun.function_prepare_dut(tentacle=tentacle)
+        with PHASES.span(util_phases.SPAN_SETUP_DUT_FLASH, tentacle=label):
+            util_firmware_identity.setup_dut_flash(
+                ctxtestrun=ctxtestrun,
+                tentacle=tentacle,
+                directory_logs=testresults_directory.directory_test,
+                # In a reference session, the reference is never reflashed needlessly
+                probe=flash_probe
+                or (reference_session and tentacle is testrun.tentacle_reference),
+            )
 
-    ctxtestrun.setup_relays(
-        futs=(testrun.testrun_spec.required_fut,),
-        tentacles=list(testrun.tentacles),
-    )
+    with PHASES.span(util_phases.SPAN_SETUP_RELAYS):
+        ctxtestrun.setup_relays(
+            futs=(testrun.testrun_spec.required_fut,),
+            tentacles=list(testrun.tentacles),
+        )
     logger.info(f"TEST BEGIN {duration_text(None)} {testid}")
 
-    with testrun.active_led_on:
+    with testrun.active_led_on, PHASES.span(util_phases.SPAN_TEST):
         testrun.test_outer(
             testargs=TestArgs(
                 testresults_directory=testresults_directory,
                 repo_micropython_tests=repo_micropython_tests,
+                test_file_durations=test_file_durations,
+                rerun_tests=rerun_tests,
+                impacted_tests=testrun.testrun_spec.impacted_tests,
             ),
             debug_skip_tests=debug_skip_tests,
             debug_fast_fake_tests=debug_fast_fake_tests,
@@ -735,11 +1060,13 @@ def _target_run_one_test_async_a(
     testresults_directory: ResultsDir,
     testid: str,
     report_test: ReportTestgroup,
+    rerun_tests: list[str],
 ) -> bool:
     """
     return True on success
     """
     begin_s = time.monotonic()
+    PHASES.reset()
 
     def duration_text(duration_s: float | None = None) -> str:
         if duration_s is None:
@@ -756,9 +1083,20 @@ def _target_run_one_test_async_a(
             duration_text=duration_text,
             debug_skip_tests=args.debug_skip_tests,
             debug_fast_fake_tests=args.debug_fast_fake_tests,
+            flash_probe=args.flash_probe,
+            reference_session=args.reference_session,
+            test_file_durations=args.test_file_durations.get(
+                testrun.testrun_spec.label, {}
+            ),
+            rerun_tests=rerun_tests,
         )
         report_test.write_ok()
         return True
+    except util_live_results.EarlyAbortException as e:
+        msg = f"{testid}: Terminating test due to: {e}"
+        logger.warning(msg)
+        report_test.write_error(msg=msg, deterministic=e.deterministic)
+        return False
     except (
         OctoprobeTestException,
         UdevFailException,
@@ -778,9 +1116,13 @@ def _target_run_one_test_async_a(
     finally:
         logger.info(f"TEST TEARDOWN {duration_text()} {testid}")
         try:
-            ctxtestrun.function_teardown(active_tentacles=testrun.tentacles)
+            with PHASES.span(util_phases.SPAN_TEARDOWN):
+                ctxtestrun.function_teardown(active_tentacles=testrun.tentacles)
         except Exception as e:
             logger.exception(e)
+        PHASES.write(
+            filename=testresults_directory.directory_test / FILENAME_PHASES_JSON
+        )
         logger.info(f"TEST END {duration_text()} {testid}")
 
 
@@ -795,9 +1137,12 @@ def target_run_one_test_async(
     success = False
     try:
         arg1.initfunc(arg1=arg1)
+        util_live_results.set_early_abort_policy(args.early_abort)
 
         counter_error = 0
         counter_success = 0
+        # The attempt whose failed tests are run again. None: Run all tests.
+        rerun_of: ResultTestGroup | None = None
         while True:
             testid_idx0 = testrun.testid_idx0(idx0=counter_success + counter_error)
 
@@ -815,6 +1160,7 @@ def target_run_one_test_async(
                     testresults_directory=testresults_directory,
                     testrun=testrun,
                     logfile=logfile,
+                    rerun_of=rerun_of,
                 )
 
                 success = _target_run_one_test_async_a(
@@ -825,8 +1171,24 @@ def target_run_one_test_async(
                     testresults_directory=testresults_directory,
                     testid=testid_idx0,
                     report_test=report_test,
+                    rerun_tests=[]
+                    if rerun_of is None
+                    else [outcome.name for outcome in rerun_of.results_failed],
                 )
 
+                if testrun.testrun_spec.rerun_failed_tests:
+                    if (
+                        success
+                        and rerun_of is not None
+                        and len(report_test.report.results_failed) == 0
+                    ):
+                        msg = "All rerun tests succeeded. We stop testing this group."
+                        logger.info(msg)
+                        break
+                    rerun_of = next_rerun_of(
+                        rerun_of=rerun_of, report=report_test.report, success=success
+                    )
+
                 if success:
                     counter_success += 1
                     if counter_success == 1:
@@ -845,7 +1207,10 @@ def target_run_one_test_async(
 
                 msg = f"Run {counter_success + 1}({args.count}), retry {counter_error}({constants.TEST_MAX_RETRIES}) failed!"
                 last_retry = counter_error >= constants.TEST_MAX_RETRIES
-                if last_retry:
+                if report_test.failure_deterministic:
+                    msg += " The failure is deterministic: No retry!"
+                    last_retry = True
+                elif last_retry:
                     msg += " Last_retry: Giving up!"
                 logger.info(msg)
                 if last_retry:
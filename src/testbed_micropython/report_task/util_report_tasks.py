@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import ast
 import copy
 import dataclasses
 import logging
 import typing
+from collections import defaultdict
 
 from ..report_task.util_report_renderer import (
     Align,
@@ -19,9 +21,76 @@ _TENTACLE_NONE = "."
 # _QUANTIZE_FACTOR =  5  # 200ms
 _QUANTIZE_FACTOR = 2  # 500ms
 
+OUTCOME_PASS = "pass"
+OUTCOME_FAIL = "fail"
+OUTCOME_SKIP = "skip"
+
+PHASE_FLASH = "flash"
+PHASE_RELAYS = "relays"
+PHASE_MIP = "mip"
+PHASE_TEST = "test"
+PHASE_TEARDOWN = "teardown"
+PHASE_OTHER = "other"
+PHASES = (
+    PHASE_FLASH,
+    PHASE_RELAYS,
+    PHASE_MIP,
+    PHASE_TEST,
+    PHASE_TEARDOWN,
+    PHASE_OTHER,
+)
+
+IDLE_FIRMWARE = "firmware"
+"""
+The tentacle waits for the firmware to be built.
+"""
+IDLE_REFERENCE = "reference"
+"""
+The tentacle waits for the other tentacles of the testrun, usually the reference tentacle.
+"""
+IDLE_NO_WORK = "no work"
+"""
+The tentacle has completed all its testruns.
+"""
+IDLE_OTHER = "other"
+IDLES = (IDLE_FIRMWARE, IDLE_REFERENCE, IDLE_NO_WORK, IDLE_OTHER)
+
 logger = logging.getLogger(__file__)
 
 
+@dataclasses.dataclass(repr=True, slots=True)
+class TaskOutcomes:
+    """
+    The per-test outcomes of a testgroup as reported live by 'run-tests.py'.
+    """
+
+    passed: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.passed + self.failed + self.skipped
+
+    def add(self, outcome: str) -> None:
+        if outcome == OUTCOME_PASS:
+            self.passed += 1
+        elif outcome == OUTCOME_FAIL:
+            self.failed += 1
+        else:
+            assert outcome == OUTCOME_SKIP, outcome
+            self.skipped += 1
+
+    def tests_per_min(self, duration_s: float) -> float:
+        return 60.0 * self.total / max(duration_s, 1.0)
+
+    def text(self, duration_s: float) -> str:
+        """
+        Example: '120 passed, 2 failed, 10 skipped, 54.2 tests/min'
+        """
+        return f"{self.passed} passed, {self.failed} failed, {self.skipped} skipped, {self.tests_per_min(duration_s):0.1f} tests/min"
+
+
 @dataclasses.dataclass
 class ReportTentacle:
     label: str
@@ -32,6 +101,19 @@ class ReportTentacle:
     """
     Example: ESP32_GENERIC
     """
+    flash_skipped: bool = False
+    """
+    True: The firmware was already on the DUT and flashing was skipped.
+    """
+    flash_duration_s: float | None = None
+    """
+    None: No firmware had to be flashed, for example '--flash-skip'.
+    """
+    phases: dict[str, float] = dataclasses.field(default_factory=dict)
+    """
+    The phases of this tentacle only, for example PHASE_MIP.
+    See 'Task.phases' for the phases of all tentacles.
+    """
 
     def __post_init__(self) -> None:
         pass
@@ -57,6 +139,25 @@ class Task:
     For mpbuild: This is an empty list
     For test: This contains the tentacles involved
     """
+    outcomes: TaskOutcomes = dataclasses.field(default_factory=TaskOutcomes)
+    running: bool = False
+    """
+    True: The test is still running, 'end_s' is the time of the report.
+    """
+    phases: dict[str, float] = dataclasses.field(default_factory=dict)
+    """
+    key: phase, for example PHASE_MIP
+    value: duration_s
+    The phases which concern all tentacles, for example PHASE_TEST.
+    The phases of one tentacle: 'ReportTentacle.phases'.
+    Flashing is recorded per tentacle: 'ReportTentacle.flash_duration_s'.
+    """
+    ccache_hits: int = 0
+    ccache_misses: int = 0
+    """
+    For mpbuild: The compilations taken from/added to the ccache.
+    Both 0: ccache was not used.
+    """
 
     def __post_init__(self) -> None:
         assert isinstance(self.start_s, float)
@@ -65,6 +166,11 @@ class Task:
         assert isinstance(self.tentacles, list)
         for tentacle in self.tentacles:
             assert isinstance(tentacle, ReportTentacle)
+        assert isinstance(self.outcomes, TaskOutcomes)
+        assert isinstance(self.running, bool)
+        assert isinstance(self.phases, dict)
+        assert isinstance(self.ccache_hits, int)
+        assert isinstance(self.ccache_misses, int)
 
     def __hash__(self) -> int:
         return hash(self.label)
@@ -95,8 +201,83 @@ class Task:
     def tentacle_text(self) -> str:
         return ", ".join([t.text for t in self.tentacles])
 
+    def phase_durations(self, tentacle: ReportTentacle) -> dict[str, float]:
+        """
+        The time 'tentacle' spent in every phase of this task:
+        The phases of all tentacles and the phases of 'tentacle'.
+        The time not covered by the phases is accounted to PHASE_TEST.
+        If PHASE_TEST has been recorded, it is accounted to PHASE_OTHER.
+        """
+        assert isinstance(tentacle, ReportTentacle)
+        durations = dict.fromkeys(PHASES, 0.0)
+        if tentacle.flash_duration_s is not None:
+            durations[PHASE_FLASH] = tentacle.flash_duration_s
+        phases = [*self.phases.items(), *tentacle.phases.items()]
+        for phase, duration_s in phases:
+            if phase == PHASE_FLASH:
+                continue
+            if phase not in durations:
+                phase = PHASE_OTHER
+            durations[phase] += duration_s
+        remainder_s = max(self.duration - sum(durations.values()), 0.0)
+        durations[PHASE_OTHER if PHASE_TEST in self.phases else PHASE_TEST] += (
+            remainder_s
+        )
+        return durations
+
+
+_REPR_CLASSES: dict[str, typing.Callable[..., typing.Any]] = {
+    "Task": Task,
+    "ReportTentacle": ReportTentacle,
+    "TaskOutcomes": TaskOutcomes,
+}
+
+
+def _literal_eval_repr(node: ast.expr) -> typing.Any:
+    """
+    Like 'ast.literal_eval()' but also allows the classes
+    in '_REPR_CLASSES' with keyword arguments as written by 'repr()'.
+    Raises ValueError for anything else.
+    """
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in _REPR_CLASSES:
+            raise ValueError(f"Unexpected call: {ast.unparse(node.func)}")
+        if len(node.args) > 0:
+            raise ValueError(f"Unexpected arguments: {ast.unparse(node)}")
+        kwargs: dict[str, typing.Any] = {}
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise ValueError(f"Unexpected unpacking: {ast.unparse(node)}")
+            kwargs[keyword.arg] = _literal_eval_repr(keyword.value)
+        return _REPR_CLASSES[node.func.id](**kwargs)
+    if isinstance(node, ast.List):
+        return [_literal_eval_repr(element) for element in node.elts]
+    if isinstance(node, ast.Tuple):
+        return tuple(_literal_eval_repr(element) for element in node.elts)
+    if isinstance(node, ast.Dict):
+        result: dict[typing.Any, typing.Any] = {}
+        for key, value in zip(node.keys, node.values, strict=True):
+            if key is None:
+                raise ValueError(f"Unexpected unpacking: {ast.unparse(node)}")
+            result[_literal_eval_repr(key)] = _literal_eval_repr(value)
+        return result
+    return ast.literal_eval(node)
+
 
 class Tasks(list[Task]):
+    @staticmethod
+    def factory_repr(text: str) -> Tasks:
+        """
+        Reads back 'repr(tasks)' as written to 'task_report_repr.py'.
+        The text is parsed, not evaluated: See '_literal_eval_repr()'.
+        Raises ValueError, TypeError or SyntaxError if the text is not valid.
+        """
+        assert isinstance(text, str)
+        tasks = _literal_eval_repr(ast.parse(text, mode="eval").body)
+        if not isinstance(tasks, list):
+            raise ValueError(f"Expected a list, got {type(tasks).__name__}")
+        return Tasks(tasks)
+
     def quantize_times(self) -> None:
         def quantize(time_s: float) -> float:
             return int(time_s * _QUANTIZE_FACTOR) / _QUANTIZE_FACTOR
@@ -140,6 +321,84 @@ class Tasks(list[Task]):
             return 0.0
         return min(task.start_s for task in self)
 
+    def flash_statistics(self) -> FlashStatistics:
+        flash_statistics = FlashStatistics()
+        for task in self:
+            for tentacle in task.tentacles:
+                flash_statistics.add(tentacle=tentacle)
+        return flash_statistics
+
+    def ccache_table(self) -> Table | None:
+        """
+        Return None if no build used the ccache.
+        """
+        tasks = [task for task in self if task.ccache_hits + task.ccache_misses > 0]
+        if len(tasks) == 0:
+            return None
+
+        def hit_rate_text(hits: int, misses: int) -> str:
+            return f"{100.0 * hits / (hits + misses):0.0f}%"
+
+        hits = sum(task.ccache_hits for task in tasks)
+        misses = sum(task.ccache_misses for task in tasks)
+        return Table(
+            header=[
+                TableHeaderCol(Align.LEFT, "Build"),
+                TableHeaderCol(Align.RIGHT, "Hits"),
+                TableHeaderCol(Align.RIGHT, "Misses"),
+                TableHeaderCol(Align.RIGHT, "Hit rate"),
+                TableHeaderCol(Align.RIGHT, "Duration"),
+            ],
+            rows=[
+                [
+                    task.label,
+                    str(task.ccache_hits),
+                    str(task.ccache_misses),
+                    hit_rate_text(task.ccache_hits, task.ccache_misses),
+                    task.duration_text,
+                ]
+                for task in sorted(tasks, key=lambda task: task.label)
+            ]
+            + [
+                [
+                    "Total",
+                    str(hits),
+                    str(misses),
+                    hit_rate_text(hits, misses),
+                    _duration_text(sum(task.duration for task in tasks)),
+                ]
+            ],
+        )
+
+    def outcomes_table(self) -> Table | None:
+        """
+        Return None if no test reported outcomes.
+        """
+        tasks = [task for task in self if task.outcomes.total > 0]
+        if len(tasks) == 0:
+            return None
+        return Table(
+            header=[
+                TableHeaderCol(Align.LEFT, "Task"),
+                TableHeaderCol(Align.RIGHT, "Passed"),
+                TableHeaderCol(Align.RIGHT, "Failed"),
+                TableHeaderCol(Align.RIGHT, "Skipped"),
+                TableHeaderCol(Align.RIGHT, "Tests/min"),
+                TableHeaderCol(Align.LEFT, "State"),
+            ],
+            rows=[
+                [
+                    task.label,
+                    str(task.outcomes.passed),
+                    str(task.outcomes.failed),
+                    str(task.outcomes.skipped),
+                    f"{task.outcomes.tests_per_min(task.duration):0.1f}",
+                    "running" if task.running else "done",
+                ]
+                for task in tasks
+            ],
+        )
+
     def as_table(self) -> Table:
         return Table(
             header=[
@@ -162,6 +421,251 @@ class Tasks(list[Task]):
         )
 
 
+@dataclasses.dataclass(repr=True, slots=True)
+class FlashStatistic:
+    board_variant: str
+    flashed: int = 0
+    skipped: int = 0
+    flash_duration_s: float = 0.0
+    """
+    The sum of the durations of all flashes.
+    """
+
+    @property
+    def mean_flash_duration_s(self) -> float | None:
+        if self.flashed == 0:
+            return None
+        return self.flash_duration_s / self.flashed
+
+    @property
+    def saved_s(self) -> float | None:
+        """
+        The time saved by skipping flashing: Estimated by the mean flash duration.
+        """
+        mean_flash_duration_s = self.mean_flash_duration_s
+        if mean_flash_duration_s is None:
+            return None
+        return self.skipped * mean_flash_duration_s
+
+
+class FlashStatistics(dict[str, FlashStatistic]):
+    """
+    Key: board_variant
+    """
+
+    def add(self, tentacle: ReportTentacle) -> None:
+        assert isinstance(tentacle, ReportTentacle)
+        if tentacle.flash_duration_s is None:
+            return
+        statistic = self.get(tentacle.board_variant, None)
+        if statistic is None:
+            statistic = FlashStatistic(board_variant=tentacle.board_variant)
+            self[tentacle.board_variant] = statistic
+        if tentacle.flash_skipped:
+            statistic.skipped += 1
+        else:
+            statistic.flashed += 1
+            statistic.flash_duration_s += tentacle.flash_duration_s
+
+    @property
+    def saved_s(self) -> float:
+        return sum(s.saved_s for s in self.values() if s.saved_s is not None)
+
+    def as_table(self) -> Table:
+        def duration_text(duration_s: float | None) -> str:
+            if duration_s is None:
+                return "-"
+            return f"{duration_s:0.1f}s"
+
+        return Table(
+            header=[
+                TableHeaderCol(Align.LEFT, "Board"),
+                TableHeaderCol(Align.RIGHT, "Flashed"),
+                TableHeaderCol(Align.RIGHT, "Skipped"),
+                TableHeaderCol(Align.RIGHT, "Flash duration"),
+                TableHeaderCol(Align.RIGHT, "Saved"),
+            ],
+            rows=[
+                [
+                    s.board_variant,
+                    str(s.flashed),
+                    str(s.skipped),
+                    duration_text(s.mean_flash_duration_s),
+                    duration_text(s.saved_s),
+                ]
+                for s in sorted(self.values(), key=lambda s: s.board_variant)
+            ]
+            + [["Total", "", "", "", duration_text(self.saved_s)]],
+        )
+
+
+def _covered_s(
+    intervals: list[tuple[float, float]], begin_s: float, end_s: float
+) -> float:
+    """
+    The time between 'begin_s' and 'end_s' covered by at least one interval.
+    """
+    covered_s = 0.0
+    cursor_s = begin_s
+    for interval_begin_s, interval_end_s in sorted(intervals):
+        interval_begin_s = max(interval_begin_s, cursor_s)
+        interval_end_s = min(interval_end_s, end_s)
+        if interval_end_s > interval_begin_s:
+            covered_s += interval_end_s - interval_begin_s
+            cursor_s = interval_end_s
+    return covered_s
+
+
+def _duration_text(duration_s: float) -> str:
+    return f"{duration_s:0.1f}s"
+
+
+@dataclasses.dataclass(repr=True, slots=True)
+class TentacleUtilisation:
+    tentacle: str
+    duration_s: float
+    """
+    The duration of the whole run.
+    """
+    phases_s: dict[str, float] = dataclasses.field(
+        default_factory=lambda: dict.fromkeys(PHASES, 0.0)
+    )
+    """
+    key: phase, for example PHASE_FLASH
+    """
+    idle_s: dict[str, float] = dataclasses.field(
+        default_factory=lambda: dict.fromkeys(IDLES, 0.0)
+    )
+    """
+    key: reason, for example IDLE_FIRMWARE
+    """
+
+    @property
+    def busy_s(self) -> float:
+        return sum(self.phases_s.values())
+
+    @property
+    def utilisation_text(self) -> str:
+        return f"{self.busy_s / max(self.duration_s, 1e-9):0.0%}"
+
+    def add_idle(
+        self,
+        begin_s: float,
+        end_s: float,
+        firmware_built_s: float | None,
+        busy_others: list[tuple[float, float]],
+    ) -> None:
+        """
+        Attribute the idle time between two testruns.
+        firmware_built_s: When the firmware for the next testrun was built.
+        busy_others: When the other tentacles of the next testrun were busy.
+        """
+        if end_s <= begin_s:
+            return
+        firmware_s = 0.0
+        if firmware_built_s is not None:
+            firmware_s = min(max(firmware_built_s - begin_s, 0.0), end_s - begin_s)
+        reference_s = _covered_s(busy_others, begin_s=begin_s + firmware_s, end_s=end_s)
+        self.idle_s[IDLE_FIRMWARE] += firmware_s
+        self.idle_s[IDLE_REFERENCE] += reference_s
+        self.idle_s[IDLE_OTHER] += end_s - begin_s - firmware_s - reference_s
+
+
+class TentacleUtilisations(dict[str, TentacleUtilisation]):
+    """
+    Key: tentacle label
+    """
+
+    @staticmethod
+    def factory(tasks: Tasks) -> TentacleUtilisations:
+        assert isinstance(tasks, Tasks)
+
+        start_s = tasks.first_start_s
+        end_s = max((task.end_s for task in tasks), default=start_s)
+        firmware_built_s: dict[str, float] = {}
+        """
+        key: board_variant
+        """
+        busy: dict[str, list[tuple[float, float]]] = defaultdict(list)
+        """
+        key: tentacle label
+        """
+        for task in tasks:
+            if task.is_mpbuild:
+                firmware_built_s[task.label] = max(
+                    firmware_built_s.get(task.label, task.end_s), task.end_s
+                )
+            for tentacle in task.tentacles:
+                busy[tentacle.label].append((task.start_s, task.end_s))
+
+        utilisations = TentacleUtilisations()
+        for label in sorted(busy):
+            utilisation = TentacleUtilisation(
+                tentacle=label, duration_s=end_s - start_s
+            )
+            utilisations[label] = utilisation
+            previous_end_s = start_s
+            tentacle_tasks = [
+                task for task in tasks if any(t.label == label for t in task.tentacles)
+            ]
+            for task in sorted(tentacle_tasks, key=lambda t: t.start_s):
+                report_tentacle = next(t for t in task.tentacles if t.label == label)
+                utilisation.add_idle(
+                    begin_s=previous_end_s,
+                    end_s=task.start_s,
+                    firmware_built_s=firmware_built_s.get(
+                        report_tentacle.board_variant, None
+                    ),
+                    busy_others=[
+                        interval
+                        for t in task.tentacles
+                        if t.label != label
+                        for interval in busy[t.label]
+                    ],
+                )
+                for phase, duration_s in task.phase_durations(report_tentacle).items():
+                    utilisation.phases_s[phase] += duration_s
+                previous_end_s = max(previous_end_s, task.end_s)
+            utilisation.idle_s[IDLE_NO_WORK] += max(end_s - previous_end_s, 0.0)
+        return utilisations
+
+    def as_table(self) -> Table:
+        return Table(
+            header=[
+                TableHeaderCol(Align.LEFT, "Tentacle"),
+                TableHeaderCol(Align.RIGHT, "Busy"),
+                *[TableHeaderCol(Align.RIGHT, phase) for phase in PHASES],
+            ],
+            rows=[
+                [
+                    u.tentacle,
+                    u.utilisation_text,
+                    *[_duration_text(u.phases_s[phase]) for phase in PHASES],
+                ]
+                for u in self.values()
+            ],
+        )
+
+    def idle_table(self) -> Table:
+        def total_s(idle: str) -> float:
+            return sum(u.idle_s[idle] for u in self.values())
+
+        return Table(
+            header=[
+                TableHeaderCol(Align.LEFT, "Tentacle"),
+                *[TableHeaderCol(Align.RIGHT, f"waiting: {idle}") for idle in IDLES],
+            ],
+            rows=[
+                [
+                    u.tentacle,
+                    *[_duration_text(u.idle_s[idle]) for idle in IDLES],
+                ]
+                for u in self.values()
+            ]
+            + [["Total", *[_duration_text(total_s(idle)) for idle in IDLES]]],
+        )
+
+
 @dataclasses.dataclass(repr=True, slots=True)
 class ReportRow:
     time_s: float
@@ -415,6 +919,24 @@ class TaskReport:
         renderer.table(self.legend_tentacles.as_table())
         renderer.h2("Legend: Tasks")
         renderer.table(self.legend_tasks.as_table())
+        utilisations = TentacleUtilisations.factory(tasks=self.tasks)
+        if len(utilisations) > 0:
+            renderer.h2("Tentacle utilisation")
+            renderer.table(utilisations.as_table())
+            renderer.h2("Tentacle idle time")
+            renderer.table(utilisations.idle_table())
+        flash_statistics = self.tasks.flash_statistics()
+        if len(flash_statistics) > 0:
+            renderer.h2("Flashing")
+            renderer.table(flash_statistics.as_table())
+        ccache_table = self.tasks.ccache_table()
+        if ccache_table is not None:
+            renderer.h2("ccache")
+            renderer.table(ccache_table)
+        outcomes_table = self.tasks.outcomes_table()
+        if outcomes_table is not None:
+            renderer.h2("Test outcomes")
+            renderer.table(outcomes_table)
         renderer.h2("Report input data")
         renderer.table(self.tasks.as_table())
         renderer.close()
@@ -0,0 +1,179 @@
+"""
+Exports a whole run in the Chrome trace-event format: 'task_trace.json'.
+
+Open it in https://ui.perfetto.dev or chrome://tracing.
+
+* Process 'mpbuild': One track per firmware build.
+* Process 'tentacles': One track per tentacle with the testruns
+  and the phases (see 'util_phases.py') of every attempt.
+
+See https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import typing
+
+from ..report_test.util_constants import (
+    FILENAME_CONTEXT_TESTGROUP_JSON,
+    FILENAME_PHASES_JSON,
+)
+from .util_report_tasks import TENTACLE_MPBUILD, Tasks
+
+logger = logging.getLogger(__file__)
+
+FILENAME_TASK_TRACE = "task_trace.json"
+
+_PID_MPBUILD = 1
+_PID_TENTACLES = 2
+
+
+def read_phases(
+    directory_results: pathlib.Path,
+) -> dict[str, list[dict[str, typing.Any]]]:
+    """
+    Reads all 'phases.json' of a run.
+    key: testid, for example 'RUN-TESTS_STANDARD@5f2a-RPI_PICO2'
+    value: The spans of all attempts
+    """
+    assert isinstance(directory_results, pathlib.Path)
+
+    phases: dict[str, list[dict[str, typing.Any]]] = {}
+    for filename in sorted(directory_results.glob(f"*/{FILENAME_PHASES_JSON}")):
+        try:
+            context_testgroup = json.loads(
+                (filename.parent / FILENAME_CONTEXT_TESTGROUP_JSON).read_text()
+            )
+            spans = json.loads(filename.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read {filename}: {e!r}")
+            continue
+        phases.setdefault(context_testgroup["testid"], []).extend(spans)
+    return phases
+
+
+class TraceEvents(list[dict[str, typing.Any]]):
+    def __init__(self, first_start_s: float) -> None:
+        super().__init__()
+        self._first_start_s = first_start_s
+        self._tids: dict[tuple[int, str], int] = {}
+
+    def _us(self, time_s: float) -> int:
+        return round((time_s - self._first_start_s) * 1e6)
+
+    def tid(self, pid: int, name: str) -> int:
+        """
+        Every track is named by a metadata event.
+        """
+        key = (pid, name)
+        tid = self._tids.get(key, None)
+        if tid is None:
+            tid = len(self._tids) + 1
+            self._tids[key] = tid
+            self.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+        return tid
+
+    def process_name(self, pid: int, name: str) -> None:
+        self.append(
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}
+        )
+
+    def complete(
+        self,
+        pid: int,
+        track: str,
+        name: str,
+        category: str,
+        start_s: float,
+        end_s: float,
+        args: dict[str, typing.Any],
+    ) -> None:
+        self.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "pid": pid,
+                "tid": self.tid(pid=pid, name=track),
+                "ts": self._us(start_s),
+                "dur": max(self._us(end_s) - self._us(start_s), 0),
+                "args": args,
+            }
+        )
+
+
+def trace_events(
+    tasks: Tasks, phases: dict[str, list[dict[str, typing.Any]]]
+) -> TraceEvents:
+    assert isinstance(tasks, Tasks)
+    assert isinstance(phases, dict)
+
+    events = TraceEvents(first_start_s=tasks.first_start_s)
+    events.process_name(pid=_PID_MPBUILD, name=TENTACLE_MPBUILD)
+    events.process_name(pid=_PID_TENTACLES, name="tentacles")
+
+    for task in sorted(tasks, key=lambda t: t.start_s):
+        if task.is_mpbuild:
+            events.complete(
+                pid=_PID_MPBUILD,
+                track=task.label,
+                name=task.label_with_mpbuild_or_test,
+                category="mpbuild",
+                start_s=task.start_s,
+                end_s=task.end_s,
+                args={},
+            )
+            continue
+
+        for tentacle in task.tentacles:
+            events.complete(
+                pid=_PID_TENTACLES,
+                track=tentacle.label,
+                name=task.label,
+                category="test",
+                start_s=task.start_s,
+                end_s=task.end_s,
+                args={
+                    "board_variant": tentacle.board_variant,
+                    "tentacles": task.tentacle_text,
+                    "outcomes": task.outcomes.text(task.duration),
+                    "running": task.running,
+                },
+            )
+
+        tentacles = [t.label for t in task.tentacles]
+        for span in phases.get(task.label, []):
+            for tentacle_label in tentacles:
+                if span["tentacle"] not in ("", tentacle_label):
+                    continue
+                events.complete(
+                    pid=_PID_TENTACLES,
+                    track=tentacle_label,
+                    name=span["name"],
+                    category="phase",
+                    start_s=span["start_s"],
+                    end_s=span["end_s"],
+                    args={"exclusive_s": round(span["exclusive_s"], 3)},
+                )
+    return events
+
+
+def write_task_trace(directory_results: pathlib.Path, tasks: Tasks) -> None:
+    assert isinstance(directory_results, pathlib.Path)
+    assert isinstance(tasks, Tasks)
+
+    events = trace_events(tasks=tasks, phases=read_phases(directory_results))
+    (directory_results / FILENAME_TASK_TRACE).write_text(
+        json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+    )
@@ -0,0 +1,188 @@
+"""
+Writes the task report while the tests are running.
+
+* Every task is appended to 'task_log_repr.txt' as soon as it is added.
+  This file is append-only: It survives a crash of 'mptest'.
+* The task report (.txt, .md, .html and 'task_report_repr.py') is
+  rendered in a background thread. Rendering is debounced and
+  rate limited: Many tasks added in a short time result in one render.
+  Every added task restarts the debounce.
+* At the end, the trace 'task_trace.json' is written.
+"""
+
+from __future__ import annotations
+
+import logging
+import pathlib
+import threading
+import time
+import typing
+
+from . import util_report_renderer, util_report_trace
+from .util_report_tasks import Task, TaskReport, Tasks
+
+logger = logging.getLogger(__file__)
+
+FILENAME_TASK_REPORT_BASE = "task_report"
+FILENAME_TASK_REPORT_REPR = FILENAME_TASK_REPORT_BASE + "_repr.py"
+FILENAME_TASK_LOG = "task_log_repr.txt"
+
+
+def read_task_log(filename: pathlib.Path) -> Tasks:
+    """
+    Reads back 'task_log_repr.txt': One 'repr(task)' per line.
+    """
+    assert isinstance(filename, pathlib.Path)
+    lines = [line for line in filename.read_text().splitlines() if line != ""]
+    return Tasks.factory_repr("[" + ",".join(lines) + "]")
+
+
+def write_task_report(directory_results: pathlib.Path, tasks: Tasks) -> None:
+    """
+    Write 'task_report_repr.py' and render the task report.
+    """
+    assert isinstance(directory_results, pathlib.Path)
+    assert isinstance(tasks, Tasks)
+
+    filename_report_base = directory_results / FILENAME_TASK_REPORT_BASE
+    (directory_results / FILENAME_TASK_REPORT_REPR).write_text(
+        repr(Tasks(task for task in tasks if not task.running))
+    )
+
+    report = TaskReport(tasks=tasks)
+    for suffix, cls_renderer in (
+        (".txt", util_report_renderer.RendererAscii),
+        (".md", util_report_renderer.RendererMarkdown),
+        (".html", util_report_renderer.RendererHtml),
+    ):
+        filename_report = filename_report_base.with_suffix(suffix)
+        with filename_report.open("w", encoding="ascii") as f:
+            report.report(renderer=cls_renderer(f))
+
+
+class TaskReportWriter:
+    """
+    The main process adds the tasks: 'add_task()'.
+    A background thread renders the task report.
+    """
+
+    DEBOUNCE_S = 1.0
+    """
+    Render when no more tasks have been added within this time.
+    """
+    MAX_DELAY_S = 30.0
+    """
+    Render at the latest this time after the first request,
+    even if more tasks are added.
+    """
+    MIN_INTERVAL_S = 10.0
+    """
+    Render at most once within this interval.
+    """
+
+    def __init__(self, directory_results: pathlib.Path) -> None:
+        assert isinstance(directory_results, pathlib.Path)
+        self._directory_results = directory_results
+        self.tasks = Tasks()
+        """
+        The tasks which are completed.
+        """
+        self._snapshot: Tasks | None = None
+        """
+        The tasks to be rendered next.
+        None: Nothing to render.
+        """
+        self._rendered_s = 0.0
+        self._requested_s = 0.0
+        self._first_requested_s = 0.0
+        """
+        The first request since the last render.
+        """
+        self._closed = False
+        self._condition = threading.Condition()
+        self._filename_task_log = directory_results / FILENAME_TASK_LOG
+        self._filename_task_log.write_text("")
+        self._thread = threading.Thread(
+            target=self._run, name="TaskReportWriter", daemon=True
+        )
+        self._thread.start()
+
+    def add_task(self, task: Task, running_tasks: typing.Iterable[Task] = ()) -> None:
+        """
+        running_tasks: The tests which are still running. They are
+          included in the report but not in the task log.
+        """
+        assert isinstance(task, Task)
+
+        self.tasks.append(task)
+        with self._filename_task_log.open("a") as f:
+            f.write(repr(task) + "\n")
+        self.request(running_tasks=running_tasks)
+
+    def request(self, running_tasks: typing.Iterable[Task] = ()) -> None:
+        """
+        Request the task report to be rendered.
+        The tasks are copied: The background thread does not
+        share any data with the main process.
+        """
+        snapshot = Tasks(self.tasks)
+        snapshot.extend(running_tasks)
+        with self._condition:
+            self._requested_s = time.monotonic()
+            if self._snapshot is None:
+                self._first_requested_s = self._requested_s
+            self._snapshot = snapshot
+            self._condition.notify()
+
+    def _render_at_s(self) -> float:
+        """
+        Debounce and rate limit.
+        """
+        debounced_s = min(
+            self._requested_s + self.DEBOUNCE_S,
+            self._first_requested_s + self.MAX_DELAY_S,
+        )
+        return max(debounced_s, self._rendered_s + self.MIN_INTERVAL_S)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._snapshot is None and not self._closed:
+                    self._condition.wait()
+                # Every request restarts the debounce
+                while not self._closed:
+                    wait_s = self._render_at_s() - time.monotonic()
+                    if wait_s <= 0.0:
+                        break
+                    self._condition.wait(timeout=wait_s)
+                if self._closed:
+                    return
+                snapshot, self._snapshot = self._snapshot, None
+
+            assert snapshot is not None
+            self._render(tasks=snapshot)
+
+    def _render(self, tasks: Tasks) -> None:
+        self._rendered_s = time.monotonic()
+        try:
+            write_task_report(directory_results=self._directory_results, tasks=tasks)
+        except Exception as e:  # The tests must not be aborted by the report
+            logger.exception(e)
+
+    def close(self) -> None:
+        """
+        Stop the background thread and render the final report
+        and the trace.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        # Called in a 'finally': Must not hide the exception of the tests
+        self._render(tasks=self.tasks)
+        try:
+            util_report_trace.write_task_trace(
+                directory_results=self._directory_results, tasks=self.tasks
+            )
+        except Exception as e:  # The tests must not be aborted by the trace
+            logger.exception(e)
@@ -383,6 +383,19 @@ class ResultTestGroup:
     Example:
     It looks like the firmware has not been compiled, but the test requires '--via-mpy'!
     """
+    shard: str = ""
+    """
+    Example: 2of3
+    Example: 1of3,2of3,3of3 after the shards have been merged
+    "": Not sharded
+    """
+    rerun_of: str = ""
+    """
+    Example: RUN-TESTS_STANDARD@5f2a-RPI_PICO2,a
+    The 'directory_relative' of the previous attempt:
+    Only the tests which failed there have been run again.
+    "": All tests have been run.
+    """
 
     def __post_init__(self) -> None:
         pass
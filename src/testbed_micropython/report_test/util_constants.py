@@ -17,6 +17,7 @@ def patch_time_format(time_str: str) -> str:
 FILENAME_CONTEXT_JSON = "context.json"
 
 FILENAME_CONTEXT_TESTGROUP_JSON = "context_testgroup.json"
+FILENAME_PHASES_JSON = "phases.json"
 FILENAME_OCTOPROBE_SUMMARY_REPORT_STEM = "octoprobe_summary_report"
 FILENAME_OCTOPROBE_PR_REPORT_STEM = "octoprobe_pr_report"
 
@@ -0,0 +1,338 @@
+"""
+History: The test outcomes of many runs in one SQLite database.
+
+A run is ingested at the end of 'mptest test' (or later using 'mptest history ingest').
+The queries ('mptest history flaky', 'mptest history first-failure') do not
+have to read the json files of the runs again.
+
+The database is append-only: A run is ingested only once.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import pathlib
+import sqlite3
+import typing
+
+from ..testcollection.constants import DELIMITER_TESTRUN
+from .util_baseclasses import Outcome, ResultContext
+from .util_testreport import Data
+
+logger = logging.getLogger(__file__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    time_start TEXT NOT NULL,
+    testbed_instance TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    ref_firmware TEXT NOT NULL,
+    firmware_sha TEXT NOT NULL,
+    ref_tests TEXT NOT NULL,
+    tests_sha TEXT NOT NULL,
+    UNIQUE (time_start, testbed_instance, directory)
+);
+CREATE INDEX IF NOT EXISTS runs_firmware_sha ON runs (firmware_sha);
+
+CREATE TABLE IF NOT EXISTS outcomes (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    testgroup TEXT NOT NULL,
+    board_variant TEXT NOT NULL,
+    attempt TEXT NOT NULL,
+    test_name TEXT NOT NULL,
+    outcome TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outcomes_test
+    ON outcomes (test_name, board_variant, testgroup);
+CREATE INDEX IF NOT EXISTS outcomes_board_variant ON outcomes (board_variant);
+CREATE INDEX IF NOT EXISTS outcomes_testgroup ON outcomes (testgroup);
+CREATE INDEX IF NOT EXISTS outcomes_run_id ON outcomes (run_id);
+"""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FlakyTest:
+    testgroup: str
+    board_variant: str
+    test_name: str
+    runs: int
+    """
+    The number of runs which executed this test.
+    """
+    runs_failed: int
+    """
+    The number of runs with at least one failed attempt.
+    """
+    runs_flaky: int
+    """
+    The number of runs with a failed and a passed attempt.
+    """
+
+    @property
+    def text(self) -> str:
+        return f"{self.runs_flaky:>4} {self.runs_failed:>4} {self.runs:>4}  {self.board_variant:<30} {self.testgroup:<30} {self.test_name}"
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FirstFailure:
+    testgroup: str
+    board_variant: str
+    test_name: str
+    time_start: str
+    firmware_sha: str
+    """
+    The first run of the latest sequence of failing runs.
+    """
+    last_pass_firmware_sha: str
+    """
+    The run before: The test passed.
+    "": The test never passed.
+    """
+
+    @property
+    def text(self) -> str:
+        return f"{self.time_start}  {self.firmware_sha[:12]:<12}  {self.last_pass_firmware_sha[:12]:<12}  {self.board_variant:<30} {self.testgroup:<30} {self.test_name}"
+
+
+def _commit_hash(result_context: ResultContext, tests: bool) -> str:
+    metadata = (
+        result_context.ref_tests_metadata
+        if tests
+        else result_context.ref_firmware_metadata
+    )
+    if metadata is None:
+        return ""
+    return metadata.commit_hash
+
+
+class History:
+    def __init__(self, filename: pathlib.Path) -> None:
+        assert isinstance(filename, pathlib.Path)
+        self.filename = filename
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(filename)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> History:
+        return self
+
+    def __exit__(
+        self, exc_type: typing.Any, value: typing.Any, traceback: typing.Any
+    ) -> None:
+        self.close()
+
+    def ingest(self, directory_results: pathlib.Path) -> bool:
+        """
+        Return False if the run has already been ingested.
+        """
+        assert isinstance(directory_results, pathlib.Path)
+
+        data = Data.gather_json_files(
+            directory_results=directory_results, xfail_file=None
+        )
+        return self.ingest_data(data=data, directory_results=directory_results)
+
+    def ingest_data(self, data: Data, directory_results: pathlib.Path) -> bool:
+        assert isinstance(data, Data)
+
+        result_context = data.result_context
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO runs (time_start, testbed_instance, directory, ref_firmware, firmware_sha, ref_tests, tests_sha) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    result_context.time_start,
+                    result_context.testbed_instance,
+                    str(directory_results),
+                    result_context.ref_firmware,
+                    _commit_hash(result_context, tests=False),
+                    result_context.ref_tests,
+                    _commit_hash(result_context, tests=True),
+                ),
+            )
+            if cursor.rowcount == 0:
+                logger.info(f"{directory_results}: Already in {self.filename}")
+                return False
+            run_id = cursor.lastrowid
+
+            def rows() -> typing.Iterator[tuple[typing.Any, ...]]:
+                for testgroup in data.testgroups:
+                    # Example: RUN-TESTS_STANDARD@5f2a-RPI_PICO2,b
+                    _, _, attempt = testgroup.directory_relative.rpartition(
+                        DELIMITER_TESTRUN
+                    )
+                    for outcome in testgroup.outcomes:
+                        yield (
+                            run_id,
+                            testgroup.testgroup,
+                            testgroup.board_variant,
+                            attempt,
+                            outcome.name,
+                            outcome.outcome,
+                        )
+
+            self._connection.executemany(
+                "INSERT INTO outcomes (run_id, testgroup, board_variant, attempt, test_name, outcome) VALUES (?, ?, ?, ?, ?, ?)",
+                rows(),
+            )
+        logger.info(f"{directory_results}: Ingested into {self.filename}")
+        return True
+
+    def flaky(
+        self,
+        pattern_test: str = "*",
+        pattern_board_variant: str = "*",
+        min_runs: int = 1,
+    ) -> list[FlakyTest]:
+        """
+        The tests which failed in at least one run, the flakiest first.
+        The patterns are globs (sqlite GLOB: case sensitive).
+        """
+        sql = """
+            SELECT testgroup, board_variant, test_name,
+                COUNT(*) AS runs,
+                SUM(failed > 0) AS runs_failed,
+                SUM(failed > 0 AND passed > 0) AS runs_flaky
+            FROM (
+                SELECT run_id, testgroup, board_variant, test_name,
+                    SUM(outcome = :failed) AS failed,
+                    SUM(outcome = :passed) AS passed
+                FROM outcomes
+                WHERE test_name GLOB :pattern_test
+                    AND board_variant GLOB :pattern_board_variant
+                GROUP BY run_id, testgroup, board_variant, test_name
+            )
+            GROUP BY testgroup, board_variant, test_name
+            HAVING runs_failed > 0 AND runs >= :min_runs
+            ORDER BY runs_flaky DESC, runs_failed DESC, board_variant, testgroup, test_name
+        """
+        cursor = self._connection.execute(
+            sql,
+            {
+                "failed": Outcome.FAILED.value,
+                "passed": Outcome.PASSED.value,
+                "pattern_test": pattern_test,
+                "pattern_board_variant": pattern_board_variant,
+                "min_runs": min_runs,
+            },
+        )
+        return [FlakyTest(*row) for row in cursor]
+
+    def first_failure(
+        self,
+        pattern_test: str = "*",
+        pattern_board_variant: str = "*",
+    ) -> list[FirstFailure]:
+        """
+        For every test which failed in its latest run:
+        The run in which it started to fail.
+        """
+        sql = """
+            SELECT o.testgroup, o.board_variant, o.test_name,
+                r.time_start, r.firmware_sha,
+                MAX(o.outcome = :failed) AS failed,
+                MAX(o.outcome = :passed) AS passed
+            FROM outcomes o JOIN runs r USING (run_id)
+            WHERE o.test_name GLOB :pattern_test
+                AND o.board_variant GLOB :pattern_board_variant
+                AND o.outcome IN (:failed, :passed)
+            GROUP BY o.run_id, o.testgroup, o.board_variant, o.test_name
+            ORDER BY o.testgroup, o.board_variant, o.test_name, r.time_start DESC
+        """
+        cursor = self._connection.execute(
+            sql,
+            {
+                "failed": Outcome.FAILED.value,
+                "passed": Outcome.PASSED.value,
+                "pattern_test": pattern_test,
+                "pattern_board_variant": pattern_board_variant,
+            },
+        )
+
+        # The runs of a test: The latest run first
+        first_failures: list[FirstFailure] = []
+        current: tuple[str, str, str] | None = None
+        first: FirstFailure | None = None
+        streak = True
+        for (
+            testgroup,
+            board_variant,
+            test_name,
+            time_start,
+            sha,
+            failed,
+            passed,
+        ) in cursor:
+            key = (testgroup, board_variant, test_name)
+            if key != current:
+                if first is not None:
+                    first_failures.append(first)
+                current, first, streak = key, None, True
+            if not streak:
+                continue
+            if failed and not passed:
+                first = FirstFailure(
+                    testgroup=testgroup,
+                    board_variant=board_variant,
+                    test_name=test_name,
+                    time_start=time_start,
+                    firmware_sha=sha,
+                    last_pass_firmware_sha="",
+                )
+                continue
+            streak = False
+            if first is not None:
+                first = dataclasses.replace(first, last_pass_firmware_sha=sha)
+        if first is not None:
+            first_failures.append(first)
+        return first_failures
+
+    def co_failures(self, testgroups: set[str], min_runs: int = 2) -> dict[str, int]:
+        """
+        The testgroups which failed in the same runs as one of 'testgroups'.
+        key: testgroup, example: 'RUN-TESTS_NET_INET'
+        value: The number of runs, at least 'min_runs'
+        """
+        assert isinstance(testgroups, set)
+        assert isinstance(min_runs, int)
+
+        if len(testgroups) == 0:
+            return {}
+        placeholders = ", ".join("?" * len(testgroups))
+        sql = f"""
+            WITH failed AS (
+                SELECT DISTINCT run_id, testgroup FROM outcomes WHERE outcome = ?
+            )
+            SELECT b.testgroup, COUNT(DISTINCT b.run_id) AS runs
+            FROM failed a JOIN failed b USING (run_id)
+            WHERE a.testgroup IN ({placeholders})
+                AND b.testgroup NOT IN ({placeholders})
+            GROUP BY b.testgroup
+            HAVING runs >= ?
+            ORDER BY runs DESC, b.testgroup
+        """
+        cursor = self._connection.execute(
+            sql,
+            (
+                Outcome.FAILED.value,
+                *sorted(testgroups),
+                *sorted(testgroups),
+                min_runs,
+            ),
+        )
+        return dict(cursor.fetchall())
+
+
+def ingest_run(filename: pathlib.Path, directory_results: pathlib.Path) -> None:
+    """
+    Called at the end of 'mptest test': The tests must not fail due to the history.
+    """
+    try:
+        with History(filename=filename) as history:
+            history.ingest(directory_results=directory_results)
+    except Exception as e:
+        logger.warning(f"Failed to ingest {directory_results} into {filename}: {e!r}")
@@ -12,6 +12,8 @@ import typing
 from octoprobe.util_constants import DirectoryTag, TAG_MCU
 from octoprobe.util_pytest.util_resultdir import ResultsDir
 
+from testbed_micropython.testcollection.constants import DELIMITER_TESTRUN
+from testbed_micropython.testcollection.testrun_shards import strip_shard
 from testbed_micropython.testcollection.testrun_specs import TestRun
 
 from . import util_xfail
@@ -33,6 +35,16 @@ from .util_xfail import XFailList
 if typing.TYPE_CHECKING:
     from .util_testreport_by_test import SummaryByTest
 
+try:
+    import orjson
+
+    _json_loads: typing.Callable[[bytes], typing.Any] = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+_OUTCOME_FAILED = Outcome.FAILED.value
+_OUTCOME_XFAILED = Outcome.XFAILED.value
+
 
 @dataclasses.dataclass(slots=True)
 class Data:
@@ -151,42 +163,120 @@ class Data:
         data = collect_top()
 
         def collect() -> None:
-            for filename in directory_results.glob(
-                f"*/{FILENAME_CONTEXT_TESTGROUP_JSON}"
+            """
+            Single pass: FAILED is replaced by XFAILED while reading.
+            """
+            xfail_list = None if data.xfail_file is None else data.xfail_file.xfail_list
+            for filename in sorted(
+                directory_results.glob(f"*/{FILENAME_CONTEXT_TESTGROUP_JSON}")
             ):
-                json_text = filename.read_text()
-                json_dict = json.loads(json_text)
-                testgroup = ResultTestGroup(**json_dict)
-
-                testgroup.outcomes = [
-                    ResultTestOutcome(**r)  # type: ignore[arg-type, call-arg]
-                    for r in testgroup.outcomes
-                ]
-                data.testgroups.append(testgroup)
+                data.testgroups.append(
+                    _parse_testgroup(
+                        json_bytes=filename.read_bytes(), xfail_list=xfail_list
+                    )
+                )
 
         collect()
+        data.testgroups = merge_shards(data.testgroups)
 
-        def patch_xfailed() -> None:
-            """
-            Replace FAILED with XFAILED
-            """
-            if data.xfail_file is None:
-                return
+        assert isinstance(data, Data)
+        return data
 
-            for testgroup in data.testgroups:
-                for outcome in testgroup.outcomes:
-                    if outcome.outcome == Outcome.FAILED.value:
-                        if data.xfail_file.xfail_list.match(
-                            testgroup=testgroup.testgroup,
-                            test_name=outcome.name,
-                            board_variant=testgroup.board_variant,
-                        ):
-                            outcome.outcome = Outcome.XFAILED.value
 
-        patch_xfailed()
+def _parse_testgroup(
+    json_bytes: bytes, xfail_list: XFailList | None
+) -> ResultTestGroup:
+    """
+    The test names and outcomes are repeated for every board:
+    They are interned to save memory.
+    """
+    json_dict = _json_loads(json_bytes)
+    json_outcomes = json_dict.pop("outcomes", [])
+    testgroup = ResultTestGroup(**json_dict)
+    board_variant = testgroup.board_variant
+    outcomes = testgroup.outcomes
+    for json_outcome in json_outcomes:
+        name = sys.intern(json_outcome["name"])
+        outcome = sys.intern(json_outcome.get("outcome", ""))
+        if outcome == _OUTCOME_FAILED and xfail_list is not None:
+            if xfail_list.match(
+                testgroup=testgroup.testgroup,
+                test_name=name,
+                board_variant=board_variant,
+            ):
+                outcome = _OUTCOME_XFAILED
+        outcomes.append(
+            ResultTestOutcome(
+                name=name, outcome=outcome, text=json_outcome.get("text", "")
+            )
+        )
+    return testgroup
 
-        assert isinstance(data, Data)
-        return data
+
+_MERGE_PRECEDENCE = {
+    Outcome.SKIPPED.value: 0,
+    Outcome.PASSED.value: 1,
+    Outcome.XFAILED.value: 2,
+    Outcome.FAILED.value: 3,
+}
+"""
+Merging shards: The outcome with the higher precedence wins.
+"""
+
+
+def merge_shards(testgroups: list[ResultTestGroup]) -> list[ResultTestGroup]:
+    """
+    The shards of a testrun are merged into one testgroup:
+    The report looks the same as if the testrun had not been sharded.
+
+    Every shard runs 'run-tests.py' with the tests of the other shards excluded:
+    These tests are reported as skipped. So a test which
+    was not skipped in one of the shards wins.
+
+    The tests outside of 'SHARD_TEST_DIRS' run in every shard:
+    A failure in one of the shards wins. See '_MERGE_PRECEDENCE'.
+    """
+    merged: list[ResultTestGroup] = []
+    shards: dict[tuple[str, str, str], list[ResultTestGroup]] = {}
+    for testgroup in testgroups:
+        if testgroup.shard == "":
+            merged.append(testgroup)
+            continue
+        # Every retry has its own directory. Example: RUN-TESTS_STANDARD+2of3@5f2a-RPI_PICO2,b
+        _, _, attempt = testgroup.directory_relative.rpartition(DELIMITER_TESTRUN)
+        key = (testgroup.testgroup, testgroup.board_variant, attempt)
+        shards.setdefault(key, []).append(testgroup)
+
+    for shard_testgroups in shards.values():
+        shard_testgroups.sort(key=lambda testgroup: testgroup.shard)
+        first = shard_testgroups[0]
+        testgroup = dataclasses.replace(
+            first,
+            testid=strip_shard(first.testid),
+            shard=",".join(tg.shard for tg in shard_testgroups),
+            time_start=min(tg.time_start for tg in shard_testgroups),
+            time_end=max(tg.time_end for tg in shard_testgroups),
+            msg_error="\n".join(
+                f"{tg.shard}: {tg.msg_error}"
+                for tg in shard_testgroups
+                if tg.msg_error != ""
+            ),
+            msg_skipped=""
+            if any(tg.msg_skipped == "" for tg in shard_testgroups)
+            else first.msg_skipped,
+        )
+        outcomes: dict[str, ResultTestOutcome] = {}
+        for tg in shard_testgroups:
+            for outcome in tg.outcomes:
+                previous = outcomes.get(outcome.name, None)
+                if previous is None or _MERGE_PRECEDENCE.get(
+                    outcome.outcome, 1
+                ) > _MERGE_PRECEDENCE.get(previous.outcome, 1):
+                    outcomes[outcome.name] = outcome
+        testgroup.outcomes = list(outcomes.values())
+        merged.append(testgroup)
+
+    return merged
 
 
 def now_formatted() -> str:
@@ -263,14 +353,43 @@ class ReportTests:
         renderer.render()
 
 
+def next_rerun_of(
+    rerun_of: ResultTestGroup | None, report: ResultTestGroup, success: bool
+) -> ResultTestGroup | None:
+    """
+    The attempt whose failed tests are run by the next attempt.
+    None: The next attempt runs all tests.
+
+    Only a completed attempt narrows the tests: An attempt which
+    ended in an error (timeout, crash, early abort) did not run all of its tests.
+    So the next attempt runs the same tests again.
+    """
+    assert isinstance(rerun_of, ResultTestGroup | None)
+    assert isinstance(report, ResultTestGroup)
+    assert isinstance(success, bool)
+
+    if success and len(report.results_failed) > 0:
+        return report
+    return rerun_of
+
+
 class ReportTestgroup:
     def __init__(
         self,
         testresults_directory: ResultsDir,
         testrun: TestRun,
         logfile: pathlib.Path,
+        rerun_of: ResultTestGroup | None = None,
     ) -> None:
+        """
+        rerun_of: The previous attempt whose failed tests are run again.
+        """
         self._report_written = False
+        self._rerun_failed: set[str] = set()
+        self.failure_deterministic = False
+        """
+        True: A retry would fail in the same way.
+        """
         self.testresults_directory = testresults_directory
         self.report = ResultTestGroup()
         self.report.time_start = now_formatted()
@@ -282,6 +401,10 @@ class ReportTestgroup:
         self.report.tentacle_variant = testrun.tentacle_variant_text
         self.report.tentacle_variant_role = testrun.tentacle_variant_role_text
         self.report.commandline = " ".join(testrun.testrun_spec.command)
+        self.report.shard = testrun.tentacle_variant.shard_text
+        if rerun_of is not None:
+            self.report.rerun_of = rerun_of.directory_relative
+            self._rerun_failed = {outcome.name for outcome in rerun_of.results_failed}
         self.report.log_output = DirectoryTag.R.render_relative_to(
             top=self.testresults_directory.directory_top,
             filename=logfile,
@@ -305,13 +428,18 @@ class ReportTestgroup:
         self._append_testresults_from_json()
         self._write()
 
-    def write_error(self, msg: str, skipped: bool = False) -> None:
+    def write_error(
+        self, msg: str, skipped: bool = False, deterministic: bool = False
+    ) -> None:
         """
         if skipped is True:
            * The test terminated as it was skipped
         if skipped is False:
            * The test terminated due to an error
+        if deterministic is True:
+           * The test should not be retried
         """
+        self.failure_deterministic = deterministic
         if self._report_written:
             # This file has already been written
             return
@@ -368,6 +496,8 @@ class ReportTestgroup:
         for test_name, _outcome, reason in list_results:
             _outcome = fix_outcomes[_outcome]
             outcome = Outcome(_outcome)
+            if outcome == Outcome.PASSED and test_name in self._rerun_failed:
+                reason = f"flaky: failed in {self.report.rerun_of}"
             self.report.outcomes.append(
                 ResultTestOutcome(name=test_name, outcome=outcome, text=reason)
             )
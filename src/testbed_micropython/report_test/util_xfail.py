@@ -1,11 +1,24 @@
 from __future__ import annotations
 
 import dataclasses
+import fnmatch
+import functools
 import json
 import pathlib
+import re
 
 DIRECTORY_OF_THIS_FILE = pathlib.Path(__file__).parent
 
+_GLOB_CHARS = frozenset("*?[")
+
+
+def is_pattern(board_variant: str) -> bool:
+    """
+    A board variant in a xfail file may be a glob pattern.
+    Example: 'RPI_PICO*', 'ESP32_GENERIC-?'
+    """
+    return not _GLOB_CHARS.isdisjoint(board_variant)
+
 
 class XFailGroup(dict[str, set[str]]):
     def add(self, board_variant: str, test_name: str) -> None:
@@ -40,9 +53,16 @@ class XFailList(dict[str, XFailGroup]):
 
     def match(self, testgroup: str, test_name: str, board_variant: str) -> bool:
         try:
-            return board_variant in self[testgroup][test_name]
+            board_variants = self[testgroup][test_name]
         except KeyError:
             return False
+        if board_variant in board_variants:
+            return True
+        return any(
+            fnmatch.fnmatchcase(board_variant, pattern)
+            for pattern in board_variants
+            if is_pattern(pattern)
+        )
 
     @staticmethod
     def from_dict(dict_report: dict[str, dict[str, list[str]]]) -> XFailList:
@@ -62,10 +82,20 @@ class XFailFile:
 
     @staticmethod
     def factory(filename: pathlib.Path) -> XFailFile:
-        return XFailFile(
+        """
+        The file is only read again if it has been modified.
+        """
+        stat = filename.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = _XFAIL_FILE_CACHE.get(filename, None)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        xfail_file = XFailFile(
             filename=filename,
             xfail_list=XFailList.factory(filename=filename),
         )
+        _XFAIL_FILE_CACHE[filename] = (signature, xfail_file)
+        return xfail_file
 
     @staticmethod
     def factory_template(filename: str | None) -> XFailFile | None:
@@ -74,28 +104,74 @@ class XFailFile:
         return XFailFile.factory(DIRECTORY_OF_THIS_FILE / filename)
 
 
+_XFAIL_FILE_CACHE: dict[pathlib.Path, tuple[tuple[int, int], XFailFile]] = {}
+"""
+key: filename
+value: ((st_mtime_ns, st_size), xfail_file)
+"""
+
+
+class XFailIndex:
+    """
+    All xfail files compiled into one lookup table.
+    key: (testgroup, test_name, board_variant)
+    value: The names of the xfail files which match.
+
+    Board variant patterns are looked up per (testgroup, test_name).
+    """
+
+    def __init__(self, xfail_files: list[XFailFile]) -> None:
+        self._exact: dict[tuple[str, str, str], list[str]] = {}
+        self._patterns: dict[tuple[str, str], list[tuple[re.Pattern[str], str]]] = {}
+        for xfail_file in xfail_files:
+            name = xfail_file.filename.name
+            for testgroup, xfail_group in xfail_file.xfail_list.items():
+                for test_name, board_variants in xfail_group.items():
+                    for board_variant in sorted(board_variants):
+                        if is_pattern(board_variant):
+                            regex = re.compile(fnmatch.translate(board_variant))
+                            self._patterns.setdefault(
+                                (testgroup, test_name), []
+                            ).append((regex, name))
+                            continue
+                        names = self._exact.setdefault(
+                            (testgroup, test_name, board_variant), []
+                        )
+                        if name not in names:
+                            names.append(name)
+
+    def get(self, testgroup: str, test_name: str, board_variant: str) -> list[str]:
+        names = self._exact.get((testgroup, test_name, board_variant), [])
+        patterns = self._patterns.get((testgroup, test_name), None)
+        if patterns is None:
+            return names
+        names = list(names)
+        for regex, name in patterns:
+            if name not in names and regex.match(board_variant):
+                names.append(name)
+        return names
+
+
 class XFailFiles(list[XFailFile]):
     @staticmethod
     def factory_from_filesystem() -> XFailFiles:
         return XFailFiles(
-            [
-                XFailFile.factory(filename=filename)
-                for filename in DIRECTORY_OF_THIS_FILE.glob("*.json")
-            ]
+            XFailFile.factory(filename=filename)
+            for filename in sorted(DIRECTORY_OF_THIS_FILE.glob("*.json"))
         )
 
+    @functools.cached_property
+    def xfail_index(self) -> XFailIndex:
+        return XFailIndex(xfail_files=self)
+
     def get_filelist(
         self,
         testgroup: str,
         test_name: str,
         board_variant: str,
     ) -> list[str]:
-        list_files: list[str] = []
-        for xfail_file in self:
-            if xfail_file.xfail_list.match(
-                testgroup=testgroup,
-                test_name=test_name,
-                board_variant=board_variant,
-            ):
-                list_files.append(xfail_file.filename.name)
-        return list_files
+        return self.xfail_index.get(
+            testgroup=testgroup,
+            test_name=test_name,
+            board_variant=board_variant,
+        )
@@ -4,6 +4,10 @@ Classes required to describe the tests to be run.
 
 from __future__ import annotations
 
+import dataclasses
+import heapq
+import logging
+import operator
 import typing
 from collections.abc import Iterator
 
@@ -11,6 +15,8 @@ from ..tentacle_spec import TentacleMicropython
 from .baseclasses_spec import ConnectedTentacles
 from .testrun_specs import TestRun, TestRunSpec
 
+logger = logging.getLogger(__file__)
+
 
 class TestRunSpecs(list[TestRunSpec]):
     def generate(
@@ -60,11 +66,17 @@ class TestRunSpecs(list[TestRunSpec]):
 
         return False
 
-    def assign_tentacles(self, tentacles: ConnectedTentacles, flash_skip: bool) -> None:
+    def assign_tentacles(
+        self,
+        tentacles: ConnectedTentacles,
+        flash_skip: bool,
+        shards: int = 1,
+    ) -> None:
         for testrun_spec in self:
             testrun_spec.assign_tentacles(
                 tentacles=tentacles,
                 flash_skip=flash_skip,
+                shards=shards,
             )
 
         self.sort()
@@ -83,3 +95,303 @@ class TestRunSpecs(list[TestRunSpec]):
             if testrun_specs.label == label:
                 return True
         return False
+
+
+class TestRunCandidates:
+    """
+    Incremental index of the testruns which may be started.
+
+    'TestRunSpecs.generate()' creates the testruns for
+    all available tentacles x testrun_specs x tsvs_todo.
+
+    This index keeps the testruns per tentacle, ordered by 'priority'
+    when they are created, and only recreates the testruns of a board if
+    * a firmware for this board has been built: 'firmware_built()'
+    * a testrun for this board has been started: 'mark_as_done()'
+
+    The priority may change while the testruns are in the index:
+    * 'firmware_already_flashed' changes if a tentacle is flashed:
+      The tentacle under test and the reference of a started testrun.
+      The testruns of the reference are recreated in 'mark_as_done()'.
+    * The load of the reference ('DurationPrioritySorter') changes if a testrun
+      requiring the reference is started: These testruns are reordered in 'mark_as_done()'.
+
+    'first()' merges the ordered testruns of the available tentacles:
+    Only the heads are compared.
+
+    The reference tentacle is assigned in 'generate()': Any of
+    'tentacles_reference' which is available, see 'select_reference()'.
+    """
+
+    def __init__(
+        self,
+        testrun_specs: TestRunSpecs,
+        tentacles_reference: list[TentacleMicropython],
+        priority: typing.Callable[[TestRun], tuple[typing.Any, ...]],
+    ) -> None:
+        """
+        priority: The lowest value has the highest priority.
+        """
+        assert isinstance(testrun_specs, TestRunSpecs)
+        assert isinstance(tentacles_reference, list)
+        assert callable(priority)
+        self._testrun_specs = testrun_specs
+        self._tentacles_reference = tentacles_reference
+        self._priority = priority
+        self._reference_testruns: dict[str, int] = {}
+        """
+        key: tentacle.label_short of the reference
+        value: The number of testruns started with this reference.
+        """
+        self._firmwares_built: set[str] | None = set()
+        self._flash_skip: bool | None = None
+        self._testruns: dict[str, list[tuple[tuple[typing.Any, ...], TestRun]]] = {}
+        """
+        key: tentacle.label_short
+        value: (priority, testrun): The testruns of this tentacle, ordered by priority.
+        """
+        self._boards: dict[str, str] = {}
+        """
+        key: tentacle.label_short
+        value: tentacle.tentacle_spec.board
+        """
+
+        if len(tentacles_reference) == 0:
+            for testrun_spec in testrun_specs:
+                if testrun_spec.requires_reference_tentacle:
+                    logger.warning(
+                        f"{testrun_spec.label}: tentacle_reference not specified/found!"
+                    )
+
+    def update(self, firmwares_built: set[str] | None, flash_skip: bool) -> None:
+        """
+        Only the firmwares which have been built since the last call
+        will invalidate testruns.
+        """
+        assert isinstance(firmwares_built, set | None)
+        assert isinstance(flash_skip, bool)
+
+        if flash_skip != self._flash_skip:
+            self._flash_skip = flash_skip
+            self._invalidate_all()
+
+        if firmwares_built is None:
+            if self._firmwares_built is not None:
+                # Every firmware is allowed
+                self._firmwares_built = None
+                self._invalidate_all()
+            return
+
+        if self._firmwares_built is None:
+            self._firmwares_built = set()
+            self._invalidate_all()
+
+        for board_variant in firmwares_built - self._firmwares_built:
+            self.firmware_built(board_variant=board_variant)
+
+    def firmware_built(self, board_variant: str) -> None:
+        """
+        Example board_variant: RPI_PICO2-RISCV
+        """
+        assert isinstance(board_variant, str)
+        assert self._firmwares_built is not None
+
+        self._firmwares_built.add(board_variant)
+        for label, board in list(self._boards.items()):
+            if board_variant == board or board_variant.startswith(board + "-"):
+                self._invalidate(label=label)
+
+    def mark_as_done(self, testrun: TestRun) -> None:
+        """
+        The testrun has been started: Remove it from the index.
+        """
+        assert isinstance(testrun, TestRun)
+
+        testrun.mark_as_done()
+        if testrun.tentacle_reference is not None:
+            label = testrun.tentacle_reference.label_short
+            self._reference_testruns[label] = self._reference_testruns.get(label, 0) + 1
+            # The reference will be flashed with the reference firmware
+            if label in self._testruns:
+                self._invalidate(label=label)
+        board = testrun.tentacle_variant.board
+        for label, board_tentacle in list(self._boards.items()):
+            if board_tentacle == board:
+                self._invalidate(label=label)
+        if testrun.requires_reference_tentacle:
+            for label, entries in self._testruns.items():
+                if any(t.requires_reference_tentacle for _, t in entries):
+                    self._testruns[label] = self._prioritized(t for _, t in entries)
+
+    def _invalidate(self, label: str) -> None:
+        del self._testruns[label]
+        del self._boards[label]
+
+    def _prioritized(
+        self, testruns: typing.Iterable[TestRun]
+    ) -> list[tuple[tuple[typing.Any, ...], TestRun]]:
+        return sorted(
+            ((self._priority(testrun), testrun) for testrun in testruns),
+            key=operator.itemgetter(0),
+        )
+
+    def _invalidate_all(self) -> None:
+        self._testruns.clear()
+        self._boards.clear()
+
+    def _any_reference(
+        self, tentacle: TentacleMicropython
+    ) -> TentacleMicropython | None:
+        """
+        The reference used to generate the testruns of 'tentacle':
+        It will be replaced in 'generate()'.
+        """
+        for reference in self._tentacles_reference:
+            if reference.label_short != tentacle.label_short:
+                return reference
+        return None
+
+    def _reference_firmware_flashed(self, reference: TentacleMicropython) -> bool:
+        if self._flash_skip:
+            return True
+        tentacle_state = reference.tentacle_state
+        if not tentacle_state.has_firmware_spec:
+            return False
+        board_variant = tentacle_state.firmware_spec.board_variant.name_normalized
+        return board_variant == reference.tentacle_spec.board
+
+    def select_reference(
+        self,
+        testrun: TestRun,
+        available_references: list[TentacleMicropython],
+    ) -> TentacleMicropython | None:
+        """
+        Return the reference for 'testrun' or None if no reference is available.
+        * The reference must provide the required fut and its firmware must have been built.
+        * References which still run the reference firmware are preferred: No flashing.
+        * Then the reference with the fewest testruns.
+        """
+        assert isinstance(testrun, TestRun)
+        assert isinstance(available_references, list)
+
+        required_fut = testrun.testrun_spec.required_fut
+        candidates = [
+            reference
+            for reference in available_references
+            if reference.label_short != testrun.tentacle_variant.tentacle.label_short
+            and required_fut in reference.tentacle_spec.futs
+            and (
+                self._firmwares_built is None
+                or reference.tentacle_spec.board in self._firmwares_built
+            )
+        ]
+        if len(candidates) == 0:
+            return None
+        return min(
+            candidates,
+            key=lambda reference: (
+                not self._reference_firmware_flashed(reference),
+                self._reference_testruns.get(reference.label_short, 0),
+            ),
+        )
+
+    def _testruns_tentacle(
+        self, tentacle: TentacleMicropython
+    ) -> list[tuple[tuple[typing.Any, ...], TestRun]]:
+        label = tentacle.label_short
+        entries = self._testruns.get(label, None)
+        if entries is None:
+            assert self._flash_skip is not None
+            testruns: list[TestRun] = []
+            for testrun_spec in self._testrun_specs:
+                if testrun_spec.required_fut not in tentacle.tentacle_spec.futs:
+                    continue
+                testruns.extend(
+                    testrun_spec.generate_tentacle(
+                        tentacle=tentacle,
+                        firmwares_built=self._firmwares_built,
+                        flash_skip=self._flash_skip,
+                        tentacle_reference=self._any_reference(tentacle=tentacle),
+                    )
+                )
+            entries = self._prioritized(testruns)
+            self._testruns[label] = entries
+            self._boards[label] = tentacle.tentacle_spec.board
+        return entries
+
+    def _available_references(
+        self, available_tentacles: typing.Sequence[TentacleMicropython]
+    ) -> list[TentacleMicropython]:
+        return [
+            reference
+            for reference in self._tentacles_reference
+            if reference in available_tentacles
+        ]
+
+    def _with_reference(
+        self,
+        testrun: TestRun,
+        available_references: list[TentacleMicropython],
+    ) -> TestRun | None:
+        """
+        Return None if the testrun requires a reference but none is available.
+        """
+        if not testrun.requires_reference_tentacle:
+            return testrun
+        reference = self.select_reference(
+            testrun=testrun,
+            available_references=available_references,
+        )
+        if reference is None:
+            return None
+        if reference is not testrun.tentacle_reference:
+            testrun = dataclasses.replace(testrun, tentacle_reference=reference)
+        return testrun
+
+    def generate(
+        self,
+        available_tentacles: typing.Sequence[TentacleMicropython],
+    ) -> Iterator[TestRun]:
+        """
+        Returns the same testruns as 'TestRunSpecs.generate()',
+        but not necessarily in the same order.
+        """
+        assert isinstance(available_tentacles, list)
+
+        available_references = self._available_references(available_tentacles)
+        for tentacle in available_tentacles:
+            for _priority, testrun in self._testruns_tentacle(tentacle=tentacle):
+                testrun_with_reference = self._with_reference(
+                    testrun=testrun,
+                    available_references=available_references,
+                )
+                if testrun_with_reference is not None:
+                    yield testrun_with_reference
+
+    def first(
+        self,
+        available_tentacles: typing.Sequence[TentacleMicropython],
+        testrun_ready: typing.Callable[[TestRun], bool] | None = None,
+    ) -> TestRun | None:
+        """
+        Returns the testrun with the highest priority of 'generate()'
+        or None if there is no testrun.
+        testrun_ready: See 'TestBartender.possible_testruns()'.
+        """
+        assert isinstance(available_tentacles, list)
+
+        available_references = self._available_references(available_tentacles)
+        for _priority, testrun in heapq.merge(
+            *(self._testruns_tentacle(tentacle=t) for t in available_tentacles),
+            key=operator.itemgetter(0),
+        ):
+            testrun_with_reference = self._with_reference(
+                testrun=testrun,
+                available_references=available_references,
+            )
+            if testrun_with_reference is None:
+                continue
+            if testrun_ready is not None and not testrun_ready(testrun_with_reference):
+                continue
+            return testrun_with_reference
+        return None
@@ -12,7 +12,7 @@ import typing
 from octoprobe.lib_tentacle import TentacleUsbPort
 from octoprobe.util_micropython_boards import VARIANT_UNKNOWN
 
-from ..constants import EnumFut
+from ..constants import ANY_REFERENCE_BOARD, EnumFut, reference_boards
 from ..mpbuild.build_api import BoardVariant
 from ..mptest.util_baseclasses import ArgsQuery
 from ..tentacle_spec import TentacleMicropython, TentacleSpecMicropython
@@ -23,6 +23,16 @@ if typing.TYPE_CHECKING:
     from ..testcollection.baseclasses_run import TestRunSpecs
 
 
+def shard_text(shard: int, shards: int) -> str:
+    """
+    Example: '2of3' for shard=1, shards=3
+    "": Not sharded
+    """
+    if shards == 1:
+        return ""
+    return f"{shard + 1}of{shards}"
+
+
 class TestRole(enum.StrEnum):
     ROLE_INSTANCE0 = "instance0"
     """
@@ -43,11 +53,26 @@ class TentacleVariant:
     Example: 0, 1, 2
     If '--count=3' is given, there will be a 'TestRunSpec' for each run!
     """
+    shard: int = 0
+    shards: int = 1
+    """
+    The tests of a testrun may be split into 'shards'
+    which run on identical tentacles.
+    """
 
     def __post_init__(self) -> None:
         assert isinstance(self.tentacle, TentacleMicropython)
         assert isinstance(self.variant, str)
         assert isinstance(self.role, TestRole)
+        assert 0 <= self.shard < self.shards
+
+    @property
+    def shard_text(self) -> str:
+        """
+        Example: '2of3'
+        "": Not sharded
+        """
+        return shard_text(shard=self.shard, shards=self.shards)
 
     def testrun_idx_text(self, idx0: int) -> str:
         """
@@ -83,21 +108,39 @@ class TentacleSpecVariant:
     Example: 0, 1, 2
     If '--count=3' is given, there will be a 'TestRunSpec' for each run!
     """
+    shard: int = 0
+    shards: int = 1
 
     def __post_init__(self) -> None:
         assert isinstance(self.tentacle_spec, TentacleSpecMicropython)
         assert isinstance(self.variant, str)
         assert isinstance(self.role, TestRole)
+        assert 0 <= self.shard < self.shards
 
     def __repr__(self) -> str:
+        if self.shards > 1:
+            return f"{self.board_variant}({self.role.name},{self.shard_text})"
         return f"{self.board_variant}({self.role.name})"
 
     def equals(self, tentacle_variant: TentacleVariant) -> bool:
         assert isinstance(tentacle_variant, TentacleVariant)
-        return (self.board_variant == tentacle_variant.board_variant) and (
-            self.role == tentacle_variant.role
+        return (
+            (self.board_variant == tentacle_variant.board_variant)
+            and (self.role == tentacle_variant.role)
+            and (self.shard == tentacle_variant.shard)
         )
 
+    @property
+    def shard_text(self) -> str:
+        return shard_text(shard=self.shard, shards=self.shards)
+
+    def split_shards(self, shards: int) -> list[TentacleSpecVariant]:
+        assert self.shards == 1
+        return [
+            dataclasses.replace(self, shard=shard, shards=shards)
+            for shard in range(shards)
+        ]
+
     @property
     def board(self) -> str:
         return self.tentacle_spec.board
@@ -152,17 +195,40 @@ class ConnectedTentacles(list[TentacleMicropython]):
 
         return None
 
+    def find_reference_tentacles(
+        self, reference_board: str
+    ) -> list[TentacleMicropython]:
+        """
+        Example 'reference_board':
+         * "RPI_PICO_W" (DEFAULT_REFERENCE_BOARD)
+         * "RPI_PICO_W,RPI_PICO2_W": A pool of reference tentacles
+         * "" (ANY_REFERENCE_BOARD): Every tentacle may be used as reference
+
+        Returns the reference tentacles: Ordered as in 'reference_board'.
+        """
+        assert isinstance(reference_board, str)
+
+        if reference_board == ANY_REFERENCE_BOARD:
+            return list(self)
+
+        return [
+            t
+            for board in reference_boards(reference_board)
+            for t in self
+            if t.tentacle_spec.board == board
+        ]
+
     def query_boards(
         self,
         query: ArgsQuery,
         testrun_specs: TestRunSpecs,
-        tentacle_reference: TentacleMicropython | None = None,
+        tentacles_reference: list[TentacleMicropython] | None = None,
     ) -> ConnectedTentacles:
         assert isinstance(query, ArgsQuery)
         from ..testcollection.baseclasses_run import TestRunSpecs
 
         assert isinstance(testrun_specs, TestRunSpecs)
-        assert isinstance(tentacle_reference, TentacleMicropython | None)
+        assert isinstance(tentacles_reference, list | None)
 
         connected_boards = {t.tentacle_spec.tentacle_tag for t in self}
 
@@ -232,10 +298,11 @@ class ConnectedTentacles(list[TentacleMicropython]):
                                 [board_variant.variant]
                             )
 
-        if tentacle_reference is not None:
+        if tentacles_reference is not None:
             if testrun_specs.requires_reference_tentacle(selected_tentacles):
-                if tentacle_reference not in selected_tentacles:
-                    selected_tentacles.append(tentacle_reference)
+                for tentacle_reference in tentacles_reference:
+                    if tentacle_reference not in selected_tentacles:
+                        selected_tentacles.append(tentacle_reference)
 
         return ConnectedTentacles(selected_tentacles)
 
@@ -6,6 +6,10 @@ DELIMITER_TESTRUN = ","
 Example: RUN-TESTS_STANDARD_VIA_MPY,c@5f2a-ADA_ITSYBITSY_M0
 """
 DELIMITER_TENTACLE = "@"
+DELIMITER_SHARD = "+"
+"""
+Example: RUN-TESTS_STANDARD+2of3@5f2a-RPI_PICO2
+"""
 DELIMITER_TESTROLE = "-"
 """
 Example: run-perfbench.py,a@2d2d-lolin_D1-ESP8266_GENERIC-first
@@ -0,0 +1,303 @@
+"""
+Durations of the testruns of a previous test session.
+
+The duration aware scheduler starts the testruns on the critical path first:
+* The boards with the most work left
+* Within a board: The longest testrun first (LPT: longest processing time first)
+
+This minimizes the overall duration of a test session (makespan).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import pathlib
+import time
+from collections import defaultdict
+
+from octoprobe.util_constants import DELIMITER_SERIAL_BOARD
+
+from ..report_task.util_report_tasks import Tasks
+from ..report_task.util_report_writer import (
+    FILENAME_TASK_LOG,
+    FILENAME_TASK_REPORT_REPR,
+    read_task_log,
+)
+from ..report_test.util_constants import (
+    FILENAME_CONTEXT_TESTGROUP_JSON,
+    TIME_FORMAT,
+    patch_time_format,
+)
+from .baseclasses_run import TestRunSpecs
+from .baseclasses_spec import ConnectedTentacles
+from .constants import DELIMITER_SHARD, DELIMITER_TENTACLE
+from .testrun_specs import TestRun
+
+logger = logging.getLogger(__file__)
+
+
+class TestRunDurations(dict[tuple[str, str], float]):
+    """
+    key: (testrun_spec.label, board_variant)
+      Example: ("RUN-TESTS_STANDARD", "RPI_PICO2-RISCV")
+    value: duration in seconds including retries
+    """
+
+    def add(self, label: str, board_variant: str, duration_s: float) -> None:
+        """
+        If a testrun appears more than once (roles 'instance0' and 'instance1'),
+        the longer duration is kept.
+        """
+        assert isinstance(label, str)
+        assert isinstance(board_variant, str)
+        assert isinstance(duration_s, float)
+        key = (label, board_variant)
+        self[key] = max(self.get(key, 0.0), duration_s)
+
+    def get_duration_s(self, label: str, board_variant: str, timeout_s: float) -> float:
+        """
+        Fallback for unknown testruns: 'timeout_s'.
+        This is pessimistic but keeps unknown testruns at the beginning.
+        """
+        return self.get((label, board_variant), timeout_s)
+
+    def testrun_duration_s(self, testrun: TestRun) -> float:
+        """
+        A shard takes its share of the duration of the testrun.
+        """
+        assert isinstance(testrun, TestRun)
+        return (
+            self.get_duration_s(
+                label=testrun.testrun_spec.label,
+                board_variant=testrun.tentacle_variant.board_variant,
+                timeout_s=testrun.timeout_s,
+            )
+            / testrun.tentacle_variant.shards
+        )
+
+    def board_loads_s(self, testrun_specs: TestRunSpecs) -> dict[str, float]:
+        """
+        The sum of the durations of the testruns still to be done.
+        key: board
+          Example: "RPI_PICO2"
+        """
+        loads_s: dict[str, float] = defaultdict(float)
+        for testrun_spec in testrun_specs:
+            for tsv in testrun_spec.tsvs_todo:
+                loads_s[tsv.board] += (
+                    self.get_duration_s(
+                        label=testrun_spec.label,
+                        board_variant=tsv.board_variant,
+                        timeout_s=testrun_spec.timeout_s,
+                    )
+                    / tsv.shards
+                )
+        return loads_s
+
+    def reference_load_s(self, testrun_specs: TestRunSpecs) -> float:
+        """
+        The sum of the durations of the testruns which require the reference tentacle.
+        """
+        return sum(
+            self.get_duration_s(
+                label=testrun_spec.label,
+                board_variant=tsv.board_variant,
+                timeout_s=testrun_spec.timeout_s,
+            )
+            for testrun_spec in testrun_specs
+            if testrun_spec.requires_reference_tentacle
+            for tsv in testrun_spec.tsvs_todo
+        )
+
+    def predicted_makespan_s(
+        self,
+        testrun_specs: TestRunSpecs,
+        connected_tentacles: ConnectedTentacles,
+    ) -> float:
+        """
+        A lower bound for the duration of all testruns:
+        The load of the busiest board (divided by the number of its tentacles)
+        or the load of the reference tentacle.
+        Firmware builds are not taken into account.
+        """
+        assert isinstance(testrun_specs, TestRunSpecs)
+        assert isinstance(connected_tentacles, ConnectedTentacles)
+
+        tentacles_per_board: dict[str, int] = defaultdict(int)
+        for tentacle in connected_tentacles:
+            tentacles_per_board[tentacle.tentacle_spec.board] += 1
+
+        makespan_s = self.reference_load_s(testrun_specs=testrun_specs)
+        for board, load_s in self.board_loads_s(testrun_specs=testrun_specs).items():
+            makespan_s = max(makespan_s, load_s / max(tentacles_per_board[board], 1))
+        return makespan_s
+
+    @staticmethod
+    def factory(directory_results: pathlib.Path) -> TestRunDurations:
+        """
+        Reads the durations from the testresults of a previous run.
+        * 'task_log_repr.txt': Contains the duration of each testrun including retries.
+          Complete even if 'mptest' crashed.
+        * 'task_report_repr.py': The same, written by previous versions.
+        * Fallback: '*/context_testgroup.json'
+        """
+        assert isinstance(directory_results, pathlib.Path)
+
+        def read_task_report_repr(filename: pathlib.Path) -> Tasks:
+            return Tasks.factory_repr(filename.read_text())
+
+        for filename, read_tasks in (
+            (directory_results / FILENAME_TASK_LOG, read_task_log),
+            (directory_results / FILENAME_TASK_REPORT_REPR, read_task_report_repr),
+        ):
+            if not filename.is_file():
+                continue
+            try:
+                return TestRunDurations.factory_tasks(tasks=read_tasks(filename))
+            except Exception as e:
+                logger.warning(f"Failed to read {filename}: {e!r}")
+
+        return TestRunDurations.factory_context_testgroups(
+            directory_results=directory_results
+        )
+
+    @staticmethod
+    def factory_tasks(tasks: Tasks) -> TestRunDurations:
+        """
+        The durations of the shards of a testrun are summed up.
+        """
+        assert isinstance(tasks, Tasks)
+        durations = TestRunDurations()
+        shards_s: dict[tuple[str, str], float] = defaultdict(float)
+        for task in tasks:
+            if task.is_mpbuild:
+                continue
+            # Example label: RUN-TESTS_STANDARD@5f2c-RPI_PICO2-RISCV
+            # Example label: RUN-TESTS_STANDARD+2of3@5f2c-RPI_PICO2-RISCV
+            label, _, _ = task.label.partition(DELIMITER_TENTACLE)
+            label, sharded, _ = label.partition(DELIMITER_SHARD)
+            board_variant = task.tentacles[0].board_variant
+            if sharded:
+                shards_s[(label, board_variant)] += float(task.duration)
+                continue
+            durations.add(
+                label=label,
+                board_variant=board_variant,
+                duration_s=float(task.duration),
+            )
+        for (label, board_variant), duration_s in shards_s.items():
+            durations.add(
+                label=label,
+                board_variant=board_variant,
+                duration_s=duration_s,
+            )
+        return durations
+
+    @staticmethod
+    def factory_context_testgroups(directory_results: pathlib.Path) -> TestRunDurations:
+        """
+        Every retry has its own directory: The durations of all retries are summed up.
+        The durations of the shards of a testrun are summed up too.
+        """
+
+        def parse_s(time_str: str) -> float:
+            return time.mktime(time.strptime(patch_time_format(time_str), TIME_FORMAT))
+
+        testid_durations_s: dict[tuple[str, str, str], float] = defaultdict(float)
+        for filename in directory_results.glob(f"*/{FILENAME_CONTEXT_TESTGROUP_JSON}"):
+            try:
+                json_dict = json.loads(filename.read_text())
+                _serial, _, board_variant = json_dict["tentacle_variant"].partition(
+                    DELIMITER_SERIAL_BOARD
+                )
+                duration_s = parse_s(json_dict["time_end"]) - parse_s(
+                    json_dict["time_start"]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to read {filename}: {e!r}")
+                continue
+            testid = json_dict["testid"]
+            if json_dict.get("shard", ""):
+                # The shards run on different tentacles: Sum them up by board
+                testid = DELIMITER_SHARD
+            key = (json_dict["testgroup"], board_variant, testid)
+            testid_durations_s[key] += duration_s
+
+        durations = TestRunDurations()
+        for (label, board_variant, _testid), duration_s in testid_durations_s.items():
+            durations.add(
+                label=label,
+                board_variant=board_variant,
+                duration_s=duration_s,
+            )
+        return durations
+
+
+class DurationPrioritySorter:
+    """
+    'priority()' may be used instead of 'TestRun.priority()'.
+    """
+
+    def __init__(
+        self, durations: TestRunDurations, testrun_specs: TestRunSpecs
+    ) -> None:
+        assert isinstance(durations, TestRunDurations)
+        assert isinstance(testrun_specs, TestRunSpecs)
+        self.durations = durations
+        self.testrun_specs = testrun_specs
+        self._tentacles_per_board: dict[str, int] | None = None
+        self._tests_todo = -1
+        """
+        The loads below are valid for this 'testrun_specs.tests_todo'.
+        """
+        self._board_loads_s: dict[str, float] = {}
+        self._reference_load_s = 0.0
+
+    def _update_loads(self) -> None:
+        """
+        The loads only change when a testrun has been started.
+        """
+        tests_todo = self.testrun_specs.tests_todo
+        if tests_todo == self._tests_todo:
+            return
+        self._tests_todo = tests_todo
+        self._board_loads_s = self.durations.board_loads_s(
+            testrun_specs=self.testrun_specs
+        )
+        self._reference_load_s = self.durations.reference_load_s(
+            testrun_specs=self.testrun_specs
+        )
+
+    def priority(
+        self,
+        testrun: TestRun,
+        connected_tentacles: ConnectedTentacles,
+    ) -> tuple[int, float, float, int, str]:
+        """
+        The lowest value has the highest priority.
+        """
+        if self._tentacles_per_board is None:
+            self._tentacles_per_board = defaultdict(int)
+            for tentacle in connected_tentacles:
+                self._tentacles_per_board[tentacle.tentacle_spec.board] += 1
+        self._update_loads()
+
+        board = testrun.tentacle_variant.board
+        load_s = self._board_loads_s.get(board, 0.0) / max(
+            self._tentacles_per_board[board], 1
+        )
+        if testrun.requires_reference_tentacle:
+            load_s = max(load_s, self._reference_load_s)
+
+        return (
+            -testrun.testrun_spec.priority,
+            # The critical path first: The board with the most work left
+            -load_s,
+            # Longest processing time first
+            -self.durations.testrun_duration_s(testrun),
+            # To minimize reflashing, order by variant
+            -testrun.firmware_already_flashed,
+            # Finally, alphabetical order desc
+            testrun.testid,
+        )
@@ -0,0 +1,315 @@
+"""
+Test impact analysis: Only run the tests which may be affected by a change.
+
+'mptest test --impacted-by=<git-ref>' compares the micropython firmware repo
+with <git-ref> ('git diff --name-only <git-ref>') and maps every changed file to
+* the testrun specs which may be affected
+* the ports: Only the boards of these ports are tested
+* the test files of 'run-tests.py': Only these test files are run
+
+The mapping is maintained in IMPACT_RULES: The first matching rule wins.
+A changed file which does not match any rule impacts all tests on all boards:
+For example 'py/' or 'shared/'.
+
+The impacts of all changed files are merged. The merge is conservative:
+If one file impacts all boards and another file only 'rp2', all boards are tested.
+
+Deleted files still impact the ports, but a deleted test file can not be run:
+See 'Impact.remove_missing_tests()'.
+
+The history database ('--history') adds the testrun specs which failed in the
+same runs as the impacted testrun specs: See 'History.co_failures()'.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import logging
+import pathlib
+import re
+import subprocess
+
+from .baseclasses_run import TestRunSpecs
+from .baseclasses_spec import TentacleSpecVariants
+from .constants import MICROPYTHON_DIRECTORY_TESTS
+
+logger = logging.getLogger(__file__)
+
+_LABELS_RUNTESTS_STANDARD = (
+    "RUN-TESTS_STANDARD",
+    "RUN-TESTS_STANDARD_VIA_MPY",
+    "RUN-TESTS_STANDARD_NATIVE",
+)
+_LABELS_RUNTESTS_EXTMOD_HARDWARE = (
+    "RUN-TESTS_EXTMOD_HARDWARE",
+    "RUN-TESTS_EXTMOD_HARDWARE_NATIVE",
+)
+_LABELS_NETWORK = (
+    "RUN-TESTS_NET_INET",
+    "RUN-TESTS_NET_HOSTED",
+    "RUN-MULTITESTS_MULTINET",
+)
+
+COMMAND_RUNTESTS = "run-tests.py"
+"""
+The test files may only be selected for this command.
+"""
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ImpactRule:
+    pattern: str
+    """
+    A regex which has to match the whole changed file.
+    Example: 'ports/(?P<port>[^/]+)/.*'
+
+    Named groups
+    * 'port': Only the boards of this port are impacted.
+    * 'test': Only this test file (without '.py') is impacted.
+    """
+    labels: tuple[str, ...] | None
+    """
+    The impacted testrun specs.
+    None: All testrun specs
+    (): Nothing is impacted, for example the documentation.
+    """
+
+    def __post_init__(self) -> None:
+        assert isinstance(self.pattern, str)
+        assert isinstance(self.labels, tuple | None)
+
+    def match(self, file_changed: str) -> re.Match[str] | None:
+        return re.fullmatch(self.pattern, file_changed)
+
+
+IMPACT_RULES = (
+    ImpactRule(r"docs/.*|\.github/.*|.*\.(md|rst)", labels=()),
+    ImpactRule(r"ports/(?P<port>[^/]+)/.*", labels=None),
+    ImpactRule(r"tests/multi_net/.*", labels=("RUN-MULTITESTS_MULTINET",)),
+    ImpactRule(r"tests/multi_bluetooth/.*", labels=("RUN-MULTITESTS_MULTIBLUETOOTH",)),
+    ImpactRule(r"tests/perf_bench/.*", labels=("RUN-PERFBENCH",)),
+    ImpactRule(
+        r"tests/(?P<test>extmod_hardware/[^/]+)\.py(\.exp)?",
+        labels=_LABELS_RUNTESTS_EXTMOD_HARDWARE,
+    ),
+    ImpactRule(
+        r"tests/(?P<test>net_inet/[^/]+)\.py(\.exp)?", labels=("RUN-TESTS_NET_INET",)
+    ),
+    ImpactRule(
+        r"tests/(?P<test>net_hosted/[^/]+)\.py(\.exp)?",
+        labels=("RUN-TESTS_NET_HOSTED",),
+    ),
+    ImpactRule(
+        r"tests/(?P<test>[^/]+/[^/]+)\.py(\.exp)?", labels=_LABELS_RUNTESTS_STANDARD
+    ),
+    ImpactRule(
+        r"examples/natmod/.*|py/dynruntime\..*|tools/mpy_ld\.py",
+        labels=("RUN-NATMODTESTS",),
+    ),
+    ImpactRule(r"tools/mpremote/.*|tests/mpremote/.*", labels=("RUN-MPREMOTE_TESTS",)),
+    ImpactRule(
+        r"extmod/(modlwip|modnetwork|modsocket|modssl|modtls|modwebsocket|network_).*",
+        labels=(*_LABELS_NETWORK, *_LABELS_RUNTESTS_STANDARD),
+    ),
+    ImpactRule(
+        r"extmod/(modbluetooth|nimble|btstack).*",
+        labels=("RUN-MULTITESTS_MULTIBLUETOOTH", *_LABELS_RUNTESTS_STANDARD),
+    ),
+    ImpactRule(
+        r"extmod/(machine_|modmachine).*",
+        labels=(*_LABELS_RUNTESTS_EXTMOD_HARDWARE, *_LABELS_RUNTESTS_STANDARD),
+    ),
+    ImpactRule(
+        r"extmod/(vfs|modos).*",
+        labels=(
+            "RUN-FLASH_FORMAT",
+            "RUN-MPREMOTE_TESTS",
+            *_LABELS_RUNTESTS_STANDARD,
+        ),
+    ),
+)
+
+
+@dataclasses.dataclass(slots=True)
+class ImpactedSpec:
+    ports: set[str] | None = dataclasses.field(default_factory=set)
+    """
+    None: All ports
+    """
+    tests: set[str] | None = dataclasses.field(default_factory=set)
+    """
+    The test files of 'run-tests.py'.
+    Example: 'basics/int_big.py'
+    None: All test files
+    """
+
+    def add(self, port: str | None, test: str | None) -> None:
+        if port is None:
+            self.ports = None
+        elif self.ports is not None:
+            self.ports.add(port)
+        if test is None:
+            self.tests = None
+        elif self.tests is not None:
+            self.tests.add(test)
+
+
+class Impact(dict[str, ImpactedSpec]):
+    """
+    key: testrun_spec.label
+      Example: "RUN-TESTS_STANDARD"
+    value: The ports and test files
+    """
+
+    def add(self, labels: list[str], port: str | None, test: str | None) -> None:
+        for label in labels:
+            self.setdefault(label, ImpactedSpec()).add(port=port, test=test)
+
+    @staticmethod
+    def factory(files_changed: set[str], all_labels: list[str]) -> Impact:
+        assert isinstance(files_changed, set)
+        assert isinstance(all_labels, list)
+
+        impact = Impact()
+        for file_changed in sorted(files_changed):
+            for rule in IMPACT_RULES:
+                match = rule.match(file_changed)
+                if match is not None:
+                    break
+            else:
+                logger.debug(f"impact: {file_changed}: impacts all tests")
+                impact.add(all_labels, port=None, test=None)
+                continue
+
+            groups = match.groupdict()
+            test = groups.get("test", None)
+            impact.add(
+                all_labels if rule.labels is None else list(rule.labels),
+                port=groups.get("port", None),
+                test=None if test is None else test + ".py",
+            )
+        return impact
+
+    def remove_missing_tests(self, repo: pathlib.Path) -> None:
+        """
+        Remove the test files which do not exist (anymore) in 'repo'.
+        A testrun spec without remaining test files is not impacted.
+        """
+        assert isinstance(repo, pathlib.Path)
+        directory_tests = repo / MICROPYTHON_DIRECTORY_TESTS
+        for label, impacted_spec in list(self.items()):
+            if impacted_spec.tests is None:
+                continue
+            missing = {
+                t for t in impacted_spec.tests if not (directory_tests / t).is_file()
+            }
+            if len(missing) == 0:
+                continue
+            logger.info(f"impact: {label}: deleted tests {sorted(missing)}")
+            impacted_spec.tests -= missing
+            if len(impacted_spec.tests) == 0:
+                del self[label]
+
+    def add_co_failures(self, co_failures: dict[str, int]) -> None:
+        """
+        co_failures: See 'History.co_failures()'
+        These testrun specs are run completely.
+        """
+        assert isinstance(co_failures, dict)
+        for label, runs in co_failures.items():
+            if label in self:
+                continue
+            logger.info(f"impact: {label}: failed together in {runs} runs")
+            self.add([label], port=None, test=None)
+
+    def testrun_specs(self, testrun_specs: TestRunSpecs) -> TestRunSpecs:
+        """
+        Return the impacted testrun specs.
+        For 'run-tests.py', only the impacted test files are run: See 'TestRunSpec.impacted_tests'.
+        To be called before 'assign_tentacles()'.
+        """
+        assert isinstance(testrun_specs, TestRunSpecs)
+
+        impacted = TestRunSpecs()
+        for testrun_spec in testrun_specs:
+            impacted_spec = self.get(testrun_spec.label, None)
+            if impacted_spec is None:
+                continue
+            if (
+                impacted_spec.tests is not None
+                and testrun_spec.command_executable == COMMAND_RUNTESTS
+            ):
+                testrun_spec = dataclasses.replace(
+                    testrun_spec,
+                    impacted_tests=sorted(impacted_spec.tests),
+                    shardable=False,
+                )
+            impacted.append(testrun_spec)
+        return impacted
+
+    def filter_boards(
+        self, testrun_specs: TestRunSpecs, board_ports: dict[str, str]
+    ) -> None:
+        """
+        Remove the boards of ports which are not impacted.
+        Boards of an unknown port are never removed.
+        To be called after 'assign_tentacles()'.
+        """
+        assert isinstance(testrun_specs, TestRunSpecs)
+        assert isinstance(board_ports, dict)
+
+        for testrun_spec in testrun_specs:
+            ports = self[testrun_spec.label].ports
+            if ports is None:
+                continue
+            testrun_spec.tsvs_todo = TentacleSpecVariants(
+                tsv
+                for tsv in testrun_spec.tsvs_todo
+                if board_ports.get(tsv.board, None) in (None, *ports)
+            )
+            testrun_spec.tsvs_total_count = len(testrun_spec.tsvs_todo)
+
+    @property
+    def text(self) -> str:
+        def text(label: str, impacted_spec: ImpactedSpec) -> str:
+            ports = "all" if impacted_spec.ports is None else impacted_spec.ports
+            tests = "all" if impacted_spec.tests is None else impacted_spec.tests
+            return f"{label}: ports={ports} tests={tests}"
+
+        return "\n".join(text(label, self[label]) for label in sorted(self))
+
+
+def files_changed(repo: pathlib.Path, git_ref: str) -> set[str]:
+    """
+    Return the files which differ between 'git_ref' and the working tree.
+    This includes the deleted files.
+    """
+    assert isinstance(repo, pathlib.Path)
+    assert isinstance(git_ref, str)
+
+    result = subprocess.run(
+        ["git", "diff", "--name-only", "-z", git_ref],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise ValueError(
+            f"--impacted-by={git_ref}: 'git diff' failed in {repo}: {result.stderr.strip()}"
+        )
+    # '-z': The filenames are neither quoted nor split at spaces
+    return {filename for filename in result.stdout.split("\0") if filename != ""}
+
+
+def board_ports(repo: pathlib.Path) -> dict[str, str]:
+    """
+    key: board, example: 'RPI_PICO2'
+    value: port, example: 'rp2'
+    """
+    assert isinstance(repo, pathlib.Path)
+    return {
+        directory.name: directory.parent.parent.name
+        for directory in repo.glob("ports/*/boards/*")
+        if directory.is_dir()
+    }
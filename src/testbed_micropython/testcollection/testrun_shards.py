@@ -0,0 +1,163 @@
+"""
+Sharding: The tests of 'run-tests.py' are split into shards which
+run in parallel on identical tentacles.
+
+Every shard runs 'run-tests.py' with '--exclude' for the test files of
+all other shards. So 'run-tests.py' still decides which tests apply to
+a board. Test files in directories not listed in SHARD_TEST_DIRS run
+in every shard.
+
+The test files are distributed by LPT (longest processing time first).
+The weight of a test file is
+* its duration in a previous run ('duration_s' in 'live_results.jsonl' of '--durations-from')
+* or its file size, scaled to the known durations.
+
+Every shard computes the same distribution: The algorithm is deterministic.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import pathlib
+import re
+from collections import defaultdict
+
+from ..report_task.util_report_tasks import OUTCOME_SKIP
+from ..util_live_results import FILENAME_LIVE_RESULTS
+from .constants import DELIMITER_SHARD, DELIMITER_TENTACLE
+
+logger = logging.getLogger(__file__)
+
+SHARD_TEST_DIRS = ("basics", "extmod", "float", "micropython", "misc", "stress")
+
+
+def strip_shard(label: str) -> str:
+    """
+    Example label: 'RUN-TESTS_STANDARD+2of3@5f2a-RPI_PICO2'
+    Return: 'RUN-TESTS_STANDARD@5f2a-RPI_PICO2'
+    """
+    label_testrun, delimiter, tentacle = label.partition(DELIMITER_TENTACLE)
+    label_testrun, _, _ = label_testrun.partition(DELIMITER_SHARD)
+    return label_testrun + delimiter + tentacle
+
+
+class TestFileDurations(dict[str, dict[str, float]]):
+    """
+    key: testrun_spec.label
+      Example: "RUN-TESTS_STANDARD"
+    value: key: test file, value: duration in seconds
+      Example: {"basics/0prelim.py": 0.8}
+    """
+
+    @staticmethod
+    def factory(directory_results: pathlib.Path) -> TestFileDurations:
+        """
+        The durations are measured by 'LogfileTail' ('duration_s').
+        The first outcome of every testrun is ignored: Its duration includes
+        the startup of 'run-tests.py'.
+        Files without 'duration_s' (written by older versions) are ignored.
+        """
+        assert isinstance(directory_results, pathlib.Path)
+
+        durations = TestFileDurations()
+        filename = directory_results / FILENAME_LIVE_RESULTS
+        if not filename.is_file():
+            return durations
+
+        testids: set[str] = set()
+        samples: dict[tuple[str, str], list[float]] = defaultdict(list)
+        try:
+            for line in filename.read_text().splitlines():
+                record = json.loads(line)
+                testid = record["testid"]
+                duration_s = record.get("duration_s", None)
+                if duration_s is None:
+                    continue
+                if testid not in testids:
+                    testids.add(testid)
+                    continue
+                if record["outcome"] == OUTCOME_SKIP and DELIMITER_SHARD in testid:
+                    # Most likely excluded as the test belongs to another shard
+                    continue
+                label, _, _ = strip_shard(testid).partition(DELIMITER_TENTACLE)
+                samples[(label, record["test"])].append(float(duration_s))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to read {filename}: {e!r}")
+            return durations
+
+        for (label, test), durations_s in samples.items():
+            durations.setdefault(label, {})[test] = sum(durations_s) / len(durations_s)
+        return durations
+
+
+def file_weights(
+    directory_tests: pathlib.Path,
+    durations: dict[str, float],
+) -> dict[str, float]:
+    """
+    Return the weight of every test file in SHARD_TEST_DIRS.
+    """
+    assert isinstance(directory_tests, pathlib.Path)
+    assert isinstance(durations, dict)
+
+    sizes: dict[str, int] = {}
+    for test_dir in SHARD_TEST_DIRS:
+        for filename in (directory_tests / test_dir).glob("*.py"):
+            sizes[filename.relative_to(directory_tests).as_posix()] = (
+                filename.stat().st_size
+            )
+
+    # Scale the file sizes to the known durations
+    known = [test for test in sizes if test in durations]
+    size_known = sum(sizes[test] for test in known)
+    s_per_byte = 1.0
+    if size_known > 0:
+        s_per_byte = sum(durations[test] for test in known) / size_known
+
+    return {
+        test: durations.get(test, size * s_per_byte) for test, size in sizes.items()
+    }
+
+
+def partition(weights: dict[str, float], shards: int) -> list[list[str]]:
+    """
+    LPT: The heaviest test file is added to the shard with the smallest load.
+    """
+    assert isinstance(weights, dict)
+    assert shards >= 1
+
+    heap = [(0.0, shard) for shard in range(shards)]
+    result: list[list[str]] = [[] for _ in range(shards)]
+    for test in sorted(weights, key=lambda test: (-weights[test], test)):
+        load_s, shard = heapq.heappop(heap)
+        result[shard].append(test)
+        heapq.heappush(heap, (load_s + weights[test], shard))
+    return [sorted(tests) for tests in result]
+
+
+def exclude_regex(
+    directory_tests: pathlib.Path,
+    durations: dict[str, float],
+    shard: int,
+    shards: int,
+) -> str:
+    """
+    Return the regex for 'run-tests.py --exclude':
+    It matches the test files of all other shards.
+    """
+    assert 0 <= shard < shards
+
+    shard_tests = partition(
+        weights=file_weights(directory_tests=directory_tests, durations=durations),
+        shards=shards,
+    )
+    excluded = sorted(
+        test for idx, tests in enumerate(shard_tests) if idx != shard for test in tests
+    )
+    logger.info(
+        f"Shard {shard + 1}of{shards}: {len(shard_tests[shard])} test files, {len(excluded)} excluded"
+    )
+    # 'run-tests.py' might prefix the test file with a directory
+    return r"(^|/)(" + "|".join(re.escape(test) for test in excluded) + r")$"
@@ -23,11 +23,13 @@ from ..testcollection.baseclasses_spec import (
     TestRole,
 )
 from ..testcollection.constants import (
+    DELIMITER_SHARD,
     DELIMITER_TENTACLE,
     DELIMITER_TESTROLE,
     DELIMITER_TESTRUN,
     MICROPYTHON_DIRECTORY_TESTS,
 )
+from ..util_phases import PHASES, SPAN_SKIP_IF_NO_FILESYSTEM
 
 logger = logging.getLogger(__name__)
 
@@ -36,10 +38,28 @@ logger = logging.getLogger(__name__)
 class TestArgs:
     testresults_directory: ResultsDir
     repo_micropython_tests: pathlib.Path
+    test_file_durations: dict[str, float] = dataclasses.field(default_factory=dict)
+    """
+    The durations of the test files in a previous run. Used for sharding.
+    Example: {"basics/0prelim.py": 0.8}
+    """
+    rerun_tests: list[str] = dataclasses.field(default_factory=list)
+    """
+    A retry only runs the tests which failed in the previous attempt.
+    Example: ["extmod/machine_i2c.py"]
+    Empty: Run all tests.
+    """
+    impacted_tests: list[str] = dataclasses.field(default_factory=list)
+    """
+    See 'TestRunSpec.impacted_tests'.
+    """
 
     def __post_init__(self) -> None:
         # assert isinstance(self.testresults_directory, ResultsDir)
         assert isinstance(self.repo_micropython_tests, pathlib.Path)
+        assert isinstance(self.test_file_durations, dict)
+        assert isinstance(self.rerun_tests, list)
+        assert isinstance(self.impacted_tests, list)
 
 
 @dataclasses.dataclass(slots=True, repr=True)
@@ -121,7 +141,10 @@ class TestRun:
     def label_testrun(self) -> str:
         """
         Example: 'RUN-TESTS_EXTMOD_HARDWARE'
+        Example: 'RUN-TESTS_STANDARD+2of3'
         """
+        if self.tentacle_variant.shards > 1:
+            return f"{self.testrun_spec.label}{DELIMITER_SHARD}{self.tentacle_variant.shard_text}"
         return f"{self.testrun_spec.label}"
 
     @property
@@ -214,6 +237,29 @@ class TestRun:
 
         return sorted(testruns, key=f)
 
+    @staticmethod
+    def priority(
+        testrun: TestRun,
+        connected_tentacles: ConnectedTentacles,
+    ) -> tuple[int, int, int, str]:
+        """
+        The lowest value has the highest priority.
+        """
+        build_variants = len(
+            testrun.tentacle_variant.tentacle.tentacle_spec.build_variants
+        )
+
+        priorities = (
+            -testrun.testrun_spec.priority,
+            # The more variants to compile, the higher the priority
+            -build_variants,
+            # To minimize reflashing, order by variant
+            -testrun.firmware_already_flashed,
+            # Finally, alphabetical order desc
+            testrun.testid,
+        )
+        return priorities
+
     @staticmethod
     def priority_sorter(
         testruns: list[TestRun],
@@ -223,29 +269,17 @@ class TestRun:
         Order by priority.
         In the list, the first element has the highest priority.
         """
-
-        def priority(testrun: TestRun) -> tuple[int, int, int, str]:
-            build_variants = len(
-                testrun.tentacle_variant.tentacle.tentacle_spec.build_variants
-            )
-
-            priorities = (
-                -testrun.testrun_spec.priority,
-                # The more variants to compile, the higher the priority
-                -build_variants,
-                # To minimize reflashing, order by variant
-                -testrun.firmware_already_flashed,
-                # Finally, alphabetical order desc
-                testrun.testid,
-            )
-            return priorities
-
-        return sorted(testruns, key=priority)
+        return sorted(
+            testruns,
+            key=lambda testrun: TestRun.priority(testrun, connected_tentacles),
+        )
 
     def skip_if_no_filesystem(self) -> None:
-        dut = self.tentacle_variant.tentacle.dut
-
-        filesystem_present = dut.mpremote_success("import os; os.listdir('/')")
+        tentacle = self.tentacle_variant.tentacle
+        with PHASES.span(SPAN_SKIP_IF_NO_FILESYSTEM, tentacle=tentacle.label_short):
+            filesystem_present = tentacle.dut.mpremote_success(
+                "import os; os.listdir('/')"
+            )
         if not filesystem_present:
             raise OctoprobeTestSkipException("No filesystem")
 
@@ -348,6 +382,22 @@ class TestRunSpec:
     0: low
     10: high
     """
+    shardable: bool = False
+    """
+    True: The tests may be split into shards which
+    run in parallel on identical tentacles.
+    """
+    rerun_failed_tests: bool = False
+    """
+    True: A retry only runs the tests which failed in the previous attempt.
+    False: A retry runs all tests again.
+    """
+    impacted_tests: list[str] = dataclasses.field(default_factory=list)
+    """
+    'mptest test --impacted-by': Only these test files of 'run-tests.py' are run.
+    Example: ["basics/int_big.py"]
+    Empty: Run all tests.
+    """
 
     def __post_init__(self) -> None:
         assert isinstance(self.label, str)
@@ -358,6 +408,7 @@ class TestRunSpec:
         assert isinstance(self.timeout_s, float)
         assert isinstance(self.testrun_class, type(TestRun))
         assert isinstance(self.tsvs_todo, TentacleSpecVariants)
+        assert isinstance(self.impacted_tests, list)
 
     @property
     def command_executable(self) -> str:
@@ -371,11 +422,17 @@ class TestRunSpec:
         self,
         tentacles: ConnectedTentacles,
         flash_skip: bool,
+        shards: int = 1,
     ) -> None:
         """
         Assign tentacle-variants (board-variants) to be tested.
+
+        shards: If 'shardable', split the tests into up to 'shards' shards:
+          But not more shards than identical tentacles are connected.
         """
         assert isinstance(tentacles, ConnectedTentacles)
+        assert isinstance(shards, int)
+        assert shards >= 1
         from .baseclasses_spec import TentacleSpecsMicropython
 
         tentacle_specs: TentacleSpecsMicropython = TentacleSpecsMicropython(
@@ -391,6 +448,18 @@ class TestRunSpec:
             roles=roles,
             flash_skip=flash_skip,
         )
+        if self.shardable and shards > 1:
+            tsvs_sharded = TentacleSpecVariants()
+            for tsv in self.tsvs_todo:
+                identical_tentacles = len(
+                    [t for t in tentacles if t.tentacle_spec.board == tsv.board]
+                )
+                tsv_shards = min(shards, identical_tentacles)
+                if tsv_shards > 1:
+                    tsvs_sharded.extend(tsv.split_shards(shards=tsv_shards))
+                else:
+                    tsvs_sharded.append(tsv)
+            self.tsvs_todo = tsvs_sharded
         self.tsvs_total_count = len(self.tsvs_todo)
 
     def __repr__(self) -> str:
@@ -432,34 +501,54 @@ class TestRunSpec:
                 return
 
         for tentacle in available_tentacles:
-            for tsv in self.tsvs_todo:
-                if firmwares_built is not None:
-                    if tsv.board_variant not in firmwares_built:
+            yield from self.generate_tentacle(
+                tentacle=tentacle,
+                firmwares_built=firmwares_built,
+                flash_skip=flash_skip,
+                tentacle_reference=tentacle_reference,
+            )
+
+    def generate_tentacle(
+        self,
+        tentacle: TentacleMicropython,
+        firmwares_built: set[str] | None,
+        flash_skip: bool,
+        tentacle_reference: TentacleMicropython | None,
+    ) -> Iterator[TestRun]:
+        """
+        Generate the testruns for one tentacle.
+        The availability of the reference tentacle is NOT verified.
+        """
+        for tsv in self.tsvs_todo:
+            if firmwares_built is not None:
+                if tsv.board_variant not in firmwares_built:
+                    continue
+
+            if tsv.board == tentacle.tentacle_spec.board:
+                tentacle_variant = TentacleVariant(
+                    tentacle=tentacle,
+                    variant=tsv.variant,
+                    role=tsv.role,
+                    shard=tsv.shard,
+                    shards=tsv.shards,
+                )
+                if self.requires_reference_tentacle:
+                    if tentacle_reference is None:
+                        # There is no reference: Skip test
+                        continue
+                    if (
+                        tentacle_variant.tentacle.label_short
+                        == tentacle_reference.label_short
+                    ):
+                        # A tentacle can not be its reference
                         continue
 
-                if tsv.board == tentacle.tentacle_spec.board:
-                    tentacle_variant = TentacleVariant(
-                        tentacle=tentacle,
-                        variant=tsv.variant,
-                        role=tsv.role,
-                    )
-                    if self.requires_reference_tentacle:
-                        if tentacle_reference is None:
-                            # There is no reference: Skip test
-                            continue
-                        if (
-                            tentacle_variant.tentacle.label_short
-                            == tentacle_reference.label_short
-                        ):
-                            # A tentacle can not be its reference
-                            continue
-
-                    yield self.testrun_class(
-                        testrun_spec=self,
-                        tentacle_variant=tentacle_variant,
-                        tentacle_reference=tentacle_reference,
-                        flash_skip=flash_skip,
-                    )
+                yield self.testrun_class(
+                    testrun_spec=self,
+                    tentacle_variant=tentacle_variant,
+                    tentacle_reference=tentacle_reference,
+                    flash_skip=flash_skip,
+                )
 
     def pytest_print(self, indent: int, file: typing.TextIO) -> None:
         for tsv in self.tsvs_todo:
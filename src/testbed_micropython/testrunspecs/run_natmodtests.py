@@ -6,8 +6,10 @@ import os
 import pathlib
 import shutil
 import sys
+import time
 
 from git_cached_repo.git_cached_repo import CachedGitRepo
+from octoprobe.util_baseclasses import OctoprobeTestSkipException
 from octoprobe.util_constants import relative_cwd
 from octoprobe.util_subprocess import SubprocessExitCodeException, subprocess_run
 
@@ -25,6 +27,7 @@ from ..testcollection.testrun_specs import (
     TestRunSpec,
 )
 from ..util_multiprocessing import EVENTLOGCALLBACK
+from ..util_natmod_cache import NatmodCache, NatmodCacheKey
 from ..util_subprocess_tentacle import tentacle_subprocess_run
 
 logger = logging.getLogger(__file__)
@@ -78,6 +81,60 @@ ARCHS = [
 ]
 
 
+ARCH_BY_BOARD_VARIANT = {
+    "ADAFRUIT_ITSYBITSY_M0_EXPRESS": "armv6m",
+    "ARDUINO_NANO_33_BLE_SENSE": "armv7emsp",
+    "ESP32_GENERIC": "xtensawin",
+    "ESP32_GENERIC_C3": "rv32imc",
+    "ESP32_GENERIC_S3": "xtensawin",
+    "ESP8266_GENERIC": "xtensa",
+    "LOLIN_C3_MINI": "rv32imc",
+    "NUCLEO_WB55": "armv7emsp",
+    "PYBD_SF2": "armv7emsp",
+    "PYBD_SF6": "armv7emdp",
+    "PYBLITEV10": "armv7emsp",
+    "PYBV11": "armv7emsp",
+    "RPI_PICO": "armv6m",
+    "RPI_PICO2": "armv7emsp",
+    "RPI_PICO2-RISCV": "rv32imc",
+    "RPI_PICO2_W": "armv7emsp",
+    "RPI_PICO_W": "armv6m",
+    "TEENSY40": "armv7emdp",
+    "UM_FEATHERS2": "xtensawin",
+    "UM_FEATHERS3": "xtensawin",
+    "UM_TINYPICO": "xtensawin",
+    "pca10059": "armv7emsp",
+}
+"""
+key: board_variant, for example 'RPI_PICO2-RISCV'. The board if all variants share the arch.
+value: Arch.arch: 'sys.implementation._mpy' of the firmware.
+"""
+
+
+def natmod_filenames(directory_natmod: pathlib.Path, arch: str) -> list[pathlib.Path]:
+    """
+    The compiled examples required by 'run-natmodtests.py'.
+    Example: 'examples/natmod/btree/btree_armv6m.mpy'
+    """
+    assert isinstance(directory_natmod, pathlib.Path)
+    assert isinstance(arch, str)
+    return [
+        directory_natmod / example / f"{example}_{arch}.mpy" for example in NATMOD_LIBS
+    ]
+
+
+def natmod_arch(board_variant: str) -> str | None:
+    """
+    Return the arch of 'board_variant' or None if unknown.
+    """
+    assert isinstance(board_variant, str)
+    arch = ARCH_BY_BOARD_VARIANT.get(board_variant, None)
+    if arch is not None:
+        return arch
+    board, _, _variant = board_variant.partition("-")
+    return ARCH_BY_BOARD_VARIANT.get(board, None)
+
+
 class NatmodContainers:
     """
     The containers are missing some python libraries.
@@ -96,7 +153,10 @@ class NatmodContainers:
         "We remember the repos which have already been clones."
 
     def clone_python_libs(self) -> None:
-        shutil.rmtree(self.DIRECTORY_PYLIBS, ignore_errors=True)
+        """
+        The clones are kept between runs: 'CachedGitRepo' only fetches
+        if the git ref is not available yet.
+        """
         for pylib, pylib_git_spec in self.PYLIBS:
             git_repo = CachedGitRepo(
                 directory_cache=constants.DIRECTORY_GIT_CACHE,
@@ -128,80 +188,123 @@ class NatmodContainers:
 natmod_containers = NatmodContainers()
 
 
-class NatmodExamples:
-    def __init__(self) -> None:
-        self.compiled = False
-
-    def compile_all(
-        self,
-        repo_micropython_tests: pathlib.Path,
-        directory_mpbuild_artifacts: pathlib.Path,
-    ) -> None:
-        if self.compiled:
-            return
-        self.compiled = True
-        natmod_containers.clone_python_libs()
-        directory_natmodtests = directory_mpbuild_artifacts / "compile_natmodtests"
-
-        logfile = directory_natmodtests / "submodule_checkout.txt"
+def prepare_natmod_examples(
+    repo_micropython_tests: pathlib.Path,
+    directory_natmodtests: pathlib.Path,
+) -> None:
+    """
+    Runs once in the main process before the examples
+    are compiled by 'compile_natmod_examples()'.
+    """
+    assert isinstance(repo_micropython_tests, pathlib.Path)
+    assert isinstance(directory_natmodtests, pathlib.Path)
+
+    natmod_containers.clone_python_libs()
+
+    logfile = directory_natmodtests / "submodule_checkout.txt"
+    args = [
+        "git",
+        "submodule",
+        "update",
+        "--init",
+        "lib/berkeley-db-1.xx",
+    ]
+    subprocess_run(
+        args=args,
+        cwd=repo_micropython_tests,
+        logfile=logfile,
+        timeout_s=300.0,
+    )
+
+
+def compile_natmod_examples(
+    repo_micropython_tests: pathlib.Path,
+    directory_natmodtests: pathlib.Path,
+    arch: Arch,
+    docker_args_ext: list[str],
+    natmod_cache: NatmodCache | None,
+) -> bool:
+    """
+    Compile all NATMOD_LIBS for one arch.
+    Every arch uses its own build directory: The archs may be compiled in parallel.
+    Return True if the examples have been taken from the cache.
+    Raises if an example failed to compile: 'RUN-NATMODTESTS' will be skipped for this arch.
+    """
+    assert isinstance(repo_micropython_tests, pathlib.Path)
+    assert isinstance(directory_natmodtests, pathlib.Path)
+    assert isinstance(arch, Arch)
+    assert isinstance(docker_args_ext, list)
+    assert isinstance(natmod_cache, NatmodCache | None)
+
+    directory_natmod = repo_micropython_tests / "examples" / "natmod"
+    # Examples of a previous run must not hide a failed compilation
+    for filename in natmod_filenames(directory_natmod=directory_natmod, arch=arch.arch):
+        filename.unlink(missing_ok=True)
+
+    key: NatmodCacheKey | None = None
+    if natmod_cache is not None:
+        key = NatmodCacheKey.factory(
+            repo_micropython_tests=repo_micropython_tests,
+            arch=arch.arch,
+            docker_image=arch.container,
+        )
+        if key is not None:
+            if natmod_cache.restore(key=key, directory_natmod=directory_natmod):
+                logger.info(f"compile '{arch.arch}': Taken from the natmod cache")
+                return True
+
+    compiled: list[pathlib.Path] = []
+    failed: SubprocessExitCodeException | None = None
+    for example in NATMOD_LIBS:
+        args_extra: list[str] = []
+        opt_extra = ""
+        if arch.pyelftools_patch:
+            args_extra = docker_args_ext
+
+        directory_example = directory_natmod / example
+        build = f"build-{arch.arch}"
+        arg_trace = "--trace"
+        arg_trace = ""
         args = [
-            "git",
-            "submodule",
-            "update",
-            "--init",
-            "lib/berkeley-db-1.xx",
+            "/usr/bin/docker",
+            "run",
+            "--rm",
+            f"--volume={repo_micropython_tests}:{repo_micropython_tests}",
+            *args_extra,
+            f"--user={os.getuid()}:{os.getgid()}",
+            arch.container,
+            "bash",
+            "-c",
+            f"{opt_extra} make {arg_trace} --always-make -C {directory_example} ARCH={arch.arch} BUILD={build} {arch.extra_args}",
         ]
-        subprocess_run(
-            args=args,
-            cwd=repo_micropython_tests,
-            logfile=logfile,
-            timeout_s=300.0,
-        )
+        logfile = directory_natmodtests / f"natmodtest-{arch.arch}-{example}.txt"
+        logger.info(f"compile '{example}' for '{arch.arch}'. Logfile: {logfile}")
+
+        begin_s = time.time()
+        try:
+            subprocess_run(
+                args=args,
+                cwd=repo_micropython_tests,
+                logfile=logfile,
+                timeout_s=300.0,
+            )
+        except SubprocessExitCodeException as e:
+            logger.error(f"compile '{example}' for '{arch.arch}' failed: {e}")
+            failed = e
+        else:
+            compiled.extend(
+                f
+                for f in directory_example.glob("*.mpy")
+                if f.stat().st_mtime >= begin_s - 1.0
+            )
+
+        shutil.rmtree(directory_example / build, ignore_errors=True)
 
-        for example in NATMOD_LIBS:
-            for arch in ARCHS:
-                args_extra: list[str] = []
-                opt_extra = ""
-                if arch.pyelftools_patch:
-                    args_extra = natmod_containers.docker_args_ext
-
-                arg_trace = "--trace"
-                arg_trace = ""
-                args = [
-                    "/usr/bin/docker",
-                    "run",
-                    "--rm",
-                    f"--volume={repo_micropython_tests}:{repo_micropython_tests}",
-                    *args_extra,
-                    f"--user={os.getuid()}:{os.getgid()}",
-                    arch.container,
-                    "bash",
-                    "-c",
-                    f"{opt_extra} make {arg_trace} --always-make -C {repo_micropython_tests}/examples/natmod/{example} ARCH={arch.arch} {arch.extra_args}",
-                ]
-                logfile = (
-                    directory_natmodtests / f"natmodtest-{arch.arch}-{example}.txt"
-                )
-                logger.info(
-                    f"compile '{example}' for '{arch.arch}'. Logfile: {logfile}"
-                )
-
-                try:
-                    subprocess_run(
-                        args=args,
-                        cwd=repo_micropython_tests,
-                        logfile=logfile,
-                        timeout_s=300.0,
-                    )
-                except SubprocessExitCodeException as e:
-                    logger.error(f"compile '{example}' for '{arch.arch}' failed: {e}")
-
-                shutil.rmtree(
-                    repo_micropython_tests / example / "build", ignore_errors=True
-                )
-
-
-NATMOD_EXAMPLES = NatmodExamples()
+    if failed is not None:
+        raise failed
+    if natmod_cache is not None and key is not None:
+        natmod_cache.put(key=key, filenames=compiled)
+    return False
 
 
 class TestRunRunTests(TestRun):
@@ -212,6 +315,28 @@ class TestRunRunTests(TestRun):
     https://github.com/micropython/micropython/blob/master/tests/run-natmodtests.py
     """
 
+    def skip_missing_natmod_examples(self, testargs: TestArgs) -> None:
+        """
+        The compilation of the examples for this arch failed or timed out.
+        """
+        arch = natmod_arch(self.tentacle_variant.board_variant)
+        if arch is None:
+            return
+        missing = [
+            filename.name
+            for filename in natmod_filenames(
+                directory_natmod=testargs.repo_micropython_tests
+                / "examples"
+                / "natmod",
+                arch=arch,
+            )
+            if not filename.is_file()
+        ]
+        if len(missing) > 0:
+            raise OctoprobeTestSkipException(
+                f"Natmod examples not compiled for '{arch}': {', '.join(missing)}"
+            )
+
     def test(self, testargs: TestArgs) -> None:
         assert isinstance(self.tentacle_variant, TentacleVariant)
         tentacle = self.tentacle_variant.tentacle
@@ -220,6 +345,7 @@ class TestRunRunTests(TestRun):
 
         self.skip_missing_support_native()
         self.skip_missing_support_mpy()
+        self.skip_missing_natmod_examples(testargs=testargs)
 
         # Work out which tests can be run.
         tests_extmod_dir = testargs.repo_micropython_tests / "tests" / "extmod"
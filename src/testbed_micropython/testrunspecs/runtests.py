@@ -15,6 +15,7 @@ from ..testcollection.constants import (
     MICROPYTHON_DIRECTORY_TESTS,
     TIMEOUT_FLASH_S,
 )
+from ..testcollection.testrun_shards import exclude_regex
 from ..testcollection.testrun_specs import (
     TestArgs,
     TestRun,
@@ -98,7 +99,7 @@ class TestRunRunTests(TestRun):
                 testargs=testargs,
                 tentacle=tentacle,
                 serial_port=serial_port,
-                mip_package="unittest",
+                mip_packages=["unittest"],
                 testrun=self,
             )
 
@@ -115,6 +116,24 @@ class TestRunRunTests(TestRun):
             "--jobs=1",
             # "misc/cexample_class.py",
         ]
+        if len(testargs.rerun_tests) > 0:
+            # Retry: The failed tests of the previous attempt.
+            # These tests belong to this shard: '--exclude' is not required.
+            args.extend(testargs.rerun_tests)
+        elif len(testargs.impacted_tests) > 0:
+            # 'mptest test --impacted-by': Only the impacted tests.
+            args.extend(testargs.impacted_tests)
+        elif tentacle_variant.shards > 1:
+            args.append(
+                "--exclude="
+                + exclude_regex(
+                    directory_tests=testargs.repo_micropython_tests
+                    / MICROPYTHON_DIRECTORY_TESTS,
+                    durations=testargs.test_file_durations,
+                    shard=tentacle_variant.shard,
+                    shards=tentacle_variant.shards,
+                )
+            )
         env = env_for_mpycross()
         tentacle_subprocess_run(
             args=args,
@@ -138,7 +157,9 @@ TESTRUNSPEC_RUNTESTS_STANDARD = TestRunSpec(
     required_fut=EnumFut.FUT_MCU_ONLY,
     requires_reference_tentacle=False,
     testrun_class=TestRunRunTests,
+    rerun_failed_tests=True,
     timeout_s=60 * 60.0 + TIMEOUT_FLASH_S,
+    shardable=True,
 )
 
 TESTRUNSPEC_RUNTESTS_STANDARD_VIA_MPY = TestRunSpec(
@@ -150,7 +171,9 @@ TESTRUNSPEC_RUNTESTS_STANDARD_VIA_MPY = TestRunSpec(
     required_fut=EnumFut.FUT_MCU_ONLY,
     requires_reference_tentacle=False,
     testrun_class=TestRunRunTests,
+    rerun_failed_tests=True,
     timeout_s=60 * 60.0 + TIMEOUT_FLASH_S,
+    shardable=True,
 )
 
 TESTRUNSPEC_RUNTESTS_STANDARD_NATIVE = TestRunSpec(
@@ -162,7 +185,9 @@ TESTRUNSPEC_RUNTESTS_STANDARD_NATIVE = TestRunSpec(
     required_fut=EnumFut.FUT_MCU_ONLY,
     requires_reference_tentacle=False,
     testrun_class=TestRunRunTests,
+    rerun_failed_tests=True,
     timeout_s=60 * 60.0 + TIMEOUT_FLASH_S,
+    shardable=True,
 )
 
 TESTRUNSPEC_RUNTESTS_EXTMOD_HARDWARE = TestRunSpec(
@@ -174,6 +199,7 @@ TESTRUNSPEC_RUNTESTS_EXTMOD_HARDWARE = TestRunSpec(
     required_fut=EnumFut.FUT_EXTMOD_HARDWARE,
     requires_reference_tentacle=False,
     testrun_class=TestRunRunTests,
+    rerun_failed_tests=True,
     timeout_s=30.0 + TIMEOUT_FLASH_S,
 )
 
@@ -192,5 +218,6 @@ TESTRUNSPEC_RUNTESTS_EXTMOD_HARDWARE_NATIVE = TestRunSpec(
     required_fut=EnumFut.FUT_EXTMOD_HARDWARE,
     requires_reference_tentacle=False,
     testrun_class=TestRunRunTests,
+    rerun_failed_tests=True,
     timeout_s=30.0 + TIMEOUT_FLASH_S,
 )
@@ -54,7 +54,7 @@ class TestRunRunTests(TestRun):
             testargs=testargs,
             tentacle=tentacle,
             serial_port=serial_port,
-            mip_package="unittest",
+            mip_packages=["unittest"],
             testrun=self,
         )
 
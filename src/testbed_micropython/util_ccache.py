@@ -0,0 +1,193 @@
+"""
+A persistent ccache shared by all firmware builds (see 'mpbuild/build_api.py').
+
+Directories and files:
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/ccache/<docker image>/: 'CCACHE_DIR'
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/ccache/<docker image>/stats/<board variant>-<pid>.log:
+   'CCACHE_STATSLOG' of one build. Removed after the build.
+
+Every toolchain (docker image) has its own cache directory which is mounted
+into the docker container of mpbuild.
+
+ccache is only used if the docker image provides it:
+ * esp-idf based ports (esp32): 'IDF_CCACHE_ENABLE=1'
+ * cmake based ports (rp2): 'CMAKE_<LANG>_COMPILER_LAUNCHER=ccache'
+The make based ports do not support a compiler launcher: They are built without ccache.
+'CROSS_COMPILE="ccache <prefix>"' is not used: The prefix differs per port and
+the variable also applies to the host build of mpy-cross.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import re
+import shlex
+import subprocess
+
+from octoprobe.util_constants import DIRECTORY_OCTOPROBE_DOWNLOADS
+
+logger = logging.getLogger(__file__)
+
+DIRECTORY_CCACHE = DIRECTORY_OCTOPROBE_DOWNLOADS / "ccache"
+SUFFIX_CCACHE_STATS = ".ccache.json"
+"""
+The statistics of a build: Next to the '.spec' of the firmware.
+"""
+_DOCKER_RUN = "docker run "
+_STATS_HITS = ("direct_cache_hit", "preprocessed_cache_hit")
+_STATS_MISSES = ("cache_miss",)
+_TIMEOUT_S = 60.0
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CcacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float | None:
+        if self.total == 0:
+            return None
+        return self.hits / self.total
+
+    @property
+    def text(self) -> str:
+        """
+        Example: '812 hits, 18 misses'
+        """
+        return f"{self.hits} hits, {self.misses} misses"
+
+    @staticmethod
+    def factory(filename: pathlib.Path) -> CcacheStats | None:
+        """
+        Parses a 'CCACHE_STATSLOG': One counter per line, files as comments.
+        Return None if ccache did not write the log.
+        """
+        assert isinstance(filename, pathlib.Path)
+        try:
+            lines = filename.read_text().splitlines()
+        except OSError:
+            return None
+        return CcacheStats(
+            hits=sum(line.strip() in _STATS_HITS for line in lines),
+            misses=sum(line.strip() in _STATS_MISSES for line in lines),
+        )
+
+    def write(self, filename: pathlib.Path) -> None:
+        assert isinstance(filename, pathlib.Path)
+        filename.write_text(json.dumps(dataclasses.asdict(self), indent=4))
+
+
+_CCACHE_AVAILABLE: dict[str, bool] = {}
+"""
+key: docker image
+value: True if the docker image provides ccache
+"""
+
+
+def ccache_available(docker_image: str) -> bool:
+    """
+    Docker is called once per process and docker image.
+    """
+    assert isinstance(docker_image, str)
+
+    available = _CCACHE_AVAILABLE.get(docker_image, None)
+    if available is None:
+        args = [
+            "docker",
+            "run",
+            "--rm",
+            "--entrypoint=sh",
+            docker_image,
+            "-c",
+            "command -v ccache",
+        ]
+        try:
+            proc = subprocess.run(
+                args, capture_output=True, check=False, timeout=_TIMEOUT_S
+            )
+            available = proc.returncode == 0
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.info(f"ccache: Failed to probe '{docker_image}': {e!r}")
+            available = False
+        if not available:
+            logger.info(f"ccache: Not available in '{docker_image}'")
+        _CCACHE_AVAILABLE[docker_image] = available
+    return available
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Ccache:
+    directory: pathlib.Path = DIRECTORY_CCACHE
+
+    def __post_init__(self) -> None:
+        assert isinstance(self.directory, pathlib.Path)
+
+    def directory_image(self, docker_image: str) -> pathlib.Path:
+        """
+        Example docker_image: 'micropython/build-micropython-rp2:latest'
+        Example directory: 'micropython_build-micropython-rp2_latest'
+        """
+        return self.directory / re.sub(r"[^\w.-]", "_", docker_image)
+
+    def docker_args(
+        self,
+        docker_image: str,
+        mpy_root_directory: pathlib.Path,
+        filename_statslog: pathlib.Path,
+    ) -> list[str]:
+        """
+        Return the arguments for 'docker run'.
+        Return [] if the docker image does not provide ccache.
+        """
+        assert isinstance(docker_image, str)
+        assert isinstance(mpy_root_directory, pathlib.Path)
+        assert isinstance(filename_statslog, pathlib.Path)
+
+        if docker_image == "" or not ccache_available(docker_image):
+            return []
+
+        directory = self.directory_image(docker_image)
+        filename_statslog.parent.mkdir(parents=True, exist_ok=True)
+        return [
+            f"--volume={directory}:{directory}",
+            f"--env=CCACHE_DIR={directory}",
+            # The repo may be cloned into different directories
+            f"--env=CCACHE_BASEDIR={mpy_root_directory}",
+            f"--env=CCACHE_STATSLOG={filename_statslog}",
+            "--env=IDF_CCACHE_ENABLE=1",
+            "--env=CMAKE_C_COMPILER_LAUNCHER=ccache",
+            "--env=CMAKE_CXX_COMPILER_LAUNCHER=ccache",
+        ]
+
+    def filename_statslog(self, docker_image: str, name: str) -> pathlib.Path:
+        """
+        name: Example 'RPI_PICO2-RISCV'
+        """
+        return (
+            self.directory_image(docker_image) / "stats" / f"{name}-{os.getpid()}.log"
+        )
+
+
+def docker_cmd_add_args(build_cmd: str, docker_args: list[str]) -> str:
+    """
+    mpbuild returns the docker command as a shell command: Insert 'docker_args'.
+    """
+    assert isinstance(build_cmd, str)
+    assert isinstance(docker_args, list)
+
+    if len(docker_args) == 0:
+        return build_cmd
+    if _DOCKER_RUN not in build_cmd:
+        logger.warning(f"ccache: '{_DOCKER_RUN}' not found in: {build_cmd}")
+        return build_cmd
+    args = " ".join(shlex.quote(arg) for arg in docker_args)
+    return build_cmd.replace(_DOCKER_RUN, f"{_DOCKER_RUN}{args} ", 1)
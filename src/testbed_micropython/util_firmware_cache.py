@@ -0,0 +1,263 @@
+"""
+A persistent firmware build cache.
+
+Directories and files:
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/firmware_cache/<key>/metadata.json
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/firmware_cache/<key>/<firmware filename>
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/firmware_cache/<key>/<firmware filename>.spec
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/firmware_cache/<key>/mpy-cross
+
+The key is a hash over
+ * the git commit of the firmware repo
+ * the uncommitted changes (git diff HEAD) and the untracked files
+ * the board variant
+ * the docker image used by mpbuild
+
+Every entry contains mpy-cross: After a cache hit, the build directory of
+the firmware repo may not contain mpy-cross (for example after a 'git clean').
+An entry without mpy-cross is a cache miss.
+
+Storing and pruning: See 'util_lru_cache.py'.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import shutil
+import subprocess
+
+from octoprobe.util_constants import DIRECTORY_OCTOPROBE_DOWNLOADS
+from octoprobe.util_firmware_spec import FirmwareBuildSpec
+from octoprobe.util_micropython_boards import BoardVariant
+
+from .util_lru_cache import LruCache, LruCacheEntry
+from .util_mpycross import FILENAME_MPCROSS
+
+logger = logging.getLogger(__file__)
+
+DIRECTORY_FIRMWARE_CACHE = DIRECTORY_OCTOPROBE_DOWNLOADS / "firmware_cache"
+MAX_SIZE_BYTES_DEFAULT = 2 * 1024**3
+
+
+def _git(repo: pathlib.Path, *args: str) -> bytes:
+    proc = subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        timeout=60.0,
+    )
+    return proc.stdout
+
+
+def docker_image_id(docker_image: str) -> str:
+    """
+    Return the image id or "" if docker is not available.
+    """
+    try:
+        proc = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{.Id}}", docker_image],
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=60.0,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return proc.stdout.strip()
+
+
+def git_fingerprint(repo: pathlib.Path, untracked: bool = True) -> tuple[str, str]:
+    """
+    Return the git commit and the sha256 over the uncommitted changes
+    (git diff HEAD) and the untracked files: "" if the git repo is clean.
+    untracked=False: Ignore the untracked files, for example build results.
+    Raises if 'repo' is not a git repo.
+    """
+    git_commit = _git(repo, "rev-parse", "HEAD")
+    git_diff = _git(repo, "diff", "HEAD", "--binary")
+    untracked_files = b""
+    if untracked:
+        untracked_files = _git(repo, "ls-files", "--others", "--exclude-standard", "-z")
+
+    git_dirty_sha256 = ""
+    if git_diff != b"" or untracked_files != b"":
+        h = hashlib.sha256(git_diff)
+        for filename in sorted(untracked_files.split(b"\0")):
+            if filename == b"":
+                continue
+            h.update(filename)
+            path = repo / os.fsdecode(filename)
+            if path.is_file():
+                h.update(path.read_bytes())
+        git_dirty_sha256 = h.hexdigest()
+    return git_commit.decode().strip(), git_dirty_sha256
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FirmwareCacheKey:
+    git_commit: str
+    git_dirty_sha256: str
+    """
+    "" if the git repo is clean.
+    """
+    board_variant: str
+    """
+    Example: 'RPI_PICO2-RISCV'
+    """
+    docker_image: str
+    docker_image_id: str
+
+    @property
+    def key(self) -> str:
+        text = json.dumps(dataclasses.asdict(self), sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def factory(
+        repo_micropython_firmware: pathlib.Path,
+        board_variant: BoardVariant,
+        docker_image: str,
+    ) -> FirmwareCacheKey | None:
+        """
+        Return None if 'repo_micropython_firmware' is not a git repo:
+        This firmware may not be cached.
+        """
+        assert isinstance(repo_micropython_firmware, pathlib.Path)
+        assert isinstance(board_variant, BoardVariant)
+        assert isinstance(docker_image, str)
+
+        try:
+            git_commit, git_dirty_sha256 = git_fingerprint(repo_micropython_firmware)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.info(
+                f"Firmware cache disabled for {repo_micropython_firmware}: {e!r}"
+            )
+            return None
+
+        return FirmwareCacheKey(
+            git_commit=git_commit,
+            git_dirty_sha256=git_dirty_sha256,
+            board_variant=board_variant.name_normalized,
+            docker_image=docker_image,
+            docker_image_id=docker_image_id(docker_image),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FirmwareCacheEntry(LruCacheEntry):
+    @property
+    def filename_firmware(self) -> pathlib.Path:
+        return self.directory / self.metadata["firmware"]
+
+    @property
+    def filename_mpycross(self) -> pathlib.Path:
+        return self.directory / FILENAME_MPCROSS
+
+    def firmware_build_spec(self, directory: pathlib.Path) -> FirmwareBuildSpec:
+        """
+        Copy the firmware (and mpy-cross) into 'directory'
+        and return the spec.
+        """
+        assert isinstance(directory, pathlib.Path)
+
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = directory / self.filename_firmware.name
+        shutil.copyfile(self.filename_firmware, filename)
+        shutil.copy(self.filename_mpycross, directory / FILENAME_MPCROSS)
+
+        spec = FirmwareBuildSpec(
+            board_variant=BoardVariant(
+                board=self.metadata["board"],
+                variant=self.metadata["variant"],
+            ),
+            _filename=filename,
+            micropython_full_version_text=self.metadata[
+                "micropython_full_version_text"
+            ],
+        )
+        filename.with_suffix(".spec").write_text(spec.text)
+        return spec
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class FirmwareCache(LruCache[FirmwareCacheEntry]):
+    directory: pathlib.Path = DIRECTORY_FIRMWARE_CACHE
+    max_size_bytes: int = MAX_SIZE_BYTES_DEFAULT
+
+    @property
+    def name(self) -> str:
+        return "Firmware cache"
+
+    def entry_factory(self, directory: pathlib.Path) -> FirmwareCacheEntry | None:
+        metadata = LruCacheEntry.read_metadata(directory)
+        if metadata is None:
+            return None
+        return FirmwareCacheEntry(directory=directory, metadata=metadata)
+
+    def get(self, key: FirmwareCacheKey) -> FirmwareCacheEntry | None:
+        assert isinstance(key, FirmwareCacheKey)
+
+        entry = self.entry_factory(self.directory / key.key)
+        if entry is None:
+            return None
+        if not entry.filename_firmware.is_file():
+            return None
+        if not entry.filename_mpycross.is_file():
+            # Written by a previous version without mpy-cross
+            return None
+        entry.touch()
+        return entry
+
+    def put(
+        self,
+        key: FirmwareCacheKey,
+        spec: FirmwareBuildSpec,
+        filename_firmware: pathlib.Path,
+        filename_mpycross: pathlib.Path,
+    ) -> None:
+        """
+        The entry is not stored if mpy-cross is missing:
+        'get()' would never return it.
+        """
+        assert isinstance(key, FirmwareCacheKey)
+        assert isinstance(spec, FirmwareBuildSpec)
+        assert isinstance(filename_firmware, pathlib.Path)
+        assert isinstance(filename_mpycross, pathlib.Path)
+
+        if not filename_mpycross.is_file():
+            logger.info(f"Firmware cache: Not stored, missing {filename_mpycross}")
+            return
+
+        if self.get(key=key) is not None:
+            return
+        # An entry without mpy-cross is replaced
+        shutil.rmtree(self.directory / key.key, ignore_errors=True)
+
+        def write_files(directory: pathlib.Path) -> None:
+            shutil.copyfile(filename_firmware, directory / filename_firmware.name)
+            (directory / filename_firmware.name).with_suffix(".spec").write_text(
+                spec.text
+            )
+            shutil.copy(filename_mpycross, directory / FILENAME_MPCROSS)
+
+        self.put_entry(
+            key=key.key,
+            metadata={
+                **dataclasses.asdict(key),
+                "firmware": filename_firmware.name,
+                "board": spec.board_variant.board,
+                "variant": spec.board_variant.variant,
+                "micropython_full_version_text": spec.micropython_full_version_text,
+            },
+            write_files=write_files,
+        )
+
+    def find(self, key_prefix: str) -> list[FirmwareCacheEntry]:
+        assert isinstance(key_prefix, str)
+        return [e for e in self.entries if e.key.startswith(key_prefix)]
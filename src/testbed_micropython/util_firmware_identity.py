@@ -0,0 +1,206 @@
+"""
+Skip flashing if the DUT already runs the required firmware.
+
+The identity of the flashed firmware is kept on the host: The filesystem
+of the DUT is not touched.
+
+Directories and files:
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/flashed_firmware/<tentacle serial>.txt:
+   The sha256 of the firmware last flashed to the DUT of this tentacle.
+   Removed before flashing and written after flashing succeeded.
+
+Before flashing, the DUT is probed ('mptest test --flash-probe'):
+ * 'sys.version' must be part of 'micropython_full_version_text' of the firmware.
+   This covers the git commit and the build date.
+ * The record of the tentacle must contain the sha256 of the firmware.
+   This covers 'dirty' builds which do not change 'sys.version'.
+
+If the probe fails for whatever reason, the DUT will be flashed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import pathlib
+import time
+
+from octoprobe.octoprobe import CtxTestRun
+from octoprobe.util_constants import DIRECTORY_OCTOPROBE_DOWNLOADS
+from octoprobe.util_firmware_spec import FirmwareBuildSpec, FirmwareNoFlashingSpec
+from octoprobe.util_pyudev import UDEV_POLLER_LAZY
+
+from . import util_multiprocessing
+from .tentacle_spec import TentacleMicropython
+
+logger = logging.getLogger(__file__)
+
+DIRECTORY_FLASHED_FIRMWARE = DIRECTORY_OCTOPROBE_DOWNLOADS / "flashed_firmware"
+_PROBE_PREFIX = "OCTOPROBE_PROBE:"
+_CMD_PROBE = f"""
+import sys
+print('{_PROBE_PREFIX}' + sys.version)
+"""
+
+
+def firmware_sha256(filename: pathlib.Path) -> str:
+    assert isinstance(filename, pathlib.Path)
+    return hashlib.sha256(filename.read_bytes()).hexdigest()
+
+
+class FlashedFirmware:
+    """
+    The sha256 of the firmware last flashed, per tentacle serial.
+    """
+
+    def __init__(self, directory: pathlib.Path = DIRECTORY_FLASHED_FIRMWARE) -> None:
+        assert isinstance(directory, pathlib.Path)
+        self.directory = directory
+
+    def _filename(self, serial: str) -> pathlib.Path:
+        return self.directory / f"{serial}.txt"
+
+    def get(self, serial: str) -> str | None:
+        """
+        Return None if unknown.
+        """
+        assert isinstance(serial, str)
+        try:
+            return self._filename(serial).read_text().strip()
+        except OSError:
+            return None
+
+    def set(self, serial: str, sha256: str) -> None:
+        assert isinstance(serial, str)
+        assert isinstance(sha256, str)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        filename = self._filename(serial)
+        filename_tmp = filename.with_suffix(".tmp")
+        filename_tmp.write_text(sha256)
+        filename_tmp.replace(filename)
+
+    def remove(self, serial: str) -> None:
+        """
+        To be called before flashing: An interrupted flash leaves an unknown firmware.
+        """
+        assert isinstance(serial, str)
+        self._filename(serial).unlink(missing_ok=True)
+
+
+FLASHED_FIRMWARE = FlashedFirmware()
+
+
+def _probe(tentacle: TentacleMicropython) -> str:
+    """
+    Return 'sys.version'.
+    """
+    output = tentacle.dut.mp_remote.exec_raw(cmd=_CMD_PROBE)
+    for line in output.splitlines():
+        if line.startswith(_PROBE_PREFIX):
+            return line[len(_PROBE_PREFIX) :].strip()
+    raise ValueError(f"Unexpected probe output: {output!r}")
+
+
+def firmware_already_on_dut(
+    tentacle: TentacleMicropython,
+    firmware_spec: FirmwareBuildSpec,
+    sha256: str,
+) -> bool:
+    assert isinstance(tentacle, TentacleMicropython)
+    assert isinstance(firmware_spec, FirmwareBuildSpec)
+    assert isinstance(sha256, str)
+
+    sha256_flashed = FLASHED_FIRMWARE.get(serial=tentacle.tentacle_instance.serial)
+    if sha256_flashed != sha256:
+        logger.debug(
+            f"{tentacle.label_short}: Firmware probe: flashed '{sha256_flashed}' differs from '{sha256}'"
+        )
+        return False
+
+    try:
+        sys_version = _probe(tentacle=tentacle)
+    except Exception as e:
+        logger.debug(f"{tentacle.label_short}: Firmware probe failed: {e!r}")
+        return False
+
+    if sys_version not in firmware_spec.micropython_full_version_text:
+        logger.debug(
+            f"{tentacle.label_short}: Firmware probe: '{sys_version}' differs from '{firmware_spec.micropython_full_version_text}'"
+        )
+        return False
+    return True
+
+
+def setup_dut_flash(
+    ctxtestrun: CtxTestRun,
+    tentacle: TentacleMicropython,
+    directory_logs: pathlib.Path,
+    probe: bool,
+) -> None:
+    """
+    Replaces 'ctxtestrun.function_setup_dut_flash()':
+    Skip flashing if the DUT already runs the required firmware.
+
+    Sends 'EventFlash' to the main process.
+    """
+    assert isinstance(ctxtestrun, CtxTestRun)
+    assert isinstance(tentacle, TentacleMicropython)
+    assert isinstance(directory_logs, pathlib.Path)
+    assert isinstance(probe, bool)
+
+    tentacle_state = tentacle.tentacle_state
+    firmware_spec = tentacle_state.firmware_spec
+    serial = tentacle.tentacle_instance.serial
+    sha256: str | None = None
+    if isinstance(firmware_spec, FirmwareBuildSpec):
+        # The record is also maintained without 'probe': It must never be stale.
+        sha256 = firmware_sha256(firmware_spec.filename)
+
+    skipped = False
+    if (
+        probe
+        and sha256 is not None
+        and not tentacle_state.flash_force
+        and firmware_already_on_dut(
+            tentacle=tentacle,
+            firmware_spec=firmware_spec,
+            sha256=sha256,
+        )
+    ):
+        logger.info(
+            f"{tentacle.label_short}: Skip flashing: {firmware_spec.board_variant.name_normalized} is already on the DUT"
+        )
+        tentacle_state.firmware_spec = FirmwareNoFlashingSpec(
+            board_variant=firmware_spec.board_variant
+        )
+        skipped = True
+    elif firmware_spec is not None and not isinstance(
+        firmware_spec, FirmwareNoFlashingSpec
+    ):
+        # The DUT will be flashed
+        FLASHED_FIRMWARE.remove(serial=serial)
+
+    begin_s = time.monotonic()
+    try:
+        ctxtestrun.function_setup_dut_flash(
+            udev_poller=UDEV_POLLER_LAZY.udev_poller,
+            tentacle=tentacle,
+            directory_logs=directory_logs,
+        )
+    finally:
+        # Restore the spec: the report refers to the firmware
+        tentacle_state.firmware_spec = firmware_spec
+    duration_s = time.monotonic() - begin_s
+
+    if sha256 is not None and not skipped:
+        FLASHED_FIRMWARE.set(serial=serial, sha256=sha256)
+
+    if isinstance(firmware_spec, FirmwareBuildSpec):
+        util_multiprocessing.EVENTLOGCALLBACK.queue_put(
+            util_multiprocessing.EventFlash(
+                target_unique_name="",
+                tentacle=tentacle.label_short,
+                skipped=skipped,
+                duration_s=duration_s,
+            )
+        )
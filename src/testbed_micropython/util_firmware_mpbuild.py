@@ -12,11 +12,17 @@ from octoprobe.util_firmware_spec import (
 from octoprobe.util_micropython_boards import BoardVariant
 
 from .constants import is_url
-from .mpbuild.build_api import build_by_variant_normalized
+from .mpbuild.build_api import (
+    build_by_variant_normalized,
+    docker_image_by_variant_normalized,
+)
 from .tentacle_spec import (
     TentacleMicropython,
     TentacleSpecMicropython,
 )
+from .util_ccache import Ccache, CcacheStats, SUFFIX_CCACHE_STATS
+from .util_firmware_cache import FirmwareCache, FirmwareCacheKey
+from .util_mpycross import BUILD_FILENAME_MPCROSS
 
 logger = logging.getLogger(__file__)
 
@@ -110,19 +116,33 @@ class Builder:
         self.variant = variant
         self.mpbuild_artifacts = mpbuild_artifacts / self.variant.name_normalized
         self.mpbuild_artifacts.mkdir(parents=True, exist_ok=True)
+        self.ccache_stats: CcacheStats | None = None
+        """
+        Set by 'build()'. None: ccache was not used.
+        """
 
     @property
     def docker_logfile(self) -> pathlib.Path:
         return self.mpbuild_artifacts / "docker_stdout.txt"
 
-    def build(self, repo_micropython_firmware: pathlib.Path) -> FirmwareBuildSpec:
+    def build(
+        self,
+        repo_micropython_firmware: pathlib.Path,
+        firmware_cache: FirmwareCache | None = None,
+        ccache: Ccache | None = None,
+    ) -> FirmwareBuildSpec:
         """
         This will compile the firmware
 
         Input: The git repo containing the micropython source
         Output: The filename of the compiled firmware.
+
+        If 'firmware_cache' is given and contains the firmware, docker is not called.
+        If 'ccache' is given, the compiler cache is mounted into the docker container.
         """
         assert isinstance(repo_micropython_firmware, pathlib.Path)
+        assert isinstance(firmware_cache, FirmwareCache | None)
+        assert isinstance(ccache, Ccache | None)
 
         # Prepare environment
         env_micropy_dir = os.environ.get(_ENV_MICROPY_DIR, None)
@@ -140,14 +160,35 @@ class Builder:
         logger.info(f"{prefix}: source: {repo_micropython_firmware}")
         logger.info(f"{prefix}: docker output: {self.docker_logfile}")
 
-        # Call mpbuild
         db = Database(repo_micropython_firmware)
+
+        cache_key: FirmwareCacheKey | None = None
+        if firmware_cache is not None:
+            cache_key = FirmwareCacheKey.factory(
+                repo_micropython_firmware=repo_micropython_firmware,
+                board_variant=self.variant,
+                docker_image=docker_image_by_variant_normalized(
+                    db=db, variant_normalized=self.variant.name_normalized
+                ),
+            )
+        if firmware_cache is not None and cache_key is not None:
+            entry = firmware_cache.get(key=cache_key)
+            if entry is not None:
+                logger.info(f"{prefix}: taken from cache: {entry.directory}")
+                self.docker_logfile.write_text(
+                    f"Firmware taken from cache: {entry.directory}\n"
+                )
+                return entry.firmware_build_spec(directory=self.mpbuild_artifacts)
+
+        # Call mpbuild
         firmware = build_by_variant_normalized(
             logfile=self.docker_logfile,
             db=db,
             variant_normalized=self.variant.name_normalized,
             do_clean=False,
+            ccache=ccache,
         )
+        self.ccache_stats = firmware.ccache_stats
 
         # Store build results
         filename = self.mpbuild_artifacts / firmware.filename.name
@@ -163,6 +204,17 @@ class Builder:
         )
 
         filename.with_suffix(".spec").write_text(spec.text)
+        if self.ccache_stats is not None:
+            self.ccache_stats.write(filename.with_suffix(SUFFIX_CCACHE_STATS))
+            logger.info(f"{prefix}: ccache: {self.ccache_stats.text}")
+
+        if firmware_cache is not None and cache_key is not None:
+            firmware_cache.put(
+                key=cache_key,
+                spec=spec,
+                filename_firmware=filename,
+                filename_mpycross=repo_micropython_firmware / BUILD_FILENAME_MPCROSS,
+            )
 
         return spec
 
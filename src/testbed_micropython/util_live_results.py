@@ -0,0 +1,352 @@
+"""
+Live results: Per-test outcomes while a testgroup is still running.
+
+In the subprocess, 'LogfileTail' follows the logfile of
+'run-tests.py' (and friends) and sends the parsed outcomes
+as 'EventTestOutcomes' to the main process.
+
+In the main process, 'LiveResults' writes the outcomes to the console
+and optionally to a JSON-lines file.
+
+'EarlyAbortPolicy': The subprocess is terminated if too many tests fail.
+For example if the firmware is broken.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import pathlib
+import re
+import subprocess
+import threading
+import time
+import typing
+
+from octoprobe.util_baseclasses import OctoprobeTestException
+
+from . import util_multiprocessing
+from .report_task.util_report_tasks import (
+    OUTCOME_FAIL,
+    OUTCOME_PASS,
+    OUTCOME_SKIP,
+    TaskOutcomes,
+)
+
+logger = logging.getLogger(__file__)
+
+FILENAME_LIVE_RESULTS = "live_results.jsonl"
+
+
+_RE_RUNTESTS = re.compile(r"^(?P<outcome>pass|skip|lrge|FAIL)\s+(?P<test>\S+)")
+"""
+run-tests.py, run-natmodtests.py
+Example: 'pass  basics/0prelim.py'
+Example: 'FAIL  extmod/machine_i2c.py'
+"""
+_RE_MULTITESTS = re.compile(
+    r"^(?P<test>\S+) on .+: (?P<outcome>pass|skip|SKIP|FAIL)\s*$"
+)
+"""
+run-multitests.py
+Example: 'multi_net/tcp_data.py on ttyACM0 ttyACM1: pass'
+"""
+_OUTCOMES = {
+    "pass": OUTCOME_PASS,
+    "skip": OUTCOME_SKIP,
+    "SKIP": OUTCOME_SKIP,
+    "lrge": OUTCOME_SKIP,
+    "FAIL": OUTCOME_FAIL,
+}
+
+
+def parse_line(line: str) -> tuple[str, str] | None:
+    """
+    Return (outcome, test) or None if the line does not report a test outcome.
+    """
+    for regex in (_RE_RUNTESTS, _RE_MULTITESTS):
+        match = regex.match(line)
+        if match is not None:
+            return _OUTCOMES[match.group("outcome")], match.group("test")
+    return None
+
+
+class EarlyAbortException(OctoprobeTestException):
+    """
+    The test was terminated by the 'EarlyAbortPolicy'.
+    """
+
+    def __init__(self, reason: str, deterministic: bool) -> None:
+        super().__init__(f"EARLY ABORT: {reason}")
+        self.deterministic = deterministic
+        """
+        True: Not a single test passed: A retry will fail too.
+        """
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class EarlyAbortPolicy:
+    consecutive_failures: int = 0
+    """
+    Abort after this number of failed tests in a row.
+    0: Disabled
+    """
+    failure_rate: float = 0.0
+    """
+    Abort if the rate of failed tests (skipped tests are not counted)
+    reaches this value. Example 0.5: Half of the tests failed.
+    0.0: Disabled
+    """
+    min_tests: int = 50
+    """
+    'failure_rate' is only evaluated after this number of tests.
+    """
+
+    def __post_init__(self) -> None:
+        assert isinstance(self.consecutive_failures, int)
+        assert self.consecutive_failures >= 0
+        assert isinstance(self.failure_rate, float)
+        assert 0.0 <= self.failure_rate <= 1.0
+        assert isinstance(self.min_tests, int)
+
+    @property
+    def enabled(self) -> bool:
+        return self.consecutive_failures > 0 or self.failure_rate > 0.0
+
+    def check(self, outcomes: TaskOutcomes, consecutive_failures: int) -> str | None:
+        """
+        Return the reason to abort or None.
+        """
+        assert isinstance(outcomes, TaskOutcomes)
+        assert isinstance(consecutive_failures, int)
+
+        if 0 < self.consecutive_failures <= consecutive_failures:
+            return f"{consecutive_failures} tests failed in a row"
+        tests = outcomes.passed + outcomes.failed
+        if self.failure_rate > 0.0 and tests >= self.min_tests:
+            rate = outcomes.failed / tests
+            if rate >= self.failure_rate:
+                return f"{outcomes.failed} of {tests} tests failed ({rate:0.0%})"
+        return None
+
+
+EARLY_ABORT_POLICY_DISABLED = EarlyAbortPolicy()
+_EARLY_ABORT_POLICY = EARLY_ABORT_POLICY_DISABLED
+
+
+def set_early_abort_policy(policy: EarlyAbortPolicy) -> None:
+    """
+    Called in the subprocess before the test is started.
+    """
+    assert isinstance(policy, EarlyAbortPolicy)
+    global _EARLY_ABORT_POLICY  # pylint: disable=global-statement
+    _EARLY_ABORT_POLICY = policy
+
+
+def get_early_abort_policy() -> EarlyAbortPolicy:
+    return _EARLY_ABORT_POLICY
+
+
+class LogfileTail:
+    """
+    Background thread which follows a logfile and sends
+    the parsed test outcomes to the main process.
+
+    The logfile is read every 'SAMPLE_S' to measure the duration of every test.
+    Outcomes are collected and sent every 'POLL_S' to keep the queue traffic low.
+
+    If 'policy' decides to abort, 'process' is terminated.
+    """
+
+    POLL_S = 1.0
+    SAMPLE_S = 0.1
+
+    def __init__(self, logfile: pathlib.Path, policy: EarlyAbortPolicy) -> None:
+        assert isinstance(logfile, pathlib.Path)
+        assert isinstance(policy, EarlyAbortPolicy)
+        self._logfile = logfile
+        self.policy = policy
+        self._position = 0
+        self._partial_line = ""
+        self._outcomes = TaskOutcomes()
+        self._pending: list[tuple[str, str]] = []
+        self._pending_durations_s: list[float] = []
+        self._last_outcome_s = time.monotonic()
+        self._consecutive_failures = 0
+        self._process: subprocess.Popen[str] | None = None
+        self.abort_reason: str | None = None
+        self._terminated = False
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="LogfileTail", daemon=True
+        )
+
+    def set_process(self, process: subprocess.Popen[str]) -> None:
+        """
+        Callback: The subprocess has been started.
+        """
+        self._process = process
+        if self.abort_reason is not None:
+            self._terminate()
+
+    def _terminate(self) -> None:
+        assert self._process is not None
+        self._terminated = True
+        self._process.terminate()
+
+    @property
+    def early_abort_exception(self) -> EarlyAbortException | None:
+        """
+        Return None if the process has not been terminated by the policy.
+        """
+        if not self._terminated:
+            return None
+        assert self.abort_reason is not None
+        return EarlyAbortException(
+            reason=self.abort_reason,
+            deterministic=self._outcomes.passed == 0,
+        )
+
+    def _run(self) -> None:
+        next_send_s = time.monotonic() + self.POLL_S
+        while not self._stop_event.wait(timeout=self.SAMPLE_S):
+            self._read()
+            if time.monotonic() >= next_send_s:
+                next_send_s = time.monotonic() + self.POLL_S
+                self._send()
+
+    def _poll(self, final: bool = False) -> None:
+        self._read(final=final)
+        self._send()
+
+    def _read(self, final: bool = False) -> None:
+        """
+        The time since the last outcome is split evenly between
+        the outcomes which appeared within the same sample.
+        """
+        try:
+            with self._logfile.open("r", errors="replace") as f:
+                f.seek(0, 2)
+                if f.tell() < self._position:
+                    # The file has been truncated
+                    self._position = 0
+                    self._partial_line = ""
+                f.seek(self._position)
+                text = f.read()
+                self._position = f.tell()
+        except OSError:
+            # The file has not been created yet
+            return
+
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = "" if final else lines.pop()
+        outcomes = [o for o in map(parse_line, lines) if o is not None]
+        if len(outcomes) == 0:
+            return
+        now_s = time.monotonic()
+        duration_s = (now_s - self._last_outcome_s) / len(outcomes)
+        self._last_outcome_s = now_s
+        self._pending.extend(outcomes)
+        self._pending_durations_s.extend(len(outcomes) * [duration_s])
+
+    def _send(self) -> None:
+        outcomes, self._pending = self._pending, []
+        durations_s, self._pending_durations_s = self._pending_durations_s, []
+        if len(outcomes) == 0:
+            return
+        util_multiprocessing.EVENTLOGCALLBACK.queue_put(
+            util_multiprocessing.EventTestOutcomes(
+                target_unique_name="",
+                outcomes=outcomes,
+                durations_s=durations_s,
+            )
+        )
+        self._check_policy(outcomes=outcomes)
+
+    def _check_policy(self, outcomes: list[tuple[str, str]]) -> None:
+        for outcome, _test in outcomes:
+            self._outcomes.add(outcome)
+            if outcome == OUTCOME_FAIL:
+                self._consecutive_failures += 1
+            elif outcome == OUTCOME_PASS:
+                self._consecutive_failures = 0
+
+        if self.abort_reason is not None:
+            return
+        self.abort_reason = self.policy.check(
+            outcomes=self._outcomes,
+            consecutive_failures=self._consecutive_failures,
+        )
+        if self.abort_reason is None:
+            return
+        logger.warning(f"Early abort: {self.abort_reason}: Terminating {self._logfile}")
+        if self._process is not None:
+            self._terminate()
+
+    def __enter__(self) -> LogfileTail:
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self, exc_type: typing.Any, value: typing.Any, traceback: typing.Any
+    ) -> None:
+        self._stop_event.set()
+        self._thread.join(timeout=2 * self.POLL_S)
+        try:
+            # Pick up the last lines
+            self._poll(final=True)
+        except Exception as e:  # Never hide the exception of the subprocess
+            logger.exception(e)
+
+
+class LiveResults:
+    """
+    Main process: Collects the 'EventTestOutcomes' of all testgroups.
+    """
+
+    PROGRESS_INTERVAL_S = 60.0
+
+    def __init__(self, filename_jsonl: pathlib.Path | None) -> None:
+        assert isinstance(filename_jsonl, pathlib.Path | None)
+        self._filename_jsonl = filename_jsonl
+        self.outcomes = TaskOutcomes()
+        self._start_s = time.monotonic()
+        self._progress_logged_s = self._start_s
+        if filename_jsonl is not None:
+            filename_jsonl.write_text("")
+
+    def handle_event(self, event: util_multiprocessing.EventTestOutcomes) -> None:
+        assert isinstance(event, util_multiprocessing.EventTestOutcomes)
+
+        now_s = time.monotonic()
+        for outcome, test in event.outcomes:
+            self.outcomes.add(outcome)
+            if outcome == OUTCOME_FAIL:
+                logger.warning(f"[COLOR_FAILED]{event.target_unique_name}: FAIL {test}")
+
+        if self._filename_jsonl is not None:
+            with self._filename_jsonl.open("a") as f:
+                for (outcome, test), duration_s in zip(
+                    event.outcomes, event.durations_s, strict=True
+                ):
+                    line = {
+                        "time_s": round(now_s - self._start_s, 1),
+                        "duration_s": round(duration_s, 3),
+                        "testid": event.target_unique_name,
+                        "outcome": outcome,
+                        "test": test,
+                    }
+                    f.write(json.dumps(line) + "\n")
+
+        if now_s - self._progress_logged_s >= self.PROGRESS_INTERVAL_S:
+            self.log_progress()
+
+    def log_progress(self) -> None:
+        if self.outcomes.total == 0:
+            return
+        now_s = time.monotonic()
+        self._progress_logged_s = now_s
+        logger.info(
+            f"[COLOR_INFO]Live results: {self.outcomes.text(now_s - self._start_s)}"
+        )
@@ -0,0 +1,156 @@
+"""
+A persistent cache of directories, pruned by 'last used'.
+Used by 'util_firmware_cache.py' and 'util_natmod_cache.py'.
+
+Directories and files:
+ * <directory>/<key>/metadata.json
+ * <directory>/<key>/... The files of the entry
+
+Entries are written into a temporary directory and then renamed: Parallel
+processes will never see a partial entry.
+
+The cache is pruned by 'last used' (the mtime of the entry directory)
+if it grows beyond 'max_size_bytes'.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import shutil
+import time
+import typing
+
+logger = logging.getLogger(__file__)
+
+FILENAME_METADATA = "metadata.json"
+_PREFIX_TMP = "tmp-"
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class LruCacheEntry:
+    directory: pathlib.Path
+    metadata: dict[str, str]
+
+    @property
+    def key(self) -> str:
+        return self.directory.name
+
+    @property
+    def last_used_s(self) -> float:
+        return self.directory.stat().st_mtime
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(f.stat().st_size for f in self.directory.rglob("*") if f.is_file())
+
+    def touch(self) -> None:
+        os.utime(self.directory)
+
+    @staticmethod
+    def read_metadata(directory: pathlib.Path) -> dict[str, str] | None:
+        """
+        Return None if the entry has not been written completely.
+        """
+        try:
+            metadata = json.loads((directory / FILENAME_METADATA).read_text())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(metadata, dict):
+            return None
+        return metadata
+
+
+E = typing.TypeVar("E", bound=LruCacheEntry)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class LruCache(typing.Generic[E]):  # noqa: UP046
+    directory: pathlib.Path
+    max_size_bytes: int
+
+    def __post_init__(self) -> None:
+        assert isinstance(self.directory, pathlib.Path)
+        assert isinstance(self.max_size_bytes, int)
+
+    @property
+    def name(self) -> str:
+        """
+        Example: 'Firmware cache'
+        """
+        raise NotImplementedError()
+
+    def entry_factory(self, directory: pathlib.Path) -> E | None:
+        """
+        Return None if 'directory' is not a valid entry.
+        """
+        raise NotImplementedError()
+
+    def put_entry(
+        self,
+        key: str,
+        metadata: dict[str, str],
+        write_files: typing.Callable[[pathlib.Path], None],
+    ) -> None:
+        """
+        'write_files': Writes the files of the entry into the given directory.
+        """
+        assert isinstance(key, str)
+        assert isinstance(metadata, dict)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        directory_tmp = self.directory / f"{_PREFIX_TMP}{key}-{os.getpid()}"
+        shutil.rmtree(directory_tmp, ignore_errors=True)
+        directory_tmp.mkdir()
+
+        write_files(directory_tmp)
+        metadata = {**metadata, "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+        (directory_tmp / FILENAME_METADATA).write_text(json.dumps(metadata, indent=4))
+
+        try:
+            directory_tmp.rename(self.directory / key)
+        except OSError:
+            # A parallel process was faster
+            shutil.rmtree(directory_tmp, ignore_errors=True)
+            return
+
+        self.prune(max_size_bytes=self.max_size_bytes)
+
+    @property
+    def entries(self) -> list[E]:
+        """
+        Return the entries, the most recently used first.
+        """
+        if not self.directory.is_dir():
+            return []
+        entries: list[E] = []
+        for directory in self.directory.iterdir():
+            if directory.name.startswith(_PREFIX_TMP):
+                continue
+            entry = self.entry_factory(directory)
+            if entry is not None:
+                entries.append(entry)
+        entries.sort(key=lambda e: e.last_used_s, reverse=True)
+        return entries
+
+    def prune(self, max_size_bytes: int) -> list[E]:
+        """
+        Remove the least recently used entries until
+        the cache is smaller than 'max_size_bytes'.
+        Return the removed entries.
+        """
+        assert isinstance(max_size_bytes, int)
+
+        removed: list[E] = []
+        size_bytes = 0
+        for entry in self.entries:
+            size_bytes += entry.size_bytes
+            if size_bytes > max_size_bytes:
+                shutil.rmtree(entry.directory, ignore_errors=True)
+                removed.append(entry)
+        for entry in removed:
+            logger.debug(f"{self.name}: Removed {entry.key}")
+        return removed
@@ -0,0 +1,214 @@
+"""
+A persistent cache of the micropython-lib packages installed by mip.
+
+Directories and files:
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/mip_cache/package/<mpy version>/<package>/latest.json
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/mip_cache/file/<short hash[:2]>/<short hash>
+
+The layout follows the mip index (https://micropython.org/pi/v2):
+ * <mpy version>: For example '6' for .mpy files, 'py' for .py files.
+ * 'latest.json' lists the files ('hashes') and the dependencies ('deps').
+ * The files are addressed by their hash and therefore shared by all
+   packages and versions.
+
+'latest.json' is only downloaded if the cached version is older than
+'max_age_s': Every testrun is its own process and reads the cache written
+by the previous testruns. The cached version is used if the index is
+not reachable: The tests also run offline. A failed download touches the
+cached version: The other processes do not retry within 'max_age_s'.
+
+Files are written into a temporary file and then renamed: Parallel
+tentacles will never see a partial file.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+import typing
+
+import requests
+from octoprobe.util_constants import DIRECTORY_OCTOPROBE_DOWNLOADS
+
+logger = logging.getLogger(__file__)
+
+DIRECTORY_MIP_CACHE = DIRECTORY_OCTOPROBE_DOWNLOADS / "mip_cache"
+MIP_INDEX = "https://micropython.org/pi/v2"
+MPY_VERSION_PY = "py"
+"""
+The mpy version of boards without .mpy support: Install the .py files.
+"""
+_TIMEOUT_S = 20.0
+MAX_AGE_S = 3600.0
+
+
+class MipCacheException(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class MipFile:
+    path: str
+    """
+    The path relative to the 'lib' directory on the device.
+    Example: 'unittest/__init__.mpy'
+    """
+    filename: pathlib.Path
+    """
+    The file in the cache.
+    """
+
+
+def mpy_version(mpy: int) -> str:
+    """
+    'mpy': 'sys.implementation._mpy' of the device, 0 if not available.
+    Return the mpy version as used by the mip index.
+    """
+    assert isinstance(mpy, int)
+    if mpy == 0:
+        return MPY_VERSION_PY
+    return str(mpy & 0xFF)
+
+
+def _write_atomic(filename: pathlib.Path, data: bytes) -> None:
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    filename_tmp = filename.with_name(
+        f"{filename.name}.tmp-{os.getpid()}-{threading.get_ident()}"
+    )
+    filename_tmp.write_bytes(data)
+    filename_tmp.replace(filename)
+
+
+def _parse_package_json(data: bytes | str) -> dict[str, typing.Any]:
+    """
+    Raises ValueError if 'data' is not a 'latest.json'.
+    """
+    package_json = json.loads(data)
+    if not isinstance(package_json, dict):
+        raise ValueError(f"Expected a json object, got {type(package_json).__name__}")
+    return package_json
+
+
+@dataclasses.dataclass(slots=True)
+class MipCache:
+    directory: pathlib.Path = DIRECTORY_MIP_CACHE
+    index: str = MIP_INDEX
+    max_age_s: float = MAX_AGE_S
+    """
+    A cached 'latest.json' younger than this is used without downloading.
+    0.0: Always download.
+    """
+    _packages_fetched: set[str] = dataclasses.field(default_factory=set)
+    """
+    'latest.json' is downloaded at most once per process.
+    """
+
+    def __post_init__(self) -> None:
+        assert isinstance(self.directory, pathlib.Path)
+        assert isinstance(self.index, str)
+        assert isinstance(self.max_age_s, float)
+
+    def _is_fresh(self, filename: pathlib.Path) -> bool:
+        try:
+            age_s = time.time() - filename.stat().st_mtime
+        except OSError:
+            return False
+        return age_s < self.max_age_s
+
+    def _download(self, url: str) -> bytes:
+        response = requests.get(url, timeout=_TIMEOUT_S)
+        response.raise_for_status()
+        return response.content
+
+    def filename_package(self, package: str, mpy_version: str) -> pathlib.Path:
+        return self.directory / "package" / mpy_version / package / "latest.json"
+
+    def filename_file(self, short_hash: str) -> pathlib.Path:
+        return self.directory / "file" / short_hash[:2] / short_hash
+
+    def package_json(self, package: str, mpy_version: str) -> dict[str, typing.Any]:
+        """
+        Return 'latest.json' of the package.
+        Falls back to the cached version if the index is not reachable.
+        """
+        assert isinstance(package, str)
+        assert isinstance(mpy_version, str)
+
+        filename = self.filename_package(package=package, mpy_version=mpy_version)
+        key = f"{mpy_version}/{package}"
+        if key not in self._packages_fetched and not self._is_fresh(filename):
+            url = f"{self.index}/package/{mpy_version}/{package}/latest.json"
+            try:
+                data = self._download(url)
+                _parse_package_json(data)
+            except (requests.RequestException, ValueError) as e:
+                if not filename.is_file():
+                    raise MipCacheException(
+                        f"Failed to download {url} and not cached: {e!r}"
+                    ) from e
+                logger.info(f"mip cache: Using cached {filename}: {e!r}")
+                # The other processes do not retry within 'max_age_s'
+                filename.touch()
+            else:
+                _write_atomic(filename, data)
+            self._packages_fetched.add(key)
+
+        try:
+            return _parse_package_json(filename.read_text())
+        except (OSError, ValueError) as e:
+            raise MipCacheException(f"Failed to read {filename}: {e!r}") from e
+
+    def file(self, short_hash: str) -> pathlib.Path:
+        """
+        Return the file in the cache. Download it if required.
+        """
+        assert isinstance(short_hash, str)
+
+        filename = self.filename_file(short_hash)
+        if filename.is_file():
+            return filename
+
+        url = f"{self.index}/file/{short_hash[:2]}/{short_hash}"
+        try:
+            data = self._download(url)
+        except requests.RequestException as e:
+            raise MipCacheException(f"Failed to download {url}: {e!r}") from e
+        if not hashlib.sha256(data).hexdigest().startswith(short_hash):
+            raise MipCacheException(f"{url}: Hash mismatch")
+        _write_atomic(filename, data)
+        return filename
+
+    def resolve(self, packages: list[str], mpy_version: str) -> list[MipFile]:
+        """
+        Return the files of the packages including all dependencies.
+        """
+        assert isinstance(packages, list)
+        assert isinstance(mpy_version, str)
+
+        files: dict[str, MipFile] = {}
+        todo = list(packages)
+        done: set[str] = set()
+        while len(todo) > 0:
+            package = todo.pop(0)
+            if package in done:
+                continue
+            done.add(package)
+            package_json = self.package_json(package=package, mpy_version=mpy_version)
+            if len(package_json.get("urls", [])) > 0:
+                raise MipCacheException(
+                    f"Package '{package}': 'urls' outside the index are not supported"
+                )
+            for path, short_hash in package_json.get("hashes", []):
+                files[path] = MipFile(path=path, filename=self.file(short_hash))
+            for dep, _version in package_json.get("deps", []):
+                todo.append(dep)
+        return list(files.values())
+
+
+MIP_CACHE = MipCache()
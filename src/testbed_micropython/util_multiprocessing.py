@@ -7,6 +7,8 @@ Features:
 * Subprocess queue to host process:
   * User defined events
 * Scheduling of process terminations and reading the queue
+* Deadline heap: The main process sleeps until an event arrives
+  or the next timeout deadline is due
 
 Same interface as sync and async
 """
@@ -14,6 +16,9 @@ Same interface as sync and async
 from __future__ import annotations
 
 import contextlib
+import copy
+import heapq
+import itertools
 import logging
 import multiprocessing as mp
 import multiprocessing.process as mpp
@@ -41,9 +46,30 @@ class EventLogCallback:
         self._arg1 = arg1
         self._callback = self._callback_event
 
+    @property
+    def is_subprocess(self) -> bool:
+        """
+        True: Events will be sent to the main process.
+        """
+        return self._arg1 is not None
+
     def log(self, msg: str, target_unique_name: str | None = None) -> None:
         self._callback(msg=msg, target_unique_name=target_unique_name)
 
+    def queue_put(self, event: EventBase) -> None:
+        """
+        Send an event to the main process.
+        An empty 'target_unique_name' is replaced by the name of this subprocess.
+        If running in one process, the event is dropped.
+        """
+        assert isinstance(event, EventBase)
+        if self._arg1 is None:
+            logger.debug(f"Event dropped: {event}")
+            return
+        if event.target_unique_name == "":
+            event.target_unique_name = self._arg1.target_unique_name
+        self._arg1.queue_put(event)
+
     def _callback_empty(self, msg: str, target_unique_name: str | None) -> None:
         """
         This callback will be used if running in one process
@@ -137,28 +163,95 @@ class AsyncTarget:
         self.target_func: typing.Callable[..., typing.Any] = func
         self.target_args: list[typing.Any] = func_args
         self.timeout_s = timeout_s
+        self.event_flashes: dict[str, EventFlash] = {}
+        """
+        Key: tentacle.label_short
+        """
+        self.test_outcomes = util_report_tasks.TaskOutcomes()
+        self.phases_s: dict[tuple[str, str], float] = {}
+        """
+        Key: (tentacle, phase), for example ("5f2c-RPI_PICO_W", util_report_tasks.PHASE_MIP)
+        tentacle "": The phase concerns all tentacles of the testrun.
+        """
+
+    def add_event_test_outcomes(self, event: EventTestOutcomes) -> None:
+        assert isinstance(event, EventTestOutcomes)
+        for outcome, _test in event.outcomes:
+            self.test_outcomes.add(outcome)
+
+    def add_event_flash(self, event: EventFlash) -> None:
+        """
+        A test might be repeated: Only the first flash is relevant.
+        """
+        assert isinstance(event, EventFlash)
+        self.event_flashes.setdefault(event.tentacle, event)
+
+    def add_event_phase(self, event: EventPhase) -> None:
+        """
+        The phases of all attempts are summed up.
+        """
+        assert isinstance(event, EventPhase)
+        key = (event.tentacle, event.phase)
+        self.phases_s[key] = self.phases_s.get(key, 0.0) + event.exclusive_s
+
+    def phases_by_tentacle(self, tentacle: str) -> dict[str, float]:
+        """
+        tentacle "": The phases which concern all tentacles.
+        """
+        assert isinstance(tentacle, str)
+        return {
+            phase: round(duration_s, 1)
+            for (_tentacle, phase), duration_s in self.phases_s.items()
+            if _tentacle == tentacle
+        }
 
     def __str__(self) -> str:
         return f"{self.target_unique_name} target={self.target_optional!r}"
 
+    @property
+    def worker_key(self) -> str | None:
+        """
+        Targets with the same key may run in the same persistent worker.
+        None: Always start a new process.
+        """
+        return None
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self})"
 
     @property
     def report_task(self) -> util_report_tasks.Task:
-        report_tentacles = [
-            util_report_tasks.ReportTentacle(
+        assert self.target.end_s is not None
+        return self.report_task_at(end_s=self.target.end_s, running=False)
+
+    def report_task_running(self) -> util_report_tasks.Task:
+        """
+        A snapshot of a task which is still running.
+        """
+        return self.report_task_at(end_s=time.monotonic(), running=True)
+
+    def report_task_at(self, end_s: float, running: bool) -> util_report_tasks.Task:
+        def report_tentacle(t: TentacleMicropython) -> util_report_tasks.ReportTentacle:
+            event_flash = self.event_flashes.get(t.label_short, None)
+            return util_report_tasks.ReportTentacle(
                 label=t.label_short,
                 board_variant=t.tentacle_state.firmware_spec.board_variant.name_normalized,
+                flash_skipped=False if event_flash is None else event_flash.skipped,
+                flash_duration_s=None
+                if event_flash is None
+                else round(event_flash.duration_s, 1),
+                phases=self.phases_by_tentacle(tentacle=t.label_short),
             )
-            for t in self.tentacles
-        ]
-        assert self.target.end_s is not None
+
+        report_tentacles = [report_tentacle(t) for t in self.tentacles]
         return util_report_tasks.Task(
             start_s=self.target.start_s,
-            end_s=self.target.end_s,
+            end_s=end_s,
             label=self.target_unique_name,
             tentacles=report_tentacles,
+            outcomes=copy.copy(self.test_outcomes),
+            running=running,
+            phases=self.phases_by_tentacle(tentacle=""),
         )
 
     def log_started(self) -> None:
@@ -181,8 +274,8 @@ class AsyncTarget:
     def fake_start(self) -> None:
         self.target_optional = Target(
             multiprocessing=False,
-            timeout_s=60.0,
-            process=mp.Process(),
+            timeout_s=self.timeout_s,
+            process=mp.Process(name=self.target_unique_name),
         )
 
     def fake_join(self) -> None:
@@ -280,23 +373,40 @@ class Target:
         assert self.end_s is not None
         return self.end_s - self.start_s
 
+    @property
+    def deadlines_s(self) -> tuple[float, float]:
+        """
+        The points in time when 'timeout_reached()' has to be called:
+        The timeout notification and the timeout.
+        """
+        return (
+            self.start_s + self._timeout_notification_s,
+            self.start_s + self.timeout_s,
+        )
+
     def join(self) -> None:
         assert not self.has_been_joined
         begin_s = time.monotonic()
         if self.multiprocessing:
-            self._process.join()
+            self._join_process()
         duration_s = time.monotonic() - begin_s
         self.has_been_joined = True
         self.end_s = time.monotonic()
         if duration_s > 1.0:
             logger.warning(f".join() took {duration_s}s. This should be below 0.5s!")
 
+    def _join_process(self) -> None:
+        self._process.join()
+
+    def _kill(self) -> None:
+        self._process.kill()
+
     def timeout_reached(self) -> bool:
         """
         Return True: If a process has been killed and the processlist was modified.
         In this case, the calling method must not use the process list anymore!
         """
-        if self._process.is_alive():
+        if self.is_alive:
             livetime_s = self.livetime_s
             if not self._timeout_notification_sent:
                 if livetime_s > self._timeout_notification_s:
@@ -305,7 +415,7 @@ class Target:
                     )
                     self._timeout_notification_sent = True
             if livetime_s > self.timeout_s:
-                self._process.kill()
+                self._kill()
                 self.join()
                 return True
         return False
@@ -347,16 +457,307 @@ class Target:
         return self._process.is_alive()
 
 
+@dataclass(repr=True)
+class Job:
+    """
+    A target to be called in a persistent worker.
+    In contrast to 'TargetArg1', a job does not contain the queue:
+    The queue is passed to the worker when it is spawned.
+    """
+
+    target_unique_name: str
+    func: typing.Callable[..., typing.Any]
+    func_args: list[typing.Any]
+    initfunc: typing.Callable[..., typing.Any]
+
+
+def target_worker(queue: mp.Queue[EventBase], queue_jobs: mp.Queue[Job | None]) -> None:
+    """
+    The main loop of a persistent worker.
+    Imports, the udev poller etc. stay initialized between the jobs.
+    'None' terminates the worker.
+    """
+    while True:
+        job = queue_jobs.get()
+        if job is None:
+            return
+        arg1 = TargetArg1(
+            target_unique_name=job.target_unique_name,
+            queue=queue,
+            initfunc=job.initfunc,
+        )
+        try:
+            job.func(arg1, *job.func_args)
+        except Exception as e:
+            # The target should send the exit event itself.
+            # If not, the timeout in the main process will recycle this worker.
+            logger.exception(f"{job.target_unique_name}: {e!r}", exc_info=e)
+
+
+class Worker:
+    """
+    A persistent process which runs one job after the other.
+    """
+
+    def __init__(
+        self,
+        ctx: typing.Any,
+        key: str,
+        queue: mp.Queue[EventBase],
+    ) -> None:
+        assert isinstance(key, str)
+        self.key = key
+        self.queue_jobs: mp.Queue[Job | None] = ctx.Queue()
+        self.process: mpp.BaseProcess = ctx.Process(
+            name=f"worker-{key}",
+            target=target_worker,
+            args=(queue, self.queue_jobs),
+        )
+        self.process.start()
+        self.busy = False
+        """
+        True: A job has been submitted and not been joined yet.
+        """
+        self.idle_since_s = time.monotonic()
+        logger.debug(f"{self.process.name}: started")
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.key}, is_alive={self.is_alive}, busy={self.busy})"
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    @property
+    def idle_s(self) -> float:
+        """
+        0.0: The worker is busy.
+        """
+        if self.busy:
+            return 0.0
+        return time.monotonic() - self.idle_since_s
+
+    def submit(self, job: Job) -> None:
+        assert isinstance(job, Job)
+        assert not self.busy, f"{self.process.name}: Already busy"
+        self.busy = True
+        self.queue_jobs.put(job)
+
+    def job_done(self) -> None:
+        """
+        The job has been joined: The worker is idle.
+        """
+        self.busy = False
+        self.idle_since_s = time.monotonic()
+
+    def kill(self) -> None:
+        """
+        The watchdog: A job reached its timeout.
+        """
+        logger.debug(f"{self.process.name}: killed")
+        self.process.kill()
+        self.process.join()
+
+    def close(self, timeout_s: float) -> None:
+        if self.is_alive:
+            self.queue_jobs.put(None)
+            self.process.join(timeout=timeout_s)
+        if self.is_alive:
+            self.kill()
+
+
+class Workers(dict[str, Worker]):
+    """
+    Key: 'AsyncTarget.worker_key'
+
+    Idle workers are recycled:
+    * A worker which was idle for more than 'max_idle_s' is closed.
+    * At most 'max_workers' workers are kept: The workers idle the longest are closed first.
+      Busy workers are never closed: If all workers are busy, 'max_workers' may be exceeded.
+    """
+
+    CLOSE_TIMEOUT_S = 5.0
+    MAX_WORKERS = 16
+    MAX_IDLE_S = 300.0
+
+    def __init__(
+        self, max_workers: int = MAX_WORKERS, max_idle_s: float = MAX_IDLE_S
+    ) -> None:
+        assert isinstance(max_workers, int)
+        assert max_workers >= 1
+        assert isinstance(max_idle_s, float)
+        super().__init__()
+        self.max_workers = max_workers
+        self.max_idle_s = max_idle_s
+
+    def get_worker(
+        self, ctx: typing.Any, key: str, queue: mp.Queue[EventBase]
+    ) -> Worker:
+        """
+        Return the worker for 'key'.
+        A worker which has been killed (or died) is replaced.
+        """
+        worker = self.get(key, None)
+        if worker is None or not worker.is_alive:
+            self.pop(key, None)
+            self.recycle(reserve=1)
+            worker = Worker(ctx=ctx, key=key, queue=queue)
+            self[key] = worker
+        return worker
+
+    def recycle(self, reserve: int = 0) -> None:
+        """
+        Close the dead workers, the workers idle for too long and the
+        workers idle the longest until 'reserve' workers may be added.
+        """
+        assert isinstance(reserve, int)
+
+        for key, worker in list(self.items()):
+            if not worker.is_alive:
+                del self[key]
+            elif worker.idle_s > self.max_idle_s:
+                logger.debug(f"{worker.process.name}: idle for {worker.idle_s:0.0f}s")
+                self._close(key)
+
+        idle_keys = sorted(
+            (key for key, worker in self.items() if not worker.busy),
+            key=lambda key: self[key].idle_since_s,
+        )
+        for key in idle_keys:
+            if len(self) + reserve <= self.max_workers:
+                break
+            self._close(key)
+
+    def _close(self, key: str) -> None:
+        worker = self.pop(key)
+        worker.close(timeout_s=self.CLOSE_TIMEOUT_S)
+
+    def close(self) -> None:
+        for worker in self.values():
+            worker.close(timeout_s=self.CLOSE_TIMEOUT_S)
+        self.clear()
+
+
+class TargetJob(Target):
+    """
+    A target running as a job in a persistent worker.
+    'join()' does not join the process as the worker continues to run.
+    On timeout, the worker is killed: It will be replaced by a new worker.
+    """
+
+    def __init__(
+        self,
+        worker: Worker,
+        target_unique_name: str,
+        timeout_s: float,
+    ) -> None:
+        assert isinstance(worker, Worker)
+        assert isinstance(target_unique_name, str)
+        super().__init__(process=worker.process, timeout_s=timeout_s)
+        self._worker = worker
+        self._target_unique_name = target_unique_name
+
+    @typing.override
+    def _join_process(self) -> None:
+        # The worker continues to run
+        self._worker.job_done()
+
+    @typing.override
+    def _kill(self) -> None:
+        self._worker.kill()
+
+    @property
+    @typing.override
+    def name(self) -> str:
+        return self._target_unique_name
+
+    @property
+    @typing.override
+    def is_alive(self) -> bool:
+        return (not self.has_been_joined) and self._worker.is_alive
+
+
+class Deadlines:
+    """
+    A heap with the deadlines of all started targets.
+
+    This allows the main process to sleep until the next deadline
+    instead of scanning all targets for timeouts in a polling loop.
+    Deadlines of targets which have been joined in the meantime
+    are dropped lazily.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, Target]] = []
+        # Tie breaker: 'Target' does not support '<'
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        self._drop_joined()
+        return len(self._heap)
+
+    def push(self, target: Target) -> None:
+        assert isinstance(target, Target)
+        for deadline_s in target.deadlines_s:
+            heapq.heappush(self._heap, (deadline_s, next(self._counter), target))
+
+    def _drop_joined(self) -> None:
+        while len(self._heap) > 0:
+            _deadline_s, _counter, target = self._heap[0]
+            if not target.has_been_joined:
+                return
+            heapq.heappop(self._heap)
+
+    @property
+    def next_deadline_s(self) -> float | None:
+        """
+        Return the next deadline or None if there is no target running.
+        """
+        self._drop_joined()
+        if len(self._heap) == 0:
+            return None
+        return self._heap[0][0]
+
+    def pop_reached(self) -> bool:
+        """
+        Return True if at least one deadline has been passed.
+        The passed deadlines are removed from the heap.
+        """
+        now_s = time.monotonic()
+        reached = False
+        while True:
+            next_deadline_s = self.next_deadline_s
+            if next_deadline_s is None:
+                return reached
+            if next_deadline_s >= now_s:
+                return reached
+            heapq.heappop(self._heap)
+            reached = True
+
+
 class TargetCtx:
+    MAX_WAIT_S = 10.0
+    """
+    'iter_queue()' will wait at most this time for an event.
+    This is a safety net: Normally an event or a deadline will wake up the main process earlier.
+    """
+
     def __init__(
-        self, multiprocessing: bool, initfunc: typing.Callable[..., typing.Any]
+        self,
+        multiprocessing: bool,
+        initfunc: typing.Callable[..., typing.Any],
+        persistent_workers: bool = False,
     ) -> None:
         """
         is_multiprocessing == False: This will call the target directly, eg. in the same
         process. This is useful for debugging.
+
+        persistent_workers == True: Targets with a 'worker_key' are run as jobs
+        in persistent workers instead of a new process per target.
         """
         assert isinstance(multiprocessing, bool)
         assert callable(initfunc)
+        assert isinstance(persistent_workers, bool)
 
         self.multiprocessing = multiprocessing
         self.ctx = mp.get_context("spawn")
@@ -364,6 +765,9 @@ class TargetCtx:
         self.bartender_token: typing.Any = None
         self.initfunc = initfunc
         self.begin_s = time.monotonic()
+        self.deadlines = Deadlines()
+        self.persistent_workers = persistent_workers
+        self.workers = Workers()
 
     def __enter__(self) -> TargetCtx:
         return self
@@ -371,7 +775,7 @@ class TargetCtx:
     def __exit__(
         self, exc_type: typing.Any, exc_val: typing.Any, exc_tb: typing.Any
     ) -> None:
-        pass
+        self.workers.close()
 
     def start(self, async_target: AsyncTarget) -> None:
         assert isinstance(async_target, AsyncTarget)
@@ -382,6 +786,11 @@ class TargetCtx:
         assert isinstance(async_target.timeout_s, float)
         target_unique_name = async_target.target_unique_name
 
+        worker_key = async_target.worker_key
+        if self.multiprocessing and self.persistent_workers and worker_key is not None:
+            self._start_job(async_target=async_target, worker_key=worker_key)
+            return
+
         target_args_complete = [
             TargetArg1(
                 target_unique_name=target_unique_name,
@@ -400,6 +809,7 @@ class TargetCtx:
             process=process,
             timeout_s=async_target.timeout_s,
         )
+        self.deadlines.push(async_target.target)
 
         if self.multiprocessing:
             # Start the process
@@ -408,12 +818,57 @@ class TargetCtx:
             # Call the function directly
             async_target.target_func(*target_args_complete)
 
-    def iter_queue(self) -> typing.Iterator[EventBase]:
+    def _start_job(self, async_target: AsyncTarget, worker_key: str) -> None:
+        worker = self.workers.get_worker(ctx=self.ctx, key=worker_key, queue=self.queue)
+        async_target.target = TargetJob(
+            worker=worker,
+            target_unique_name=async_target.target_unique_name,
+            timeout_s=async_target.timeout_s,
+        )
+        self.deadlines.push(async_target.target)
+        worker.submit(
+            Job(
+                target_unique_name=async_target.target_unique_name,
+                func=async_target.target_func,
+                func_args=async_target.target_args,
+                initfunc=self.initfunc,
+            )
+        )
+
+    @property
+    def wait_s(self) -> float:
+        """
+        The time to wait for an event before the next deadline is due.
+        """
+        next_deadline_s = self.deadlines.next_deadline_s
+        if next_deadline_s is None:
+            return self.MAX_WAIT_S
+        wait_s = next_deadline_s - time.monotonic()
+        return min(max(wait_s, 0.0), self.MAX_WAIT_S)
+
+    def deadline_reached(self) -> bool:
+        """
+        Return True if the timeouts have to be handled.
+        """
+        return self.deadlines.pop_reached()
+
+    def iter_queue(self, timeout_s: float = 0.1) -> typing.Iterator[EventBase]:
+        """
+        Wait up to 'timeout_s' for the first event.
+        Then return all events which are already in the queue without waiting.
+        """
+        assert isinstance(timeout_s, float)
+
+        block_timeout_s: float | None = timeout_s
         while True:
             try:
-                event = self.queue.get(timeout=0.1)
+                if block_timeout_s is None:
+                    event = self.queue.get_nowait()
+                else:
+                    event = self.queue.get(timeout=block_timeout_s)
             except Empty:
                 break
+            block_timeout_s = None
             assert isinstance(event, EventBase), f"Unexpected event: {event!r}"
             logger.debug(f"{event.target_unique_name}: Queue get: {event}")
             yield event
@@ -480,3 +935,66 @@ class EventExit(EventBase):
 @dataclass(repr=True)
 class EventLog(EventBase):
     msg: str
+
+
+@dataclass(repr=True)
+class EventFlash(EventBase):
+    """
+    A firmware had to be flashed.
+    """
+
+    tentacle: str
+    """
+    Example: 5f2c-RPI_PICO_W
+    """
+    skipped: bool
+    """
+    True: The firmware was already on the DUT.
+    """
+    duration_s: float
+
+
+@dataclass(repr=True)
+class EventPhase(EventBase):
+    """
+    A span of the setup, test or teardown has ended.
+    See 'util_phases.py'.
+    """
+
+    span: str
+    """
+    Example: 'mip_install'
+    """
+    phase: str
+    """
+    Example: util_report_tasks.PHASE_MIP
+    """
+    tentacle: str
+    """
+    Example: 5f2c-RPI_PICO_W
+    "": All tentacles of the testrun.
+    """
+    start_s: float
+    end_s: float
+    exclusive_s: float
+    """
+    The duration without the nested spans.
+    """
+
+
+@dataclass(repr=True)
+class EventTestOutcomes(EventBase):
+    """
+    Per-test outcomes parsed from the output of a running test.
+    """
+
+    outcomes: list[tuple[str, str]]
+    """
+    Example: [('pass', 'basics/0prelim.py'), ('fail', 'extmod/machine_i2c.py')]
+    """
+    durations_s: list[float]
+    """
+    For every outcome: The time since the previous outcome was written to the logfile.
+    Resolution: 'LogfileTail.SAMPLE_S'.
+    The duration of the first outcome includes the startup of the test.
+    """
@@ -0,0 +1,141 @@
+"""
+A persistent cache of the compiled natmod examples (see 'run_natmodtests.py').
+
+Directories and files:
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/natmod_cache/<key>/metadata.json
+ * DIRECTORY_OCTOPROBE_DOWNLOADS/natmod_cache/<key>/<example>/<example>_<arch>.mpy
+
+The key is a hash over
+ * the git commit of the micropython tests repo
+ * the uncommitted changes (git diff HEAD)
+ * the arch
+ * the docker image used to compile
+
+Storing and pruning: See 'util_lru_cache.py'.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import pathlib
+import shutil
+import subprocess
+
+from octoprobe.util_constants import DIRECTORY_OCTOPROBE_DOWNLOADS
+
+from .util_firmware_cache import docker_image_id, git_fingerprint
+from .util_lru_cache import LruCache, LruCacheEntry
+
+logger = logging.getLogger(__file__)
+
+DIRECTORY_NATMOD_CACHE = DIRECTORY_OCTOPROBE_DOWNLOADS / "natmod_cache"
+MAX_SIZE_BYTES_DEFAULT = 200 * 1024**2
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class NatmodCacheKey:
+    git_commit: str
+    git_dirty_sha256: str
+    """
+    "" if the git repo is clean.
+    The untracked files are ignored: The compiled examples are untracked.
+    """
+    arch: str
+    """
+    Example: 'armv6m'
+    """
+    docker_image: str
+    docker_image_id: str
+
+    @property
+    def key(self) -> str:
+        text = json.dumps(dataclasses.asdict(self), sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def factory(
+        repo_micropython_tests: pathlib.Path,
+        arch: str,
+        docker_image: str,
+    ) -> NatmodCacheKey | None:
+        """
+        Return None if 'repo_micropython_tests' is not a git repo:
+        The examples may not be cached.
+        """
+        assert isinstance(repo_micropython_tests, pathlib.Path)
+        assert isinstance(arch, str)
+        assert isinstance(docker_image, str)
+
+        try:
+            git_commit, git_dirty_sha256 = git_fingerprint(
+                repo_micropython_tests, untracked=False
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.info(f"Natmod cache disabled for {repo_micropython_tests}: {e!r}")
+            return None
+
+        return NatmodCacheKey(
+            git_commit=git_commit,
+            git_dirty_sha256=git_dirty_sha256,
+            arch=arch,
+            docker_image=docker_image,
+            docker_image_id=docker_image_id(docker_image),
+        )
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class NatmodCache(LruCache[LruCacheEntry]):
+    directory: pathlib.Path = DIRECTORY_NATMOD_CACHE
+    max_size_bytes: int = MAX_SIZE_BYTES_DEFAULT
+
+    @property
+    def name(self) -> str:
+        return "Natmod cache"
+
+    def entry_factory(self, directory: pathlib.Path) -> LruCacheEntry | None:
+        metadata = LruCacheEntry.read_metadata(directory)
+        if metadata is None:
+            return None
+        return LruCacheEntry(directory=directory, metadata=metadata)
+
+    def restore(self, key: NatmodCacheKey, directory_natmod: pathlib.Path) -> bool:
+        """
+        Copy the cached examples into 'directory_natmod' ('examples/natmod').
+        Return False if not cached.
+        """
+        assert isinstance(key, NatmodCacheKey)
+        assert isinstance(directory_natmod, pathlib.Path)
+
+        entry = self.entry_factory(self.directory / key.key)
+        if entry is None:
+            return False
+        for filename in entry.directory.glob("*/*.mpy"):
+            shutil.copyfile(
+                filename,
+                directory_natmod / filename.parent.name / filename.name,
+            )
+        entry.touch()
+        return True
+
+    def put(self, key: NatmodCacheKey, filenames: list[pathlib.Path]) -> None:
+        """
+        'filenames': The compiled examples: 'examples/natmod/<example>/<file>.mpy'
+        """
+        assert isinstance(key, NatmodCacheKey)
+        assert isinstance(filenames, list)
+
+        if (self.directory / key.key).exists():
+            return
+
+        def write_files(directory: pathlib.Path) -> None:
+            for filename in filenames:
+                directory_example = directory / filename.parent.name
+                directory_example.mkdir(exist_ok=True)
+                shutil.copyfile(filename, directory_example / filename.name)
+
+        self.put_entry(
+            key=key.key, metadata=dataclasses.asdict(key), write_files=write_files
+        )
@@ -0,0 +1,180 @@
+"""
+Phases: Where the time of a testrun goes.
+
+In the subprocess, the setup, the test and the teardown are wrapped into spans:
+
+    with PHASES.span(SPAN_SETUP_RELAYS):
+        ctxtestrun.setup_relays(...)
+
+When a span ends, 'EventPhase' is sent to the main process.
+The task report sums up the phases per testrun and tentacle.
+
+At the end of every attempt, the spans are written to
+FILENAME_PHASES_JSON next to 'context_testgroup.json'.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import json
+import logging
+import pathlib
+import time
+import typing
+
+from . import util_multiprocessing
+from .report_task.util_report_tasks import (
+    PHASE_FLASH,
+    PHASE_MIP,
+    PHASE_OTHER,
+    PHASE_RELAYS,
+    PHASE_TEARDOWN,
+    PHASE_TEST,
+)
+
+logger = logging.getLogger(__file__)
+
+SPAN_SETUP_INFRA = "function_setup_infra"
+SPAN_PREPARE_DUT = "function_prepare_dut"
+SPAN_SETUP_DUT_FLASH = "function_setup_dut_flash"
+SPAN_SETUP_RELAYS = "setup_relays"
+SPAN_MIP_INSTALL = "mip_install"
+SPAN_SKIP_IF_NO_FILESYSTEM = "skip_if_no_filesystem"
+SPAN_TEST = "test"
+SPAN_TEARDOWN = "function_teardown"
+
+PHASE_BY_SPAN = {
+    SPAN_SETUP_INFRA: PHASE_OTHER,
+    SPAN_PREPARE_DUT: PHASE_OTHER,
+    SPAN_SETUP_DUT_FLASH: PHASE_FLASH,
+    SPAN_SETUP_RELAYS: PHASE_RELAYS,
+    SPAN_MIP_INSTALL: PHASE_MIP,
+    SPAN_SKIP_IF_NO_FILESYSTEM: PHASE_OTHER,
+    SPAN_TEST: PHASE_TEST,
+    SPAN_TEARDOWN: PHASE_TEARDOWN,
+}
+"""
+key: span
+value: the phase in the task report
+"""
+
+
+@dataclasses.dataclass(repr=True, slots=True)
+class Span:
+    name: str
+    """
+    Example: SPAN_MIP_INSTALL
+    """
+    start_s: float
+    """
+    time.monotonic(): The same clock as the tasks in the task report.
+    """
+    end_s: float
+    exclusive_s: float
+    """
+    The duration without the nested spans.
+    Example: SPAN_TEST without SPAN_MIP_INSTALL.
+    """
+    tentacle: str = ""
+    """
+    Example: 5f2c-RPI_PICO_W
+    "": The span concerns all tentacles of the testrun.
+    """
+    parent: str = ""
+    """
+    The name of the enclosing span.
+    """
+
+    @property
+    def duration_s(self) -> float:
+        return self.end_s - self.start_s
+
+    @property
+    def phase(self) -> str:
+        return PHASE_BY_SPAN.get(self.name, PHASE_OTHER)
+
+    def event_phase(
+        self, target_unique_name: str = ""
+    ) -> util_multiprocessing.EventPhase:
+        return util_multiprocessing.EventPhase(
+            target_unique_name=target_unique_name,
+            span=self.name,
+            phase=self.phase,
+            tentacle=self.tentacle,
+            start_s=self.start_s,
+            end_s=self.end_s,
+            exclusive_s=self.exclusive_s,
+        )
+
+
+@dataclasses.dataclass(slots=True)
+class _OpenSpan:
+    name: str
+    tentacle: str
+    start_s: float
+    nested_s: float = 0.0
+
+
+class PhaseRecorder:
+    """
+    One instance per subprocess: 'PHASES'.
+    """
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self._stack: list[_OpenSpan] = []
+
+    def reset(self) -> None:
+        """
+        Called at the beginning of every attempt.
+        """
+        self.spans.clear()
+        self._stack.clear()
+
+    @contextlib.contextmanager
+    def span(self, name: str, tentacle: str = "") -> typing.Iterator[None]:
+        assert isinstance(name, str)
+        assert isinstance(tentacle, str)
+
+        open_span = _OpenSpan(name=name, tentacle=tentacle, start_s=time.monotonic())
+        self._stack.append(open_span)
+        try:
+            yield
+        finally:
+            end_s = time.monotonic()
+            self._stack.pop()
+            duration_s = end_s - open_span.start_s
+            if len(self._stack) > 0:
+                self._stack[-1].nested_s += duration_s
+            span = Span(
+                name=name,
+                start_s=open_span.start_s,
+                end_s=end_s,
+                exclusive_s=max(duration_s - open_span.nested_s, 0.0),
+                tentacle=tentacle,
+                parent="" if len(self._stack) == 0 else self._stack[-1].name,
+            )
+            self.spans.append(span)
+            util_multiprocessing.EVENTLOGCALLBACK.queue_put(span.event_phase())
+
+    def write(self, filename: pathlib.Path) -> None:
+        assert isinstance(filename, pathlib.Path)
+        try:
+            filename.write_text(
+                json.dumps(
+                    [dataclasses.asdict(span) for span in self.spans],
+                    indent=4,
+                )
+            )
+        except OSError as e:
+            # The test outcome must not depend on the instrumentation
+            logger.warning(f"Failed to write {filename}: {e!r}")
+
+
+def read_phases_json(filename: pathlib.Path) -> list[Span]:
+    assert isinstance(filename, pathlib.Path)
+    return [Span(**span) for span in json.loads(filename.read_text())]
+
+
+PHASES = PhaseRecorder()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import contextlib
 import logging
 import pathlib
 
@@ -8,7 +9,7 @@ from octoprobe.util_constants_uart_flakiness import (
 )
 from octoprobe.util_subprocess import SubprocessExitCodeException, subprocess_run
 
-from . import util_subprocess_tentacle_timeout
+from . import util_live_results, util_multiprocessing, util_subprocess_tentacle_timeout
 from .constants import SUBPROCESS_PROVOKE_RETURNCODE2
 from .testcollection.testrun_specs import TestRun
 
@@ -30,8 +31,60 @@ def tentacle_subprocess_run(
             logger.info(msg)
             raise SubprocessExitCodeException(msg)
 
-    if SUBPROCESS_TENTACLE_DUT_TIMEOUT:
-        stdout = util_subprocess_tentacle_timeout.tentacle_subprocess_run(
+    policy = util_live_results.get_early_abort_policy()
+    tail: util_live_results.LogfileTail | None = None
+    with contextlib.ExitStack() as stack:
+        if util_multiprocessing.EVENTLOGCALLBACK.is_subprocess or policy.enabled:
+            # Stream the test outcomes to the main process.
+            # Remove the logfile of a previous run: Its outcomes must not be reported.
+            logfile.unlink(missing_ok=True)
+            tail = stack.enter_context(
+                util_live_results.LogfileTail(logfile=logfile, policy=policy)
+            )
+        try:
+            stdout = _subprocess_run(
+                args=args,
+                cwd=cwd,
+                logfile=logfile,
+                testrun=testrun,
+                env=env,
+                timeout_s=timeout_s,
+                success_returncodes=success_returncodes,
+                tail=tail,
+            )
+        except SubprocessExitCodeException as e:
+            if tail is not None:
+                early_abort_exception = tail.early_abort_exception
+                if early_abort_exception is not None:
+                    raise early_abort_exception from e
+            raise
+
+    if tail is not None:
+        early_abort_exception = tail.early_abort_exception
+        if early_abort_exception is not None:
+            # The process has been terminated but returned a success returncode
+            raise early_abort_exception
+
+    provoke_error()
+
+    return stdout
+
+
+def _subprocess_run(
+    args: list[str],
+    cwd: pathlib.Path,
+    logfile: pathlib.Path,
+    testrun: TestRun,
+    env: dict[str, str] | None,
+    timeout_s: float,
+    success_returncodes: list[int] | None,
+    tail: util_live_results.LogfileTail | None,
+) -> str | None:
+    early_abort = tail is not None and tail.policy.enabled
+    if SUBPROCESS_TENTACLE_DUT_TIMEOUT or early_abort:
+        # 'early_abort': The process has to be terminated by 'tail'.
+        # The DUT is only powered off if SUBPROCESS_TENTACLE_DUT_TIMEOUT.
+        return util_subprocess_tentacle_timeout.tentacle_subprocess_run(
             args=args,
             cwd=cwd,
             env=env,
@@ -41,19 +94,16 @@ def tentacle_subprocess_run(
             timeout_s=timeout_s,
             # TODO: Remove the following line as soon returncode of 'run-multitest.py' is fixed.
             success_returncodes=success_returncodes,
+            process_started=None if tail is None else tail.set_process,
+            power_off_dut=bool(SUBPROCESS_TENTACLE_DUT_TIMEOUT),
         )
-    else:
-        stdout = subprocess_run(
-            args=args,
-            cwd=cwd,
-            env=env,
-            # logfile=testresults_directory(f"run-tests-{test_dir}.txt").filename,
-            logfile=logfile,
-            timeout_s=timeout_s,
-            # TODO: Remove the following line as soon returncode of 'run-multitest.py' is fixed.
-            success_returncodes=success_returncodes,
-        )
-
-    provoke_error()
-
-    return stdout
+    return subprocess_run(
+        args=args,
+        cwd=cwd,
+        env=env,
+        # logfile=testresults_directory(f"run-tests-{test_dir}.txt").filename,
+        logfile=logfile,
+        timeout_s=timeout_s,
+        # TODO: Remove the following line as soon returncode of 'run-multitest.py' is fixed.
+        success_returncodes=success_returncodes,
+    )
@@ -27,6 +27,7 @@ class TentaclePowerOffTimer:
 
     - Starts on context enter and fires after `timeout_s`.
     - Calling `cancel()` (or leaving the context) prevents power-off.
+    - `enabled=False`: The timer is never started.
     """
 
     PRE_TIMEOUT_S = 10.0
@@ -36,10 +37,13 @@ class TentaclePowerOffTimer:
         testrun: TestRun,
         timeout_s: float,
         f: io.TextIOWrapper,
+        enabled: bool = True,
     ) -> None:
         assert isinstance(testrun, TestRun)
         assert isinstance(timeout_s, float)
         assert timeout_s >= 0.0
+        assert isinstance(enabled, bool)
+        self._enabled = enabled
         self._testrun = testrun
         self._timeout_s = timeout_s
         self._timeout_powerdown_s = max(0.0, timeout_s - self.PRE_TIMEOUT_S)
@@ -76,7 +80,7 @@ class TentaclePowerOffTimer:
 
     def __enter__(self) -> TentaclePowerOffTimer:
         # Start timer thread
-        if not self._thread.is_alive():
+        if self._enabled and not self._thread.is_alive():
             self._thread.start()
         return self
 
@@ -100,10 +104,15 @@ def tentacle_subprocess_run(
     env: dict[str, str] | None = None,
     timeout_s: float = 10.0,
     success_returncodes: list[int] | None = None,
+    process_started: typing.Callable[[subprocess.Popen[str]], None] | None = None,
+    power_off_dut: bool = True,
 ) -> str | None:
     """
     Wrapper around 'subprocess()'
 
+    'process_started' is called with the running process: This allows to terminate it.
+    'power_off_dut': False: The DUT is not powered off before the timeout.
+
     There was instability of USB-cdc with many tentacles involved.
     See: https://github.com/octoprobe/testbed_micropython/issues/67
     This method is a blind guess: When a subprocess times out but still has USB-cdc open will lead in some leaks...
@@ -119,6 +128,7 @@ def tentacle_subprocess_run(
     assert isinstance(logfile, pathlib.Path)
     assert isinstance(timeout_s, float | None)
     assert isinstance(success_returncodes, list | None)
+    assert isinstance(power_off_dut, bool)
 
     if success_returncodes is None:
         success_returncodes = [0]
@@ -174,10 +184,13 @@ def tentacle_subprocess_run(
                         stdout=f,
                         stderr=subprocess.STDOUT,
                     ) as process:
+                        if process_started is not None:
+                            process_started(process)
                         with TentaclePowerOffTimer(
                             testrun=testrun,
                             timeout_s=timeout_s - 2 * SUBPROCESS_TERMINATE_PAUSE_S,
                             f=f,
+                            enabled=power_off_dut,
                         ) as tenacle_power_off_timer:
                             stdout = stderr = "...empty...\n"
                             try:
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from testbed_micropython.mptest.util_bench_scheduler import SchedulerBench
+
+
+def test_bench_scheduler() -> None:
+    result = SchedulerBench(copies=2, build_jobs=2).run()
+    assert result.testruns > 0
+    assert result.firmwares > 0
+    assert result.makespan_s > 0.0
+    assert 0.0 <= result.idle_tentacle_s < result.tentacles * result.makespan_s
+
+    # The simulation is deterministic
+    result2 = SchedulerBench(copies=2, build_jobs=2).run()
+    assert result2.makespan_s == result.makespan_s
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import pathlib
+import shlex
+
+import pytest
+
+from testbed_micropython.util_ccache import Ccache, CcacheStats, docker_cmd_add_args
+
+BUILD_CMD = "docker run --rm -v /home/user/micropython:/home/user/micropython micropython/build-micropython-rp2 make -C ports/rp2 BOARD=RPI_PICO2"
+
+
+def test_ccache_stats(tmp_path: pathlib.Path) -> None:
+    filename = tmp_path / "RPI_PICO2-1234.log"
+    filename.write_text(
+        "\n".join(
+            [
+                "# ports/rp2/main.c",
+                "direct_cache_hit",
+                "# ports/rp2/mphalport.c",
+                "preprocessed_cache_hit",
+                "# py/vm.c",
+                "cache_miss",
+                "# py/gc.c",
+                "  direct_cache_hit  ",
+                # Other counters are ignored
+                "called_for_link",
+                "",
+            ]
+        )
+    )
+    stats = CcacheStats.factory(filename)
+    assert stats is not None
+    assert stats == CcacheStats(hits=3, misses=1)
+    assert stats.text == "3 hits, 1 misses"
+    assert stats.hit_rate == 0.75
+
+    # ccache did not write the log
+    assert CcacheStats.factory(tmp_path / "missing.log") is None
+    assert CcacheStats().hit_rate is None
+
+
+def test_docker_cmd_add_args() -> None:
+    docker_args = ["--env=CCACHE_DIR=/tmp/my cache", "--env=IDF_CCACHE_ENABLE=1"]
+    build_cmd = docker_cmd_add_args(build_cmd=BUILD_CMD, docker_args=docker_args)
+    assert build_cmd == BUILD_CMD.replace(
+        "docker run ",
+        "docker run '--env=CCACHE_DIR=/tmp/my cache' --env=IDF_CCACHE_ENABLE=1 ",
+    )
+    assert shlex.split(build_cmd)[2:4] == docker_args
+
+
+@pytest.mark.parametrize(
+    "build_cmd,docker_args",
+    [
+        # The docker image does not provide ccache
+        (BUILD_CMD, []),
+        # Not a docker command
+        ("make -C ports/unix", ["--env=IDF_CCACHE_ENABLE=1"]),
+    ],
+)
+def test_docker_cmd_add_args_unchanged(build_cmd: str, docker_args: list[str]) -> None:
+    assert (
+        docker_cmd_add_args(build_cmd=build_cmd, docker_args=docker_args) == build_cmd
+    )
+
+
+def test_ccache_directory_image(tmp_path: pathlib.Path) -> None:
+    ccache = Ccache(directory=tmp_path)
+    assert (
+        ccache.directory_image("micropython/build-micropython-rp2:latest")
+        == tmp_path / "micropython_build-micropython-rp2_latest"
+    )
+    assert (
+        ccache.directory_image("espressif/idf:v5.4.1")
+        == tmp_path / "espressif_idf_v5.4.1"
+    )
+    filename_statslog = ccache.filename_statslog(
+        docker_image="espressif/idf:v5.4.1", name="ESP32_GENERIC-SPIRAM"
+    )
+    assert filename_statslog.parent == tmp_path / "espressif_idf_v5.4.1" / "stats"
+    assert filename_statslog.name.startswith("ESP32_GENERIC-SPIRAM-")
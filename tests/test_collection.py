@@ -12,6 +12,8 @@ from octoprobe.usb_tentacle.usb_baseclasses import Location
 from octoprobe.usb_tentacle.usb_constants import HwVersion
 from octoprobe.usb_tentacle.usb_tentacle import UsbPico, UsbTentacle
 from octoprobe.util_baseclasses import TentacleInstance
+from octoprobe.util_firmware_spec import FirmwareBuildSpec
+from octoprobe.util_micropython_boards import BoardVariant
 
 from testbed_micropython import constants
 from testbed_micropython.bartenders import test_bartender
@@ -70,6 +72,36 @@ class Ttestparam:
         return DIRECTORY_TESTRESULTS / f"testresult_{self.label}.txt"
 
 
+def _connected_tentacles(specs: list[TentacleSpecMicropython]) -> ConnectedTentacles:
+    tentacle_list = []
+    for i, spec in enumerate(specs):
+        serial = f"1c4{i}"
+        tentacle_instance = TentacleInstance(
+            serial=serial,
+            tentacle_spec=spec,
+            hw_version_expected=HwVersion.V03,
+            solder_version="1.0",
+            testbed_name="testbed_micropython",
+            testbed_instance="ch_hans_1",
+        )
+        tentacle_list.append(
+            TentacleMicropython(
+                tentacle_instance=tentacle_instance,
+                usb_tentacle=UsbTentacle(
+                    tentacle_hub_location=Location(3, [1, i]),
+                    pico_infra=UsbPico(
+                        location=Location(bus=1, path=[]),
+                        serial=None,
+                        serial_port=None,
+                    ),
+                ),
+            )
+        )
+    # Sort tentacles by their serial for deterministic output
+    tentacle_list.sort(key=lambda t: t.tentacle_serial_number)
+    return ConnectedTentacles(tentacle_list)
+
+
 def _test_collection(testparam: Ttestparam) -> None:
     with testparam.filename_txt.open("w") as file:
         fork = ForkTextIO(files=[file, sys.stdout])  # type: ignore[abstract]
@@ -81,39 +113,10 @@ def _test_collection2(testparam: Ttestparam, file: typing.TextIO) -> None:
     specs = testparam.specs
     testrun_specs_ = testparam.testrun_specs
 
-    def factory() -> list[TentacleMicropython]:
-        tentacle_list = []
-        for i, spec in enumerate(specs):
-            serial = f"1c4{i}"
-            tentacle_instance = TentacleInstance(
-                serial=serial,
-                tentacle_spec=spec,
-                hw_version_expected=HwVersion.V03,
-                solder_version="1.0",
-                testbed_name="testbed_micropython",
-                testbed_instance="ch_hans_1",
-            )
-            tentacle_list.append(
-                TentacleMicropython(
-                    tentacle_instance=tentacle_instance,
-                    usb_tentacle=UsbTentacle(
-                        tentacle_hub_location=Location(3, [1, i]),
-                        pico_infra=UsbPico(
-                            location=Location(bus=1, path=[]),
-                            serial=None,
-                            serial_port=None,
-                        ),
-                    ),
-                )
-            )
-        # Sort tentacles by their serial for deterministic output
-        tentacle_list.sort(key=lambda t: t.tentacle_serial_number)
-        return tentacle_list
-
-    connected_tentacles = ConnectedTentacles(factory())
+    connected_tentacles = _connected_tentacles(specs)
 
-    tentacle_reference = connected_tentacles.find_first_tentacle(
-        board=constants.DEFAULT_REFERENCE_BOARD
+    tentacles_reference = connected_tentacles.find_reference_tentacles(
+        reference_board=constants.DEFAULT_REFERENCE_BOARD
     )
 
     testrun_specs_.assign_tentacles(
@@ -126,9 +129,9 @@ def _test_collection2(testparam: Ttestparam, file: typing.TextIO) -> None:
 
     bartender = test_bartender.TestBartender(
         connected_tentacles=connected_tentacles,
-        tentacle_reference=tentacle_reference,
+        tentacles_reference=tentacles_reference,
         testrun_specs=testrun_specs_,
-        priority_sorter=testrun_specs.TestRun.priority_sorter,
+        priority=testrun_specs.TestRun.priority,
         directory_results=DIRECTORY_TESTRESULTS,
     )
     print(f"## START: test_todo={bartender.tests_todo}")
@@ -316,6 +319,124 @@ def test_collection(testparam: Ttestparam) -> None:
     _test_collection(testparam)
 
 
+@pytest.mark.parametrize(
+    "testparam", _TESTPARAMS, ids=lambda testparam: testparam.pytest_id
+)
+def test_candidates(testparam: Ttestparam) -> None:
+    """
+    The index of 'TestRunCandidates' selects the same testruns as
+    'TestRunSpecs.generate()' followed by 'TestRun.priority_sorter()'
+    after firmwares have been built and testruns have been started (reserve)
+    and completed (release, done).
+    """
+    testrun_specs_ = testparam.testrun_specs
+    connected_tentacles = _connected_tentacles(testparam.specs)
+    tentacles_reference = connected_tentacles.find_reference_tentacles(
+        reference_board=constants.DEFAULT_REFERENCE_BOARD
+    )
+    assert len(tentacles_reference) <= 1
+    tentacle_reference = tentacles_reference[0] if tentacles_reference else None
+    testrun_specs_.assign_tentacles(tentacles=connected_tentacles, flash_skip=False)
+
+    bartender = test_bartender.TestBartender(
+        connected_tentacles=connected_tentacles,
+        tentacles_reference=tentacles_reference,
+        testrun_specs=testrun_specs_,
+        priority=testrun_specs.TestRun.priority,
+        directory_results=DIRECTORY_TESTRESULTS,
+    )
+    args = util_testrunner.Args.get_default_args(
+        directory_git_cache=constants.DIRECTORY_GIT_CACHE,
+        directory_results=constants.DIRECTORY_TESTRESULTS_DEFAULT,
+    )
+    args.firmware.flash_skip = False
+    ctxtestrun = octoprobe.CtxTestRun(connected_tentacles=connected_tentacles)
+
+    # The reference firmware is built first
+    firmwares_todo = sorted(
+        {
+            tsv.board_variant
+            for testrun_spec in testrun_specs_
+            for tsv in testrun_spec.tsvs_todo
+        }
+        | {constants.DEFAULT_REFERENCE_BOARD},
+        key=lambda board_variant: (
+            board_variant != constants.DEFAULT_REFERENCE_BOARD,
+            board_variant,
+        ),
+    )
+    firmwares_built: set[str] = set()
+
+    def flash(testrun: testrun_specs.TestRun) -> None:
+        tentacle = testrun.tentacle_variant.tentacle
+        tentacle.tentacle_state.firmware_spec = FirmwareBuildSpec(
+            board_variant=BoardVariant(
+                board=tentacle.tentacle_spec.board,
+                variant=testrun.tentacle_variant.variant,
+            )
+        )
+        if testrun.tentacle_reference is not None:
+            reference = testrun.tentacle_reference
+            reference.tentacle_state.firmware_spec = FirmwareBuildSpec(
+                board_variant=BoardVariant(
+                    board=reference.tentacle_spec.board, variant=""
+                )
+            )
+
+    def done(async_target: test_bartender.AsyncTargetTest) -> None:
+        bartender.testrun_done(
+            util_testrunner.EventExitRunOneTest(
+                target_unique_name=async_target.target_unique_name,
+                logfile=pathlib.Path("/dummy"),
+                success=True,
+                testid=async_target.testrun.testid,
+            )
+        )
+        async_target.fake_join()
+
+    for _ in range(100):
+        if len(firmwares_todo) > 0:
+            firmwares_built.add(firmwares_todo.pop(0))
+
+        expected = testrun_specs.TestRun.priority_sorter(
+            list(
+                testrun_specs_.generate(
+                    available_tentacles=bartender.available_tentacles,
+                    firmwares_built=firmwares_built,
+                    flash_skip=False,
+                    tentacle_reference=tentacle_reference,
+                )
+            ),
+            connected_tentacles,
+        )
+        possible_testruns = bartender.possible_testruns(
+            firmwares_built=firmwares_built, flash_skip=False
+        )
+        assert [t.testid for t in possible_testruns] == [t.testid for t in expected]
+
+        if len(expected) == 0:
+            if len(bartender.async_targets) == 0:
+                if len(firmwares_todo) == 0:
+                    break
+                continue
+            done(bartender.async_targets[0])
+            continue
+
+        async_target = bartender.testrun_next(
+            firmwares_built=firmwares_built,
+            args=args,
+            ctxtestrun=ctxtestrun,
+            repo_micropython_tests=pathlib.Path("/dummy_path"),
+        )
+        assert async_target.testrun.testid == expected[0].testid
+        flash(async_target.testrun)
+        async_target.fake_start()
+        if len(bartender.async_targets) > 1:
+            done(bartender.async_targets[0])
+    else:
+        raise AssertionError("should never get here!")
+
+
 if __name__ == "__main__":
     _test_collection(testparam=_TESTPARAM_WLAN_ASYMMETRICAL)
     # _test_collection(testparam=_TESTPARAM_POTPOURRY)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import pathlib
+
+from testbed_micropython import constants
+from testbed_micropython.mptest.util_bench_scheduler import SchedulerBench
+from testbed_micropython.report_task.util_report_tasks import ReportTentacle, Task
+from testbed_micropython.report_task.util_report_writer import FILENAME_TASK_LOG
+from testbed_micropython.report_test.util_constants import (
+    FILENAME_CONTEXT_TESTGROUP_JSON,
+)
+from testbed_micropython.testcollection import testrun_durations
+
+
+def _task(label: str, board_variant: str, duration_s: float) -> Task:
+    return Task(
+        start_s=0.0,
+        end_s=duration_s,
+        label=f"{label}@5f2a-{board_variant}",
+        tentacles=[
+            ReportTentacle(label=f"5f2a-{board_variant}", board_variant=board_variant)
+        ],
+    )
+
+
+def test_durations_task_log(tmp_path: pathlib.Path) -> None:
+    tasks = [
+        _task("RUN-TESTS_STANDARD", "RPI_PICO2", 100.0),
+        # The shards are summed up
+        _task("RUN-TESTS_STANDARD+1of2", "RPI_PICO2-RISCV", 30.0),
+        _task("RUN-TESTS_STANDARD+2of2", "RPI_PICO2-RISCV", 40.0),
+        # Roles 'instance0' and 'instance1': The longer duration is kept
+        _task("RUN-MULTITESTS_MULTINET", "RPI_PICO_W", 50.0),
+        _task("RUN-MULTITESTS_MULTINET", "RPI_PICO_W", 70.0),
+        # Firmware builds are ignored
+        Task(start_s=0.0, end_s=300.0, label="RPI_PICO2"),
+    ]
+    (tmp_path / FILENAME_TASK_LOG).write_text(
+        "".join(repr(task) + "\n" for task in tasks)
+    )
+
+    durations = testrun_durations.TestRunDurations.factory(directory_results=tmp_path)
+    assert durations == {
+        ("RUN-TESTS_STANDARD", "RPI_PICO2"): 100.0,
+        ("RUN-TESTS_STANDARD", "RPI_PICO2-RISCV"): 70.0,
+        ("RUN-MULTITESTS_MULTINET", "RPI_PICO_W"): 70.0,
+    }
+    assert (
+        durations.get_duration_s(
+            label="RUN-TESTS_STANDARD", board_variant="ESP32_GENERIC", timeout_s=600.0
+        )
+        == 600.0
+    )
+
+
+def test_durations_fallback(tmp_path: pathlib.Path) -> None:
+    # The task log is parsed, never evaluated
+    filename_marker = tmp_path / "marker"
+    (tmp_path / FILENAME_TASK_LOG).write_text(
+        f"__import__('pathlib').Path({str(filename_marker)!r}).touch()\n"
+    )
+    for testid, time_start, time_end in (
+        ("RUN-TESTS_STANDARD@5f2a-RPI_PICO2", "00-00-00", "00-01-40"),
+        # A retry
+        ("RUN-TESTS_STANDARD@5f2a-RPI_PICO2", "00-02-00", "00-02-20"),
+    ):
+        directory = tmp_path / f"{testid},{time_start}"
+        directory.mkdir()
+        (directory / FILENAME_CONTEXT_TESTGROUP_JSON).write_text(
+            json.dumps(
+                {
+                    "testid": testid,
+                    "testgroup": "RUN-TESTS_STANDARD",
+                    "tentacle_variant": "5f2a-RPI_PICO2",
+                    "time_start": f"2025-06-01_{time_start}+0200",
+                    "time_end": f"2025-06-01_{time_end}+0200",
+                }
+            )
+        )
+
+    durations = testrun_durations.TestRunDurations.factory(directory_results=tmp_path)
+    assert not filename_marker.exists()
+    assert durations == {("RUN-TESTS_STANDARD", "RPI_PICO2"): 120.0}
+
+
+def test_duration_priority() -> None:
+    """
+    The testruns of the board with the most work left come first,
+    within a board the longest testrun first.
+    """
+    testrun_specs = SchedulerBench().test_bartender.testrun_specs
+    boards = sorted(
+        {
+            tsv.board
+            for testrun_spec in testrun_specs
+            for tsv in testrun_spec.tsvs_todo
+            if tsv.board != constants.DEFAULT_REFERENCE_BOARD
+        }
+    )
+    board_slow = boards[0]
+
+    durations = testrun_durations.TestRunDurations()
+    for idx, testrun_spec in enumerate(testrun_specs):
+        for tsv in testrun_spec.tsvs_todo:
+            durations.add(
+                label=testrun_spec.label,
+                board_variant=tsv.board_variant,
+                duration_s=1e6 * (idx + 1) if tsv.board == board_slow else 10.0,
+            )
+
+    bench = SchedulerBench(durations=durations)
+    testruns = bench.test_bartender.possible_testruns(
+        firmwares_built=None, flash_skip=True
+    )
+    assert len(testruns) > 0
+
+    # 'TestRunSpec.priority' still wins
+    spec_priorities = [testrun.testrun_spec.priority for testrun in testruns]
+    assert spec_priorities == sorted(spec_priorities, reverse=True)
+
+    for spec_priority in set(spec_priorities):
+        group = [
+            testrun
+            for testrun in testruns
+            if testrun.testrun_spec.priority == spec_priority
+            and not testrun.requires_reference_tentacle
+        ]
+        slow = [t.tentacle_variant.board == board_slow for t in group]
+        # The critical path first
+        assert slow == sorted(slow, reverse=True)
+        # Longest processing time first
+        durations_s = [
+            durations.testrun_duration_s(testrun)
+            for testrun in group
+            if testrun.tentacle_variant.board == board_slow
+        ]
+        assert durations_s == sorted(durations_s, reverse=True)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+import pathlib
+
+from octoprobe.util_firmware_spec import FirmwareBuildSpec
+from octoprobe.util_micropython_boards import BoardVariant
+
+from testbed_micropython.util_firmware_cache import FirmwareCache, FirmwareCacheKey
+
+
+def _key(git_commit: str) -> FirmwareCacheKey:
+    return FirmwareCacheKey(
+        git_commit=git_commit,
+        git_dirty_sha256="",
+        board_variant="RPI_PICO2-RISCV",
+        docker_image="micropython/build-micropython-rp2",
+        docker_image_id="sha256:1234",
+    )
+
+
+def _put(cache: FirmwareCache, tmp_path: pathlib.Path, git_commit: str) -> None:
+    filename_firmware = tmp_path / "build" / "firmware.uf2"
+    filename_firmware.parent.mkdir(parents=True, exist_ok=True)
+    filename_firmware.write_bytes(1000 * b"x")
+    filename_mpycross = tmp_path / "build" / "mpy-cross"
+    filename_mpycross.write_bytes(100 * b"m")
+    spec = FirmwareBuildSpec(
+        board_variant=BoardVariant(board="RPI_PICO2", variant="RISCV"),
+        _filename=filename_firmware,
+        micropython_full_version_text="RPI_PICO2;3.4.0; MicroPython v1.26.0",
+    )
+    cache.put(
+        key=_key(git_commit),
+        spec=spec,
+        filename_firmware=filename_firmware,
+        filename_mpycross=filename_mpycross,
+    )
+
+
+def test_firmware_cache_hit(tmp_path: pathlib.Path) -> None:
+    cache = FirmwareCache(directory=tmp_path / "cache")
+    assert cache.get(_key("a")) is None
+
+    _put(cache, tmp_path, "a")
+    entry = cache.get(_key("a"))
+    assert entry is not None
+    assert cache.get(_key("b")) is None
+
+    spec = entry.firmware_build_spec(directory=tmp_path / "artifacts")
+    assert spec.board_variant.name_normalized == "RPI_PICO2-RISCV"
+    assert (tmp_path / "artifacts" / "firmware.uf2").read_bytes() == 1000 * b"x"
+    assert (tmp_path / "artifacts" / "mpy-cross").read_bytes() == 100 * b"m"
+
+
+def test_firmware_cache_without_mpycross(tmp_path: pathlib.Path) -> None:
+    cache = FirmwareCache(directory=tmp_path / "cache")
+    _put(cache, tmp_path, "a")
+    entry = cache.get(_key("a"))
+    assert entry is not None
+
+    # An entry without mpy-cross is a cache miss
+    entry.filename_mpycross.unlink()
+    assert cache.get(_key("a")) is None
+
+    # ... and is replaced
+    _put(cache, tmp_path, "a")
+    assert cache.get(_key("a")) is not None
+
+
+def test_firmware_cache_prune(tmp_path: pathlib.Path) -> None:
+    cache = FirmwareCache(directory=tmp_path / "cache", max_size_bytes=10_000)
+    for idx, git_commit in enumerate(("a", "b", "c")):
+        _put(cache, tmp_path, git_commit)
+        entry = cache.get(_key(git_commit))
+        assert entry is not None
+        os.utime(entry.directory, (idx, idx))
+
+    # 'a' is the least recently used
+    removed = cache.prune(max_size_bytes=cache.entries[0].size_bytes * 2)
+    assert [e.metadata["git_commit"] for e in removed] == ["a"]
+    assert [e.metadata["git_commit"] for e in cache.entries] == ["c", "b"]
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import dataclasses
+import pathlib
+import types
+
+import pytest
+from octoprobe import octoprobe
+from octoprobe.util_firmware_spec import FirmwareBuildSpec, FirmwareNoFlashingSpec
+from octoprobe.util_micropython_boards import BoardVariant
+
+from testbed_micropython import util_firmware_identity, util_multiprocessing
+from testbed_micropython.mptest.util_bench_scheduler import simulated_tentacles
+from testbed_micropython.tentacle_spec import TentacleMicropython
+from testbed_micropython.util_firmware_identity import (
+    FlashedFirmware,
+    firmware_already_on_dut,
+    firmware_sha256,
+    setup_dut_flash,
+)
+
+SYS_VERSION = "3.4.0; MicroPython v1.26.0 on 2025-08-09"
+
+
+@dataclasses.dataclass
+class FakeDut:
+    """
+    Replaces '_probe()': Returns 'sys.version' of the firmware on the DUT.
+    Replaces 'CtxTestRun.function_setup_dut_flash()'.
+    """
+
+    sys_version: str = SYS_VERSION
+    exception: Exception | None = None
+    probes: int = 0
+    flashed: list[object] = dataclasses.field(default_factory=list)
+    """
+    'tentacle_state.firmware_spec' of every call to 'function_setup_dut_flash()'.
+    """
+    flash_exception: Exception | None = None
+    flashed_firmware: FlashedFirmware | None = None
+    sha256_while_flashing: list[str | None] = dataclasses.field(default_factory=list)
+
+    def probe(self, tentacle: TentacleMicropython) -> str:
+        self.probes += 1
+        if self.exception is not None:
+            raise self.exception
+        return self.sys_version
+
+    def function_setup_dut_flash(
+        self,
+        udev_poller: object,
+        tentacle: TentacleMicropython,
+        directory_logs: pathlib.Path,
+    ) -> None:
+        self.flashed.append(tentacle.tentacle_state.firmware_spec)
+        assert self.flashed_firmware is not None
+        self.sha256_while_flashing.append(
+            self.flashed_firmware.get(serial=tentacle.tentacle_instance.serial)
+        )
+        if self.flash_exception is not None:
+            raise self.flash_exception
+
+
+@dataclasses.dataclass
+class FlashSetup:
+    tentacle: TentacleMicropython
+    ctxtestrun: octoprobe.CtxTestRun
+    firmware_spec: FirmwareBuildSpec
+    sha256: str
+    fake_dut: FakeDut
+    flashed_firmware: FlashedFirmware
+    events: list[util_multiprocessing.EventBase]
+
+    @property
+    def serial(self) -> str:
+        return self.tentacle.tentacle_instance.serial
+
+    def setup_dut_flash(self, tmp_path: pathlib.Path, probe: bool = True) -> None:
+        self.tentacle.tentacle_state.firmware_spec = self.firmware_spec
+        setup_dut_flash(
+            ctxtestrun=self.ctxtestrun,
+            tentacle=self.tentacle,
+            directory_logs=tmp_path,
+            probe=probe,
+        )
+
+    @property
+    def event_flash(self) -> util_multiprocessing.EventFlash:
+        (event,) = self.events
+        assert isinstance(event, util_multiprocessing.EventFlash)
+        return event
+
+
+@pytest.fixture
+def flash_setup(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> FlashSetup:
+    connected_tentacles = simulated_tentacles(copies=1)
+    tentacle = connected_tentacles[0]
+
+    filename_firmware = tmp_path / "firmware.uf2"
+    filename_firmware.write_bytes(1000 * b"x")
+    firmware_spec = FirmwareBuildSpec(
+        board_variant=BoardVariant(board="RPI_PICO2", variant=""),
+        _filename=filename_firmware,
+        micropython_full_version_text=f"RPI_PICO2;{SYS_VERSION}; Raspberry Pi Pico2",
+    )
+
+    flashed_firmware = FlashedFirmware(directory=tmp_path / "flashed_firmware")
+    fake_dut = FakeDut(flashed_firmware=flashed_firmware)
+    events: list[util_multiprocessing.EventBase] = []
+    monkeypatch.setattr(util_firmware_identity, "FLASHED_FIRMWARE", flashed_firmware)
+    monkeypatch.setattr(util_firmware_identity, "_probe", fake_dut.probe)
+    monkeypatch.setattr(
+        util_firmware_identity,
+        "UDEV_POLLER_LAZY",
+        types.SimpleNamespace(udev_poller=None),
+    )
+    monkeypatch.setattr(
+        octoprobe.CtxTestRun,
+        "function_setup_dut_flash",
+        fake_dut.function_setup_dut_flash,
+    )
+    monkeypatch.setattr(
+        util_multiprocessing.EVENTLOGCALLBACK, "queue_put", events.append
+    )
+
+    return FlashSetup(
+        tentacle=tentacle,
+        ctxtestrun=octoprobe.CtxTestRun(connected_tentacles=connected_tentacles),
+        firmware_spec=firmware_spec,
+        sha256=firmware_sha256(filename_firmware),
+        fake_dut=fake_dut,
+        flashed_firmware=flashed_firmware,
+        events=events,
+    )
+
+
+def test_firmware_already_on_dut(flash_setup: FlashSetup) -> None:
+    def already_on_dut() -> bool:
+        return firmware_already_on_dut(
+            tentacle=flash_setup.tentacle,
+            firmware_spec=flash_setup.firmware_spec,
+            sha256=flash_setup.sha256,
+        )
+
+    # Unknown firmware: The DUT is not probed
+    assert not already_on_dut()
+    assert flash_setup.fake_dut.probes == 0
+
+    # A different firmware has been flashed
+    flash_setup.flashed_firmware.set(serial=flash_setup.serial, sha256="0" * 64)
+    assert not already_on_dut()
+    assert flash_setup.fake_dut.probes == 0
+
+    flash_setup.flashed_firmware.set(
+        serial=flash_setup.serial, sha256=flash_setup.sha256
+    )
+    assert already_on_dut()
+    assert flash_setup.fake_dut.probes == 1
+
+    # The DUT runs a different version
+    flash_setup.fake_dut.sys_version = "3.4.0; MicroPython v1.25.0 on 2025-04-15"
+    assert not already_on_dut()
+
+    # The probe fails
+    flash_setup.fake_dut.sys_version = SYS_VERSION
+    flash_setup.fake_dut.exception = TimeoutError("no response")
+    assert not already_on_dut()
+
+
+def test_setup_dut_flash_skipped(
+    flash_setup: FlashSetup, tmp_path: pathlib.Path
+) -> None:
+    flash_setup.flashed_firmware.set(
+        serial=flash_setup.serial, sha256=flash_setup.sha256
+    )
+
+    flash_setup.setup_dut_flash(tmp_path)
+    (flashed,) = flash_setup.fake_dut.flashed
+    assert isinstance(flashed, FirmwareNoFlashingSpec)
+    # The report refers to the firmware
+    assert (
+        flash_setup.tentacle.tentacle_state.firmware_spec is flash_setup.firmware_spec
+    )
+    assert (
+        flash_setup.flashed_firmware.get(serial=flash_setup.serial)
+        == flash_setup.sha256
+    )
+    assert flash_setup.event_flash.skipped
+
+
+@pytest.mark.parametrize(
+    "sys_version,exception",
+    [
+        ("3.4.0; MicroPython v1.25.0 on 2025-04-15", None),
+        (SYS_VERSION, TimeoutError("no response")),
+    ],
+)
+def test_setup_dut_flash_probe_fails(
+    flash_setup: FlashSetup,
+    tmp_path: pathlib.Path,
+    sys_version: str,
+    exception: Exception | None,
+) -> None:
+    flash_setup.flashed_firmware.set(
+        serial=flash_setup.serial, sha256=flash_setup.sha256
+    )
+    flash_setup.fake_dut.sys_version = sys_version
+    flash_setup.fake_dut.exception = exception
+
+    flash_setup.setup_dut_flash(tmp_path)
+    assert flash_setup.fake_dut.flashed == [flash_setup.firmware_spec]
+    # The record is removed while flashing ...
+    assert flash_setup.fake_dut.sha256_while_flashing == [None]
+    # ... and written after flashing succeeded
+    assert (
+        flash_setup.flashed_firmware.get(serial=flash_setup.serial)
+        == flash_setup.sha256
+    )
+    assert not flash_setup.event_flash.skipped
+
+
+def test_setup_dut_flash_force(flash_setup: FlashSetup, tmp_path: pathlib.Path) -> None:
+    flash_setup.flashed_firmware.set(
+        serial=flash_setup.serial, sha256=flash_setup.sha256
+    )
+    flash_setup.tentacle.tentacle_state.flash_force = True
+
+    flash_setup.setup_dut_flash(tmp_path)
+    # 'flash_force' overrides the probe
+    assert flash_setup.fake_dut.probes == 0
+    assert flash_setup.fake_dut.flashed == [flash_setup.firmware_spec]
+    assert not flash_setup.event_flash.skipped
+
+
+def test_setup_dut_flash_without_probe(
+    flash_setup: FlashSetup, tmp_path: pathlib.Path
+) -> None:
+    flash_setup.flashed_firmware.set(
+        serial=flash_setup.serial, sha256=flash_setup.sha256
+    )
+
+    flash_setup.setup_dut_flash(tmp_path, probe=False)
+    assert flash_setup.fake_dut.probes == 0
+    assert flash_setup.fake_dut.flashed == [flash_setup.firmware_spec]
+    assert (
+        flash_setup.flashed_firmware.get(serial=flash_setup.serial)
+        == flash_setup.sha256
+    )
+
+
+def test_setup_dut_flash_fails(flash_setup: FlashSetup, tmp_path: pathlib.Path) -> None:
+    flash_setup.flashed_firmware.set(
+        serial=flash_setup.serial, sha256=flash_setup.sha256
+    )
+    flash_setup.fake_dut.exception = TimeoutError("no response")
+    flash_setup.fake_dut.flash_exception = OSError("flashing failed")
+
+    with pytest.raises(OSError, match="flashing failed"):
+        flash_setup.setup_dut_flash(tmp_path)
+    # An interrupted flash leaves an unknown firmware
+    assert flash_setup.flashed_firmware.get(serial=flash_setup.serial) is None
+    assert (
+        flash_setup.tentacle.tentacle_state.firmware_spec is flash_setup.firmware_spec
+    )
+    assert flash_setup.events == []
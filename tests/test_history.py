@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import pathlib
+
+from testbed_micropython.report_test.util_baseclasses import (
+    ResultContext,
+    ResultTestGroup,
+)
+from testbed_micropython.report_test.util_constants import (
+    FILENAME_CONTEXT_JSON,
+    FILENAME_CONTEXT_TESTGROUP_JSON,
+)
+from testbed_micropython.report_test.util_history import History
+
+
+def _write_run(
+    directory_results: pathlib.Path,
+    time_start: str,
+    attempts: dict[str, str],
+) -> None:
+    """
+    attempts: key: attempt, value: outcome of 'basics/0prelim.py'
+    """
+    directory_results.mkdir(parents=True)
+    (directory_results / FILENAME_CONTEXT_JSON).write_text(
+        json.dumps(dataclasses.asdict(ResultContext(time_start=time_start)))
+    )
+    for attempt, outcome in attempts.items():
+        directory_relative = f"RUN-TESTS_STANDARD@5f2a-RPI_PICO2,{attempt}"
+        testgroup = ResultTestGroup(
+            directory_relative=directory_relative,
+            testgroup="RUN-TESTS_STANDARD",
+            testid="RUN-TESTS_STANDARD@5f2a-RPI_PICO2",
+            tentacle_variant="5f2a-RPI_PICO2",
+            msg_error="",
+        )
+        testgroup_dict = dataclasses.asdict(testgroup)
+        testgroup_dict["outcomes"] = [{"name": "basics/0prelim.py", "outcome": outcome}]
+        (directory_results / directory_relative).mkdir()
+        (
+            directory_results / directory_relative / FILENAME_CONTEXT_TESTGROUP_JSON
+        ).write_text(json.dumps(testgroup_dict))
+
+
+def test_history(tmp_path: pathlib.Path) -> None:
+    _write_run(tmp_path / "run1", "2025-04-18 23:00:00", {"a": "passed"})
+    _write_run(tmp_path / "run2", "2025-04-19 23:00:00", {"a": "failed", "b": "passed"})
+    _write_run(tmp_path / "run3", "2025-04-20 23:00:00", {"a": "failed"})
+    _write_run(tmp_path / "run4", "2025-04-21 23:00:00", {"a": "failed"})
+
+    with History(filename=tmp_path / "history.sqlite") as history:
+        for run in ("run1", "run2", "run3", "run4"):
+            assert history.ingest(directory_results=tmp_path / run)
+        assert not history.ingest(directory_results=tmp_path / "run4")
+
+        (flaky,) = history.flaky()
+        assert (flaky.runs, flaky.runs_failed, flaky.runs_flaky) == (4, 3, 1)
+
+        (first_failure,) = history.first_failure(pattern_board_variant="RPI_PICO*")
+        assert first_failure.time_start == "2025-04-20 23:00:00"
+
+        assert history.flaky(pattern_test="extmod/*") == []
+
+        # Only one testgroup: No other testgroup failed in the same runs
+        assert history.co_failures(testgroups={"RUN-TESTS_STANDARD"}, min_runs=1) == {}
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import pathlib
+import subprocess
+
+from testbed_micropython.mptest.util_testrunner import (
+    DICT_TESTRUN_SPECS,
+    get_testrun_specs,
+)
+from testbed_micropython.testcollection import testrun_impact
+from testbed_micropython.testcollection.testrun_impact import IMPACT_RULES, Impact
+
+_ALL_LABELS = sorted(DICT_TESTRUN_SPECS)
+
+
+def test_rules_labels() -> None:
+    for rule in IMPACT_RULES:
+        for label in rule.labels or ():
+            assert label in DICT_TESTRUN_SPECS, (rule.pattern, label)
+
+
+def test_impact_test_file() -> None:
+    impact = Impact.factory(
+        files_changed={"tests/basics/int_big.py.exp", "docs/index.rst"},
+        all_labels=_ALL_LABELS,
+    )
+    assert sorted(impact) == [
+        "RUN-TESTS_STANDARD",
+        "RUN-TESTS_STANDARD_NATIVE",
+        "RUN-TESTS_STANDARD_VIA_MPY",
+    ]
+    assert impact["RUN-TESTS_STANDARD"].ports is None
+    assert impact["RUN-TESTS_STANDARD"].tests == {"basics/int_big.py"}
+
+
+def test_impact_port() -> None:
+    impact = Impact.factory(
+        files_changed={"ports/rp2/machine_pin.c"}, all_labels=_ALL_LABELS
+    )
+    assert sorted(impact) == _ALL_LABELS
+    assert impact["RUN-TESTS_STANDARD"].ports == {"rp2"}
+    assert impact["RUN-TESTS_STANDARD"].tests is None
+
+
+def test_impact_core() -> None:
+    impact = Impact.factory(
+        files_changed={"ports/rp2/machine_pin.c", "py/obj.c"},
+        all_labels=_ALL_LABELS,
+    )
+    assert sorted(impact) == _ALL_LABELS
+    assert impact["RUN-TESTS_STANDARD"].ports is None
+
+
+def test_impact_testrun_specs() -> None:
+    impact = Impact.factory(
+        files_changed={"tests/basics/int_big.py"}, all_labels=_ALL_LABELS
+    )
+    testrun_specs = impact.testrun_specs(get_testrun_specs())
+    (testrun_spec,) = [t for t in testrun_specs if t.label == "RUN-TESTS_STANDARD"]
+    # The command is not modified: A retry only runs the failed tests
+    assert testrun_spec.command == ["run-tests.py"]
+    assert testrun_spec.impacted_tests == ["basics/int_big.py"]
+    assert not testrun_spec.shardable
+
+
+def test_impact_deleted_test(tmp_path: pathlib.Path) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    directory_basics = tmp_path / "tests" / "basics"
+    directory_basics.mkdir(parents=True)
+    for name in ("int_big.py", "int_big.py.exp", "deleted.py", "with space.py"):
+        (directory_basics / name).write_text("print(1)\n")
+    git("init", "-q")
+    git("add", ".")
+    git("-c", "user.name=test", "-c", "user.email=test@test", "commit", "-qm", "a")
+
+    (directory_basics / "int_big.py.exp").write_text("2\n")
+    (directory_basics / "deleted.py").unlink()
+    (directory_basics / "with space.py").write_text("print(2)\n")
+
+    files_changed = testrun_impact.files_changed(repo=tmp_path, git_ref="HEAD")
+    assert files_changed == {
+        "tests/basics/int_big.py.exp",
+        "tests/basics/deleted.py",
+        "tests/basics/with space.py",
+    }
+    impact = Impact.factory(files_changed=files_changed, all_labels=_ALL_LABELS)
+    impact.remove_missing_tests(repo=tmp_path)
+    assert impact["RUN-TESTS_STANDARD"].tests == {
+        "basics/int_big.py",
+        "basics/with space.py",
+    }
+
+    # Only deleted tests: Nothing to run
+    impact = Impact.factory(
+        files_changed={"tests/basics/deleted.py"}, all_labels=_ALL_LABELS
+    )
+    impact.remove_missing_tests(repo=tmp_path)
+    assert len(impact) == 0
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import pytest
+
+from testbed_micropython.report_task.util_report_tasks import TaskOutcomes
+from testbed_micropython.util_live_results import EarlyAbortPolicy, parse_line
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        ("pass  basics/0prelim.py", ("pass", "basics/0prelim.py")),
+        ("FAIL  extmod/machine_i2c.py", ("fail", "extmod/machine_i2c.py")),
+        ("skip  extmod/vfs_lfs.py", ("skip", "extmod/vfs_lfs.py")),
+        ("lrge  stress/bytecode_limit.py", ("skip", "stress/bytecode_limit.py")),
+        (
+            "multi_net/tcp_data.py on ttyACM0 ttyACM1: pass",
+            ("pass", "multi_net/tcp_data.py"),
+        ),
+        (
+            "multi_net/ssl_data.py on ttyACM0 ttyACM1: FAIL",
+            ("fail", "multi_net/ssl_data.py"),
+        ),
+        ("852 tests performed (25012 individual testcases)", None),
+        ("passed", None),
+    ],
+)
+def test_parse_line(line: str, expected: tuple[str, str] | None) -> None:
+    assert parse_line(line) == expected
+
+
+def test_early_abort_policy() -> None:
+    policy = EarlyAbortPolicy(consecutive_failures=3, failure_rate=0.5, min_tests=10)
+    assert policy.check(TaskOutcomes(failed=2), consecutive_failures=2) is None
+    assert policy.check(TaskOutcomes(failed=3), consecutive_failures=3) is not None
+    assert (
+        policy.check(TaskOutcomes(passed=5, failed=4), consecutive_failures=0) is None
+    )
+    assert (
+        policy.check(TaskOutcomes(passed=5, failed=5), consecutive_failures=0)
+        is not None
+    )
+    assert not EarlyAbortPolicy().enabled
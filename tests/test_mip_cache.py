@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import pathlib
+
+import pytest
+import requests
+
+from testbed_micropython.util_mip_cache import MipCache, MipCacheException
+
+INDEX = "https://index.invalid/pi/v2"
+
+
+def _short_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:8]
+
+
+@dataclasses.dataclass
+class FakeIndex:
+    """
+    Serves 'unittest' which depends on 'unittest-base'.
+    """
+
+    online: bool = True
+    urls: list[str] = dataclasses.field(default_factory=list)
+    files: dict[str, bytes] = dataclasses.field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self._add(
+            "unittest",
+            files={"unittest/__init__.mpy": b"from unittest_base import *\n"},
+            deps=["unittest-base"],
+        )
+        self._add(
+            "unittest-base",
+            files={"unittest_base.mpy": b"class TestCase: pass\n"},
+            deps=[],
+        )
+
+    def _add(self, package: str, files: dict[str, bytes], deps: list[str]) -> None:
+        hashes = []
+        for path, data in files.items():
+            short_hash = _short_hash(data)
+            self.files[f"{INDEX}/file/{short_hash[:2]}/{short_hash}"] = data
+            hashes.append([path, short_hash])
+        self.files[f"{INDEX}/package/6/{package}/latest.json"] = json.dumps(
+            {"hashes": hashes, "deps": [[dep, "latest"] for dep in deps]}
+        ).encode()
+
+    def get(self, url: str, timeout: float) -> FakeResponse:
+        self.urls.append(url)
+        if not self.online:
+            raise requests.ConnectionError(url)
+        return FakeResponse(url=url, content=self.files.get(url, None))
+
+
+@dataclasses.dataclass
+class FakeResponse:
+    url: str
+    content: bytes | None
+
+    def raise_for_status(self) -> None:
+        if self.content is None:
+            raise requests.HTTPError(f"404: {self.url}")
+
+
+@pytest.fixture
+def fake_index(monkeypatch: pytest.MonkeyPatch) -> FakeIndex:
+    fake_index = FakeIndex()
+    monkeypatch.setattr(requests, "get", fake_index.get)
+    return fake_index
+
+
+def _resolve(mip_cache: MipCache) -> dict[str, bytes]:
+    mip_files = mip_cache.resolve(packages=["unittest"], mpy_version="6")
+    return {f.path: f.filename.read_bytes() for f in mip_files}
+
+
+def test_mip_cache_resolve(tmp_path: pathlib.Path, fake_index: FakeIndex) -> None:
+    files = _resolve(MipCache(directory=tmp_path, index=INDEX))
+    assert files == {
+        "unittest/__init__.mpy": b"from unittest_base import *\n",
+        "unittest_base.mpy": b"class TestCase: pass\n",
+    }
+
+    # A fresh 'latest.json' and the files are not downloaded again
+    fake_index.urls.clear()
+    assert _resolve(MipCache(directory=tmp_path, index=INDEX)) == files
+    assert fake_index.urls == []
+
+    # 'max_age_s=0.0' refreshes 'latest.json' but not the files
+    assert _resolve(MipCache(directory=tmp_path, index=INDEX, max_age_s=0.0)) == files
+    assert all("/package/" in url for url in fake_index.urls)
+
+
+def test_mip_cache_offline(tmp_path: pathlib.Path, fake_index: FakeIndex) -> None:
+    files = _resolve(MipCache(directory=tmp_path, index=INDEX))
+
+    # Offline: The cached version is used
+    fake_index.online = False
+    assert _resolve(MipCache(directory=tmp_path, index=INDEX, max_age_s=0.0)) == files
+
+    # Offline and not cached
+    with pytest.raises(MipCacheException):
+        _resolve(MipCache(directory=tmp_path / "empty", index=INDEX))
+
+
+def test_mip_cache_hash_mismatch(tmp_path: pathlib.Path, fake_index: FakeIndex) -> None:
+    mip_cache = MipCache(directory=tmp_path, index=INDEX)
+    package_json = mip_cache.package_json(package="unittest-base", mpy_version="6")
+    ((_path, short_hash),) = package_json["hashes"]
+    fake_index.files[f"{INDEX}/file/{short_hash[:2]}/{short_hash}"] = b"corrupt"
+    with pytest.raises(MipCacheException, match="Hash mismatch"):
+        mip_cache.file(short_hash)
+    assert not mip_cache.filename_file(short_hash).exists()
+
+
+def test_mip_cache_invalid_package_json(
+    tmp_path: pathlib.Path, fake_index: FakeIndex
+) -> None:
+    fake_index.files[f"{INDEX}/package/6/unittest/latest.json"] = b"[]"
+    with pytest.raises(MipCacheException, match="not cached"):
+        MipCache(directory=tmp_path, index=INDEX).package_json(
+            package="unittest", mpy_version="6"
+        )
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import os
+import pathlib
+
+from testbed_micropython.util_natmod_cache import NatmodCache, NatmodCacheKey
+
+
+def _key(git_commit: str) -> NatmodCacheKey:
+    return NatmodCacheKey(
+        git_commit=git_commit,
+        git_dirty_sha256="",
+        arch="armv6m",
+        docker_image="micropython/build-micropython-arm:bookworm",
+        docker_image_id="sha256:1234",
+    )
+
+
+def _put(cache: NatmodCache, tmp_path: pathlib.Path, git_commit: str) -> None:
+    filename = tmp_path / "natmod" / "btree" / "btree_armv6m.mpy"
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    filename.write_bytes(1000 * b"x")
+    cache.put(key=_key(git_commit), filenames=[filename])
+
+
+def test_natmod_cache_restore(tmp_path: pathlib.Path) -> None:
+    cache = NatmodCache(directory=tmp_path / "cache")
+    _put(cache, tmp_path, "a")
+
+    directory_natmod = tmp_path / "restored"
+    (directory_natmod / "btree").mkdir(parents=True)
+    assert cache.restore(key=_key("a"), directory_natmod=directory_natmod)
+    assert (directory_natmod / "btree" / "btree_armv6m.mpy").read_bytes() == (
+        1000 * b"x"
+    )
+    assert not cache.restore(key=_key("b"), directory_natmod=directory_natmod)
+
+
+def test_natmod_cache_prune(tmp_path: pathlib.Path) -> None:
+    cache = NatmodCache(directory=tmp_path / "cache", max_size_bytes=10_000)
+    for idx, git_commit in enumerate(("a", "b", "c")):
+        _put(cache, tmp_path, git_commit)
+        os.utime(cache.directory / _key(git_commit).key, (idx, idx))
+
+    # 'a' is the least recently used
+    removed = cache.prune(max_size_bytes=cache.entries[0].size_bytes * 2)
+    assert [e.metadata["git_commit"] for e in removed] == ["a"]
+    assert [e.metadata["git_commit"] for e in cache.entries] == ["c", "b"]
+
+
+def test_natmod_cache_restore_touches(tmp_path: pathlib.Path) -> None:
+    cache = NatmodCache(directory=tmp_path / "cache")
+    for idx, git_commit in enumerate(("a", "b")):
+        _put(cache, tmp_path, git_commit)
+        os.utime(cache.directory / _key(git_commit).key, (idx, idx))
+    assert [e.metadata["git_commit"] for e in cache.entries] == ["b", "a"]
+
+    directory_natmod = tmp_path / "restored"
+    (directory_natmod / "btree").mkdir(parents=True)
+    assert cache.restore(key=_key("a"), directory_natmod=directory_natmod)
+    assert [e.metadata["git_commit"] for e in cache.entries] == ["a", "b"]
+
+
+def test_natmod_cache_put_prunes(tmp_path: pathlib.Path) -> None:
+    cache = NatmodCache(directory=tmp_path / "cache", max_size_bytes=1500)
+    for idx, git_commit in enumerate(("a", "b", "c")):
+        _put(cache, tmp_path, git_commit)
+        os.utime(cache.directory / _key(git_commit).key, (idx, idx))
+
+    # Every entry is more than 1000 bytes: Only the most recent one fits
+    assert [e.metadata["git_commit"] for e in cache.entries] == ["c"]
+
+
+def test_natmod_cache_partial_entries(tmp_path: pathlib.Path) -> None:
+    cache = NatmodCache(directory=tmp_path / "cache")
+    _put(cache, tmp_path, "a")
+
+    # A parallel compilation which has not been renamed yet
+    (cache.directory / f"tmp-{_key('b').key}-1234").mkdir()
+    # An entry without metadata
+    (cache.directory / _key("c").key).mkdir()
+    assert [e.metadata["git_commit"] for e in cache.entries] == ["a"]
+
+    directory_natmod = tmp_path / "restored"
+    (directory_natmod / "btree").mkdir(parents=True)
+    assert not cache.restore(key=_key("c"), directory_natmod=directory_natmod)
+
+    # An existing entry is not replaced
+    filename_metadata = cache.directory / _key("a").key / "metadata.json"
+    mtime_ns = filename_metadata.stat().st_mtime_ns
+    _put(cache, tmp_path, "a")
+    assert filename_metadata.stat().st_mtime_ns == mtime_ns
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from testbed_micropython import util_multiprocessing
+from testbed_micropython.report_task.util_report_tasks import (
+    PHASE_MIP,
+    PHASE_OTHER,
+    PHASE_RELAYS,
+    PHASE_TEST,
+    ReportTentacle,
+    Task,
+)
+from testbed_micropython.util_phases import (
+    PhaseRecorder,
+    SPAN_MIP_INSTALL,
+    SPAN_SETUP_INFRA,
+    SPAN_SETUP_RELAYS,
+    SPAN_TEST,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now_s = 0.0
+
+    def __call__(self) -> float:
+        return self.now_s
+
+
+def _async_target() -> util_multiprocessing.AsyncTarget:
+    return util_multiprocessing.AsyncTarget(
+        target_unique_name="RUN-MULTITESTS_MULTINET@a,b",
+        tentacles=[],
+        func=print,
+        func_args=[],
+        timeout_s=60.0,
+    )
+
+
+def test_phases(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+
+    recorder = PhaseRecorder()
+    for tentacle in ("a", "b"):
+        with recorder.span(SPAN_SETUP_INFRA, tentacle=tentacle):
+            clock.now_s += 2.0
+    with recorder.span(SPAN_SETUP_RELAYS):
+        clock.now_s += 1.0
+    with recorder.span(SPAN_TEST):
+        with recorder.span(SPAN_MIP_INSTALL, tentacle="a"):
+            clock.now_s += 3.0
+        with recorder.span(SPAN_MIP_INSTALL, tentacle="b"):
+            clock.now_s += 4.0
+        clock.now_s += 10.0
+
+    (span_test,) = [s for s in recorder.spans if s.name == SPAN_TEST]
+    assert span_test.duration_s == 17.0
+    assert span_test.exclusive_s == 10.0
+
+    async_target = _async_target()
+    for span in recorder.spans:
+        async_target.add_event_phase(span.event_phase())
+    assert async_target.phases_by_tentacle(tentacle="") == {
+        PHASE_RELAYS: 1.0,
+        PHASE_TEST: 10.0,
+    }
+    assert async_target.phases_by_tentacle(tentacle="a") == {
+        PHASE_OTHER: 2.0,
+        PHASE_MIP: 3.0,
+    }
+    assert async_target.phases_by_tentacle(tentacle="b") == {
+        PHASE_OTHER: 2.0,
+        PHASE_MIP: 4.0,
+    }
+
+    # Every tentacle is only charged its own phases
+    tentacles = {
+        tentacle: ReportTentacle(
+            label=tentacle,
+            board_variant="RPI_PICO_W",
+            phases=async_target.phases_by_tentacle(tentacle=tentacle),
+        )
+        for tentacle in ("a", "b")
+    }
+    task = Task(
+        start_s=0.0,
+        end_s=clock.now_s,
+        label=async_target.target_unique_name,
+        tentacles=list(tentacles.values()),
+        phases=async_target.phases_by_tentacle(tentacle=""),
+    )
+    durations_a = task.phase_durations(tentacles["a"])
+    assert durations_a[PHASE_MIP] == 3.0
+    assert durations_a[PHASE_TEST] == 10.0
+    # 2s setup_infra and the 6s setup_infra and mip_install of 'b'
+    assert durations_a[PHASE_OTHER] == 2.0 + 6.0
+    durations_b = task.phase_durations(tentacles["b"])
+    assert durations_b[PHASE_MIP] == 4.0
+    assert durations_b[PHASE_OTHER] == 2.0 + 5.0
+    for durations in (durations_a, durations_b):
+        assert sum(durations.values()) == task.duration
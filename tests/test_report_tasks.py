@@ -8,11 +8,23 @@ import pytest
 
 from testbed_micropython.report_task import util_report_renderer
 from testbed_micropython.report_task.util_report_tasks import (
+    IDLE_FIRMWARE,
+    IDLE_NO_WORK,
+    IDLE_OTHER,
+    IDLE_REFERENCE,
+    PHASE_FLASH,
+    PHASE_MIP,
+    PHASE_RELAYS,
+    PHASE_TEARDOWN,
+    PHASE_TEST,
     ReportTentacle,
     Task,
+    TaskOutcomes,
     TaskReport,
     Tasks,
+    TentacleUtilisations,
 )
+from testbed_micropython.report_task.util_report_trace import trace_events
 
 DIRECTORY_OF_THIS_FILE = pathlib.Path(__file__).parent
 FILENAME_OF_THIS_FILE = pathlib.Path(__file__).name
@@ -112,9 +124,203 @@ _TESTPARAMS = [
             ]
         ),
     ),
+    Ttestparam(
+        "test_flash",
+        Tasks(
+            [
+                Task(start_s=1.3, end_s=4.5, label="PICO2"),
+                Task(
+                    start_s=4.6,
+                    end_s=12.1,
+                    label="Test X",
+                    tentacles=[
+                        ReportTentacle(
+                            label="PICO",
+                            board_variant="PICO2",
+                            flash_duration_s=6.2,
+                        ),
+                    ],
+                ),
+                Task(
+                    start_s=4.6,
+                    end_s=8.3,
+                    label="Test Y",
+                    tentacles=[
+                        ReportTentacle(
+                            label="Lolin",
+                            board_variant="ESP8266",
+                            flash_skipped=True,
+                            flash_duration_s=0.4,
+                        ),
+                    ],
+                ),
+                Task(
+                    start_s=12.2,
+                    end_s=15.5,
+                    label="Test Z",
+                    tentacles=[
+                        ReportTentacle(
+                            label="PICO",
+                            board_variant="PICO2",
+                            flash_skipped=True,
+                            flash_duration_s=0.5,
+                        ),
+                    ],
+                ),
+            ]
+        ),
+    ),
+    Ttestparam(
+        "test_outcomes",
+        Tasks(
+            [
+                Task(start_s=1.3, end_s=4.5, label="PICO2"),
+                Task(
+                    start_s=4.6,
+                    end_s=124.6,
+                    label="Test X",
+                    tentacles=[
+                        ReportTentacle(label="PICO", board_variant="PICO2"),
+                    ],
+                    outcomes=TaskOutcomes(passed=50, failed=2, skipped=8),
+                ),
+                Task(
+                    start_s=4.6,
+                    end_s=64.6,
+                    label="Test Y",
+                    tentacles=[
+                        ReportTentacle(label="Lolin", board_variant="ESP8266"),
+                    ],
+                    outcomes=TaskOutcomes(passed=12),
+                    running=True,
+                ),
+            ]
+        ),
+    ),
+    Ttestparam(
+        "test_ccache",
+        Tasks(
+            [
+                Task(
+                    start_s=0.0,
+                    end_s=12.0,
+                    label="RPI_PICO2-RISCV",
+                    ccache_hits=810,
+                    ccache_misses=2,
+                ),
+                Task(
+                    start_s=0.0,
+                    end_s=95.0,
+                    label="ESP32_GENERIC",
+                    ccache_hits=120,
+                    ccache_misses=980,
+                ),
+                Task(start_s=0.0, end_s=30.0, label="PYBV11"),
+            ]
+        ),
+    ),
+    Ttestparam(
+        "test_utilisation",
+        Tasks(
+            [
+                Task(start_s=0.0, end_s=10.0, label="RPI_PICO_W"),
+                Task(start_s=0.0, end_s=20.0, label="ESP32_GENERIC"),
+                Task(
+                    start_s=10.0,
+                    end_s=40.0,
+                    label="Test X",
+                    tentacles=[
+                        ReportTentacle(
+                            label="PICO_W",
+                            board_variant="RPI_PICO_W",
+                            flash_duration_s=5.0,
+                        ),
+                    ],
+                    phases={PHASE_RELAYS: 1.0, PHASE_MIP: 4.0, PHASE_TEARDOWN: 2.0},
+                ),
+                Task(
+                    start_s=40.0,
+                    end_s=60.0,
+                    label="Test WLAN",
+                    tentacles=[
+                        ReportTentacle(label="ESP32", board_variant="ESP32_GENERIC"),
+                        ReportTentacle(label="PICO_W", board_variant="RPI_PICO_W"),
+                    ],
+                ),
+                Task(
+                    start_s=20.0,
+                    end_s=30.0,
+                    label="Test Y",
+                    tentacles=[
+                        ReportTentacle(label="ESP32", board_variant="ESP32_GENERIC"),
+                    ],
+                ),
+                Task(
+                    start_s=30.0,
+                    end_s=50.0,
+                    label="Test Z",
+                    tentacles=[
+                        ReportTentacle(label="PICO2", board_variant="RPI_PICO2"),
+                    ],
+                ),
+            ]
+        ),
+    ),
 ]
 
 
+def test_utilisation() -> None:
+    utilisations = TentacleUtilisations.factory(tasks=_TESTPARAMS[-1].tasks)
+
+    pico_w = utilisations["PICO_W"]
+    assert pico_w.phases_s[PHASE_FLASH] == 5.0
+    assert pico_w.phases_s[PHASE_TEST] == 18.0 + 20.0
+    assert pico_w.idle_s[IDLE_FIRMWARE] == 10.0
+    assert pico_w.idle_s[IDLE_NO_WORK] == 0.0
+
+    esp32 = utilisations["ESP32"]
+    assert esp32.idle_s[IDLE_FIRMWARE] == 20.0
+    assert esp32.idle_s[IDLE_REFERENCE] == 10.0
+    assert esp32.busy_s == 30.0
+
+    pico2 = utilisations["PICO2"]
+    assert pico2.idle_s[IDLE_OTHER] == 30.0
+    assert pico2.idle_s[IDLE_NO_WORK] == 10.0
+
+
+def test_trace_events() -> None:
+    phases = {
+        "Test WLAN": [
+            {
+                "name": "test",
+                "tentacle": "",
+                "start_s": 45.0,
+                "end_s": 58.0,
+                "exclusive_s": 9.0,
+            },
+            {
+                "name": "mip_install",
+                "tentacle": "ESP32",
+                "start_s": 46.0,
+                "end_s": 50.0,
+                "exclusive_s": 4.0,
+            },
+        ]
+    }
+    events = trace_events(tasks=_TESTPARAMS[-1].tasks, phases=phases)
+    complete = [e for e in events if e["ph"] == "X"]
+    assert len([e for e in complete if e["cat"] == "mpbuild"]) == 2
+    assert len([e for e in complete if e["cat"] == "test"]) == 5
+    # 'test' on both tentacles, 'mip_install' on ESP32 only
+    assert sorted(e["name"] for e in complete if e["cat"] == "phase") == [
+        "mip_install",
+        "test",
+        "test",
+    ]
+    (mip_install,) = [e for e in complete if e["name"] == "mip_install"]
+    assert (mip_install["ts"], mip_install["dur"]) == (46_000_000, 4_000_000)
+
+
 @pytest.mark.parametrize(
     "testparam", _TESTPARAMS, ids=lambda testparam: testparam.pytest_id
 )
@@ -130,3 +336,26 @@ def test_report_tasks(testparam: Ttestparam) -> None:
     ):
         with (DIRECTORY_RESULTS / f"{testparam.filename_base}{suffix}").open("w") as f:
             report.report(renderer=cls_renderer(f))
+
+
+@pytest.mark.parametrize(
+    "testparam", _TESTPARAMS, ids=lambda testparam: testparam.pytest_id
+)
+def test_tasks_factory_repr(testparam: Ttestparam) -> None:
+    assert Tasks.factory_repr(repr(testparam.tasks)) == testparam.tasks
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "__import__('os').getcwd()",
+        "[Task(start_s=1.0, end_s=2.0, label=open('x').read())]",
+        "[Task(1.0, 2.0, 'label')]",
+        "[Task(**{'start_s': 1.0})]",
+        "{'a': 1}",
+    ],
+)
+def test_tasks_factory_repr_invalid(text: str) -> None:
+    # The text is never evaluated
+    with pytest.raises(ValueError):
+        Tasks.factory_repr(text)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import logging
+import pathlib
+import time
+
+import pytest
+
+from testbed_micropython.report_task import util_report_trace, util_report_writer
+from testbed_micropython.report_task.util_report_tasks import Task, Tasks
+from testbed_micropython.report_task.util_report_writer import TaskReportWriter
+
+
+def _task(idx: int) -> Task:
+    return Task(
+        start_s=float(idx),
+        end_s=float(idx) + 1.0,
+        label=f"RUN-TESTS_STANDARD@5f2a-RPI_PICO2_{idx}",
+        tentacles=[],
+    )
+
+
+class FakeWriter:
+    def __init__(self) -> None:
+        self.written: list[int] = []
+        """
+        The number of tasks of every write.
+        """
+        self.fail = False
+
+    def __call__(self, directory_results: pathlib.Path, tasks: Tasks) -> None:
+        self.written.append(len(tasks))
+        if self.fail:
+            raise ValueError("render failed")
+
+
+@pytest.fixture
+def fake_writer(monkeypatch: pytest.MonkeyPatch) -> FakeWriter:
+    fake_writer = FakeWriter()
+    monkeypatch.setattr(util_report_writer, "write_task_report", fake_writer)
+    monkeypatch.setattr(
+        util_report_trace,
+        "write_task_trace",
+        lambda directory_results, tasks: None,
+    )
+    return fake_writer
+
+
+def test_task_report_writer_debounce(
+    tmp_path: pathlib.Path, fake_writer: FakeWriter
+) -> None:
+    writer = TaskReportWriter(directory_results=tmp_path)
+    writer.DEBOUNCE_S = 0.5
+    writer.MIN_INTERVAL_S = 0.0
+
+    # The tasks arrive faster than 'DEBOUNCE_S' but
+    # take longer than 'DEBOUNCE_S' in total
+    for idx in range(6):
+        writer.add_task(_task(idx))
+        time.sleep(0.1)
+    time.sleep(1.5)
+    assert fake_writer.written == [6]
+
+    writer.close()
+    assert fake_writer.written == [6, 6]
+    assert len(util_report_writer.read_task_log(tmp_path / "task_log_repr.txt")) == 6
+
+
+def test_task_report_writer_close_render_fails(
+    tmp_path: pathlib.Path,
+    fake_writer: FakeWriter,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    writer = TaskReportWriter(directory_results=tmp_path)
+    writer.add_task(_task(0))
+    fake_writer.fail = True
+
+    # Called in a 'finally': The error is logged, not raised
+    with caplog.at_level(logging.ERROR):
+        writer.close()
+    assert fake_writer.written == [1]
+    assert "render failed" in caplog.text
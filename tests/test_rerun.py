@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from testbed_micropython.report_test.util_baseclasses import (
+    Outcome,
+    ResultTestGroup,
+    ResultTestOutcome,
+)
+from testbed_micropython.report_test.util_testreport import next_rerun_of
+
+
+def _report(directory_relative: str, failed: list[str]) -> ResultTestGroup:
+    return ResultTestGroup(
+        directory_relative=directory_relative,
+        outcomes=[
+            ResultTestOutcome(name=name, outcome=Outcome.FAILED.value)
+            for name in failed
+        ],
+    )
+
+
+def test_next_rerun_of_completed() -> None:
+    report = _report("a", failed=["basics/int_big.py"])
+    assert next_rerun_of(rerun_of=None, report=report, success=True) is report
+
+
+def test_next_rerun_of_error() -> None:
+    """
+    The attempt crashed after 'basics/int_big.py' failed:
+    The tests after the crash never ran, so all tests are run again.
+    """
+    report = _report("a", failed=["basics/int_big.py"])
+    assert next_rerun_of(rerun_of=None, report=report, success=False) is None
+
+    # A rerun crashed: The same tests are run again.
+    rerun_of = _report("a", failed=["basics/int_big.py", "basics/list1.py"])
+    report = _report("b", failed=["basics/int_big.py"])
+    assert next_rerun_of(rerun_of=rerun_of, report=report, success=False) is rerun_of
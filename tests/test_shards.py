@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import pathlib
+import time
+
+import pytest
+
+from testbed_micropython import util_live_results, util_multiprocessing
+from testbed_micropython.report_test.util_baseclasses import (
+    ResultTestGroup,
+    ResultTestOutcome,
+)
+from testbed_micropython.report_test.util_testreport import merge_shards
+from testbed_micropython.testcollection import testrun_shards
+from testbed_micropython.testcollection.testrun_shards import (
+    file_weights,
+    partition,
+    strip_shard,
+)
+from testbed_micropython.util_live_results import LiveResults, LogfileTail
+
+
+def test_strip_shard() -> None:
+    assert (
+        strip_shard("RUN-TESTS_STANDARD+2of3@5f2a-RPI_PICO2")
+        == "RUN-TESTS_STANDARD@5f2a-RPI_PICO2"
+    )
+    assert (
+        strip_shard("RUN-TESTS_STANDARD@5f2a-RPI_PICO2")
+        == "RUN-TESTS_STANDARD@5f2a-RPI_PICO2"
+    )
+
+
+def test_partition() -> None:
+    weights = {"a.py": 5.0, "b.py": 4.0, "c.py": 3.0, "d.py": 2.0, "e.py": 2.0}
+    shards = partition(weights=weights, shards=2)
+    assert shards == [["a.py", "d.py", "e.py"], ["b.py", "c.py"]]
+    assert partition(weights=weights, shards=1) == [sorted(weights)]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now_s = 0.0
+
+    def __call__(self) -> float:
+        return self.now_s
+
+
+def _durations_s() -> dict[str, float]:
+    """
+    Many fast tests and a few slow ones, as in 'basics'.
+    """
+    durations_s = {f"basics/test_{idx:02d}.py": 0.02 + 0.01 * idx for idx in range(60)}
+    durations_s.update(
+        {
+            "basics/test_10.py": 12.0,
+            "basics/test_30.py": 9.0,
+            "basics/test_50.py": 6.0,
+        }
+    )
+    return durations_s
+
+
+def test_test_file_durations(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    run-tests.py writes the outcomes to the logfile,
+    'LogfileTail' samples the logfile and 'LiveResults' writes 'live_results.jsonl'.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    events: list[util_multiprocessing.EventTestOutcomes] = []
+    monkeypatch.setattr(
+        util_multiprocessing.EVENTLOGCALLBACK, "queue_put", events.append
+    )
+
+    durations_s = _durations_s()
+    directory_tests = tmp_path / "tests"
+    (directory_tests / "basics").mkdir(parents=True)
+    for test in durations_s:
+        # The file sizes do not correlate with the durations
+        (directory_tests / test).write_text(1000 * "#")
+
+    logfile = tmp_path / "run-tests.txt"
+    logfile.write_text("")
+    tail = LogfileTail(logfile=logfile, policy=util_live_results.EarlyAbortPolicy())
+    live_results = LiveResults(
+        filename_jsonl=tmp_path / util_live_results.FILENAME_LIVE_RESULTS
+    )
+
+    # Startup of 'run-tests.py'
+    end_s = 2.0
+    samples = 0
+    for test, duration_s in durations_s.items():
+        end_s += duration_s
+        while clock.now_s + LogfileTail.SAMPLE_S < end_s:
+            clock.now_s += LogfileTail.SAMPLE_S
+            tail._read()
+            samples += 1
+            if samples % 10 == 0:
+                tail._send()
+        with logfile.open("a") as f:
+            f.write(f"pass  {test}\n")
+    tail._poll(final=True)
+
+    for event in events:
+        event.target_unique_name = "RUN-TESTS_STANDARD@5f2a-RPI_PICO2"
+        live_results.handle_event(event)
+    assert live_results.outcomes.passed == len(durations_s)
+
+    durations = testrun_shards.TestFileDurations.factory(directory_results=tmp_path)
+    measured_s = durations["RUN-TESTS_STANDARD"]
+    # The first test includes the startup
+    assert "basics/test_00.py" not in measured_s
+    assert len(measured_s) == len(durations_s) - 1
+    for test in ("basics/test_10.py", "basics/test_30.py", "basics/test_50.py"):
+        assert measured_s[test] == pytest.approx(durations_s[test], abs=0.2)
+    assert measured_s["basics/test_11.py"] < 0.5
+
+    shards = 3
+    shard_tests = partition(
+        weights=file_weights(directory_tests=directory_tests, durations=measured_s),
+        shards=shards,
+    )
+    loads_s = [sum(durations_s[test] for test in tests) for tests in shard_tests]
+    # Every slow test in its own shard, the fast tests balance the load
+    assert max(loads_s) < 1.1 * sum(durations_s.values()) / shards
+
+
+def _shard(shard: str, outcomes: dict[str, str]) -> ResultTestGroup:
+    return ResultTestGroup(
+        directory_relative=f"RUN-TESTS_STANDARD+{shard}@5f2a-RPI_PICO2,a",
+        testgroup="RUN-TESTS_STANDARD",
+        testid=f"RUN-TESTS_STANDARD+{shard}@5f2a-RPI_PICO2",
+        tentacle_variant="5f2a-RPI_PICO2",
+        shard=shard,
+        msg_error="",
+        outcomes=[
+            ResultTestOutcome(name=name, outcome=outcome)
+            for name, outcome in outcomes.items()
+        ],
+    )
+
+
+def test_merge_shards() -> None:
+    merged = merge_shards(
+        [
+            _shard(
+                "1of2",
+                {
+                    "basics/a.py": "passed",
+                    "basics/b.py": "skipped",
+                    "thread/c.py": "passed",
+                },
+            ),
+            _shard(
+                "2of2",
+                {
+                    "basics/a.py": "skipped",
+                    "basics/b.py": "failed",
+                    # Outside of SHARD_TEST_DIRS: Runs in every shard
+                    "thread/c.py": "failed",
+                },
+            ),
+        ]
+    )
+    assert len(merged) == 1
+    assert merged[0].shard == "1of2,2of2"
+    assert merged[0].testid == "RUN-TESTS_STANDARD@5f2a-RPI_PICO2"
+    assert {o.name: o.outcome for o in merged[0].outcomes} == {
+        "basics/a.py": "passed",
+        "basics/b.py": "failed",
+        "thread/c.py": "failed",
+    }
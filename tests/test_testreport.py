@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import pathlib
+
+from testbed_micropython.report_test.util_baseclasses import (
+    Outcome,
+    ResultContext,
+    ResultTestGroup,
+    ResultTestOutcome,
+)
+from testbed_micropython.report_test.util_constants import (
+    FILENAME_CONTEXT_JSON,
+    FILENAME_CONTEXT_TESTGROUP_JSON,
+)
+from testbed_micropython.report_test.util_testreport import Data
+from testbed_micropython.report_test.util_xfail import XFailList
+
+TESTGROUP = "RUN-TESTS_STANDARD"
+
+
+def _write_testgroup(directory: pathlib.Path, tentacle_variant: str) -> None:
+    testgroup = ResultTestGroup(
+        directory_relative=f"{TESTGROUP}@{tentacle_variant}",
+        testgroup=TESTGROUP,
+        testid=f"{TESTGROUP}@{tentacle_variant}",
+        tentacle_variant=tentacle_variant,
+        msg_error="",
+        outcomes=[
+            ResultTestOutcome(name="basics/xfail.py", outcome=Outcome.FAILED.value),
+            ResultTestOutcome(name="basics/fail.py", outcome=Outcome.FAILED.value),
+            ResultTestOutcome(name="basics/pass.py", outcome=Outcome.PASSED.value),
+        ],
+    )
+    directory_testgroup = directory / testgroup.directory_relative
+    directory_testgroup.mkdir()
+    (directory_testgroup / FILENAME_CONTEXT_TESTGROUP_JSON).write_text(
+        json.dumps(dataclasses.asdict(testgroup))
+    )
+
+
+def test_gather_json_files_xfail(tmp_path: pathlib.Path) -> None:
+    (tmp_path / FILENAME_CONTEXT_JSON).write_text(
+        json.dumps(dataclasses.asdict(ResultContext()))
+    )
+    _write_testgroup(tmp_path, "5f2a-RPI_PICO2")
+    _write_testgroup(tmp_path, "3c2a-PYBV11")
+
+    xfail_list = XFailList()
+    xfail_group = xfail_list.get_group(testgroup=TESTGROUP)
+    for test_name in ("basics/xfail.py", "basics/pass.py"):
+        xfail_group.add(board_variant="RPI_PICO*", test_name=test_name)
+    filename_xfail = tmp_path / "xfail.json"
+    xfail_list.write(filename_xfail)
+
+    def outcomes(data: Data) -> dict[str, dict[str, str]]:
+        return {
+            testgroup.board_variant: {o.name: o.outcome for o in testgroup.outcomes}
+            for testgroup in data.testgroups
+        }
+
+    data = Data.gather_json_files(
+        directory_results=tmp_path, xfail_file=str(filename_xfail)
+    )
+    assert outcomes(data) == {
+        "RPI_PICO2": {
+            "basics/xfail.py": Outcome.XFAILED.value,
+            "basics/fail.py": Outcome.FAILED.value,
+            # Only failed tests are xfailed
+            "basics/pass.py": Outcome.PASSED.value,
+        },
+        # Other board variant
+        "PYBV11": {
+            "basics/xfail.py": Outcome.FAILED.value,
+            "basics/fail.py": Outcome.FAILED.value,
+            "basics/pass.py": Outcome.PASSED.value,
+        },
+    }
+
+    # Without xfail file
+    data = Data.gather_json_files(directory_results=tmp_path, xfail_file=None)
+    assert outcomes(data)["RPI_PICO2"]["basics/xfail.py"] == Outcome.FAILED.value
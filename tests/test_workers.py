@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import time
+import typing
+from dataclasses import dataclass
+
+from testbed_micropython import util_multiprocessing as mp
+
+
+@dataclass(repr=True)
+class EventExitPid(mp.EventExit):
+    pid: int
+
+
+def init_empty(arg1: mp.TargetArg1) -> None:
+    assert isinstance(arg1, mp.TargetArg1)
+
+
+def target_pid(arg1: mp.TargetArg1, sleep_s: float) -> None:
+    arg1.initfunc(arg1=arg1)
+    time.sleep(sleep_s)
+    arg1.queue_put(
+        EventExitPid(
+            arg1.target_unique_name,
+            logfile=pathlib.Path("/here_is_the_logfile"),
+            success=True,
+            pid=os.getpid(),
+        )
+    )
+
+
+class AsyncTargetWorker(mp.AsyncTarget):
+    def __init__(self, name: str, key: str, sleep_s: float, timeout_s: float) -> None:
+        super().__init__(
+            target_unique_name=name,
+            tentacles=[],
+            func=target_pid,
+            func_args=[sleep_s],
+            timeout_s=timeout_s,
+        )
+        self._key = key
+
+    @property
+    @typing.override
+    def worker_key(self) -> str | None:
+        return self._key
+
+
+def _run(target_ctx: mp.TargetCtx, async_target: AsyncTargetWorker) -> EventExitPid:
+    target_ctx.start(async_target=async_target)
+    end_s = time.monotonic() + 30.0
+    while time.monotonic() < end_s:
+        for event in target_ctx.iter_queue(timeout_s=1.0):
+            assert isinstance(event, EventExitPid)
+            assert event.target_unique_name == async_target.target_unique_name
+            assert async_target.target.handle_exit_event(event)
+            return event
+    raise TimeoutError(async_target.target_unique_name)
+
+
+def test_worker_reused() -> None:
+    with mp.TargetCtx(
+        multiprocessing=True, initfunc=init_empty, persistent_workers=True
+    ) as target_ctx:
+        event_a = _run(target_ctx, AsyncTargetWorker("a", "5f2a", 0.0, 30.0))
+        worker = target_ctx.workers["5f2a"]
+        assert not worker.busy
+        assert worker.is_alive
+
+        event_b = _run(target_ctx, AsyncTargetWorker("b", "5f2a", 0.0, 30.0))
+        assert event_a.pid == event_b.pid
+        assert target_ctx.workers["5f2a"] is worker
+
+        event_c = _run(target_ctx, AsyncTargetWorker("c", "3c2a", 0.0, 30.0))
+        assert event_c.pid != event_a.pid
+        assert sorted(target_ctx.workers) == ["3c2a", "5f2a"]
+    assert len(target_ctx.workers) == 0
+
+
+def test_workers_max_workers() -> None:
+    with mp.TargetCtx(
+        multiprocessing=True, initfunc=init_empty, persistent_workers=True
+    ) as target_ctx:
+        target_ctx.workers.max_workers = 2
+        for key in ("a", "b", "c"):
+            _run(target_ctx, AsyncTargetWorker(key, key, 0.0, 30.0))
+        # The worker idle the longest has been closed
+        assert sorted(target_ctx.workers) == ["b", "c"]
+
+
+def test_workers_max_idle() -> None:
+    with mp.TargetCtx(
+        multiprocessing=True, initfunc=init_empty, persistent_workers=True
+    ) as target_ctx:
+        target_ctx.workers.max_idle_s = 0.1
+        _run(target_ctx, AsyncTargetWorker("a", "a", 0.0, 30.0))
+        worker = target_ctx.workers["a"]
+        time.sleep(0.2)
+        target_ctx.workers.recycle()
+        assert len(target_ctx.workers) == 0
+        assert not worker.is_alive
+
+
+def test_target_job_timeout() -> None:
+    with mp.TargetCtx(
+        multiprocessing=True, initfunc=init_empty, persistent_workers=True
+    ) as target_ctx:
+        async_target = AsyncTargetWorker("a", "a", 30.0, 0.5)
+        target_ctx.start(async_target=async_target)
+        target = async_target.target
+        assert isinstance(target, mp.TargetJob)
+        worker = target_ctx.workers["a"]
+        assert worker.busy
+
+        time.sleep(1.0)
+        # The watchdog kills the worker
+        assert target.timeout_reached()
+        assert target.has_been_joined
+        assert not worker.is_alive
+
+        # The next job spawns a new worker
+        event = _run(target_ctx, AsyncTargetWorker("b", "a", 0.0, 30.0))
+        assert target_ctx.workers["a"] is not worker
+        assert event.pid != worker.process.pid
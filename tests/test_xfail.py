@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pathlib
+
+from testbed_micropython.report_test.util_xfail import (
+    XFailFile,
+    XFailFiles,
+    XFailList,
+)
+
+
+def _xfail_file(filename: pathlib.Path, board_variant: str) -> XFailFile:
+    xfail_list = XFailList()
+    xfail_group = xfail_list.get_group(testgroup="RUN-TESTS_STANDARD")
+    xfail_group.add(board_variant=board_variant, test_name="basics/0prelim.py")
+    xfail_list.write(filename)
+    return XFailFile.factory(filename=filename)
+
+
+def test_xfail_index(tmp_path: pathlib.Path) -> None:
+    xfail_files = XFailFiles(
+        [
+            _xfail_file(tmp_path / "exact.json", "RPI_PICO2"),
+            _xfail_file(tmp_path / "pattern.json", "RPI_PICO*"),
+        ]
+    )
+
+    def get(board_variant: str) -> list[str]:
+        return xfail_files.get_filelist(
+            testgroup="RUN-TESTS_STANDARD",
+            test_name="basics/0prelim.py",
+            board_variant=board_variant,
+        )
+
+    assert get("RPI_PICO2") == ["exact.json", "pattern.json"]
+    assert get("RPI_PICO_W") == ["pattern.json"]
+    assert get("PYBV11") == []
+    # 'list.index()' is not hidden by the lookup table
+    assert xfail_files.index(xfail_files[1]) == 1
+    assert xfail_files[1].xfail_list.match(
+        testgroup="RUN-TESTS_STANDARD",
+        test_name="basics/0prelim.py",
+        board_variant="RPI_PICO_W",
+    )
+
+
+def test_xfail_file_cached(tmp_path: pathlib.Path) -> None:
+    filename = tmp_path / "exact.json"
+    xfail_file = _xfail_file(filename, "RPI_PICO2")
+    assert XFailFile.factory(filename=filename) is xfail_file
+    xfail_file_changed = _xfail_file(filename, "RPI_PICO2-RISCV")
+    assert xfail_file_changed is not xfail_file